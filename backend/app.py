@@ -1,46 +1,68 @@
 # backend/app.py
 
-import os
-from flask import Flask, send_from_directory
+from flask import Flask, send_from_directory, jsonify
 from flask_cors import CORS
-import firebase_admin
-from firebase_admin import credentials
-from config import UPLOAD_FOLDER, FIREBASE_STORAGE_BUCKET
-from routes.reports import reports_bp
+from config import UPLOAD_FOLDER, WARMUP_ON_START
+from services import registry, metrics, firestore_profiler, http_cache
+from routes.reports import reports_bp, start_enrichment_sweeper
 from routes.admin import admin_bp
 from routes.team import team_bp
 from routes.translate import translate_bp
 from routes.speech_stt import speech_bp
+from routes.tiles import tiles_bp
 
-# Initialize Firebase Admin (service account file must be in backend/)
-if not os.path.exists("./firebase_admin_key.json"):
-    raise FileNotFoundError("Place firebase_admin_key.json in backend/ before running.")
 
-# Initialize app with storage bucket if provided
-cred = credentials.Certificate("firebase_admin_key.json")
-if FIREBASE_STORAGE_BUCKET:
-    firebase_admin.initialize_app(cred, {"storageBucket": FIREBASE_STORAGE_BUCKET})
-else:
-    # initialize without storage bucket (will error if you try to use storage)
-    firebase_admin.initialize_app(cred)
+def create_app(warm_up=WARMUP_ON_START):
+    """
+    App factory. Nothing heavy happens here: Firebase, Speech/Translate clients,
+    Gemini and the ML models are lazy services (services/registry.py) that load on
+    first use, or in a background warm-up thread when warm_up is True.
+    """
+    app = Flask(__name__, static_folder="../frontend", static_url_path="/static")
+    CORS(app)
+    # per-route latency histograms, optional Server-Timing header and GET /metrics
+    metrics.init_app(app)
+    # Firestore reads/writes/round trips per request, N+1 detection, GET /debug/firestore
+    firestore_profiler.init_app(app)
+    # gzip / brotli for large JSON responses (listings also get version ETags, see routes)
+    http_cache.init_app(app)
 
-app = Flask(__name__, static_folder="../frontend", static_url_path="/static")
-CORS(app)
+    # Register modular routes (blueprints)
+    app.register_blueprint(speech_bp, url_prefix="/api/speech")
+    app.register_blueprint(translate_bp, url_prefix="/api")
+    app.register_blueprint(team_bp, url_prefix="/api")
+    app.register_blueprint(reports_bp, url_prefix="/api")
+    app.register_blueprint(admin_bp, url_prefix="/api")
+    app.register_blueprint(tiles_bp, url_prefix="/api")
 
-# Ensure upload folder exists (kept for fallback/local debugging)
-os.makedirs(UPLOAD_FOLDER, exist_ok=True)
+    # Serve uploaded images at /uploads/<filename> (local fallback)
+    @app.route("/uploads/<path:filename>")
+    def uploaded_file(filename):
+        return send_from_directory(UPLOAD_FOLDER, filename)
 
-# Register modular routes (blueprints)
-app.register_blueprint(speech_bp, url_prefix="/api/speech")
-app.register_blueprint(translate_bp, url_prefix="/api")
-app.register_blueprint(team_bp, url_prefix="/api")
-app.register_blueprint(reports_bp, url_prefix="/api")
-app.register_blueprint(admin_bp, url_prefix="/api")
+    # Readiness: 200 once every required service (Firebase) has loaded, else 503
+    @app.route("/healthz")
+    def healthz():
+        from services.gemini_service import GATEWAY, tier_stats
+        from services.triage_queue import get_triage_queue
+        from services.admission import get_admission
+        ready, services = registry.readiness()
+        return jsonify({"ready": ready, "services": services, "llm_gateway": GATEWAY.status(),
+                        "analysis_tiers": tier_stats(), "triage": get_triage_queue().stats(),
+                        "admission": get_admission().stats()}), (200 if ready else 503)
+
+    if warm_up:
+        registry.warm_up_async()
+        from services.firestore_service import start_team_load_reconciler
+        from services.archive_service import start_archiver
+        from auth_store import start_revocation_sync
+        start_team_load_reconciler()
+        start_archiver()
+        start_enrichment_sweeper()
+        start_revocation_sync()
+    return app
 
-# Serve uploaded images at /uploads/<filename> (local fallback)
-@app.route("/uploads/<path:filename>")
-def uploaded_file(filename):
-    return send_from_directory(UPLOAD_FOLDER, filename)
 
 if __name__ == "__main__":
+    app = create_app()
     app.run(debug=True, port=5000)
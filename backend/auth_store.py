@@ -1,5 +1,170 @@
 # backend/auth_store.py
-# Central, shared in-memory token stores (dev-only)
-# Keep minimal and import from routes to share tokens across blueprints.
-ACTIVE_ADMIN_TOKENS = {}
-ACTIVE_TEAM_TOKENS = {}
+# Stateless signed auth tokens (JWT / HS256) shared by the admin and team blueprints.
+# Tokens carry role (+ team_id for teams) and an expiry, so any worker or node can
+# verify a request locally without a shared token store. Logout adds the token's jti to an
+# in-process deny-list and to the shared `revoked_tokens` collection; a background thread
+# pulls other workers' revocations into the deny-list every REVOCATION_SYNC_SECONDS, so
+# verifying a token never touches the database. An LRU of already-verified tokens skips
+# repeated HMAC checks.
+
+import os
+import time
+import uuid
+import logging
+import threading
+
+import jwt
+from cachetools import LRUCache
+
+from config import AUTH_SECRET_KEY, AUTH_TOKEN_TTL_SECONDS
+
+JWT_ALGORITHM = "HS256"
+
+ROLE_ADMIN = "admin"
+ROLE_TEAM = "team"
+
+# how often each worker pulls new revocations into its deny-list, i.e. the worst-case delay
+# before a logout on another worker takes effect; a failed pull is retried after a doubling
+# backoff capped at REVOCATION_SYNC_MAX_BACKOFF_SECONDS (tokens stay valid meanwhile)
+REVOCATION_SYNC_SECONDS = float(os.getenv("AUTH_REVOCATION_SYNC_SECONDS", "10"))
+REVOCATION_SYNC_MAX_BACKOFF_SECONDS = float(os.getenv("AUTH_REVOCATION_SYNC_MAX_BACKOFF_SECONDS", "300"))
+# pulls after the first re-read this much history, for clock skew between workers
+_SYNC_OVERLAP_SECONDS = 60
+
+if not AUTH_SECRET_KEY:
+    # dev fallback: a per-process secret means tokens are only valid on this worker
+    AUTH_SECRET_KEY = uuid.uuid4().hex + uuid.uuid4().hex
+    logging.warning("AUTH_SECRET_KEY not set; using an ephemeral per-process signing key.")
+
+_lock = threading.Lock()
+
+# token string -> decoded claims (only tokens that passed signature verification)
+_VERIFIED = LRUCache(maxsize=4096)
+
+# deny-list: jti -> exp (unix seconds) of tokens revoked by this or (once synced) any other
+# worker; entries are dropped once the token would have expired anyway
+_REVOKED = {}
+
+# state of the background pull: last pull start (None before the first full pull) and
+# consecutive failures
+_SYNC = {"since": None, "failures": 0}
+
+
+def issue_token(role, subject, team_id=None, ttl_seconds=None):
+    """Create a signed token for `subject` (admin username or team id)."""
+    now = int(time.time())
+    claims = {
+        "sub": str(subject),
+        "role": role,
+        "jti": uuid.uuid4().hex,
+        "iat": now,
+        "exp": now + int(ttl_seconds or AUTH_TOKEN_TTL_SECONDS),
+    }
+    if team_id:
+        claims["team_id"] = team_id
+    return jwt.encode(claims, AUTH_SECRET_KEY, algorithm=JWT_ALGORITHM)
+
+
+def _prune_revoked(now):
+    for jti, exp in list(_REVOKED.items()):
+        if exp <= now:
+            _REVOKED.pop(jti, None)
+
+
+def _is_revoked(jti):
+    with _lock:
+        return bool(jti) and jti in _REVOKED
+
+
+def sync_revocations():
+    """
+    Pull revocations recorded since the last pull (all unexpired ones the first time) into
+    the deny-list. Returns the seconds until the next pull: REVOCATION_SYNC_SECONDS, or a
+    backoff after a failure, during which this worker keeps serving with the list it has.
+    """
+    from services.firestore_service import get_token_revocations
+    started = time.time()
+    since = _SYNC["since"]
+    try:
+        pulled = get_token_revocations(None if since is None else since - _SYNC_OVERLAP_SECONDS)
+    except Exception as e:
+        _SYNC["failures"] += 1
+        delay = min(REVOCATION_SYNC_SECONDS * 2 ** _SYNC["failures"], REVOCATION_SYNC_MAX_BACKOFF_SECONDS)
+        if _SYNC["failures"] == 1:
+            logging.warning("Token revocation sync failed, retrying with backoff: %s", e)
+        return delay
+    if _SYNC["failures"]:
+        logging.info("Token revocation sync recovered after %d failed pulls", _SYNC["failures"])
+    _SYNC.update(since=started, failures=0)
+    with _lock:
+        _prune_revoked(started)
+        _REVOKED.update((jti, exp) for jti, exp in pulled.items() if exp > started)
+    return REVOCATION_SYNC_SECONDS
+
+
+_SYNCER = None
+
+def start_revocation_sync(interval=REVOCATION_SYNC_SECONDS):
+    """Run sync_revocations() now and then on its own schedule in a daemon thread (0 disables)."""
+    global _SYNCER
+    if interval <= 0 or (_SYNCER is not None and _SYNCER.is_alive()):
+        return _SYNCER
+
+    def loop():
+        while True:
+            try:
+                delay = sync_revocations()
+            except Exception:
+                logging.exception("Token revocation sync failed")
+                delay = interval
+            time.sleep(delay)
+
+    _SYNCER = threading.Thread(target=loop, name="revocation-sync", daemon=True)
+    _SYNCER.start()
+    return _SYNCER
+
+
+def verify_token(token, role=None):
+    """
+    Return the token's claims if it is validly signed, unexpired, not revoked and
+    (optionally) carries the given role. Returns None otherwise.
+    """
+    if not token:
+        return None
+    now = time.time()
+    with _lock:
+        claims = _VERIFIED.get(token)
+    if claims is None:
+        try:
+            claims = jwt.decode(token, AUTH_SECRET_KEY, algorithms=[JWT_ALGORITHM])
+        except jwt.PyJWTError:
+            return None
+        with _lock:
+            _VERIFIED[token] = claims
+    if claims.get("exp", 0) <= now:
+        with _lock:
+            _VERIFIED.pop(token, None)
+        return None
+    if _is_revoked(claims.get("jti")):
+        return None
+    if role is not None and claims.get("role") != role:
+        return None
+    return claims
+
+
+def revoke_token(token):
+    """Revoke a token (logout) on every worker. Returns True if the token was valid."""
+    claims = verify_token(token)
+    if not claims:
+        return False
+    jti, exp = claims["jti"], claims.get("exp", 0)
+    with _lock:
+        _prune_revoked(time.time())
+        _REVOKED[jti] = exp
+        _VERIFIED.pop(token, None)
+    try:
+        from services.firestore_service import save_token_revocation
+        save_token_revocation(jti, exp)
+    except Exception as e:
+        logging.warning("Token revocation not shared with other workers: %s", e)
+    return True
@@ -0,0 +1,243 @@
+# backend/benchmarks/bench_admission.py
+
+"""
+Admission control under a 10x surge of POST /api/submit-report.
+
+Each mode runs in its own process against the local stand-ins (benchmarks/standins.py),
+with tiered analysis off so every full-pipeline report costs one FakeLLM call of
+--llm-latency-ms on --workers triage workers, i.e. a capacity of about
+workers / llm-latency reports per second. Reports arrive open-loop (Poisson) at
+--overload x that capacity for --seconds, from distinct IPs / phones; --critical-share
+of them are critical-sounding texts, the rest low / medium. Latency is measured from
+the scheduled arrival time.
+
+  off   ADMISSION_ENABLED=0: everything waits in the triage queue (202 after the
+        response timeout).
+  on    services/admission.py: full pipeline while it keeps up, degraded (keyword
+        analysis, deferred enrichment) or shed (503) beyond that.
+
+Also checks the per-IP token bucket (a burst from one address gets 429 + Retry-After),
+on a controller held at ADMISSION_MAX_INFLIGHT, that a low-priority report is shed
+while a high-priority one still gets in, that a full deferred queue sheds instead of
+degrading, and - after a simulated restart that drops the in-memory deferred queue -
+that the pending-enrichment sweep finishes every degraded report. A last check plants jobs
+whose upload sits on another host: the sweep must leave them alone until they are orphaned,
+and finish orphaned jobs (and its own jobs whose file is gone) marked image_lost, counted
+in crisismap_enrichment_images_lost_total. Exits non-zero if, with admission on, p99
+exceeds 2x ADMISSION_SLO_MS or is not at least 5x below p99 without it, if any request
+errors (5xx other than 503), if high-priority reports are shed at a higher rate than
+low-priority ones, or if either check fails.
+
+Usage (from backend/):
+    python benchmarks/bench_admission.py [--overload 10] [--seconds 15] [--workers 2] [--llm-latency-ms 500]
+"""
+
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(BACKEND_DIR))
+
+
+def run_mode(args):
+    os.environ["ADMISSION_ENABLED"] = "1" if args.mode == "on" else "0"
+    os.environ["ANALYSIS_TIERED"] = "0"
+    os.environ["TRIAGE_WORKERS"] = str(args.workers)
+    from benchmarks.bench_e2e import Harness, percentiles, citizen_ip
+    from services import admission
+
+    h = Harness(argparse.Namespace(seed=args.seed, fs_latency_ms=2, storage_latency_ms=20,
+                                   llm_latency_ms=args.llm_latency_ms, llm_jitter_ms=0, llm_fail_rate=0))
+    rnd = random.Random(args.seed)
+    critical = [t for t, label in h.templates if label == "critical"]
+    minor = [t for t, label in h.templates if label in ("low", "medium")]
+    rate = args.overload * args.workers * 1000.0 / args.llm_latency_ms
+    schedule, t = [], 0.0
+    while True:
+        t += rnd.expovariate(rate)
+        if t >= args.seconds:
+            break
+        schedule.append((t, rnd.choice(critical) if rnd.random() < args.critical_share else rnd.choice(minor)))
+
+    results = []
+    lock = threading.Lock()
+
+    def submit(i, due, text):
+        lat, lng = h.scatter()
+        data = {"name": f"citizen{i}", "phone": f"+9100000{i:05d}", "location": f"surge-{i}", "description": text,
+                "lat": str(lat), "lng": str(lng)}
+        r = h.client().post("/api/submit-report", data=data, content_type="multipart/form-data",
+                            environ_base={"REMOTE_ADDR": citizen_ip(i)})
+        body = r.get_json(silent=True) or {}
+        row = {"latency": time.perf_counter() - due, "status": r.status_code, "degraded": bool(body.get("degraded")),
+               "high": admission.keyword_priority(text)[1] >= admission.ADMISSION_HIGH_PRIORITY,
+               "retry_after": r.headers.get("Retry-After")}
+        with lock:
+            results.append(row)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.threads) as pool:
+        for i, (offset, text) in enumerate(schedule):
+            due = start + offset
+            delay = due - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            pool.submit(submit, i, due, text)
+    elapsed = time.perf_counter() - start
+
+    def shed_rate(high):
+        rows = [r for r in results if r["high"] == high]
+        return round(sum(r["status"] == 503 for r in rows) / len(rows), 4) if rows else None
+
+    statuses = {}
+    for r in results:
+        key = f"{r['status']}{' degraded' if r['degraded'] else ''}"
+        statuses[key] = statuses.get(key, 0) + 1
+    out = {
+        "mode": args.mode, "offered_rps": round(rate, 1), "requests": len(results), "elapsed_s": round(elapsed, 1),
+        "latency": percentiles([r["latency"] for r in results]),
+        "accepted_latency": percentiles([r["latency"] for r in results if r["status"] in (200, 202)]),
+        "statuses": dict(sorted(statuses.items())),
+        "errors": sum(r["status"] >= 500 and r["status"] != 503 for r in results),
+        "missing_retry_after": sum(r["status"] in (429, 503) and not r["retry_after"] for r in results),
+        "shed_rate": {"high_priority": shed_rate(True), "low_priority": shed_rate(False)},
+    }
+    if args.mode == "on":
+        out["admission"] = admission.get_admission().stats()
+        # one address, more reports at once than the IP burst allows
+        def same_ip(i):
+            r = h.client().post("/api/submit-report", data={"name": "x", "phone": f"+9199999{i:05d}", "location": "x",
+                                                             "description": "minor pothole"},
+                                content_type="multipart/form-data", environ_base={"REMOTE_ADDR": "192.0.2.1"})
+            return r.status_code, r.headers.get("Retry-After")
+        burst = int(admission.ADMISSION_IP_BURST) + 10
+        with ThreadPoolExecutor(max_workers=burst) as pool:
+            codes = list(pool.map(same_ip, range(burst)))
+        out["same_ip_burst"] = {"sent": burst, "rate_limited": sum(c == 429 and bool(ra) for c, ra in codes)}
+        # shedding order at the in-flight limit, on a fresh controller (nothing released)
+        ctl = admission.AdmissionController()
+        low, high = minor[0], critical[0]
+        held = [ctl.admit(f"198.51.100.{i % 250}", f"+9188888{i:05d}", low) for i in range(admission.ADMISSION_MAX_INFLIGHT)]
+        out["at_limit"] = {"held": sum(t.route != admission.ROUTE_SHED for t in held),
+                           "low_priority": ctl.admit("203.0.113.1", "+911", low).route,
+                           "high_priority": ctl.admit("203.0.113.2", "+912", high).route}
+        # no room for deferred enrichment: degraded-mode reports are shed instead
+        ctl = admission.AdmissionController()
+        ctl._degraded_until = time.monotonic() + 60
+        deferred_max, admission.ADMISSION_DEFERRED_MAX = admission.ADMISSION_DEFERRED_MAX, 0
+        out["deferred_full_route"] = ctl.admit("203.0.113.3", "+913", low).route
+        admission.ADMISSION_DEFERRED_MAX = deferred_max
+        # restart: a fresh controller with an empty deferred queue, load gone
+        from routes import reports
+
+        def pending():
+            return sum(1 for d in h.fs._data.get("processed_incidents", {}).values() if d.get("enrichment_pending"))
+        old = admission.get_admission()
+        with old._deferred_cond:
+            lost = len(old._deferred)
+            old._deferred.clear()
+        before = pending()
+        admission._CONTROLLER = None
+        h.llm.latency_ms = 0
+        requeued, deadline = 0, time.monotonic() + 120
+        while pending() and time.monotonic() < deadline:
+            requeued += reports.requeue_pending_enrichments(older_than_seconds=0)  # what the sweeper runs
+            time.sleep(0.5)
+        out["restart_recovery"] = {"lost_from_queue": lost, "pending_before": before, "requeued": requeued,
+                                   "pending_after": pending()}
+        # uploads held by another host (alive / gone), and one of ours whose file vanished
+        now = time.time()
+        jobs = {"other_host": ("host-b", now - 2 * reports.ENRICHMENT_STALE_SECONDS),
+                "orphaned": ("host-b", now - reports.ENRICHMENT_ORPHAN_SECONDS - 1),
+                "own_missing_file": (reports.ENRICHMENT_HOST, now - 2 * reports.ENRICHMENT_STALE_SECONDS)}
+        col = h.fs.collection("processed_incidents")
+        for name, (host, queued_at) in jobs.items():
+            col.document(f"cross_host_{name}").set({
+                "description": "water entering houses near the river", "location": name, "lat": 12.9, "lng": 74.8,
+                "image_filename": f"{name}.jpg", "image_url": None, "status": "new", "timestamp": datetime.utcnow(),
+                "analysis": {"severity": "high"}, "enrichment_pending": True,
+                "enrichment": {"priority": 1.0, "local_path": f"/nonexistent/{name}.jpg", "content_type": "image/jpeg",
+                               "host": host, "queued_at": queued_at}})
+        lost0 = reports.IMAGES_LOST.values.get((), 0)
+        reports.requeue_pending_enrichments()  # what the sweeper runs, with the default ages
+        deadline = time.monotonic() + 30
+        while time.monotonic() < deadline and (h.fs._data["processed_incidents"]["cross_host_orphaned"]["enrichment_pending"]
+                                               or h.fs._data["processed_incidents"]["cross_host_own_missing_file"]["enrichment_pending"]):
+            time.sleep(0.1)
+        docs = h.fs._data["processed_incidents"]
+        out["cross_host"] = {name: {"pending": docs[f"cross_host_{name}"].get("enrichment_pending"),
+                                    "image_lost": bool(docs[f"cross_host_{name}"].get("image_lost"))} for name in jobs}
+        out["cross_host"]["images_lost_counted"] = reports.IMAGES_LOST.values.get((), 0) - lost0
+        out["slo_ms"] = admission.ADMISSION_SLO_MS
+    print(json.dumps(out))
+    sys.stdout.flush()
+    os._exit(0)  # leave the triage backlog / deferred enrichment behind
+
+
+def main():
+    p = argparse.ArgumentParser()
+    p.add_argument("--overload", type=float, default=10.0)
+    p.add_argument("--seconds", type=float, default=15.0)
+    p.add_argument("--workers", type=int, default=2)
+    p.add_argument("--llm-latency-ms", type=float, default=500)
+    p.add_argument("--critical-share", type=float, default=0.3)
+    p.add_argument("--threads", type=int, default=256)
+    p.add_argument("--seed", type=int, default=7)
+    p.add_argument("--mode", choices=("on", "off"), help=argparse.SUPPRESS)
+    args = p.parse_args()
+    if args.mode:
+        return run_mode(args)
+
+    runs = {}
+    for mode in ("off", "on"):
+        cmd = [sys.executable, __file__, "--mode", mode] + sys.argv[1:]
+        proc = subprocess.run(cmd, cwd=BACKEND_DIR, capture_output=True, text=True)
+        lines = [l for l in proc.stdout.splitlines() if l.startswith("{")]
+        if proc.returncode or not lines:
+            sys.stderr.write(proc.stderr[-4000:])
+            sys.exit(f"{mode} run failed")
+        runs[mode] = json.loads(lines[-1])
+    print(json.dumps(runs, indent=2))
+
+    on, off = runs["on"], runs["off"]
+    shed = on["shed_rate"]
+    problems = []
+    if on["latency"]["p99_ms"] > 2 * on["slo_ms"]:
+        problems.append("p99 with admission above 2x SLO")
+    if on["latency"]["p99_ms"] * 5 > off["latency"]["p99_ms"]:
+        problems.append("p99 with admission not 5x below without")
+    if on["errors"] or on["missing_retry_after"]:
+        problems.append("errors or missing Retry-After with admission")
+    if (shed["high_priority"] or 0) > (shed["low_priority"] or 0):
+        problems.append("high-priority reports shed more than low-priority ones")
+    if not on["same_ip_burst"]["rate_limited"]:
+        problems.append("per-IP rate limit never triggered")
+    if on["at_limit"]["low_priority"] != "shed" or on["at_limit"]["high_priority"] == "shed":
+        problems.append("at the in-flight limit, low priority not shed before high priority")
+    if on["deferred_full_route"] != "shed":
+        problems.append("degraded report admitted with the deferred queue full")
+    recovery = on["restart_recovery"]
+    if not recovery["pending_before"] or recovery["pending_after"]:
+        problems.append("pending enrichments not recovered after a restart")
+    cross = on["cross_host"]
+    if not cross["other_host"]["pending"]:
+        problems.append("a live host's deferred upload was swept by another host")
+    if cross["orphaned"]["pending"] or cross["own_missing_file"]["pending"] \
+            or not (cross["orphaned"]["image_lost"] and cross["own_missing_file"]["image_lost"]) \
+            or cross["images_lost_counted"] != 2:
+        problems.append("orphaned / missing-file enrichments not finished and flagged image_lost")
+    print(json.dumps({"problems": problems}))
+    sys.exit(1 if problems else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,220 @@
+# backend/benchmarks/bench_analytics.py
+
+"""
+/api/analytics from hourly rollups vs streaming processed_incidents.
+
+Part 1 (correctness, --stored incidents kept in FakeFirestore, spread over 30 days):
+  - backfill with rebuild_rollups()
+  - compare the 30-day analytics (counts by type / severity / status, time-to-dispatch
+    and time-to-close quantiles) with an exact computation over the stored incidents
+  - drive incremental writes through the normal paths (new reports, status changes,
+    analysis refinement, a dispatch commit) and check the stored rollups still equal
+    a recount from scratch
+  - time the legacy full-collection scan for comparison
+
+Part 2 (scale, --incidents synthetic incidents over one year, default 1M): only the
+rollups are stored (8,760 hourly docs, built through the same delta code); measures
+GET /api/analytics for 24h / 7d / 30d / 365d windows and checks the 365d quantiles
+against the exact ones. projected_ms adds --fs-latency-ms per Firestore round trip;
+the legacy scan at 1M is extrapolated from part 1 (docs scanned are linear in history).
+
+Usage (from backend/):
+    python benchmarks/bench_analytics.py [--incidents 1000000] [--stored 20000] [--fs-latency-ms 2]
+"""
+
+import argparse
+import json
+import random
+import sys
+import time
+import uuid
+from datetime import datetime, timedelta
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from benchmarks.bench_e2e import Harness
+from services import firestore_service, rollups
+from services.dispatch_service import commit_dispatch
+from services.gemini_service import INCIDENT_TYPES
+
+TYPES = sorted(INCIDENT_TYPES)
+SEVERITIES = ["low", "medium", "high", "critical"]
+ACCURACY = rollups.ROLLUP_SKETCH_ACCURACY
+
+
+def synthetic_incident(rnd, start, span_hours):
+    ts = start + timedelta(seconds=rnd.uniform(0, span_hours * 3600))
+    status = rnd.choices(["new", "rescue_dispatched", "closed"], weights=[2, 3, 5])[0]
+    doc = {"timestamp": ts, "status": status,
+           "analysis": {"incident_type": rnd.choice(TYPES), "severity": rnd.choice(SEVERITIES)}}
+    if status != "new":
+        doc["dispatched_at"] = ts + timedelta(seconds=rnd.lognormvariate(6.5, 0.8))
+    if status == "closed":
+        doc["closed_at"] = doc["dispatched_at"] + timedelta(seconds=rnd.lognormvariate(8.0, 0.6))
+        doc["status_updated_at"] = doc["closed_at"]
+    return doc
+
+
+def exact(docs):
+    out = {"count": 0, "incident_type": {}, "severity": {}, "status": {}}
+    durations = {"ttd": [], "ttc": []}
+    for d in docs:
+        ts = rollups.as_utc(d.get("timestamp"))
+        if ts is None:
+            continue
+        out["count"] += 1
+        for name, val in (("incident_type", (d.get("analysis") or {}).get("incident_type") or "other"),
+                          ("severity", (d.get("analysis") or {}).get("severity") or d.get("severity") or "unknown"),
+                          ("status", d.get("status") or "new")):
+            key = rollups.field_key(val)
+            out[name][key] = out[name].get(key, 0) + 1
+        for k, v in rollups._durations(d, ts).items():
+            durations[k].append(v)
+    return out, durations
+
+
+def check_quantiles(summary, durations):
+    bad = []
+    for prefix, name in rollups.DURATIONS.items():
+        vals = sorted(durations[prefix])
+        if summary[name]["count"] != len(vals):
+            bad.append((name, "count", len(vals), summary[name]["count"]))
+            continue
+        for q in rollups.QUANTILES:
+            if not vals:
+                continue
+            want = vals[int(q * (len(vals) - 1))]
+            got = summary[name][f"p{int(q * 100)}"]
+            if abs(got - want) > 2 * ACCURACY * want + 0.1:
+                bad.append((name, q, round(want, 1), got))
+    return bad
+
+
+def stored_mismatches(fs):
+    expected = {}
+    for d in fs._data.get("processed_incidents", {}).values():
+        for hour, fields in rollups.incident_rollup_deltas({}, d).items():
+            cur = expected.setdefault(hour, {})
+            for f, n in fields.items():
+                cur[f] = cur.get(f, 0) + n
+    stored = fs._data.get(rollups.ROLLUPS_COLLECTION, {})
+    bad = []
+    for hour in set(expected) | set(stored):
+        exp, got = expected.get(hour, {}), stored.get(hour, {})
+        for f in set(exp) | set(got):
+            if f in ("hour", "start"):
+                continue
+            if abs((exp.get(f) or 0) - (got.get(f) or 0)) > 1e-6:
+                bad.append((hour, f, exp.get(f), got.get(f)))
+    return bad
+
+
+def query(h, frm, to, bucket, latency_ms):
+    c = h.client()
+    h.fs.reset_ops()
+    t0 = time.perf_counter()
+    r = c.get(f"/api/analytics?from={frm.isoformat()}&to={to.isoformat()}&bucket={bucket}",
+              headers={"x-admin-token": h.admin_token})
+    ms = (time.perf_counter() - t0) * 1000
+    assert r.status_code == 200, r.status_code
+    ops = h.fs.op_counts()
+    body = r.get_json()
+    return body, {"ms": round(ms, 1), "round_trips": ops["round_trips"], "docs_read": body["docs_read"],
+                  "bytes": len(r.data), "projected_ms": round(ms + ops["round_trips"] * latency_ms, 1)}
+
+
+def legacy_scan(fs):
+    """What /api/analytics would cost without rollups: stream every incident and aggregate."""
+    docs = [d.to_dict() for d in fs.collection("processed_incidents").stream()]
+    return exact(docs)
+
+
+def main():
+    p = argparse.ArgumentParser()
+    p.add_argument("--incidents", type=int, default=1000000)
+    p.add_argument("--stored", type=int, default=20000)
+    p.add_argument("--fs-latency-ms", type=float, default=2.0)
+    args = p.parse_args()
+
+    h = Harness(argparse.Namespace(seed=0, fs_latency_ms=0.0, storage_latency_ms=0.0, llm_latency_ms=0.0,
+                                   llm_jitter_ms=0.0, llm_fail_rate=0.0))
+    team_ids = h.seed_teams(3)
+    rnd = random.Random(0)
+    now = datetime.utcnow().replace(minute=0, second=0, microsecond=0)
+
+    # ---- part 1: correctness on stored incidents ----
+    start = now - timedelta(days=30)
+    col = h.fs.collection("processed_incidents")
+    for _ in range(args.stored):
+        col.add(synthetic_incident(rnd, start, 30 * 24))
+    t0 = time.perf_counter()
+    backfill = firestore_service.rebuild_rollups()
+    backfill["ms"] = round((time.perf_counter() - t0) * 1000, 1)
+
+    body, _ = query(h, start, now, "day", 0)
+    want, durations = exact(h.fs._data["processed_incidents"].values())
+    problems = [("totals", want, body["totals"])] if body["totals"] != want else []
+    problems += check_quantiles(body, durations)
+
+    h.fs.reset_ops()
+    t0 = time.perf_counter()
+    legacy_scan(h.fs)
+    legacy_ms = (time.perf_counter() - t0) * 1000
+    legacy = {"incidents": args.stored, "ms": round(legacy_ms, 1), "docs_read": args.stored,
+              "extrapolated_ms_at_scale": round(legacy_ms * args.incidents / args.stored, 1)}
+
+    ids = list(h.fs._data["processed_incidents"])
+    for _ in range(300):
+        firestore_service.save_processed_incident({**synthetic_incident(rnd, now - timedelta(hours=2), 2), "status": "new"})
+    for i in rnd.sample(ids, 400):
+        firestore_service.update_incident_status(i, rnd.choice(["rescue_dispatched", "closed", "in_progress"]))
+    for i in rnd.sample(ids, 100):
+        firestore_service.update_incident_analysis(i, {"severity": rnd.choice(SEVERITIES), "incident_type": rnd.choice(TYPES)})
+    commit_dispatch({"dispatch_id": f"bench_{uuid.uuid4().hex[:8]}", "team_id": team_ids[0],
+                     "incidents": [{"_id": i} for i in rnd.sample(ids, 700)]}, team_id=team_ids[0])
+    incremental_bad = stored_mismatches(h.fs)
+    body, _ = query(h, start, now + timedelta(hours=1), "hour", 0)
+    want, durations = exact(h.fs._data["processed_incidents"].values())
+    if body["totals"] != want:
+        problems.append(("totals after writes", want, body["totals"]))
+    problems += check_quantiles(body, durations)
+
+    # ---- part 2: query latency with a year of history ----
+    h.fs._data.pop("processed_incidents", None)
+    h.fs._data.pop(rollups.ROLLUPS_COLLECTION, None)
+    year_start = now - timedelta(days=365)
+    hours, durations = {}, {"ttd": [], "ttc": []}
+    t0 = time.perf_counter()
+    for _ in range(args.incidents):
+        doc = synthetic_incident(rnd, year_start, 365 * 24)
+        for hour, fields in rollups.incident_rollup_deltas({}, doc).items():
+            cur = hours.setdefault(hour, {})
+            for f, n in fields.items():
+                cur[f] = cur.get(f, 0) + n
+        for k, v in rollups._durations(doc, doc["timestamp"]).items():
+            durations[k].append(v)
+    rdb = firestore_service.get_db()
+    firestore_service._commit_writes(rdb, [("set", rdb.collection(rollups.ROLLUPS_COLLECTION).document(hr),
+                                            {**f, **rollups.doc_fields(hr)}) for hr, f in hours.items()])
+    build_s = time.perf_counter() - t0
+
+    results = []
+    for label, days, bucket in (("24h", 1, "hour"), ("7d", 7, "hour"), ("30d", 30, "day"), ("365d", 366, "day")):
+        body, res = query(h, now - timedelta(days=days), now, bucket, args.fs_latency_ms)
+        results.append({"window": label, "bucket": bucket, **res})
+    problems += check_quantiles(body, durations)
+    if body["totals"]["count"] != args.incidents:
+        problems.append(("365d count", args.incidents, body["totals"]["count"]))
+
+    print(json.dumps({"part1": {"stored": args.stored, "backfill": backfill, "legacy_scan": legacy,
+                                "incremental_mismatches": len(incremental_bad), "examples": incremental_bad[:5]},
+                      "part2": {"incidents": args.incidents, "rollup_docs": len(hours), "build_s": round(build_s, 1),
+                                "queries": results,
+                                "quantiles_365d": {"time_to_dispatch": body["time_to_dispatch"], "time_to_close": body["time_to_close"]}},
+                      "problems": problems[:10]}, indent=2, default=str))
+    sys.exit(0 if not problems and not incremental_bad else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,197 @@
+# backend/benchmarks/bench_archive.py
+
+"""
+Hot-path latency before and after archiving closed history to Parquet.
+
+Seeds --incidents incidents in FakeFirestore: --archived-share of them closed 40-300 days
+ago in completed dispatches of 10, the rest recent (new / dispatched, in active
+dispatches). Backfills the counters, then measures the hot paths
+  - list:        GET /api/incidents
+  - search:      GET /api/incidents?q=flood
+  - status_new:  GET /api/incidents?status=new
+  - reconcile:   reconcile_team_loads() (projected scan of the collection)
+runs run_archive(older_than_days=30) and measures them again, plus the archive
+queries (historical search, dispatch lookup, stats; cold and warm cache).
+
+Checks: the hot collection keeps exactly the recent incidents; every archived incident
+and finished dispatch is in the archive and found by its search; /api/analytics is
+unchanged by archiving (and by a rebuild_rollups() afterwards); the tile counters
+match a recount of the hot collection; no hot incident points at a missing dispatch.
+
+Usage (from backend/):
+    python benchmarks/bench_archive.py [--incidents 20000] [--archived-share 0.9] [--fs-latency-ms 2]
+"""
+
+import argparse
+import json
+import random
+import shutil
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from benchmarks.bench_e2e import Harness
+from benchmarks.bench_tiles import mismatches as tile_mismatches
+from services import firestore_service, archive_service
+
+
+def timed_call(h, name, fn, latency_ms):
+    h.fs.reset_ops()
+    t0 = time.perf_counter()
+    out = fn()
+    ms = (time.perf_counter() - t0) * 1000
+    rt = h.fs.op_counts()["round_trips"]
+    return out, {"step": name, "ms": round(ms, 1), "round_trips": rt, "projected_ms": round(ms + rt * latency_ms, 1)}
+
+
+def hot_paths(h, latency_ms):
+    c = h.client()
+    steps = [("list", lambda: c.get("/api/incidents").get_json()),
+             ("search", lambda: c.get("/api/incidents?q=flood").get_json()),
+             ("status_new", lambda: c.get("/api/incidents?status=new").get_json()),
+             ("reconcile", firestore_service.reconcile_team_loads)]
+    out = []
+    for name, fn in steps:
+        res, row = timed_call(h, name, fn, latency_ms)
+        if isinstance(res, list):
+            row["items"] = len(res)
+        out.append(row)
+    return out
+
+
+def seed(h, n, share, team_ids, rnd):
+    now = datetime.utcnow()
+    col = h.fs.collection("processed_incidents")
+    dcol = h.fs.collection("dispatches")
+    old = int(n * share)
+    templates = h.templates
+    group = []
+
+    def add(ts, status, team=None, dispatch_id=None, closed=None):
+        text, label = templates[rnd.randrange(len(templates))]
+        lat, lng = h.scatter()
+        doc = {"description": text, "location": f"seed-{rnd.randrange(10**6)}", "lat": lat, "lng": lng,
+               "timestamp": ts, "status": status,
+               "analysis": {"severity": label, "incident_type": rnd.choice(["flood", "medical", "fire", "other"]),
+                            "summary": text[:60]}}
+        if team:
+            doc.update(assigned_team=team, dispatch_id=dispatch_id, dispatched_at=ts + timedelta(minutes=20))
+        if closed:
+            doc.update(closed_at=closed, status_updated_at=closed)
+        _, ref = col.add(doc)
+        return ref.id
+
+    def flush(status, team, created):
+        nonlocal group
+        if group:
+            did = f"dispatch_{rnd.getrandbits(40):010x}"
+            for i in group:
+                h.fs._data["processed_incidents"][i]["dispatch_id"] = did
+            dcol.document(did).set({"dispatch_id": did, "team_id": team, "created_at": created.isoformat(),
+                                    "status": status, "plan_text": "x" * 2000, "commit_state": "committed",
+                                    "incidents": [{"_id": i} for i in group]})
+        group = []
+
+    for k in range(old):
+        ts = now - timedelta(days=rnd.uniform(40, 300))
+        team = team_ids[k // 10 % len(team_ids)]
+        group.append(add(ts, "closed", team, None, ts + timedelta(hours=2)))
+        if len(group) == 10:
+            flush("completed", team, ts)
+    flush("completed", team_ids[0], now - timedelta(days=40))
+    for k in range(n - old):
+        ts = now - timedelta(days=rnd.uniform(0, 5))
+        if k % 2:
+            team = team_ids[k // 10 % len(team_ids)]
+            group.append(add(ts, "rescue_dispatched", team))
+            if len(group) == 10:
+                flush("assigned", team, ts)
+        else:
+            add(ts, "new")
+    flush("assigned", team_ids[0], now)
+    return old
+
+
+def analytics(h):
+    now = datetime.utcnow() + timedelta(hours=1)
+    r = h.client().get(f"/api/analytics?from={(now - timedelta(days=360)).isoformat()}&to={now.isoformat()}&bucket=day",
+                       headers={"x-admin-token": h.admin_token})
+    body = r.get_json()
+    return {k: body[k] for k in ("totals", "time_to_dispatch", "time_to_close")}
+
+
+def main():
+    p = argparse.ArgumentParser()
+    p.add_argument("--incidents", type=int, default=20000)
+    p.add_argument("--archived-share", type=float, default=0.9)
+    p.add_argument("--fs-latency-ms", type=float, default=2.0)
+    args = p.parse_args()
+
+    archive_service.ARCHIVE_DIR = tempfile.mkdtemp(prefix="crisismap-archive-")
+    try:
+        h = Harness(argparse.Namespace(seed=0, fs_latency_ms=0.0, storage_latency_ms=0.0, llm_latency_ms=0.0,
+                                       llm_jitter_ms=0.0, llm_fail_rate=0.0))
+        rnd = random.Random(0)
+        team_ids = h.seed_teams(10)
+        expected_archived = seed(h, args.incidents, args.archived_share, team_ids, rnd)
+        firestore_service.rebuild_tile_aggregates()
+        firestore_service.rebuild_rollups()
+        firestore_service.reconcile_team_loads()
+        fs = h.fs._data
+        old_ids = {i for i, d in fs["processed_incidents"].items() if d["status"] == "closed"}
+        finished = {i for i, d in fs["dispatches"].items() if d["status"] == "completed"}
+        flood_old = sum(1 for i in old_ids if "flood" in (fs["processed_incidents"][i]["description"] + " "
+                        + fs["processed_incidents"][i]["location"] + " " + fs["processed_incidents"][i]["analysis"]["summary"]).lower())
+
+        before = hot_paths(h, args.fs_latency_ms)
+        stats_before = analytics(h)
+        run, run_row = timed_call(h, "archive_run", lambda: archive_service.run_archive(older_than_days=30), args.fs_latency_ms)
+        after = hot_paths(h, args.fs_latency_ms)
+        stats_after = analytics(h)
+        firestore_service.rebuild_rollups()
+        stats_rebuilt = analytics(h)
+
+        archive_service._read_file.cache_clear()
+        searched, cold = timed_call(h, "archive_search_cold", lambda: archive_service.search_archive(q="flood", limit=50), 0)
+        _, warm = timed_call(h, "archive_search_warm", lambda: archive_service.search_archive(q="flood", limit=50), 0)
+        _, ranged = timed_call(h, "archive_search_60d", lambda: archive_service.search_archive(
+            start=datetime.utcnow() - timedelta(days=100), end=datetime.utcnow() - timedelta(days=40)), 0)
+        dispatches, disp = timed_call(h, "archive_dispatches_team", lambda: archive_service.search_archived_dispatches(team_id=team_ids[0]), 0)
+        astats, st = timed_call(h, "archive_stats", lambda: archive_service.archive_stats(bucket="day"), 0)
+        all_archived = archive_service.search_archive(limit=10 ** 7)
+        all_dispatches = archive_service.search_archived_dispatches(limit=10 ** 7)
+
+        problems = []
+        hot = set(fs["processed_incidents"])
+        if hot & old_ids or len(hot) != args.incidents - expected_archived:
+            problems.append("hot collection does not hold exactly the recent incidents")
+        if {i["_id"] for i in all_archived["items"]} != old_ids:
+            problems.append("archive incidents differ from the closed history")
+        if {d["_id"] for d in all_dispatches["items"]} != finished or set(fs.get("dispatches", {})) & finished:
+            problems.append("finished dispatches not moved exactly")
+        if searched["total"] != flood_old:
+            problems.append(f"archive search found {searched['total']} of {flood_old}")
+        if stats_after != stats_before or stats_rebuilt != stats_before:
+            problems.append("analytics changed by archiving / rebuild")
+        if tile_mismatches(h.fs):
+            problems.append("tile counters do not match the hot collection")
+        dangling = [i for i, d in fs["processed_incidents"].items() if d.get("dispatch_id") and d["dispatch_id"] not in fs["dispatches"]]
+        if dangling:
+            problems.append(f"{len(dangling)} hot incidents point at archived dispatches")
+
+        print(json.dumps({"incidents": args.incidents, "archived": {k: v for k, v in run.items() if k != "files"},
+                          "files": len(run["files"]), "archive_bytes": archive_service.archive_info(), "archive_run": run_row,
+                          "hot_before": before, "hot_after": after,
+                          "archive_queries": [cold, warm, ranged, disp, st],
+                          "archive_stats_totals": astats["totals"]["count"], "problems": problems}, indent=2))
+        sys.exit(1 if problems else 0)
+    finally:
+        shutil.rmtree(archive_service.ARCHIVE_DIR, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+# backend/benchmarks/bench_batch_analysis.py
+
+"""
+Batched vs single-report Gemini analysis during a burst.
+
+Sends a burst of reports through (a) analyze_incident, one prompt per report, and
+(b) AnalysisBatcher, which packs up to --batch-size queued reports into one prompt.
+FakeLLM charges a fixed per-call latency plus a per-1000-prompt-chars cost, so the
+prompt overhead that batching amortises shows up in both latency and prompt chars.
+A share of batch elements is returned invalid (--drop-rate) to exercise the
+retry-only-failed-items path. Reports LLM calls, prompt chars per report and latency
+percentiles; exits non-zero if batching does not cut calls by at least
+--min-reduction x or a report is left without a severity.
+
+Usage (from backend/):
+    python benchmarks/bench_batch_analysis.py [--reports 256] [--batch-size 16] [--concurrency 64]
+"""
+
+import argparse
+import json
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from benchmarks.standins import FakeLLM
+from benchmarks.bench_e2e import load_templates, percentiles
+from services import gemini_service
+from services.llm_gateway import LLMGateway
+from services.analysis_batcher import AnalysisBatcher
+
+
+def run_mode(name, analyze, llm, args, templates):
+    gemini_service.GEMINI.override(llm)
+    gemini_service.GATEWAY = LLMGateway(
+        gemini_service.get_model, timeout_seconds=30, max_concurrency=args.llm_concurrency,
+        initial_concurrency=args.llm_concurrency, rate_per_second=1000, burst=1000, queue_seconds=60,
+    )
+    lat = []
+
+    def one(i):
+        text, _ = templates[i % len(templates)]
+        t0 = time.perf_counter()
+        out = analyze({"location": f"loc{i}", "description": text})
+        lat.append(time.perf_counter() - t0)
+        return out
+
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as ex:
+        outs = list(ex.map(one, range(args.reports)))
+    wall = time.perf_counter() - t0
+    return {
+        "mode": name, "reports": args.reports, "wall_seconds": round(wall, 2), **percentiles(lat),
+        "llm_calls": llm.calls, "prompt_chars_per_report": round(llm.prompt_chars / args.reports, 1),
+        "llm_answered": sum(1 for o in outs if not str(o.get("summary", "")).startswith("(AI")),
+        "missing_severity": sum(1 for o in outs if not o.get("severity")),
+    }
+
+
+def main():
+    p = argparse.ArgumentParser()
+    p.add_argument("--reports", type=int, default=256)
+    p.add_argument("--batch-size", type=int, default=16)
+    p.add_argument("--wait-ms", type=float, default=50)
+    p.add_argument("--concurrency", type=int, default=64, help="concurrent request handlers")
+    p.add_argument("--llm-concurrency", type=int, default=8)
+    p.add_argument("--latency-ms", type=float, default=300, help="fixed FakeLLM cost per call")
+    p.add_argument("--per-kchar-ms", type=float, default=20, help="FakeLLM cost per 1000 prompt chars")
+    p.add_argument("--drop-rate", type=float, default=0.05, help="share of batch elements returned invalid")
+    p.add_argument("--min-reduction", type=float, default=4.0)
+    args = p.parse_args()
+
+    templates = load_templates()
+    gemini_service.load_severity_model()
+
+    single = run_mode("single", gemini_service.analyze_incident,
+                      FakeLLM(latency_ms=args.latency_ms, per_kchar_ms=args.per_kchar_ms), args, templates)
+    batcher = AnalysisBatcher(max_batch=args.batch_size, max_wait_ms=args.wait_ms, workers=args.llm_concurrency)
+    batched = run_mode("batched", batcher.analyze,
+                       FakeLLM(latency_ms=args.latency_ms, per_kchar_ms=args.per_kchar_ms,
+                               batch_drop_rate=args.drop_rate), args, templates)
+
+    reduction = single["llm_calls"] / max(1, batched["llm_calls"])
+    print(json.dumps({"single": single, "batched": batched, "call_reduction_x": round(reduction, 1)}, indent=2))
+    ok = reduction >= args.min_reduction and single["missing_severity"] == 0 and batched["missing_severity"] == 0
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,209 @@
+# backend/benchmarks/bench_conditional_get.py
+
+"""
+Polling dashboards with and without conditional GET + compression (services/http_cache.py).
+
+A fleet of --admins admin dashboards polls GET /api/incidents and GET /api/teams, and
+--teams team dashboards poll GET /api/team/dispatches?active=1&summary=1&limit=50, for
+--rounds rounds (every poller once per round, in parallel). Between rounds a writer
+updates an incident status every --incident-write-every rounds, a team location every
+--team-write-every rounds and a dispatch every --dispatch-write-every rounds, all through
+the API, so the change counters see them.
+
+Modes:
+  baseline     ETags off, no Accept-Encoding (what every poll cost before)
+  etag         pollers send If-None-Match, no compression
+  etag+gzip    pollers send If-None-Match and Accept-Encoding: gzip
+
+Reports per mode: process CPU ms per poll (server + in-process test client), bytes per
+poll, Firestore documents read per poll, and the 304 / 200 split. Each poller checks that
+the body it ends up with (cached on 304, decompressed on 200) equals a fresh uncached
+read of the same URL right after its poll, so a stale 304 is caught. A last check writes
+an incident straight into the store (a write on another host: no change counter bump),
+lets the rendered version expire and has two pollers revalidate: both must get the new
+body, and then 304 again. Exits non-zero on any stale body, if the cross-host check fails,
+or if etag+gzip does not cut CPU per poll by 2x and bytes per poll by 5x against baseline.
+
+Usage (from backend/):
+    python benchmarks/bench_conditional_get.py [--incidents 2000] [--admins 20] [--teams 20] [--rounds 30]
+"""
+
+import argparse
+import gzip
+import json
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from benchmarks.bench_e2e import Harness, git_commit
+from auth_store import issue_token, ROLE_TEAM
+from services import http_cache, firestore_profiler
+
+
+def seed_dispatches(h, team_ids, per_team):
+    now = datetime.utcnow()
+    incident_ids = list(h.fs._data.get("processed_incidents", {}))
+    for t, tid in enumerate(team_ids):
+        for k in range(per_team):
+            did = f"dispatch_bench{t:03d}_{k:03d}"
+            h.fs.collection("dispatches").document(did).set({
+                "dispatch_id": did, "team_id": tid, "status": "assigned", "commit_state": "committed",
+                "created_at": (now - timedelta(minutes=k)).isoformat(), "plan_preview": "Evacuate and assess " * 6,
+                "plan_text": "step " * 400, "incidents": [{"_id": i} for i in incident_ids[k * 5:(k + 1) * 5]],
+            })
+
+
+class Poller:
+    def __init__(self, url, headers):
+        self.url = url
+        self.headers = headers
+        self.etag = None
+        self.body = None
+
+    def poll(self, h, conditional, encoding):
+        headers = dict(self.headers)
+        if conditional and self.etag:
+            headers["If-None-Match"] = self.etag
+        if encoding:
+            headers["Accept-Encoding"] = encoding
+        r = h.client().get(self.url, headers=headers)
+        sent = len(r.data)
+        if r.status_code == 200:
+            data = r.data
+            if r.headers.get("Content-Encoding") == "gzip":
+                data = gzip.decompress(data)
+            self.body = data
+            self.etag = r.headers.get("ETag") if conditional else None
+        elif r.status_code != 304:
+            raise RuntimeError(f"{self.url}: {r.status_code}")
+        return r.status_code, sent
+
+
+def doc_reads():
+    return sum(firestore_profiler.READS.values.values())
+
+
+def run_mode(h, name, pollers, writers, args):
+    conditional = name != "baseline"
+    encoding = "gzip" if name == "etag+gzip" else None
+    http_cache.ETAG_ENABLED = conditional
+    for p in pollers:
+        p.etag, p.body = None, None
+    statuses, sent, stale = {}, 0, 0
+    cpu, reads = 0.0, 0
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        for rnd in range(args.rounds):
+            for every, fn in writers:
+                if rnd and rnd % every == 0:
+                    fn(rnd)
+            reads0, cpu0 = doc_reads(), time.process_time()
+            results = list(pool.map(lambda p: p.poll(h, conditional, encoding), pollers))
+            cpu += time.process_time() - cpu0
+            reads += doc_reads() - reads0
+            for code, n in results:
+                statuses[code] = statuses.get(code, 0) + 1
+                sent += n
+            if rnd % args.verify_every == 0 or rnd == args.rounds - 1:
+                # fresh, unconditional read (ETags off so it cannot come from the server-side cache)
+                http_cache.ETAG_ENABLED = False
+                for p in pollers:
+                    fresh = h.client().get(p.url, headers=p.headers).data
+                    stale += fresh != p.body
+                http_cache.ETAG_ENABLED = conditional
+    polls = len(pollers) * args.rounds
+    return {"mode": name, "polls": polls, "cpu_ms_per_poll": round(cpu * 1000 / polls, 3),
+            "bytes_per_poll": round(sent / polls, 1), "doc_reads_per_poll": round(reads / polls, 2),
+            "statuses": {str(k): v for k, v in sorted(statuses.items())}, "stale_bodies": stale}
+
+
+def check_cross_host_write(h, admin, incident_id, max_age=0.3):
+    """Two pollers of one version, then a write this host's counters never see."""
+    saved, http_cache.ETAG_MAX_AGE_SECONDS = http_cache.ETAG_MAX_AGE_SECONDS, max_age
+    try:
+        http_cache._RENDERED.clear()
+        first = h.client().get("/api/incidents", headers=admin)
+        etag = first.headers["ETag"]
+        doc = h.fs._data["processed_incidents"][incident_id]
+        doc["status"] = "closed" if doc.get("status") != "closed" else "new"
+        time.sleep(max_age * 1.5)
+        a = h.client().get("/api/incidents", headers={**admin, "If-None-Match": etag})
+        b = h.client().get("/api/incidents", headers={**admin, "If-None-Match": etag})
+        b_again = h.client().get("/api/incidents", headers={**admin, "If-None-Match": b.headers.get("ETag", "")})
+        statuses = [a.status_code, b.status_code, b_again.status_code]
+        return {"statuses": statuses, "etag_changed": a.headers.get("ETag") != etag,
+                "ok": statuses == [200, 200, 304] and a.get_data() == b.get_data() != first.get_data()}
+    finally:
+        http_cache.ETAG_MAX_AGE_SECONDS = saved
+
+
+def main():
+    p = argparse.ArgumentParser()
+    p.add_argument("--incidents", type=int, default=2000)
+    p.add_argument("--admins", type=int, default=20)
+    p.add_argument("--teams", type=int, default=20)
+    p.add_argument("--dispatches-per-team", type=int, default=10)
+    p.add_argument("--rounds", type=int, default=30)
+    p.add_argument("--incident-write-every", type=int, default=3)
+    p.add_argument("--team-write-every", type=int, default=5)
+    p.add_argument("--dispatch-write-every", type=int, default=10)
+    p.add_argument("--verify-every", type=int, default=5)
+    p.add_argument("--concurrency", type=int, default=8)
+    p.add_argument("--fs-latency-ms", type=float, default=0)
+    p.add_argument("--seed", type=int, default=11)
+    p.add_argument("--out")
+    args = p.parse_args()
+
+    h = Harness(argparse.Namespace(seed=args.seed, fs_latency_ms=args.fs_latency_ms, storage_latency_ms=0,
+                                   llm_latency_ms=0, llm_jitter_ms=0, llm_fail_rate=0))
+    team_ids = h.seed_teams(args.teams)
+    h.seed_incidents(args.incidents)
+    seed_dispatches(h, team_ids, args.dispatches_per_team)
+    incident_ids = list(h.fs._data["processed_incidents"])
+    admin = {"x-admin-token": h.admin_token}
+    team_headers = [{"x-team-token": issue_token(ROLE_TEAM, t, team_id=t)} for t in team_ids]
+
+    pollers = []
+    for _ in range(args.admins):
+        pollers += [Poller("/api/incidents", admin), Poller("/api/teams", admin)]
+    pollers += [Poller("/api/team/dispatches?active=1&summary=1&limit=50", hdr) for hdr in team_headers]
+
+    statuses = ["new", "in_progress", "rescue_dispatched"]
+
+    def write_incident(rnd):
+        h.client().post("/api/update-status", json={"id": incident_ids[rnd], "status": statuses[rnd % 3]}, headers=admin)
+
+    def write_team(rnd):
+        h.client().post("/api/team/update-location", json={"lat": 13.0 + rnd / 1000, "lng": 74.8},
+                        headers=team_headers[rnd % len(team_headers)])
+
+    def write_dispatch(rnd):
+        from services.firestore_service import mark_dispatch_completed
+        mark_dispatch_completed(f"dispatch_bench{rnd % len(team_ids):03d}_{rnd // len(team_ids) % args.dispatches_per_team:03d}")
+
+    writers = [(args.incident_write_every, write_incident), (args.team_write_every, write_team),
+               (args.dispatch_write_every, write_dispatch)]
+    results = [run_mode(h, mode, pollers, writers, args) for mode in ("baseline", "etag", "etag+gzip")]
+    cross_host = check_cross_host_write(h, admin, incident_ids[0])
+    out = {"commit": git_commit(), "params": vars(args), "modes": results, "cross_host_write": cross_host}
+    print(json.dumps(out, indent=2))
+    if args.out:
+        Path(args.out).write_text(json.dumps(out, indent=2))
+
+    base, best = results[0], results[-1]
+    problems = [f"{r['mode']}: {r['stale_bodies']} stale bodies" for r in results if r["stale_bodies"]]
+    if not cross_host["ok"]:
+        problems.append("a write from another host left pollers on the stale body")
+    if best["cpu_ms_per_poll"] * 2 > base["cpu_ms_per_poll"]:
+        problems.append("etag+gzip CPU per poll not 2x below baseline")
+    if best["bytes_per_poll"] * 5 > base["bytes_per_poll"]:
+        problems.append("etag+gzip bytes per poll not 5x below baseline")
+    print(json.dumps({"problems": problems}))
+    sys.exit(1 if problems else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+# backend/benchmarks/bench_dispatch_commit.py
+
+"""
+Dispatch commit latency: per-incident loop vs dispatch_service.commit_dispatch.
+
+Seeds --incidents processed incidents in FakeFirestore (--fs-latency-ms per round
+trip) and commits one dispatch over all of them, either the old way
+(create_dispatch + update_incident_assignment per incident) or through
+commit_dispatch (get_all + chunked WriteBatches). Sizes below 500 take the single
+atomic-batch path; 500 and up take the chunked path. Reports wall time and
+Firestore round trips per mode and size.
+
+Usage (from backend/):
+    python benchmarks/bench_dispatch_commit.py [--sizes 100,499,500,2000] [--fs-latency-ms 5]
+"""
+
+import argparse
+import json
+import sys
+import time
+import uuid
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from benchmarks.standins import FakeFirestore, install_standins
+from services import firestore_service
+from services.dispatch_service import commit_dispatch
+
+
+def seed(db, n):
+    ids = []
+    for i in range(n):
+        ref = db.collection("processed_incidents").document(f"inc{i:06d}")
+        ref.set({"location": f"loc{i}", "status": "new", "lat": 13.0, "lng": 74.8, "analysis": {"severity": "high"}})
+        ids.append(ref.id)
+    return ids
+
+
+def dispatch_doc(ids):
+    return {"dispatch_id": f"dispatch_{uuid.uuid4().hex[:10]}", "team_id": "team1", "status": "assigned",
+            "incidents": [{"_id": i} for i in ids]}
+
+
+def legacy(doc):
+    firestore_service.create_dispatch(doc)
+    for it in doc["incidents"]:
+        firestore_service.update_incident_assignment(it["_id"], dispatch_id=doc["dispatch_id"], team_id="team1",
+                                                     new_status="rescue_dispatched")
+
+
+def main():
+    p = argparse.ArgumentParser()
+    p.add_argument("--sizes", default="100,499,500,2000")
+    p.add_argument("--fs-latency-ms", type=float, default=5.0)
+    args = p.parse_args()
+
+    results = []
+    for n in [int(x) for x in args.sizes.split(",") if x]:
+        for mode, fn in (("per_incident_loop", legacy), ("commit_dispatch", lambda d: commit_dispatch(d, team_id="team1"))):
+            db = FakeFirestore()
+            install_standins(firestore=db)
+            ids = seed(db, n)
+            db.latency_ms = args.fs_latency_ms
+            db.reset_ops()
+            t0 = time.perf_counter()
+            fn(dispatch_doc(ids))
+            wall = time.perf_counter() - t0
+            assigned = sum(1 for d in db._data["processed_incidents"].values() if d.get("status") == "rescue_dispatched")
+            results.append({"incidents": n, "mode": mode, "ms": round(wall * 1000, 1),
+                            "round_trips": db.op_counts()["round_trips"], "assigned": assigned})
+    print(json.dumps(results, indent=2))
+    sys.exit(0 if all(r["assigned"] == r["incidents"] for r in results) else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+# backend/benchmarks/bench_dispatch_view.py
+
+"""
+Opening one dispatch on the team dashboard: old request pattern vs the joined view.
+
+Old: GET /api/team/dispatches (full docs) to list, then per open
+GET /api/team/dispatches/<id> + GET /api/incidents (twice: modal + archive check).
+New: GET /api/team/dispatches?active=1&summary=1&limit=50 to list, then one
+GET /api/team/dispatches/<id>/view.
+Seeds --history incidents (the size /api/incidents has to scan) plus one dispatch of
+--dispatch-size incidents; reports requests, response bytes, Firestore round trips
+and latency for each pattern (--fs-latency-ms per round trip).
+
+Usage (from backend/):
+    python benchmarks/bench_dispatch_view.py [--history 2000] [--dispatch-size 12] [--fs-latency-ms 1]
+"""
+
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from benchmarks.bench_e2e import Harness
+from auth_store import issue_token, ROLE_TEAM
+
+
+def run(h, name, requests, latency_ms):
+    c = h.client()
+    h.fs.latency_ms = latency_ms
+    h.fs.reset_ops()
+    nbytes = 0
+    t0 = time.perf_counter()
+    for path, headers in requests:
+        r = c.get(path, headers=headers)
+        assert r.status_code == 200, (path, r.status_code)
+        nbytes += len(r.data)
+    ms = (time.perf_counter() - t0) * 1000
+    h.fs.latency_ms = 0.0
+    return {"pattern": name, "requests": len(requests), "response_kb": round(nbytes / 1024, 1),
+            "round_trips": h.fs.op_counts()["round_trips"], "ms": round(ms, 1)}
+
+
+def main():
+    p = argparse.ArgumentParser()
+    p.add_argument("--history", type=int, default=2000)
+    p.add_argument("--dispatch-size", type=int, default=12)
+    p.add_argument("--fs-latency-ms", type=float, default=1.0)
+    args = p.parse_args()
+
+    h = Harness(argparse.Namespace(seed=0, fs_latency_ms=0.0, storage_latency_ms=0.0, llm_latency_ms=0.0,
+                                   llm_jitter_ms=0.0, llm_fail_rate=0.0))
+    team_id = h.seed_teams(1)[0]
+    h.seed_incidents(args.history, status="closed")
+    h.seed_incidents(args.dispatch_size)
+    r = h.client().post("/api/generate-plan", json={"statuses": ["new"], "team_id": team_id},
+                        headers={"x-admin-token": h.admin_token})
+    dispatch_id = r.get_json()["dispatch_id"]
+    hdr = {"x-team-token": issue_token(ROLE_TEAM, team_id, team_id=team_id)}
+
+    old = run(h, "detail + /api/incidents x2", [
+        ("/api/team/dispatches", hdr), (f"/api/team/dispatches/{dispatch_id}", hdr),
+        ("/api/incidents", {}), ("/api/incidents", {})], args.fs_latency_ms)
+    new = run(h, "summary list + joined view", [
+        ("/api/team/dispatches?active=1&summary=1&limit=50", hdr),
+        (f"/api/team/dispatches/{dispatch_id}/view", hdr)], args.fs_latency_ms)
+    print(json.dumps([old, new], indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,245 @@
+# backend/benchmarks/bench_e2e.py
+
+"""
+End-to-end benchmark / load test against local stand-ins (benchmarks/standins.py).
+
+Scenarios:
+  citizen_burst     N concurrent POST /api/submit-report (some with images)
+  dashboard_poll    P pollers repeatedly GET /api/incidents, /api/teams, /api/team/dispatches
+  auto_dispatch     POST /api/auto-dispatch-ai over I new incidents x T teams
+  plan_generation   POST /api/generate-plan over the open incidents
+
+Each scenario reports throughput, p50/p95/p99 latency, error count and Firestore op
+counts as JSON (plus the git commit), so runs can be compared across commits.
+
+Usage (from backend/):
+    python benchmarks/bench_e2e.py [--scenarios citizen_burst,auto_dispatch] [--reports 500]
+        [--concurrency 16] [--incidents 500] [--teams 20] [--fs-latency-ms 2] [--llm-latency-ms 50]
+        [--out results.json]
+"""
+
+import argparse
+import csv
+import io
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(BACKEND_DIR))
+os.environ.setdefault("CRISISMAP_WARMUP", "0")
+
+from benchmarks.standins import FakeFirestore, FakeBucket, FakeLLM, install_standins
+
+TEMPLATES_CSV = BACKEND_DIR / "services" / "models" / "severity_data.csv"
+CENTER = (13.0108, 74.7943)
+
+
+def citizen_ip(i):
+    """Distinct client address per simulated citizen (submit-report rate-limits per IP)."""
+    return f"10.{i // 65536 % 256}.{i // 256 % 256}.{i % 256}"
+
+
+def load_templates():
+    with open(TEMPLATES_CSV) as f:
+        return [(r["text"], r["label"]) for r in csv.DictReader(f)]
+
+
+def percentiles(samples):
+    if not samples:
+        return {"p50_ms": None, "p95_ms": None, "p99_ms": None, "max_ms": None}
+    s = sorted(samples)
+    pick = lambda q: round(s[min(len(s) - 1, int(q * len(s)))] * 1000, 2)
+    return {"p50_ms": pick(0.50), "p95_ms": pick(0.95), "p99_ms": pick(0.99), "max_ms": round(s[-1] * 1000, 2)}
+
+
+class Harness:
+    def __init__(self, args):
+        self.args = args
+        self.rnd = random.Random(args.seed)
+        self.templates = load_templates()
+        self.fs = FakeFirestore(latency_ms=args.fs_latency_ms)
+        self.bucket = FakeBucket(latency_ms=args.storage_latency_ms)
+        self.llm = FakeLLM(latency_ms=args.llm_latency_ms, jitter_ms=args.llm_jitter_ms, fail_rate=args.llm_fail_rate)
+        install_standins(self.fs, self.bucket, self.llm)
+        import app as app_module
+        from services import registry
+        self.app = app_module.create_app(warm_up=False)
+        registry.warm_up(["severity_model"])  # keep the one-off model load out of the measurements
+        self._local = threading.local()
+        c = self.app.test_client()
+        self.admin_token = c.post("/api/login", json={"username": "admin", "password": "password123"}).get_json()["token"]
+
+    def client(self):
+        c = getattr(self._local, "client", None)
+        if c is None:
+            c = self._local.client = self.app.test_client()
+        return c
+
+    # ---- seeding (direct to the fake store; not measured) ----
+    def scatter(self, km=25.0):
+        return CENTER[0] + self.rnd.uniform(-km, km) / 111.0, CENTER[1] + self.rnd.uniform(-km, km) / 108.0
+
+    def seed_teams(self, n):
+        from werkzeug.security import generate_password_hash
+        pw = generate_password_hash("pw")
+        ids = []
+        for i in range(n):
+            lat, lng = self.scatter()
+            tid = f"team_bench{i:04d}"
+            self.fs.collection("teams").document(tid).set({
+                "name": f"bench-team-{i}", "contact": "", "password": pw, "status": "ready",
+                "created_at": datetime.utcnow().isoformat(), "base_lat": lat, "base_lng": lng,
+            })
+            ids.append(tid)
+        return ids
+
+    def seed_incidents(self, n, status="new", **extra):
+        from benchmarks.standins import FakeLLM as _L
+        now = datetime.utcnow()
+        for i in range(n):
+            text, label = self.templates[self.rnd.randrange(len(self.templates))]
+            lat, lng = self.scatter()
+            analysis = _L.analysis_for(text)
+            analysis["severity"] = label
+            doc = {"reporter_name": "seed", "reporter_phone": "000", "location": f"seed-{i}", "description": text,
+                   "lat": lat, "lng": lng, "timestamp": now - timedelta(seconds=i), "status": status, "analysis": analysis}
+            doc.update(extra)
+            self.fs.collection("processed_incidents").add(doc)
+
+    # ---- measurement ----
+    def run(self, name, fn, jobs, concurrency):
+        self.fs.reset_ops()
+        llm_before = self.llm.calls
+        latencies, errors = [], []
+        lock = threading.Lock()
+
+        def one(job):
+            t0 = time.perf_counter()
+            try:
+                status = fn(job)
+                ok = status < 400
+            except Exception as e:  # noqa: BLE001
+                status, ok = repr(e), False
+            dt = time.perf_counter() - t0
+            with lock:
+                latencies.append(dt)
+                if not ok:
+                    errors.append(status)
+
+        t0 = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as ex:
+            list(ex.map(one, jobs))
+        wall = time.perf_counter() - t0
+        return {
+            "scenario": name,
+            "requests": len(latencies),
+            "concurrency": concurrency,
+            "wall_seconds": round(wall, 3),
+            "throughput_rps": round(len(latencies) / wall, 2) if wall else None,
+            **percentiles(latencies),
+            "errors": len(errors),
+            "error_samples": sorted(set(map(str, errors)))[:5],
+            "firestore_ops": self.fs.op_counts(),
+            "llm_calls": self.llm.calls - llm_before,
+        }
+
+    # ---- scenarios ----
+    def citizen_burst(self):
+        a = self.args
+
+        def submit(i):
+            text, _ = self.templates[i % len(self.templates)]
+            lat, lng = self.scatter()
+            data = {"name": f"citizen{i}", "phone": f"+9100000{i:05d}", "location": f"burst-{i}", "description": text,
+                    "lat": str(lat), "lng": str(lng)}
+            if a.image_every and i % a.image_every == 0:
+                data["image"] = (io.BytesIO(b"\xff\xd8" + os.urandom(a.image_kb * 1024)), "photo.jpg", "image/jpeg")
+            r = self.client().post("/api/submit-report", data=data, content_type="multipart/form-data",
+                                   environ_base={"REMOTE_ADDR": citizen_ip(i)})
+            return r.status_code
+        return self.run("citizen_burst", submit, range(a.reports), a.concurrency)
+
+    def dashboard_poll(self):
+        a = self.args
+        team_id = self.team_ids[0]
+        from auth_store import issue_token, ROLE_TEAM
+        team_token = issue_token(ROLE_TEAM, team_id, team_id=team_id)
+        paths = [("/api/incidents", {}), ("/api/teams", {"x-admin-token": self.admin_token}),
+                 ("/api/team/dispatches", {"x-team-token": team_token})]
+
+        def poll(i):
+            path, headers = paths[i % len(paths)]
+            return self.client().get(path, headers=headers).status_code
+        return self.run("dashboard_poll", poll, range(a.pollers * a.polls), a.pollers)
+
+    def auto_dispatch(self):
+        self.seed_incidents(self.args.incidents)
+
+        def dispatch(_):
+            r = self.client().post("/api/auto-dispatch-ai", json={"statuses": ["new"]}, headers={"x-admin-token": self.admin_token})
+            return r.status_code
+        return self.run("auto_dispatch", dispatch, range(1), 1)
+
+    def plan_generation(self):
+        self.seed_incidents(self.args.plan_incidents)
+
+        def plan(_):
+            r = self.client().post("/api/generate-plan", json={"statuses": ["new"], "team_id": self.team_ids[0]},
+                                   headers={"x-admin-token": self.admin_token})
+            return r.status_code
+        return self.run("plan_generation", plan, range(1), 1)
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR, text=True).strip()
+    except Exception:
+        return None
+
+
+def main():
+    p = argparse.ArgumentParser()
+    p.add_argument("--scenarios", default="citizen_burst,dashboard_poll,auto_dispatch,plan_generation")
+    p.add_argument("--reports", type=int, default=300)
+    p.add_argument("--concurrency", type=int, default=16)
+    p.add_argument("--image-every", type=int, default=5, help="attach an image to every Nth report (0 = never)")
+    p.add_argument("--image-kb", type=int, default=200)
+    p.add_argument("--pollers", type=int, default=20)
+    p.add_argument("--polls", type=int, default=10)
+    p.add_argument("--incidents", type=int, default=500)
+    p.add_argument("--plan-incidents", type=int, default=50)
+    p.add_argument("--teams", type=int, default=20)
+    p.add_argument("--fs-latency-ms", type=float, default=2.0)
+    p.add_argument("--storage-latency-ms", type=float, default=20.0)
+    p.add_argument("--llm-latency-ms", type=float, default=50.0)
+    p.add_argument("--llm-jitter-ms", type=float, default=20.0)
+    p.add_argument("--llm-fail-rate", type=float, default=0.0)
+    p.add_argument("--seed", type=int, default=0)
+    p.add_argument("--out", default=None)
+    args = p.parse_args()
+
+    os.chdir(tempfile.mkdtemp(prefix="crisismap_e2e_"))  # local image copies land here
+    h = Harness(args)
+    h.team_ids = h.seed_teams(args.teams)
+    results = []
+    for name in [s.strip() for s in args.scenarios.split(",") if s.strip()]:
+        results.append(getattr(h, name)())
+
+    report = {"commit": git_commit(), "timestamp": datetime.utcnow().isoformat(), "params": vars(args), "results": results}
+    text = json.dumps(report, indent=2, default=str)
+    if args.out:
+        Path(args.out).write_text(text)
+    print(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+# backend/benchmarks/bench_fast_severity.py
+
+"""
+Compact severity scorer: parity check + latency benchmark.
+
+Loads the active severity model (sklearn), exports it with services.fast_severity and
+compares predict_proba for every row of severity_data.csv (plus a few edge cases).
+Exits non-zero if any probability differs by more than --tol (default 1e-6) or the
+predicted label differs. Then times single-description scoring for both paths.
+
+Usage (from backend/):
+    python benchmarks/bench_fast_severity.py [--tol 1e-6] [--repeats 2000]
+"""
+
+import argparse
+import csv
+import json
+import sys
+import time
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(BACKEND_DIR))
+
+import joblib
+import numpy as np
+
+from services import model_registry, fast_severity
+
+DATA_CSV = BACKEND_DIR / "services" / "models" / "severity_data.csv"
+EDGE_CASES = ["", "   ", "!!!", "FIRE FIRE FIRE", "ünïcödé flood near the dam", "a b c", "boat sinking " * 50]
+
+
+def _timeit(fn, texts, repeats):
+    timings = []
+    for i in range(repeats):
+        t = texts[i % len(texts)]
+        t0 = time.perf_counter()
+        fn(t)
+        timings.append((time.perf_counter() - t0) * 1e6)
+    timings.sort()
+    return {"p50_us": round(timings[len(timings) // 2], 2), "p99_us": round(timings[int(len(timings) * 0.99) - 1], 2)}
+
+
+def main():
+    p = argparse.ArgumentParser()
+    p.add_argument("--tol", type=float, default=1e-6)
+    p.add_argument("--repeats", type=int, default=2000)
+    args = p.parse_args()
+
+    version = model_registry.current_version("severity")
+    if version is None:
+        raise SystemExit("no severity model found; run services/train_models.py first")
+    data = joblib.load(model_registry.artifact_path("severity", version))
+    vec, clf = data["vectorizer"], data["model"]
+    scorer = fast_severity.CompactSeverityScorer(fast_severity.export_compact(vec, clf))
+
+    with open(DATA_CSV) as f:
+        texts = [r["text"] for r in csv.DictReader(f)] + EDGE_CASES
+
+    ref = clf.predict_proba(vec.transform(texts))
+    max_diff = 0.0
+    label_mismatches = []
+    for i, t in enumerate(texts):
+        got = scorer.predict_proba(t)
+        max_diff = max(max_diff, float(np.abs(got - ref[i]).max()))
+        if scorer.classes[int(np.argmax(got))] != str(clf.classes_[int(np.argmax(ref[i]))]):
+            label_mismatches.append(t)
+
+    report = {
+        "model_version": version,
+        "rows": len(texts),
+        "max_abs_proba_diff": max_diff,
+        "label_mismatches": len(label_mismatches),
+        "parity_ok": max_diff <= args.tol and not label_mismatches,
+        "latency_sklearn": _timeit(lambda t: clf.predict_proba(vec.transform([t])), texts, args.repeats),
+        "latency_compact": _timeit(scorer.predict, texts, args.repeats),
+    }
+    print(json.dumps(report, indent=2))
+    if not report["parity_ok"]:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
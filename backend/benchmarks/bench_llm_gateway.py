@@ -0,0 +1,83 @@
+# backend/benchmarks/bench_llm_gateway.py
+
+"""
+LLM gateway under a degraded model: bounded analyze_incident latency.
+
+Runs analyze_incident concurrently against FakeLLM in three modes - healthy, slow
+(latency far beyond the deadline) and failing - and checks that p99 stays within the
+deadline plus a small margin, that the breaker opens, and that every report still gets
+an ML/heuristic severity. Exits non-zero if a bound is violated.
+
+Usage (from backend/):
+    python benchmarks/bench_llm_gateway.py [--reports 200] [--concurrency 32] [--timeout 0.5]
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from benchmarks.standins import FakeLLM
+from benchmarks.bench_e2e import load_templates, percentiles
+from services import gemini_service
+from services.llm_gateway import LLMGateway
+
+
+def run_mode(name, llm, args, templates):
+    gemini_service.GEMINI.override(llm)
+    gemini_service.GATEWAY = LLMGateway(
+        gemini_service.get_model, timeout_seconds=args.timeout, max_concurrency=16, initial_concurrency=8,
+        rate_per_second=1000, burst=1000, failure_threshold=5, cooldown_seconds=60,
+    )
+    lat = []
+    sources = {}
+
+    def one(i):
+        text, _ = templates[i % len(templates)]
+        t0 = time.perf_counter()
+        out = gemini_service.analyze_incident({"location": f"loc{i}", "description": text})
+        lat.append(time.perf_counter() - t0)
+        src = "llm" if not str(out.get("summary", "")).startswith("(AI") else "fallback"
+        sources[src] = sources.get(src, 0) + 1
+        return out.get("severity")
+
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as ex:
+        severities = list(ex.map(one, range(args.reports)))
+    wall = time.perf_counter() - t0
+    res = {"mode": name, "wall_seconds": round(wall, 2), **percentiles(lat), "llm_calls": llm.calls,
+           "results_by_source": sources, "missing_severity": sum(1 for s in severities if not s),
+           "gateway": gemini_service.GATEWAY.status()}
+    bound_ms = (args.timeout + args.margin) * 1000  # deadline + queue wait + ML/heuristics
+    res["p99_within_bound"] = res["p99_ms"] <= bound_ms
+    return res
+
+
+def main():
+    p = argparse.ArgumentParser()
+    p.add_argument("--reports", type=int, default=200)
+    p.add_argument("--concurrency", type=int, default=32)
+    p.add_argument("--timeout", type=float, default=0.5, help="per-call deadline (s)")
+    p.add_argument("--margin", type=float, default=0.5, help="allowed overhead above the deadline (s)")
+    args = p.parse_args()
+
+    templates = load_templates()
+    gemini_service.load_severity_model()
+    results = [
+        run_mode("healthy", FakeLLM(latency_ms=30), args, templates),
+        run_mode("slow", FakeLLM(latency_ms=5000), args, templates),
+        run_mode("failing", FakeLLM(latency_ms=30, fail_rate=1.0), args, templates),
+    ]
+    print(json.dumps(results, indent=2))
+    ok = all(r["p99_within_bound"] and r["missing_severity"] == 0 for r in results)
+    ok = ok and results[1]["gateway"]["breaker"] != "closed" and results[2]["gateway"]["breaker"] != "closed"
+    os._exit(0 if ok else 1)  # don't wait for abandoned slow calls
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+# backend/benchmarks/bench_model_rss.py
+
+"""
+Per-worker memory of the severity model: private unpickled copy vs. mmap-loaded
+registry artifact shared across forked workers.
+
+Forks N workers (default 8) that each load the model and run one prediction, then
+report Rss and Pss (proportional share, i.e. shared pages divided by sharers) from
+/proc/<pid>/smaps_rollup. Linux only.
+
+Usage (from backend/):
+    python benchmarks/bench_model_rss.py [--workers 8]
+"""
+
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+from multiprocessing import get_context
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from services import model_registry
+
+
+def _mem_kb(pid):
+    out = {}
+    with open(f"/proc/{pid}/smaps_rollup") as f:
+        for line in f:
+            parts = line.split()
+            if parts[0] in ("Rss:", "Pss:"):
+                out[parts[0][:-1].lower()] = int(parts[1])
+    return out
+
+
+def _worker(mode, path, ready, release):
+    import joblib
+    if mode == "mmap":
+        data = joblib.load(path, mmap_mode="r")
+    else:
+        data = joblib.load(path)
+    data["model"].predict_proba(data["vectorizer"].transform(["boat sinking, children in water"]))
+    ready.release()
+    release.wait()
+
+
+def measure(mode, path, workers):
+    ctx = get_context("fork")
+    ready = ctx.Semaphore(0)
+    release = ctx.Event()
+    procs = [ctx.Process(target=_worker, args=(mode, path, ready, release)) for _ in range(workers)]
+    for p in procs:
+        p.start()
+    for _ in procs:
+        ready.acquire()
+    time.sleep(0.2)
+    mems = [_mem_kb(p.pid) for p in procs]
+    release.set()
+    for p in procs:
+        p.join()
+    return {
+        "rss_kb_per_worker": round(sum(m["rss"] for m in mems) / len(mems)),
+        "pss_kb_per_worker": round(sum(m["pss"] for m in mems) / len(mems)),
+        "pss_kb_total": sum(m["pss"] for m in mems),
+    }
+
+
+def main():
+    p = argparse.ArgumentParser()
+    p.add_argument("--workers", type=int, default=8)
+    args = p.parse_args()
+
+    version = model_registry.current_version("severity")
+    if version is None:
+        raise SystemExit("no severity model found; run services/train_models.py first")
+    path = str(model_registry.artifact_path("severity", version))
+    print(json.dumps({
+        "workers": args.workers,
+        "artifact": path,
+        "private_copy": measure("copy", path, args.workers),
+        "mmap_shared": measure("mmap", path, args.workers),
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,260 @@
+# backend/benchmarks/bench_rebalance.py
+
+"""
+Per-event cost of the incremental rebalancer (services/rebalancer.py) against a full
+auto-dispatch pass.
+
+Seeds --teams teams and --incidents open incidents (status rescue_dispatched, spread over
+the teams, team_counters matching) in the local Firestore stand-in, loads the rebalancer
+from it, then feeds --events events of each kind synchronously:
+
+  incident_created   an urgent (high / critical) incident at a random position
+  team_moved         a random team relocated up to 10 km
+  incident_closed    a random open incident closed
+
+and reports p50 / p99 / max ms per event kind and the proposals made. The baseline is the
+scoring loop of POST /api/auto-dispatch-ai over every open incident (what re-dispatching
+from scratch costs before any plan generation or writes); with --e2e the whole endpoint is
+also timed over the same incidents as status "new".
+
+Finally --apply proposals are applied through POST /api/rebalance/apply and the incident
+documents and team counters are checked against them. Then: the same proposal applied
+from two threads at once (one must win, the other be "stale"), a swap whose batch fails
+(neither leg may land, documents, counters and rebalancer state unchanged), and a bad
+?limit= on the proposals endpoint (400). Exits non-zero if the p99 of any event kind is
+not at least --min-speedup times below the full pass, if a proposal has a gain below the
+threshold, if an applied proposal left the documents inconsistent, or if a check fails.
+
+Usage (from backend/):
+    python benchmarks/bench_rebalance.py [--incidents 10000] [--teams 300] [--events 200] [--model]
+"""
+
+import argparse
+import json
+import random
+import sys
+import threading
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from benchmarks.bench_e2e import Harness, git_commit, percentiles
+
+
+def main():
+    p = argparse.ArgumentParser()
+    p.add_argument("--incidents", type=int, default=10000)
+    p.add_argument("--teams", type=int, default=300)
+    p.add_argument("--events", type=int, default=200)
+    p.add_argument("--apply", type=int, default=20)
+    p.add_argument("--model", action="store_true", help="score with the assignment model instead of the heuristic")
+    p.add_argument("--e2e", action="store_true", help="also time POST /api/auto-dispatch-ai end to end")
+    p.add_argument("--min-speedup", type=float, default=20.0)
+    p.add_argument("--seed", type=int, default=5)
+    p.add_argument("--out")
+    args = p.parse_args()
+
+    h = Harness(argparse.Namespace(seed=args.seed, fs_latency_ms=0, storage_latency_ms=0,
+                                   llm_latency_ms=0, llm_jitter_ms=0, llm_fail_rate=0))
+    from services import rebalancer as rb_module
+    from services.rebalancer import Rebalancer
+    from services.dispatch_scoring import ScoreParams, sev_norm, team_coords, coords_array, distances_km, team_scores
+    from services.firestore_service import TEAM_COUNTERS, get_all_teams, get_team_loads
+    from services.gemini_service import load_assignment_model
+
+    rnd = random.Random(args.seed)
+    team_ids = h.seed_teams(args.teams)
+    h.seed_incidents(args.incidents, status="rescue_dispatched")
+    loads = dict.fromkeys(team_ids, 0)
+    for doc in h.fs._data["processed_incidents"].values():
+        tid = rnd.choice(team_ids)
+        doc["assigned_team"] = tid
+        loads[tid] += 1
+    for tid, n in loads.items():
+        h.fs.collection(TEAM_COUNTERS).document(tid).set({"active_incidents": n})
+    model = load_assignment_model() if args.model else None
+
+    rb = Rebalancer(model=model)
+    t0 = time.perf_counter()
+    rb.refresh()
+    if not args.model:
+        rb.model = None
+    load_ms = (time.perf_counter() - t0) * 1000
+
+    # baseline: auto-dispatch scoring over every open incident
+    params = ScoreParams()
+    teams = get_all_teams()
+    incidents = [{**d, "_id": k} for k, d in h.fs._data["processed_incidents"].items()]
+    t0 = time.perf_counter()
+    full_loads = get_team_loads([t["_id"] for t in teams])
+    tids = [t["_id"] for t in teams]
+    team_xy = coords_array([team_coords(t) for t in teams])
+    for inc in sorted(incidents, key=sev_norm, reverse=True):
+        scores = team_scores(params, sev_norm(inc), distances_km(team_xy, inc["lat"], inc["lng"]),
+                             [full_loads.get(t, 0) for t in tids], model)
+        best = tids[int(np.argmax(scores))]
+        full_loads[best] = full_loads.get(best, 0) + 1
+    full_ms = (time.perf_counter() - t0) * 1000
+
+    events = {}
+    proposals = []
+    open_ids = list(rb.incidents)
+    rnd.shuffle(open_ids)
+    for kind in ("incident_created", "team_moved", "incident_closed"):
+        times = []
+        for k in range(args.events):
+            if kind == "incident_created":
+                lat, lng = h.scatter()
+                ev = lambda: rb.incident_created({"_id": f"urgent{k}", "lat": lat, "lng": lng,
+                                                  "analysis": {"severity": rnd.choice(["high", "critical"])}})
+            elif kind == "team_moved":
+                tid = rnd.choice(team_ids)
+                lat, lng = rb.teams[tid]
+                lat, lng = lat + rnd.uniform(-10, 10) / 111.0, lng + rnd.uniform(-10, 10) / 108.0
+                ev = lambda: rb.team_moved(tid, lat, lng)
+            else:
+                iid = open_ids.pop()
+                ev = lambda: rb.incident_closed(iid)
+            t0 = time.perf_counter()
+            made = ev()
+            times.append(time.perf_counter() - t0)
+            proposals += made
+        events[kind] = {"events": len(times), **percentiles(times)}
+    by_kind = {}
+    for pr in proposals:
+        by_kind[pr["kind"]] = by_kind.get(pr["kind"], 0) + 1
+
+    # apply some move / swap proposals through the API against a freshly loaded state
+    problems = []
+    rb_module._REBALANCER = rb
+    rb.refresh()
+    if not args.model:
+        rb.model = None
+    admin = {"x-admin-token": h.admin_token}
+    applied = 0
+    for k in range(args.events * 5):
+        if applied >= args.apply:
+            break
+        tid = rnd.choice(team_ids)
+        lat, lng = rb.teams[tid]
+        for pr in rb.team_moved(tid, lat + rnd.uniform(-10, 10) / 111.0, lng + rnd.uniform(-10, 10) / 108.0):
+            if pr["kind"] == "assign" or applied >= args.apply:
+                continue
+            before = get_team_loads(team_ids)
+            r = h.client().post("/api/rebalance/apply", json={"id": pr["id"]}, headers=admin)
+            if r.status_code != 200:
+                continue  # an earlier proposal of the same event touched it (stale)
+            applied += 1
+            after = get_team_loads(team_ids)
+            docs = h.fs._data["processed_incidents"]
+            if docs[pr["incident_id"]].get("assigned_team") != pr["to_team"]:
+                problems.append(f"{pr['id']}: incident not reassigned")
+            if pr["kind"] == "move" and (after[pr["to_team"]] != before[pr["to_team"]] + 1
+                                         or after[pr["from_team"]] != before[pr["from_team"]] - 1):
+                problems.append(f"{pr['id']}: team counters off")
+            if pr["kind"] == "swap" and (docs[pr["incident_id_2"]].get("assigned_team") != pr["from_team"] or after != before):
+                problems.append(f"{pr['id']}: swap inconsistent")
+
+    def next_proposal(kind):
+        for _ in range(args.events * 5):
+            tid = rnd.choice(team_ids)
+            lat, lng = rb.teams[tid]
+            made = [pr for pr in rb.team_moved(tid, lat + rnd.uniform(-10, 10) / 111.0, lng + rnd.uniform(-10, 10) / 108.0)
+                    if pr["kind"] == kind]
+            if made:
+                return made[0]
+        return None
+
+    def snapshot(pr):
+        ids = [pr["incident_id"]] + ([pr["incident_id_2"]] if pr["kind"] == "swap" else [])
+        docs = h.fs._data["processed_incidents"]
+        return ([docs[i].get("assigned_team") for i in ids], [rb.incidents[i]["team"] for i in ids],
+                get_team_loads(team_ids), len(h.fs._data.get("dispatches", {})))
+
+    # admin and auto-apply racing on the same proposal: exactly one may commit
+    checks = {}
+    pr = next_proposal("move") or next_proposal("swap")
+    if pr is None:
+        problems.append("race: no proposal to apply")
+    else:
+        before = get_team_loads(team_ids)
+        barrier, outcomes = threading.Barrier(2), []
+
+        def apply_copy():
+            barrier.wait()
+            outcomes.append(rb.apply(dict(pr))["status"])
+        threads = [threading.Thread(target=apply_copy) for _ in range(2)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        after = get_team_loads(team_ids)
+        moved = sum(abs(after[t] - before[t]) for t in team_ids)
+        checks["race"] = {"kind": pr["kind"], "outcomes": sorted(outcomes), "counter_changes": moved}
+        if sorted(outcomes) != ["applied", "stale"] or moved != (2 if pr["kind"] == "move" else 0):
+            problems.append("race: concurrent applies of one proposal did not resolve to one applied + one stale")
+
+    # a swap whose batch fails must leave both incidents where they were
+    pr = next_proposal("swap")
+    if pr is None:
+        problems.append("swap failure: no swap proposal")
+    else:
+        before = snapshot(pr)
+        real_batch = h.fs.batch
+
+        def failing_batch():
+            b = real_batch()
+
+            def commit():
+                raise ValueError("injected commit failure")
+            b.commit = commit
+            return b
+        h.fs.batch = failing_batch
+        try:
+            status = rb.apply(dict(pr))["status"]
+        finally:
+            h.fs.batch = real_batch
+        checks["swap_failure"] = {"status": status, "unchanged": snapshot(pr) == before}
+        if status != "failed" or snapshot(pr) != before:
+            problems.append("swap failure: a leg landed or state changed")
+
+    r = h.client().get("/api/rebalance/proposals?limit=abc", headers=admin)
+    checks["bad_limit_status"] = r.status_code
+    if r.status_code != 400:
+        problems.append(f"proposals?limit=abc: {r.status_code}")
+
+    if args.e2e:
+        for doc in h.fs._data["processed_incidents"].values():
+            doc["status"], doc["assigned_team"] = "new", None
+        t0 = time.perf_counter()
+        r = h.client().post("/api/auto-dispatch-ai", json={}, headers=admin)
+        e2e_ms = (time.perf_counter() - t0) * 1000
+        if r.status_code != 200:
+            problems.append(f"auto-dispatch-ai: {r.status_code}")
+    else:
+        e2e_ms = None
+
+    out = {"commit": git_commit(), "params": vars(args), "scoring": "model" if args.model else "heuristic",
+           "state_load_ms": round(load_ms, 1), "full_pass_ms": round(full_ms, 1), "auto_dispatch_e2e_ms": e2e_ms and round(e2e_ms, 1),
+           "events": events, "proposals": by_kind, "applied": applied, "checks": checks,
+           "speedup_p99": {k: round(full_ms / v["p99_ms"], 1) for k, v in events.items()}}
+    print(json.dumps(out, indent=2))
+    if args.out:
+        Path(args.out).write_text(json.dumps(out, indent=2))
+
+    for kind, v in events.items():
+        if v["p99_ms"] * args.min_speedup > full_ms:
+            problems.append(f"{kind}: p99 {v['p99_ms']} ms not {args.min_speedup}x below full pass {full_ms:.0f} ms")
+    if any(pr["kind"] != "assign" and pr["gain"] <= rb_module.REBALANCE_THRESHOLD for pr in proposals):
+        problems.append("proposal with gain below the threshold")
+    if args.apply and not applied:
+        problems.append("no proposal applied")
+    print(json.dumps({"problems": problems}))
+    sys.exit(1 if problems else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,299 @@
+# backend/benchmarks/bench_road_network.py
+
+"""
+Road-network travel times (services/road_network.py) on a synthetic OpenStreetMap extract.
+
+Writes a --grid x --grid street grid (~100 m blocks, every 10th street primary, some
+residential streets one-way) centred on the demo area, cut north-south by a river that only
+--bridges bridges cross, as OSM XML. Then reports:
+
+  build        parse + compile from the XML, and reload from the compiled .npz
+  matrix       --teams x --incidents minutes, cold (no cached trees) and warm, and a fresh
+               batch of incidents against the warm cache
+  correctness  rows for a few teams against a plain heapq Dijkstra over the parsed ways
+  river        road minutes vs straight-line km (at ROUTING_FALLBACK_KMH) for pairs on the
+               same bank and across the river
+  closure      a bridge closed through POST /api/roads/closures: cached trees kept / dropped,
+               matrix time, and the result against the reference Dijkstra without that bridge;
+               then reopened (DELETE) and checked against the original matrix
+  plan         order_stops for ROUTING_ORDER_MAX_STOPS stops from a team base (the routing
+               inside generate-plan): time against one uncached tree per stop, the first legs
+               against the reference Dijkstra, no trees cached, and None past the bound
+  dispatch     POST /api/auto-dispatch-ai with distance_unit km vs minutes: mean road minutes
+               from the team to each assigned incident, and the share sent across the river
+
+Exits non-zero if the cold matrix takes more than --max-seconds, a checked row or plan leg
+differs from the reference, plan ordering caches trees or ignores its bound, or minutes-based
+dispatch does not give shorter drives than km-based.
+
+Usage (from backend/):
+    python benchmarks/bench_road_network.py [--grid 300] [--teams 300] [--incidents 5000] [--bridges 3]
+"""
+
+import argparse
+import heapq
+import json
+import math
+import os
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from benchmarks.bench_e2e import Harness, git_commit, CENTER
+
+STEP_KM = 0.1
+
+
+def write_extract(path, grid, bridges):
+    """Grid streets; the river runs between columns grid//2 - 1 and grid//2."""
+    lat0 = CENTER[0] - grid * STEP_KM / 2 / 110.574
+    lng0 = CENTER[1] - grid * STEP_KM / 2 / (111.32 * math.cos(math.radians(CENTER[0])))
+    dlat = STEP_KM / 110.574
+    dlng = STEP_KM / (111.32 * math.cos(math.radians(CENTER[0])))
+    node = lambda r, c: r * grid + c + 1
+    river = grid // 2
+    bridge_rows = [int((k + 0.5) * grid / bridges) for k in range(bridges)]
+    way_id = 1000
+    bridge_ways = []
+    with open(path, "w") as f:
+        f.write('<?xml version="1.0" encoding="UTF-8"?>\n<osm version="0.6">\n')
+        for r in range(grid):
+            for c in range(grid):
+                f.write(f'<node id="{node(r, c)}" lat="{lat0 + r * dlat:.7f}" lon="{lng0 + c * dlng:.7f}"/>\n')
+
+        def way(refs, tags):
+            nonlocal way_id
+            way_id += 1
+            f.write(f'<way id="{way_id}">' + "".join(f'<nd ref="{n}"/>' for n in refs)
+                    + "".join(f'<tag k="{k}" v="{v}"/>' for k, v in tags.items()) + "</way>\n")
+            return way_id
+
+        for r in range(grid):  # east-west streets, split by the river
+            tags = {"highway": "primary" if r % 10 == 0 else "residential"}
+            if r % 10 == 5:
+                tags["oneway"] = "yes" if r % 20 == 5 else "-1"
+            way([node(r, c) for c in range(river)], tags)
+            way([node(r, c) for c in range(river, grid)], tags)
+            if r in bridge_rows:
+                bridge_ways.append(way([node(r, river - 1), node(r, river)], {"highway": "primary", "bridge": "yes"}))
+        for c in range(grid):  # north-south streets
+            way([node(r, c) for r in range(grid)], {"highway": "primary" if c % 10 == 0 else "residential"})
+        f.write("</osm>\n")
+    return bridge_ways, (lat0, lng0, dlat, dlng, river)
+
+
+def reference_dijkstra(coords, ways, source, skip_ways=()):
+    """Minutes from node id `source` to every node id, straight from the parsed ways."""
+    from services.road_network import _speed, _direction, _haversine
+    adj = {}
+    for wid, refs, tags in ways:
+        if wid in skip_ways:
+            continue
+        kmh, d = _speed(tags), _direction(tags)
+        for a, b in zip(refs, refs[1:]):
+            m = max(float(_haversine(*coords[a], *coords[b])) / kmh * 60.0, 1e-4)
+            if d >= 0:
+                adj.setdefault(a, []).append((b, m))
+            if d <= 0:
+                adj.setdefault(b, []).append((a, m))
+    dist = {source: 0.0}
+    heap = [(0.0, source)]
+    while heap:
+        d, n = heapq.heappop(heap)
+        if d > dist.get(n, math.inf):
+            continue
+        for m, w in adj.get(n, ()):
+            if d + w < dist.get(m, math.inf):
+                dist[m] = d + w
+                heapq.heappush(heap, (d + w, m))
+    return dist
+
+
+def main():
+    p = argparse.ArgumentParser()
+    p.add_argument("--grid", type=int, default=300)
+    p.add_argument("--bridges", type=int, default=2)
+    p.add_argument("--teams", type=int, default=300)
+    p.add_argument("--incidents", type=int, default=5000)
+    p.add_argument("--check-teams", type=int, default=4)
+    p.add_argument("--dispatch-teams", type=int, default=40)
+    p.add_argument("--dispatch-incidents", type=int, default=400)
+    p.add_argument("--max-seconds", type=float, default=10.0)
+    p.add_argument("--seed", type=int, default=9)
+    p.add_argument("--out")
+    args = p.parse_args()
+
+    from services import road_network
+    from services.road_network import RoadNetwork, parse_osm_xml
+
+    rnd = random.Random(args.seed)
+    tmp = tempfile.TemporaryDirectory()
+    path = os.path.join(tmp.name, "city.osm")
+    bridge_ways, (lat0, lng0, dlat, dlng, river) = write_extract(path, args.grid, args.bridges)
+    out = {"commit": git_commit(), "params": vars(args), "extract_mb": round(os.path.getsize(path) / 1e6, 1)}
+    problems = []
+
+    t0 = time.perf_counter()
+    net = RoadNetwork.load(path)
+    out["build_s"] = round(time.perf_counter() - t0, 2)
+    t0 = time.perf_counter()
+    net = RoadNetwork.load(path)
+    out["reload_s"] = round(time.perf_counter() - t0, 3)
+    out["graph"] = net.stats()
+
+    def at(r, c):
+        return lat0 + r * dlat, lng0 + c * dlng
+
+    def random_cells(n):
+        return [(rnd.randrange(args.grid), rnd.randrange(args.grid)) for _ in range(n)]
+
+    team_cells, inc_cells = random_cells(args.teams), random_cells(args.incidents)
+    team_xy = np.array([at(*c) for c in team_cells])
+    inc_xy = np.array([at(*c) for c in inc_cells])
+
+    t0 = time.perf_counter()
+    cold = net.matrix(team_xy, inc_xy)
+    out["matrix_cold_s"] = round(time.perf_counter() - t0, 2)
+    t0 = time.perf_counter()
+    warm = net.matrix(team_xy, inc_xy)
+    out["matrix_warm_s"] = round(time.perf_counter() - t0, 3)
+    fresh_xy = np.array([at(*c) for c in random_cells(args.incidents)])
+    t0 = time.perf_counter()
+    net.matrix(team_xy, fresh_xy)
+    out["matrix_new_incidents_s"] = round(time.perf_counter() - t0, 3)
+    if out["matrix_cold_s"] > args.max_seconds:
+        problems.append(f"cold {args.teams}x{args.incidents} matrix took {out['matrix_cold_s']} s")
+    if not np.array_equal(cold, warm):
+        problems.append("warm matrix differs from cold")
+
+    coords, ways = parse_osm_xml(path)
+    node_id = lambda cell: cell[0] * args.grid + cell[1] + 1
+
+    def check(matrix, skip_ways=()):
+        worst = 0.0
+        for i in range(args.check_teams):
+            ref = reference_dijkstra(coords, ways, node_id(team_cells[i]), skip_ways)
+            expect = np.array([ref.get(node_id(c), math.inf) for c in inc_cells])
+            got = matrix[i]
+            if not np.array_equal(np.isinf(expect), np.isinf(got)):
+                return math.inf
+            fin = np.isfinite(expect)
+            worst = max(worst, float(np.max(np.abs(got[fin] - expect[fin]))) if fin.any() else 0.0)
+        return worst
+
+    out["max_abs_error_min"] = check(cold)
+    if out["max_abs_error_min"] > 1e-2:
+        problems.append(f"matrix differs from reference Dijkstra by {out['max_abs_error_min']} min")
+
+    # straight line vs road, same bank / across the river
+    from services.dispatch_scoring import km_matrix
+    km = km_matrix(team_xy, inc_xy) / road_network.ROUTING_FALLBACK_KMH * 60.0
+    across = np.array([c[1] < river for c in team_cells])[:, None] != np.array([c[1] < river for c in inc_cells])[None, :]
+    ratio = cold / np.maximum(km, 1e-6)
+    out["road_vs_straight_minutes"] = {"same_bank_median": round(float(np.median(ratio[~across])), 2),
+                                       "across_median": round(float(np.median(ratio[across])), 2)}
+
+    # closures through the API
+    h = Harness(argparse.Namespace(seed=args.seed, fs_latency_ms=0, storage_latency_ms=0,
+                                   llm_latency_ms=0, llm_jitter_ms=0, llm_fail_rate=0))
+    road_network.ROADS.override(net)
+    admin = {"x-admin-token": h.admin_token}
+    cached = net.stats()["cached_trees"]
+    r = h.client().post("/api/roads/closures", json={"way_ids": [bridge_ways[0]], "note": "flooded"}, headers=admin)
+    closure_id = r.get_json()["closure"]["id"]
+    kept = net.stats()["cached_trees"]
+    t0 = time.perf_counter()
+    closed = net.matrix(team_xy, inc_xy)
+    closure = {"closed_edges": r.get_json()["closed_edges"], "trees_kept": kept, "trees_dropped": cached - kept,
+               "matrix_s": round(time.perf_counter() - t0, 3),
+               "pairs_slower": int(np.sum(closed > cold + 1e-6)), "max_abs_error_min": check(closed, {bridge_ways[0]})}
+    if closure["max_abs_error_min"] > 1e-2:
+        problems.append(f"closed matrix differs from reference by {closure['max_abs_error_min']} min")
+    if np.any(closed < cold - 1e-3):
+        problems.append("a closure made some trip faster")
+    r = h.client().delete(f"/api/roads/closures/{closure_id}", headers=admin)
+    t0 = time.perf_counter()
+    reopened = net.matrix(team_xy, inc_xy)
+    closure["reopen_matrix_s"] = round(time.perf_counter() - t0, 2)
+    if r.status_code != 200 or not np.allclose(reopened, cold):
+        problems.append("reopening did not restore the original times")
+    out["closure"] = closure
+
+    # plan ordering (generate-plan): one search from the stops, nothing cached
+    stop_cells = random_cells(road_network.ROUTING_ORDER_MAX_STOPS)
+    start_cell = random_cells(1)[0]
+    stops = [at(*c) for c in stop_cells]
+    ranks = [rnd.choice((1, 2, 3, 4)) for _ in stops]
+    cached = net.stats()["cached_trees"]
+    t0 = time.perf_counter()
+    order, legs = road_network.order_stops(stops, ranks, start=at(*start_cell))
+    plan = {"stops": len(stops), "order_s": round(time.perf_counter() - t0, 3),
+            "trees_cached": net.stats()["cached_trees"] - cached}
+    t0 = time.perf_counter()
+    net.matrix(np.array(stops + [at(*start_cell)]), np.array(stops), cache=False)
+    plan["per_stop_trees_s"] = round(time.perf_counter() - t0, 3)
+    worst, prev = 0.0, start_cell
+    for k, leg in list(zip(order, legs))[:3]:  # legs are rounded to 0.1 min
+        ref = reference_dijkstra(coords, ways, node_id(prev)).get(node_id(stop_cells[k]), math.inf)
+        worst = max(worst, abs(leg - ref) if leg is not None else math.inf)
+        prev = stop_cells[k]
+    plan["max_abs_error_min"] = round(worst, 3)
+    plan["over_bound"] = road_network.order_stops(stops + stops[:1], ranks + ranks[:1])
+    if worst > 1e-1:
+        problems.append(f"plan legs differ from reference Dijkstra by {worst} min")
+    if plan["trees_cached"]:
+        problems.append("plan ordering cached per-stop trees")
+    if plan["over_bound"] is not None:
+        problems.append("plan ordering ran past ROUTING_ORDER_MAX_STOPS")
+    out["plan"] = plan
+
+    # auto-dispatch: km vs minutes
+    team_ids = h.seed_teams(args.dispatch_teams)
+    bank, base = {}, {}
+    for tid in team_ids:
+        cell = (rnd.randrange(args.grid), rnd.randrange(args.grid))
+        base[tid] = at(*cell)
+        h.fs.collection("teams").document(tid).update({"base_lat": base[tid][0], "base_lng": base[tid][1]})
+        bank[tid] = cell[1] < river
+    dispatch = {}
+    cells = random_cells(args.dispatch_incidents)
+    for unit in ("km", "minutes"):
+        # the same incidents (positions and severities) for both runs
+        h.fs._data.pop("processed_incidents", None)
+        h.fs._data.pop("team_counters", None)
+        h.fs._data.pop("dispatches", None)
+        h.rnd.seed(args.seed)
+        h.seed_incidents(args.dispatch_incidents)
+        inc_bank = {}
+        for (doc_id, doc), cell in zip(h.fs._data["processed_incidents"].items(), cells):
+            doc["lat"], doc["lng"] = at(*cell)
+            inc_bank[doc_id] = cell[1] < river
+        t0 = time.perf_counter()
+        r = h.client().post("/api/auto-dispatch-ai", json={"distance_unit": unit, "max_per_team": 20}, headers=admin)
+        elapsed = time.perf_counter() - t0
+        body = r.get_json()
+        pairs = [(d["team_id"], i) for d in body["dispatches"] for i in d.get("incidents", [])]
+        drive = [float(net.matrix([base[tid]], [(i["lat"], i["lng"])])[0, 0]) for tid, i in pairs]
+        crossed = sum(inc_bank[i["_id"]] != bank[tid] for tid, i in pairs)
+        dispatch[unit] = {"status": r.status_code, "assigned": len(pairs), "mean_drive_min": round(float(np.mean(drive)), 2),
+                          "p90_drive_min": round(float(np.percentile(drive, 90)), 2), "across_river": crossed,
+                          "seconds": round(elapsed, 2)}
+    out["dispatch"] = dispatch
+    if dispatch["minutes"]["mean_drive_min"] >= dispatch["km"]["mean_drive_min"]:
+        problems.append("minutes-based dispatch does not give shorter drives than km-based")
+
+    print(json.dumps(out, indent=2))
+    if args.out:
+        Path(args.out).write_text(json.dumps(out, indent=2))
+    print(json.dumps({"problems": problems}))
+    sys.exit(1 if problems else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+# backend/benchmarks/bench_startup.py
+
+"""
+Startup-time benchmark.
+Runs `python -X importtime -c "import app; app.create_app(warm_up=False)"` in a fresh
+interpreter and prints a JSON breakdown: total wall time, total import time and the
+slowest top-level imports (cumulative). Compare the JSON across commits to catch
+regressions (e.g. a heavy SDK imported at module level again).
+
+Usage (from backend/):
+    python benchmarks/bench_startup.py [--runs 5] [--top 15]
+"""
+
+import argparse
+import json
+import re
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parents[1]
+SNIPPET = "import app; app.create_app(warm_up=False)"
+LINE_RE = re.compile(r"import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)")
+
+
+def run_once():
+    t0 = time.perf_counter()
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", SNIPPET],
+        cwd=BACKEND_DIR, capture_output=True, text=True
+    )
+    wall = time.perf_counter() - t0
+    if proc.returncode != 0:
+        raise RuntimeError(proc.stderr[-2000:])
+    modules = []
+    for line in proc.stderr.splitlines():
+        m = LINE_RE.match(line)
+        if not m:
+            continue
+        self_us, cumulative_us, indent, name = m.groups()
+        # nesting depth = (leading spaces - 1) / 2 ; depth 0 are top-level imports
+        depth = (len(indent) - 1) // 2
+        modules.append({"module": name, "self_us": int(self_us), "cumulative_us": int(cumulative_us), "depth": depth})
+    return wall, modules
+
+
+def main():
+    p = argparse.ArgumentParser()
+    p.add_argument("--runs", type=int, default=5)
+    p.add_argument("--top", type=int, default=15)
+    args = p.parse_args()
+
+    walls, totals, last = [], [], []
+    for _ in range(args.runs):
+        wall, modules = run_once()
+        walls.append(wall)
+        totals.append(sum(m["self_us"] for m in modules))
+        last = modules
+
+    # depth 0 is `app` itself (plus interpreter bootstrap); depth 1 are the imports it pulls in
+    app_total = next((m["cumulative_us"] for m in last if m["depth"] == 0 and m["module"] == "app"), 0)
+    top = sorted((m for m in last if m["depth"] == 1), key=lambda m: m["cumulative_us"], reverse=True)[:args.top]
+    print(json.dumps({
+        "runs": args.runs,
+        "wall_seconds_median": round(statistics.median(walls), 4),
+        "import_seconds_median": round(statistics.median(totals) / 1e6, 4),
+        "modules_imported": len(last),
+        "import_app_ms": round(app_total / 1000, 2),
+        "slowest_imports_of_app": [{"module": m["module"], "cumulative_ms": round(m["cumulative_us"] / 1000, 2)} for m in top],
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,307 @@
+# backend/benchmarks/bench_storage_backends.py
+
+"""
+Conformance and latency comparison of the storage backends behind
+services/firestore_service: Firestore (modelled by benchmarks.standins.FakeFirestore
+with --firestore-latency-ms per RPC round trip) and the embedded SQLite store
+(services/sqlite_store.py, on a temporary file).
+
+Part 1 (conformance): the same script of repository calls runs against each backend -
+incident writes, status / assignment updates, text search, teams, dispatch commits,
+paginated dispatch listings, the joined dispatch view, team loads, map tiles,
+analytics, rebuilds, paging over every incident, and an atomic batch that fails
+half-way. Generated ids are renamed by creation order and timestamps masked, then
+every step's result (and the counter collections it leaves behind) must be identical
+on both backends.
+
+Part 2 (latency): --incidents incidents and --teams teams are seeded into each backend
+through the normal write path, then each hot call is timed --repeat times (p50 / p95).
+For SQLite it also checks that the status, team_id and assigned_team queries are
+answered from an index (EXPLAIN QUERY PLAN).
+
+Usage (from backend/):
+    python benchmarks/bench_storage_backends.py [--incidents 10000] [--firestore-latency-ms 20] [--repeat 20]
+"""
+
+import argparse
+import json
+import os
+import re
+import shutil
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from benchmarks.bench_e2e import Harness, CENTER, percentiles
+from benchmarks.standins import FakeFirestore
+from services import firestore_service as fss, geo_tiles
+from services.dispatch_service import commit_dispatch
+from services.sqlite_store import SqliteStore
+
+_ISO = re.compile(r"^\d{4}-\d{2}-\d{2}T\d{2}:\d{2}")
+COUNTER_COLLECTIONS = (fss.TEAM_COUNTERS, geo_tiles.TILES_COLLECTION, "incident_rollups")
+
+
+def canonical(value, aliases):
+    """ids -> creation-order aliases, datetimes masked, duration sketch fields dropped (they depend on now)."""
+    if isinstance(value, dict):
+        out = {}
+        for k, v in value.items():
+            if re.match(r"^(ttd|ttc)_|^sum_tt|^(mean_seconds|p50|p90|p99)$", str(k)):
+                continue
+            out[aliases.get(k, k)] = canonical(v, aliases)
+        return out
+    if isinstance(value, (list, tuple)):
+        return [canonical(v, aliases) for v in value]
+    if isinstance(value, datetime) or (isinstance(value, str) and _ISO.match(value)):
+        return "<dt>"
+    if isinstance(value, str):
+        return aliases.get(value, value)
+    if isinstance(value, float):
+        return round(value, 6)
+    return value
+
+
+def dump_collections(db, names):
+    return {n: {d.id: d.to_dict() for d in db.collection(n).stream()} for n in names}
+
+
+def conformance(h, client):
+    """Run the repository script on `client`; returns {step: canonical result}."""
+    fss.use_client(client)
+    fss.TEAM_BY_NAME_CACHE.clear()
+    ids = []
+    steps = {}
+    base = datetime.utcnow().replace(microsecond=0) - timedelta(hours=3)
+
+    def alias(x):
+        ids.append(x)
+        return x
+
+    for i in range(240):
+        text, label = h.templates[(i * 7) % len(h.templates)]
+        doc = {"reporter_name": f"r{i}", "reporter_phone": str(i), "location": f"ward-{i % 13}", "description": text,
+               "lat": CENTER[0] + ((i * 37) % 100 - 50) / 400.0, "lng": CENTER[1] + ((i * 53) % 100 - 50) / 400.0,
+               "timestamp": base + timedelta(seconds=30 * i), "status": "new",
+               "analysis": {"severity": label, "incident_type": ["flood", "fire", "medical", "other"][i % 4],
+                            "summary": text[:40]}}
+        _, ref = fss.save_processed_incident(doc)
+        alias(ref.id)
+    _, raw = fss.save_raw_report({"description": "raw", "timestamp": base})
+    alias(raw.id)
+    inc = list(ids[:240])
+
+    teams = [alias(fss.create_team(f"conf-team-{k}", f"c{k}", "pw")) for k in range(3)]
+    steps["team_by_name"] = fss.get_team_by_name("conf-team-1")
+    fss.set_team_status(teams[0], "busy")
+    fss.update_team_location(teams[1], 13.1, 74.8)
+    steps["teams"] = sorted(fss.get_all_teams(), key=lambda t: t["name"])
+    steps["team_by_id"] = fss.get_team_by_id(teams[1])
+
+    steps["commit_1"] = commit_dispatch({"dispatch_id": "conf_d1", "team_id": teams[0], "created_at": "2026-01-01T10:00:00",
+                                         "status": "assigned", "incidents": [{"_id": i} for i in inc[:60]] + [{"_id": "missing"}]},
+                                        team_id=teams[0])
+    steps["commit_2"] = commit_dispatch({"dispatch_id": "conf_d2", "team_id": teams[0], "created_at": "2026-01-01T11:00:00",
+                                         "status": "assigned", "incidents": [{"_id": i} for i in inc[60:80]]}, team_id=teams[0])
+    steps["commit_3"] = commit_dispatch({"dispatch_id": "conf_d3", "team_id": teams[1], "created_at": "2026-01-01T12:00:00",
+                                         "status": "assigned", "incidents": [{"_id": i} for i in inc[80:90]]}, team_id=teams[1])
+    for i in inc[60:70]:
+        fss.update_incident_status(i, "closed")
+    fss.update_incident_assignment(inc[85], team_id=False, new_status="new")
+    fss.update_incident_analysis(inc[100], {"severity": "critical", "incident_type": "fire", "summary": "refined"})
+    fss.mark_dispatch_completed("conf_d2")
+
+    steps["all_incidents"] = fss.get_all_incidents()
+    steps["by_status_new"] = fss.get_incidents_by_status(["new"])
+    steps["by_status_multi"] = fss.get_incidents_by_status(["closed", "rescue_dispatched"])
+    steps["search"] = fss.search_incidents_by_text("flood")
+    steps["dispatches_all"] = fss.get_dispatches_by_team(teams[0])
+    steps["dispatches_active"] = fss.get_dispatches_by_team(teams[0], active_only=True, summary=True)
+    page1 = fss.get_dispatches_by_team(teams[0], summary=True, limit=1)
+    page2 = fss.get_dispatches_by_team(teams[0], summary=True, limit=1, cursor=page1["next_cursor"])
+    steps["dispatch_pages"] = [page1, page2]
+    steps["dispatch_view"] = fss.get_dispatch_view("conf_d1")
+    steps["dispatch"] = fss.get_dispatch("conf_d3")
+    steps["team_loads"] = fss.get_team_loads(teams)
+    steps["reconcile"] = fss.reconcile_team_loads()
+    x, y = geo_tiles.tile_xy(CENTER[0], CENTER[1], 10)
+    steps["tile_aggregate"] = fss.get_tile(10, x, y)
+    x, y = geo_tiles.tile_xy(CENTER[0], CENTER[1], 14)
+    steps["tile_points"] = fss.get_tile(14, x, y, points_limit=20)
+    steps["analytics"] = fss.get_analytics(base - timedelta(hours=1), base + timedelta(hours=4))
+    steps["counters"] = dump_collections(fss.get_db(), COUNTER_COLLECTIONS)
+    steps["rebuild_tiles"] = fss.rebuild_tile_aggregates()
+    steps["rebuild_rollups"] = fss.rebuild_rollups()
+    steps["counters_rebuilt"] = dump_collections(fss.get_db(), COUNTER_COLLECTIONS)
+    steps["iter_incidents"] = [d["_id"] for d in fss.iter_incidents(page_size=7)]
+
+    db = fss.get_db()
+    batch = db.batch()
+    batch.set(db.collection("processed_incidents").document("atomic_probe"), {"status": "new"})
+    batch.update(db.collection("processed_incidents").document("does_not_exist"), {"status": "x"})
+    try:
+        batch.commit()
+        steps["atomic_batch"] = "committed"
+    except Exception as e:  # noqa: BLE001
+        steps["atomic_batch"] = [type(e).__name__, db.collection("processed_incidents").document("atomic_probe").get().exists]
+
+    aliases = {x: f"id{n}" for n, x in enumerate(ids)}
+    out = {k: canonical(v, aliases) for k, v in steps.items()}
+    # these come back in document-id order, and generated ids differ between backends
+    iterated = steps["iter_incidents"]
+    out["iter_incidents"] = [iterated == sorted(iterated), sorted(out["iter_incidents"])]
+    out["search"].sort(key=lambda x: x["_id"])
+    out["tile_points"]["points"].sort(key=lambda x: x["_id"])
+    return out
+
+
+def diff(a, b, path=""):
+    if type(a) is not type(b):
+        return [f"{path}: {a!r:.80} != {b!r:.80}"]
+    if isinstance(a, dict):
+        out = []
+        for k in sorted(set(a) | set(b), key=str):
+            if k not in a or k not in b:
+                out.append(f"{path}/{k}: only in {'firestore' if k in a else 'sqlite'}")
+            else:
+                out += diff(a[k], b[k], f"{path}/{k}")
+        return out
+    if isinstance(a, list):
+        if len(a) != len(b):
+            return [f"{path}: {len(a)} items != {len(b)}"]
+        return [d for i, (x, y) in enumerate(zip(a, b)) for d in diff(x, y, f"{path}[{i}]")]
+    return [] if a == b else [f"{path}: {a!r:.80} != {b!r:.80}"]
+
+
+def seed(h, client, n, n_teams):
+    fss.use_client(client)
+    fss.TEAM_BY_NAME_CACHE.clear()
+    now = datetime.utcnow()
+    teams = [fss.create_team(f"bench-team-{k}", "", "pw") for k in range(n_teams)]
+    ids = []
+    for i in range(n):
+        text, label = h.templates[h.rnd.randrange(len(h.templates))]
+        lat, lng = h.scatter()
+        _, ref = fss.save_processed_incident({
+            "reporter_name": "seed", "reporter_phone": "0", "location": f"seed-{i}", "description": text,
+            "lat": lat, "lng": lng, "timestamp": now - timedelta(seconds=20 * i), "status": "new",
+            "analysis": {"severity": label, "incident_type": "other", "summary": text[:40]}})
+        ids.append(ref.id)
+    dispatches = []
+    for k, team in enumerate(teams):
+        for j in range(5):
+            did = f"bench_d{k}_{j}"
+            chunk = ids[(k * 5 + j) * 10:(k * 5 + j + 1) * 10]
+            commit_dispatch({"dispatch_id": did, "team_id": team, "created_at": (now + timedelta(seconds=j)).isoformat(),
+                             "status": "assigned", "incidents": [{"_id": i} for i in chunk]}, team_id=team)
+            dispatches.append(did)
+    return teams, ids, dispatches
+
+
+def measure(h, client, teams, ids, dispatches, repeat):
+    fss.use_client(client)
+    x, y = geo_tiles.tile_xy(CENTER[0], CENTER[1], 10)
+    now = datetime.utcnow()
+    counter = iter(range(10 ** 9))
+
+    def save():
+        fss.save_processed_incident({"description": "bench write", "location": "bench", "lat": CENTER[0], "lng": CENTER[1],
+                                     "timestamp": now, "status": "new", "analysis": {"severity": "low"}})
+
+    calls = [
+        ("get_team_by_name", lambda: fss.get_team_by_name("bench-team-3")),
+        ("get_dispatch", lambda: fss.get_dispatch(dispatches[7])),
+        ("get_dispatch_view", lambda: fss.get_dispatch_view(dispatches[7])),
+        ("team_dispatches_active_page", lambda: fss.get_dispatches_by_team(teams[2], active_only=True, summary=True, limit=50)),
+        ("get_team_loads", lambda: fss.get_team_loads(teams)),
+        ("tile_z10", lambda: fss.get_tile(10, x, y)),
+        ("analytics_24h", lambda: fss.get_analytics(now - timedelta(days=1), now)),
+        ("incidents_by_status_rescue", lambda: fss.get_incidents_by_status(["rescue_dispatched"])),
+        ("incidents_by_status_new", lambda: fss.get_incidents_by_status(["new"])),
+        ("save_processed_incident", save),
+        ("update_incident_status", lambda: fss.update_incident_status(ids[-1 - next(counter) % 1000], "in_progress")),
+    ]
+    out = {}
+    for name, fn in calls:
+        samples = []
+        for _ in range(repeat if not name.startswith("incidents_by_status_new") else max(3, repeat // 5)):
+            t0 = time.perf_counter()
+            fn()
+            samples.append(time.perf_counter() - t0)
+        p = percentiles(samples)
+        out[name] = {"p50_ms": p["p50_ms"], "p95_ms": p["p95_ms"]}
+    return out
+
+
+def sqlite_plans(store):
+    conn = store._conn()
+    queries = {
+        "status": ('SELECT id FROM "c_processed_incidents" WHERE "f_status" = ? AND "f_timestamp" IS NOT NULL '
+                   'ORDER BY "f_timestamp" DESC', ["new"]),
+        "assigned_team": ('SELECT id FROM "c_processed_incidents" WHERE "f_assigned_team" = ?', ["x"]),
+        "team_id": ('SELECT id FROM "c_dispatches" WHERE "f_team_id" = ? AND "f_status" = ? AND "f_created_at" IS NOT NULL '
+                    'ORDER BY "f_created_at" DESC LIMIT 50', ["x", "assigned"]),
+        "timestamp": ('SELECT id FROM "c_processed_incidents" WHERE "f_timestamp" >= ?', ["2026"]),
+    }
+    plans = {}
+    for name, (sql, params) in queries.items():
+        plans[name] = " | ".join(r[-1] for r in conn.execute("EXPLAIN QUERY PLAN " + sql, params).fetchall())
+    return plans
+
+
+def main():
+    p = argparse.ArgumentParser()
+    p.add_argument("--incidents", type=int, default=10000)
+    p.add_argument("--teams", type=int, default=20)
+    p.add_argument("--repeat", type=int, default=20)
+    p.add_argument("--firestore-latency-ms", type=float, default=20.0)
+    args = p.parse_args()
+
+    tmp = tempfile.mkdtemp(prefix="crisismap-sqlite-")
+    try:
+        h = Harness(argparse.Namespace(seed=0, fs_latency_ms=0.0, storage_latency_ms=0.0, llm_latency_ms=0.0,
+                                       llm_jitter_ms=0.0, llm_fail_rate=0.0))
+        problems = []
+
+        # ---- part 1: conformance ----
+        ref = conformance(h, FakeFirestore())
+        got = conformance(h, SqliteStore(os.path.join(tmp, "conformance.db")))
+        for step in ref:
+            d = diff(ref[step], got.get(step))
+            if d:
+                problems.append({"step": step, "diffs": d[:5]})
+        if got.get("atomic_batch") == "committed":
+            problems.append({"step": "atomic_batch", "diffs": ["batch with a failing update committed"]})
+
+        # ---- part 2: latency ----
+        results = {}
+        fake = FakeFirestore()
+        store = SqliteStore(os.path.join(tmp, "bench.db"))
+        for name, client in (("firestore", fake), ("sqlite", store)):
+            t0 = time.perf_counter()
+            teams, ids, dispatches = seed(h, client, args.incidents, args.teams)
+            seed_s = time.perf_counter() - t0
+            if client is fake:
+                fake.latency_ms = args.firestore_latency_ms
+            results[name] = {"seed_s": round(seed_s, 1), "calls": measure(h, client, teams, ids, dispatches, args.repeat)}
+        plans = sqlite_plans(store)
+        for name, plan in plans.items():
+            if "USING INDEX" not in plan and "USING COVERING INDEX" not in plan:
+                problems.append({"step": f"plan:{name}", "diffs": [plan]})
+        results["sqlite"]["db_bytes"] = sum(os.path.getsize(os.path.join(tmp, f)) for f in os.listdir(tmp) if f.startswith("bench.db"))
+
+        print(json.dumps({"conformance_steps": len(ref), "incidents": args.incidents,
+                          "firestore_latency_ms": args.firestore_latency_ms, "results": results,
+                          "sqlite_query_plans": plans, "problems": problems}, indent=2, default=str))
+        sys.exit(1 if problems else 0)
+    finally:
+        fss.use_client(None)
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
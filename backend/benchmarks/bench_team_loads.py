@@ -0,0 +1,85 @@
+# backend/benchmarks/bench_team_loads.py
+
+"""
+Auto-dispatch with a large incident history: counter-based team loads vs full scan.
+
+Seeds --history historical incidents (mostly closed, some still active and assigned)
+plus --incidents new ones and --teams teams in FakeFirestore, reconciles the team
+load counters once (not measured), then measures
+  - legacy_scan:   the old load computation (get_all_incidents + count per team)
+  - team_counters: get_team_loads (one get_all over the counter docs)
+  - auto_dispatch: a full POST /api/auto-dispatch-ai request
+Store latency is 0 so the run stays short; projected_ms adds --fs-latency-ms per
+round trip. Also checks the counters still match a recount after the dispatch.
+
+Usage (from backend/):
+    python benchmarks/bench_team_loads.py [--history 100000] [--incidents 50] [--teams 20] [--fs-latency-ms 2]
+"""
+
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from benchmarks.bench_e2e import Harness
+from services import firestore_service
+
+
+def measure(h, name, fn, latency_ms):
+    h.fs.reset_ops()
+    t0 = time.perf_counter()
+    out = fn()
+    ms = (time.perf_counter() - t0) * 1000
+    ops = h.fs.op_counts()
+    return out, {"step": name, "ms": round(ms, 1), "round_trips": ops["round_trips"],
+                 "projected_ms": round(ms + ops["round_trips"] * latency_ms, 1)}
+
+
+def legacy_loads(team_ids):
+    loads = {t: 0 for t in team_ids}
+    for inc in firestore_service.get_all_incidents():
+        at = inc.get("assigned_team")
+        if at and at in loads and (inc.get("status") or "").lower() != "closed":
+            loads[at] += 1
+    return loads
+
+
+def main():
+    p = argparse.ArgumentParser()
+    p.add_argument("--history", type=int, default=100000)
+    p.add_argument("--incidents", type=int, default=50)
+    p.add_argument("--teams", type=int, default=20)
+    p.add_argument("--fs-latency-ms", type=float, default=2.0)
+    args = p.parse_args()
+
+    h = Harness(argparse.Namespace(seed=0, fs_latency_ms=0.0, storage_latency_ms=0.0, llm_latency_ms=0.0,
+                                   llm_jitter_ms=0.0, llm_fail_rate=0.0))
+    team_ids = h.seed_teams(args.teams)
+    active = args.history // 20
+    h.seed_incidents(args.history - active, status="closed", assigned_team=team_ids[0])
+    for i, tid in enumerate(team_ids):
+        h.seed_incidents(active // len(team_ids) * (i % 3), status="rescue_dispatched", assigned_team=tid)
+    h.seed_incidents(args.incidents)
+    firestore_service.reconcile_team_loads()
+
+    results = []
+    scanned, res = measure(h, "legacy_scan", lambda: legacy_loads(team_ids), args.fs_latency_ms)
+    results.append(res)
+    counted, res = measure(h, "team_counters", lambda: firestore_service.get_team_loads(team_ids), args.fs_latency_ms)
+    results.append(res)
+    status, res = measure(h, "auto_dispatch", lambda: h.client().post(
+        "/api/auto-dispatch-ai", json={"statuses": ["new"]}, headers={"x-admin-token": h.admin_token}).status_code,
+        args.fs_latency_ms)
+    results.append(dict(res, status=status))
+    drift = firestore_service.reconcile_team_loads()
+
+    print(json.dumps({"history": args.history, "results": results, "loads_match": scanned == counted,
+                      "drift_after_dispatch": drift}, indent=2))
+    sys.exit(0 if scanned == counted and not drift and status == 200 else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+# backend/benchmarks/bench_tiered_analysis.py
+
+"""
+Confidence-tiered analysis on severity_data.csv: LLM call reduction and latency.
+
+Every labelled report in services/models/severity_data.csv goes through
+(a) analyze_incident (Gemini on every report) and (b) analyze_incident_tiered at
+several confidence thresholds, against FakeLLM with --latency-ms per call. For each
+run it reports the share resolved locally, LLM calls, latency percentiles, and the
+accuracy of the locally resolved severities against the CSV labels. A last run with
+no model configured checks that nothing is counted as an LLM escalation.
+
+Note: the active severity model was trained on this same CSV, so the local accuracy
+is in-sample and optimistic; use a held-out export for tuning thresholds in earnest.
+
+Usage (from backend/):
+    python benchmarks/bench_tiered_analysis.py [--thresholds 0.3,0.35,0.4] [--max-disagreement 1]
+"""
+
+import argparse
+import csv
+import json
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from benchmarks.standins import FakeLLM
+from benchmarks.bench_e2e import percentiles
+from services import gemini_service
+from services.llm_gateway import LLMGateway
+
+DATA = Path(__file__).resolve().parents[1] / "services" / "models" / "severity_data.csv"
+
+
+def run(name, analyze, rows, latency_ms, with_model=True):
+    llm = FakeLLM(latency_ms=latency_ms)
+    gemini_service.GEMINI.override(llm if with_model else None)
+    gemini_service.GATEWAY = LLMGateway(gemini_service.get_model, timeout_seconds=30, rate_per_second=10000, burst=10000)
+    lat, local_lat, local_correct, correct = [], [], 0, 0
+    for text, label in rows:
+        t0 = time.perf_counter()
+        out = analyze({"location": "bench", "description": text})
+        lat.append(time.perf_counter() - t0)
+        ok = out.get("severity") == label
+        correct += ok
+        if out.get("analysis_tier") == "local":
+            local_lat.append(lat[-1])
+            local_correct += ok
+    local = len(local_lat)
+    return {
+        "mode": name, "reports": len(rows), **percentiles(lat), "llm_calls": llm.calls,
+        "local_share": round(local / len(rows), 3),
+        "local_p50_ms": percentiles(local_lat)["p50_ms"],
+        "local_accuracy": round(local_correct / local, 3) if local else None,
+        "severity_accuracy_vs_labels": round(correct / len(rows), 3),
+    }
+
+
+def main():
+    p = argparse.ArgumentParser()
+    p.add_argument("--thresholds", default="0.3,0.35,0.4,0.45")
+    p.add_argument("--max-disagreement", type=int, default=None,
+                   help="allowed ML vs heuristic severity gap in levels (default: ANALYSIS_LOCAL_MAX_DISAGREEMENT)")
+    p.add_argument("--latency-ms", type=float, default=200)
+    args = p.parse_args()
+
+    with open(DATA, newline="", encoding="utf-8") as f:
+        rows = [(r["text"], r["label"]) for r in csv.DictReader(f)]
+    gemini_service.load_severity_model()
+
+    baseline = run("llm_always", gemini_service.analyze_incident, rows, args.latency_ms)
+    results = [baseline]
+    for t in [float(x) for x in args.thresholds.split(",") if x]:
+        res = run(f"tiered@{t}", lambda r, t=t: gemini_service.analyze_incident_tiered(
+            r, threshold=t, max_disagreement=args.max_disagreement), rows, args.latency_ms)
+        res["llm_call_reduction"] = round(1 - res["llm_calls"] / max(1, baseline["llm_calls"]), 3)
+        results.append(res)
+
+    before = gemini_service.tier_stats()
+    no_model = run("tiered@default,no_model", gemini_service.analyze_incident_tiered, rows, args.latency_ms,
+                   with_model=False)
+    after = gemini_service.tier_stats()
+    no_model["local_fallback"] = after["local_fallback"] - before["local_fallback"]
+    no_model["counted_as_llm"] = (after["total"] - before["total"]) - (after["local"] - before["local"]) \
+        - no_model["local_fallback"]
+    results.append(no_model)
+    print(json.dumps(results, indent=2))
+    # a tiered run must never call the LLM more often than the baseline, and without a
+    # model nothing may be counted as an escalation
+    ok = all(r["llm_calls"] <= baseline["llm_calls"] for r in results) and no_model["counted_as_llm"] == 0
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
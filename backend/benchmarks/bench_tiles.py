@@ -0,0 +1,146 @@
+# backend/benchmarks/bench_tiles.py
+
+"""
+Map viewport loads: pre-aggregated tiles vs the full incident list.
+
+Seeds --incidents incidents scattered over a city-sized area in FakeFirestore (written
+directly, so the tile aggregates start empty), runs rebuild_tile_aggregates() as the
+backfill, then measures for a viewport covering the area
+  - full_list:       GET /api/incidents (what dashboards fetch today)
+  - tiles_z<zoom>:   GET /api/tiles/z/x/y for every tile of the viewport, zoomed out
+                     (aggregate cells) and zoomed in (points)
+and reports response bytes, Firestore round trips and projected latency
+(measured + --fs-latency-ms per round trip).
+
+Afterwards it drives incremental writes through the normal paths (new reports,
+status changes, analysis refinement, a dispatch commit) and checks the stored cells
+still match a recount from scratch, and that each viewport's cell totals equal the
+number of incidents inside it.
+
+Usage (from backend/):
+    python benchmarks/bench_tiles.py [--incidents 20000] [--fs-latency-ms 2]
+"""
+
+import argparse
+import json
+import random
+import sys
+import time
+import uuid
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from benchmarks.bench_e2e import Harness, CENTER
+from services import firestore_service, geo_tiles
+from services.dispatch_service import commit_dispatch
+
+
+def viewport_tiles(z, width=5, height=3):
+    """Tiles of a ~1280x768 px map view centred on the seeded area."""
+    cx, cy = geo_tiles.tile_xy(CENTER[0], CENTER[1], z)
+    n = 1 << z
+    return [(z, x, y) for x in range(max(cx - width // 2, 0), min(cx + width // 2, n - 1) + 1)
+            for y in range(max(cy - height // 2, 0), min(cy + height // 2, n - 1) + 1)]
+
+
+def in_viewport(fs, z):
+    """Incidents inside viewport_tiles(z), counted directly."""
+    tiles = {(x, y) for _, x, y in viewport_tiles(z)}
+    return sum(1 for d in fs._data.get("processed_incidents", {}).values()
+               if d.get("lat") is not None and geo_tiles.tile_xy(d["lat"], d["lng"], z) in tiles)
+
+
+def measure(h, name, paths, latency_ms):
+    c = h.client()
+    h.fs.reset_ops()
+    t0 = time.perf_counter()
+    size, bodies = 0, []
+    for path in paths:
+        r = c.get(path)
+        assert r.status_code == 200, (path, r.status_code)
+        size += len(r.data)
+        bodies.append(r.get_json())
+    ms = (time.perf_counter() - t0) * 1000
+    ops = h.fs.op_counts()
+    return bodies, {"step": name, "requests": len(paths), "bytes": size, "round_trips": ops["round_trips"],
+                    "ms": round(ms, 1), "projected_ms": round(ms + ops["round_trips"] * latency_ms, 1)}
+
+
+def recount(fs):
+    cells = {}
+    for doc in fs._data.get("processed_incidents", {}).values():
+        for cell, fields in geo_tiles.incident_tile_deltas({}, doc).items():
+            cur = cells.setdefault(cell, {})
+            for f, n in fields.items():
+                cur[f] = cur.get(f, 0) + n
+    return cells
+
+
+def mismatches(fs):
+    expected = recount(fs)
+    stored = fs._data.get(geo_tiles.TILES_COLLECTION, {})
+    bad = []
+    for cell in set(expected) | set(stored):
+        exp, got = expected.get(cell, {}), stored.get(cell, {})
+        for f in set(exp) | set(got):
+            if f in ("z", "qk"):
+                continue
+            if abs((exp.get(f) or 0) - (got.get(f) or 0)) > 1e-6:
+                bad.append((cell, f, exp.get(f), got.get(f)))
+    return bad
+
+
+def main():
+    p = argparse.ArgumentParser()
+    p.add_argument("--incidents", type=int, default=20000)
+    p.add_argument("--fs-latency-ms", type=float, default=2.0)
+    args = p.parse_args()
+
+    h = Harness(argparse.Namespace(seed=0, fs_latency_ms=0.0, storage_latency_ms=0.0, llm_latency_ms=0.0,
+                                   llm_jitter_ms=0.0, llm_fail_rate=0.0))
+    team_ids = h.seed_teams(5)
+    h.seed_incidents(args.incidents)
+
+    t0 = time.perf_counter()
+    backfill = firestore_service.rebuild_tile_aggregates()
+    backfill["ms"] = round((time.perf_counter() - t0) * 1000, 1)
+
+    results = []
+    _, res = measure(h, "full_list", ["/api/incidents"], args.fs_latency_ms)
+    results.append(res)
+    totals = {}
+    for z in (8, 10, 12, 14):
+        bodies, res = measure(h, f"tiles_z{z}", [f"/api/tiles/{z}/{x}/{y}" for z, x, y in viewport_tiles(z)], args.fs_latency_ms)
+        res["mode"] = bodies[0]["mode"]
+        results.append(res)
+        if res["mode"] == "aggregate":
+            totals[z] = (sum(b["total"] for b in bodies), in_viewport(h.fs, z))
+    print(json.dumps({"incidents": args.incidents, "backfill": backfill, "results": results}, indent=2))
+
+    # incremental maintenance through the normal write paths
+    rnd = random.Random(1)
+    ids = list(h.fs._data["processed_incidents"])
+    for _ in range(200):
+        lat, lng = h.scatter()
+        firestore_service.save_processed_incident({"description": "bench", "lat": lat, "lng": lng, "status": "new",
+                                                   "analysis": {"severity": rnd.choice(["low", "high", "critical"])}})
+    for i in rnd.sample(ids, 300):
+        firestore_service.update_incident_status(i, rnd.choice(["rescue_dispatched", "closed", "in_progress"]))
+    for i in rnd.sample(ids, 100):
+        firestore_service.update_incident_analysis(i, {"severity": rnd.choice(["low", "medium", "high"])})
+    sample = rnd.sample(ids, 800)
+    commit_dispatch({"dispatch_id": f"bench_{uuid.uuid4().hex[:8]}", "team_id": team_ids[0],
+                     "incidents": [{"_id": i} for i in sample]}, team_id=team_ids[0])
+
+    bad = mismatches(h.fs)
+    after = {z: (sum(b["total"] for b in measure(h, "check", [f"/api/tiles/{z}/{x}/{y}" for z, x, y in viewport_tiles(z)], 0)[0]),
+                 in_viewport(h.fs, z)) for z in totals}
+    ok = not bad and all(got == exp for got, exp in list(totals.values()) + list(after.values()))
+    print(json.dumps({"viewport_totals_vs_direct_count": totals, "after_writes": after,
+                      "cell_mismatches": len(bad), "examples": bad[:5]}, indent=2))
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+# backend/benchmarks/bench_training.py
+
+"""
+Out-of-core training benchmark.
+Synthesizes N labeled reports (default 1,000,000) from the severity_data.csv templates
+with randomized counts/places, then runs the streaming trainer (CSV source, parallel CV)
+into a throwaway models directory. Prints wall time, rows/s, peak RSS and the model card.
+
+Usage (from backend/):
+    python benchmarks/bench_training.py [--rows 1000000] [--cv 5] [--chunksize 50000]
+"""
+
+import argparse
+import csv
+import json
+import os
+import random
+import resource
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parents[1]
+TEMPLATES_CSV = BACKEND_DIR / "services" / "models" / "severity_data.csv"
+
+PLACES = ["near the bridge", "at the market", "on highway 66", "by the river bank", "in sector 4",
+          "behind the school", "at the harbour", "in the old town", "near the hospital", ""]
+
+
+def synthesize(path, rows, seed=0):
+    rnd = random.Random(seed)
+    with open(TEMPLATES_CSV) as f:
+        templates = [(r["text"], r["label"]) for r in csv.DictReader(f)]
+    with open(path, "w", newline="") as f:
+        w = csv.writer(f)
+        w.writerow(["text", "label"])
+        for i in range(rows):
+            text, label = templates[rnd.randrange(len(templates))]
+            text = f"{text} {rnd.choice(PLACES)} ({rnd.randint(1, 40)} reported)".strip()
+            w.writerow([text, label])
+
+
+def main():
+    p = argparse.ArgumentParser()
+    p.add_argument("--rows", type=int, default=1_000_000)
+    p.add_argument("--cv", type=int, default=5)
+    p.add_argument("--chunksize", type=int, default=50000)
+    p.add_argument("--n_jobs", type=int, default=-1)
+    args = p.parse_args()
+
+    tmp = tempfile.mkdtemp(prefix="crisismap_bench_")
+    os.environ["CRISISMAP_MODELS_DIR"] = tmp  # keep benchmark artifacts out of the real registry
+    sys.path.insert(0, str(BACKEND_DIR))
+    from services import train_models
+
+    data = Path(tmp) / "reports.csv"
+    t0 = time.perf_counter()
+    synthesize(data, args.rows)
+    synth_s = time.perf_counter() - t0
+
+    ns = argparse.Namespace(source="csv", sev_csv=str(data), chunksize=args.chunksize)
+    t1 = time.perf_counter()
+    version, card = train_models.train_severity_streaming(
+        train_models.make_severity_source(ns), cv_folds=args.cv, n_jobs=args.n_jobs,
+        source_desc={"type": "csv", "path": str(data)},
+    )
+    train_s = time.perf_counter() - t1
+
+    print(json.dumps({
+        "rows": args.rows,
+        "synthesize_seconds": round(synth_s, 2),
+        "train_seconds_total": round(train_s, 2),
+        "rows_per_second_fit": round(args.rows / card["fit_seconds"]) if card["fit_seconds"] else None,
+        "peak_rss_mb_parent": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        "peak_rss_mb_children": round(resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024, 1),
+        "model_card": card,
+    }, indent=2, default=str))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+# backend/benchmarks/bench_triage.py
+
+"""
+Triage queue under a surge: do critical reports jump the backlog?
+
+Enqueues --backlog low/medium reports, then --critical critical ones, into
+(a) a FIFO queue (constant score) and (b) the priority TriageQueue, both running
+routes.reports._process_report against the local stand-ins (FakeLLM with
+--llm-latency-ms, tiered analysis disabled so every report costs an LLM call).
+Reports the wait time by severity and the position at which critical reports
+reached processed_incidents. Also checks the queue order against a backlog much older
+than the aging step (critical first, aged low reports eventually first) and that with
+tiered analysis each report's local analysis runs once (the triage pre-score is reused).
+Exits non-zero if, with triage, the worst critical wait is not at least 4x below
+FIFO's, if any report is left unprocessed (starvation), or if either check fails.
+
+Usage (from backend/):
+    python benchmarks/bench_triage.py [--backlog 300] [--critical 10] [--workers 8] [--llm-latency-ms 40]
+"""
+
+import argparse
+import json
+import os
+import sys
+import threading
+from collections import deque
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+os.environ.setdefault("CRISISMAP_WARMUP", "0")
+
+from benchmarks.standins import FakeFirestore, FakeLLM, install_standins
+from benchmarks.bench_e2e import load_templates, percentiles
+from services import gemini_service
+from services.llm_gateway import LLMGateway
+from services import triage_queue
+from services.triage_queue import TriageQueue, triage_score
+from routes import reports
+
+
+def run(name, queue, items, llm_latency_ms):
+    db, _, _ = install_standins(firestore=FakeFirestore(), llm=FakeLLM(latency_ms=llm_latency_ms))
+    gemini_service.GATEWAY = LLMGateway(gemini_service.get_model, timeout_seconds=30, max_concurrency=64,
+                                        initial_concurrency=64, rate_per_second=10000, burst=10000, queue_seconds=60)
+    order, waits = [], {}
+    lock = threading.Lock()
+
+    def process(raw_report, triage):
+        analysis = reports._process_report(raw_report, triage)
+        with lock:
+            order.append(raw_report["label"])
+            waits.setdefault(raw_report["label"], []).append(triage["wait_seconds"])
+        return analysis
+
+    futs = [queue.submit(dict(r), process) for r in items]
+    for f in futs:
+        f.result(timeout=600)
+    critical_pos = [i for i, lab in enumerate(order) if lab == "critical"]
+    return {
+        "mode": name, "processed": len(order),
+        "wait_by_label": {k: percentiles(v) for k, v in sorted(waits.items())},
+        "critical_positions": critical_pos,
+        "processed_incidents": len(db._data.get("processed_incidents", {})),
+    }
+
+
+def _queued(aging_seconds, jobs):
+    """A worker-less TriageQueue holding (arrival, severity) jobs with the given arrival times."""
+    q = TriageQueue(workers=0, aging_seconds=aging_seconds, score=None)
+    for arrival, sev in jobs:
+        q._tiers.setdefault(gemini_service.SEV_LABEL_TO_NUM[sev], deque()).append((arrival, sev, 0.0, None, {}, None, None))
+        q._size += 1
+    return q
+
+
+def check_order(aging_seconds=120):
+    """Pop order for a backlog far older than the aging step, and for a recent one."""
+    now = 10_000.0
+    # 30 min old lows have aged past critical (3 steps) and, being older, go first; the
+    # 10 min old medium has aged to critical too; fresh criticals come before a 200 s old low
+    aged = [(now - 1800 + i, "low") for i in range(5)] + [(now - 600, "medium")] + \
+        [(now - 5 + i, "critical") for i in range(3)]
+    recent = [(now - 200, "low"), (now - 1, "critical")]
+    aged_order = [j[1] for j in map(_queued(aging_seconds, aged)._pop, [now] * len(aged))]
+    recent_order = [j[1] for j in map(_queued(aging_seconds, recent)._pop, [now] * len(recent))]
+    return {"aged_backlog_order": aged_order, "recent_backlog_order": recent_order,
+            "ok": aged_order == ["low"] * 5 + ["medium"] + ["critical"] * 3 and recent_order == ["critical", "low"]}
+
+
+def check_reuse(items, workers):
+    """With tiered analysis on, count local analyses per report (1 = pre-score reused)."""
+    calls = [0]
+    inner = gemini_service.local_analysis
+
+    def counted(raw_report):
+        calls[0] += 1
+        return inner(raw_report)
+
+    triage_queue.local_analysis = gemini_service.local_analysis = counted
+    reports.ANALYSIS_TIERED = True
+    try:
+        res = run("triage_tiered", TriageQueue(workers=workers, score=triage_score), items, 0)
+    finally:
+        triage_queue.local_analysis = gemini_service.local_analysis = inner
+        reports.ANALYSIS_TIERED = False
+    return {"reports": res["processed"], "local_analyses": calls[0], "ok": calls[0] == res["processed"]}
+
+
+def main():
+    p = argparse.ArgumentParser()
+    p.add_argument("--backlog", type=int, default=300)
+    p.add_argument("--critical", type=int, default=10)
+    p.add_argument("--workers", type=int, default=8)
+    p.add_argument("--llm-latency-ms", type=float, default=40)
+    args = p.parse_args()
+
+    reports.ANALYSIS_TIERED = False
+    gemini_service.load_severity_model()
+    templates = load_templates()
+    minor = [t for t in templates if t[1] in ("low", "medium")]
+    critical = [t for t in templates if t[1] == "critical"]
+    items = [{"location": f"minor{i}", "description": minor[i % len(minor)][0], "label": minor[i % len(minor)][1]}
+             for i in range(args.backlog)]
+    items += [{"location": f"crit{i}", "description": critical[i % len(critical)][0], "label": "critical"}
+              for i in range(args.critical)]
+
+    fifo = run("fifo", TriageQueue(workers=args.workers, score=lambda r: ("medium", 0.0, None)), items, args.llm_latency_ms)
+    triage = run("triage", TriageQueue(workers=args.workers, score=triage_score), items, args.llm_latency_ms)
+    order = check_order()
+    reuse = check_reuse(items[:60], args.workers)
+    print(json.dumps({"fifo": fifo, "triage": triage, "order": order, "reuse": reuse}, indent=2))
+
+    ok = triage["processed"] == len(items) and order["ok"] and reuse["ok"] and \
+        triage["wait_by_label"]["critical"]["max_ms"] * 4 <= fifo["wait_by_label"]["critical"]["max_ms"]
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
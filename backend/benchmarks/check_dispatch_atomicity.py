@@ -0,0 +1,184 @@
+# backend/benchmarks/check_dispatch_atomicity.py
+
+"""
+Failure-injection check for dispatch_service.commit_dispatch: no half-assigned state.
+
+Commits --dispatches dispatches (alternating small single-batch and large chunked
+ones) against a FakeFirestore that fails --fail-rate of its writes/commits. After
+every attempt it checks the invariant:
+
+    each incident either still has its prior state, or points at a dispatch whose
+    commit_state is "committed" (and lists the incident),
+
+allowing only dispatches left "pending" (rollback itself failed), which must then be
+rolled forward by re-committing the same dispatch_id with failures switched off.
+Also re-commits committed dispatches and checks nothing changes (idempotency), and
+that the team load counters match a full recount (reconcile_team_loads finds no drift).
+
+A last re-commit case takes a large dispatch over already-assigned incidents, fails it
+after its first chunk with the rollback lost (the worker died), then re-commits it and
+fails that at the finalize step: the incidents must be back on their assignments from
+before the dispatch, and the team / tile / rollup counters equal to what they were
+before it. A third commit then succeeds and must leave no counter drift.
+Exits non-zero on any violation.
+
+Usage (from backend/):
+    python benchmarks/check_dispatch_atomicity.py [--dispatches 40] [--fail-rate 0.3] [--seed 0]
+"""
+
+import argparse
+import json
+import random
+import sys
+import uuid
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from benchmarks.standins import FakeFirestore, install_standins
+from services import dispatch_service
+from services.firestore_service import reconcile_team_loads
+from services.dispatch_service import commit_dispatch, DispatchCommitError, STATE_COMMITTED, STATE_PENDING, STATE_FAILED
+
+
+def violations(db, prior):
+    dispatches = db._data.get("dispatches", {})
+    bad, pending_refs = [], set()
+    for iid, doc in db._data["processed_incidents"].items():
+        did = doc.get("dispatch_id")
+        if did == prior[iid].get("dispatch_id"):
+            continue
+        d = dispatches.get(did) or {}
+        if d.get("commit_state") == STATE_COMMITTED and iid in d.get("assigned_incident_ids", []):
+            continue
+        if d.get("commit_state") == STATE_PENDING:
+            pending_refs.add(did)
+            continue
+        bad.append((iid, did, d.get("commit_state")))
+    return bad, pending_refs
+
+
+def counters(db):
+    """Counter collections with zero fields dropped and float sums rounded, for comparison."""
+    out = {}
+    for name in ("team_counters", "incident_tiles", "incident_rollups"):
+        for doc_id, fields in db._data.get(name, {}).items():
+            kept = {f: round(v, 6) for f, v in fields.items()
+                    if isinstance(v, (int, float)) and not isinstance(v, bool) and abs(v) > 1e-6}
+            if kept:
+                out[(name, doc_id)] = kept
+    return out
+
+
+def failing(step, after=0):
+    """A _with_retry that raises on the step ("chunk", "finalize", ...) once `after` of them succeeded."""
+    inner, seen = dispatch_service._with_retry, {"n": 0}
+
+    def run(fn, what):
+        if what.endswith(step):
+            seen["n"] += 1
+            if seen["n"] > after:
+                raise RuntimeError(f"injected {step} failure")
+        return inner(fn, what)
+    return run
+
+
+def check_recommit(db, ids, rnd):
+    """Pending dispatch left half-applied, re-committed and rolled back, then committed."""
+    chosen = rnd.sample(ids, 900)
+    prior = {i: dict(db._data["processed_incidents"][i]) for i in chosen}
+    counters0 = counters(db)
+    doc = {"dispatch_id": f"dispatch_recommit_{uuid.uuid4().hex[:8]}", "team_id": "team_recommit",
+           "incidents": [{"_id": i} for i in chosen]}
+    with_retry, rollback = dispatch_service._with_retry, dispatch_service._rollback
+    out = {}
+    try:
+        dispatch_service._with_retry = failing("chunk", after=1)
+        dispatch_service._rollback = lambda *a, **kw: None  # worker died before rolling back
+        try:
+            commit_dispatch(doc, team_id=doc["team_id"])
+        except DispatchCommitError:
+            pass
+        dispatch_service._rollback = rollback
+        out["left_assigned"] = sum(db._data["processed_incidents"][i].get("dispatch_id") == doc["dispatch_id"] for i in chosen)
+
+        dispatch_service._with_retry = failing("finalize")
+        try:
+            commit_dispatch(doc, team_id=doc["team_id"])
+        except DispatchCommitError:
+            pass
+    finally:
+        dispatch_service._with_retry, dispatch_service._rollback = with_retry, rollback
+    out["not_restored"] = sum(db._data["processed_incidents"][i] != prior[i] for i in chosen)
+    after = counters(db)
+    out["counters_changed"] = sorted(f"{c}/{d}" for c, d in set(after) | set(counters0) if after.get((c, d)) != counters0.get((c, d)))
+    out["state"] = db._data["dispatches"][doc["dispatch_id"]].get("commit_state")
+
+    commit_dispatch(doc, team_id=doc["team_id"])
+    out["drift_after_commit"] = reconcile_team_loads()
+    out["ok"] = (out["left_assigned"] > 0 and not out["not_restored"] and not out["counters_changed"]
+                 and out["state"] == STATE_FAILED and not out["drift_after_commit"])
+    return out
+
+
+def main():
+    p = argparse.ArgumentParser()
+    p.add_argument("--dispatches", type=int, default=40)
+    p.add_argument("--incidents", type=int, default=3000)
+    p.add_argument("--fail-rate", type=float, default=0.3)
+    p.add_argument("--seed", type=int, default=0)
+    args = p.parse_args()
+
+    rnd = random.Random(args.seed)
+    dispatch_service.DISPATCH_RETRIES = 2
+    dispatch_service.DISPATCH_BACKOFF_SECONDS = 0.0
+    dispatch_service.DISPATCH_CHUNK_SIZE = 200
+    db = FakeFirestore(seed=args.seed)
+    install_standins(firestore=db)
+    ids = [f"inc{i:05d}" for i in range(args.incidents)]
+    for i in ids:
+        db.collection("processed_incidents").document(i).set({"status": "new"})
+    db.fail_rate = args.fail_rate
+
+    stats = {"committed": 0, "failed": 0, "left_pending": 0, "rolled_forward": 0, "violations": 0, "replays_changed": 0}
+    committed_ids = []
+    for k in range(args.dispatches):
+        size = rnd.choice([rnd.randint(5, 100), rnd.randint(600, 1500)])
+        chosen = rnd.sample(ids, size)
+        prior = {i: dict(d) for i, d in db._data["processed_incidents"].items()}
+        doc = {"dispatch_id": f"dispatch_{uuid.uuid4().hex[:10]}", "team_id": f"team{k % 5}", "incidents": [{"_id": i} for i in chosen]}
+        try:
+            commit_dispatch(doc, team_id=doc["team_id"])
+            stats["committed"] += 1
+            committed_ids.append(doc)
+        except DispatchCommitError:
+            stats["failed"] += 1
+        bad, pending = violations(db, prior)
+        stats["violations"] += len(bad)
+        if pending:
+            stats["left_pending"] += 1
+            db.fail_rate = 0.0
+            commit_dispatch(doc, team_id=doc["team_id"])
+            db.fail_rate = args.fail_rate
+            bad, pending = violations(db, prior)
+            stats["violations"] += len(bad) + len(pending)
+            stats["rolled_forward"] += 1
+            committed_ids.append(doc)
+
+    db.fail_rate = 0.0
+    before = json.dumps(db._data, sort_keys=True, default=str)
+    for doc in committed_ids:
+        if not commit_dispatch(doc, team_id=doc["team_id"])["replayed"]:
+            stats["replays_changed"] += 1
+    if json.dumps(db._data, sort_keys=True, default=str) != before:
+        stats["replays_changed"] += 1
+
+    stats["counter_drift"] = reconcile_team_loads()
+    stats["recommit"] = check_recommit(db, ids, rnd)
+    print(json.dumps(stats, indent=2))
+    sys.exit(0 if stats["violations"] == 0 and stats["replays_changed"] == 0 and not stats["counter_drift"]
+             and stats["recommit"]["ok"] else 1)
+
+
+if __name__ == "__main__":
+    main()
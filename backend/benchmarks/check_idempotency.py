@@ -0,0 +1,184 @@
+# backend/benchmarks/check_idempotency.py
+
+"""
+Idempotency-Key check for POST /api/submit-report against the local stand-ins.
+
+Scenarios (tiered analysis off, so every pipeline run costs one FakeLLM call):
+  retries      the same submission sent --retries times in a row with one key
+  concurrent   --concurrency copies sent at once with one key (in-flight duplicates)
+  conflict     the key reused with a different description (expects 422)
+  no_key       two identical submissions without a key (both stored, as before)
+  fail_before  the raw report write fails once (500), then a retry with the key: the
+               key was released, so the retry stores the report (once)
+  fail_after   the processed incident write fails once after the raw report was stored
+               (500), then two retries with the key: the first processes the stored raw
+               report (200, no second raw report), the second replays that answer.
+               Triage off, so the report is processed in the request
+  fail_triage  the same with triage on: processed in the triage worker thread, the
+               failure surfaces through the triage future
+  shared_file  the concurrent scenario through two IdempotencyStore instances on one
+               SQLite file (two worker processes on a host)
+
+Reports raw / processed documents written, LLM calls and statuses per scenario, plus the
+latency of a fresh vs a replayed submission. Exits non-zero if any keyed scenario stores
+more than one report or makes more than one LLM call, or if a repeat does not get the
+original response back.
+
+Usage (from backend/):
+    python benchmarks/check_idempotency.py [--retries 5] [--concurrency 16] [--llm-latency-ms 200]
+"""
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+os.environ["ANALYSIS_TIERED"] = "0"
+
+from benchmarks.bench_e2e import Harness, citizen_ip
+from services import idempotency
+from routes import reports
+
+
+def main():
+    p = argparse.ArgumentParser()
+    p.add_argument("--retries", type=int, default=5)
+    p.add_argument("--concurrency", type=int, default=16)
+    p.add_argument("--llm-latency-ms", type=float, default=200)
+    args = p.parse_args()
+
+    h = Harness(argparse.Namespace(seed=3, fs_latency_ms=2, storage_latency_ms=5, llm_latency_ms=args.llm_latency_ms,
+                                   llm_jitter_ms=0, llm_fail_rate=0))
+    counter = iter(range(10 ** 6))
+
+    def form(description=None):
+        i = next(counter)
+        return {"name": f"citizen{i}", "phone": f"+9177777{i:05d}", "location": f"idem-{i}",
+                "description": description or h.templates[i % len(h.templates)][0]}
+
+    def post(data, key=None):
+        t0 = time.perf_counter()
+        r = h.client().post("/api/submit-report", data=dict(data), content_type="multipart/form-data",
+                            headers={"Idempotency-Key": key} if key else {}, environ_base={"REMOTE_ADDR": citizen_ip(7)})
+        return {"status": r.status_code, "body": r.get_data(as_text=True), "replayed": r.headers.get("Idempotent-Replayed"),
+                "ms": (time.perf_counter() - t0) * 1000}
+
+    def measure(fn):
+        raw0 = len(h.fs._data.get("raw_reports", {}))
+        proc0 = len(h.fs._data.get("processed_incidents", {}))
+        calls0 = h.llm.calls
+        responses = fn()
+        return {"raw_reports": len(h.fs._data.get("raw_reports", {})) - raw0,
+                "processed_incidents": len(h.fs._data.get("processed_incidents", {})) - proc0,
+                "llm_calls": h.llm.calls - calls0,
+                "statuses": sorted({r["status"] for r in responses}),
+                "replayed": sum(r["replayed"] == "true" for r in responses),
+                "same_body": len({r["body"] for r in responses if r["status"] < 300}) == 1,
+                "first_ms": round(responses[0]["ms"], 1),
+                "repeat_ms": round(max(r["ms"] for r in responses[1:]), 1) if len(responses) > 1 else None}
+
+    def concurrent():
+        data, key = form(), str(uuid.uuid4())
+        with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+            return list(pool.map(lambda _: post(data, key), range(args.concurrency)))
+
+    def retries():
+        data, key = form(), str(uuid.uuid4())
+        return [post(data, key) for _ in range(args.retries)]
+
+    def conflict():
+        data, key = form(), str(uuid.uuid4())
+        return [post(data, key), post({**data, "description": "a different report"}, key)]
+
+    def no_key():
+        data = form()
+        return [post(data), post(data)]
+
+    def failing_once(name):
+        """Send one submission three times with a key, reports.<name> raising on its first call."""
+        def run():
+            inner, failed = getattr(reports, name), []
+
+            def flaky(*a, **kw):
+                if not failed:
+                    failed.append(1)
+                    raise RuntimeError("injected storage failure")
+                return inner(*a, **kw)
+            setattr(reports, name, flaky)
+            try:
+                data, key = form(), str(uuid.uuid4())
+                return [post(data, key), post(data, key), post(data, key)]
+            finally:
+                setattr(reports, name, inner)
+        return run
+
+    def triage(enabled, fn):
+        def run():
+            saved, reports.TRIAGE_ENABLED = reports.TRIAGE_ENABLED, enabled
+            try:
+                return fn()
+            finally:
+                reports.TRIAGE_ENABLED = saved
+        return run
+
+    out = {"retries": measure(retries), "concurrent": measure(concurrent), "conflict": measure(conflict),
+           "no_key": measure(no_key), "fail_before": measure(failing_once("save_raw_report")),
+           "fail_after": measure(triage(False, failing_once("save_processed_incident"))),
+           "fail_triage": measure(triage(True, failing_once("save_processed_incident")))}
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "idempotency.db")
+        workers = [idempotency.IdempotencyStore(idempotency.SqliteBackend(path)) for _ in range(2)]
+        idempotency._STORE = None
+        local = threading.local()
+        original = idempotency.get_idempotency_store
+        counter_lock = threading.Lock()
+        seen = {"n": 0}
+
+        def per_thread_store():
+            # alternate requests between the two "worker processes"
+            if not hasattr(local, "store"):
+                with counter_lock:
+                    local.store = workers[seen["n"] % 2]
+                    seen["n"] += 1
+            return local.store
+
+        idempotency.get_idempotency_store = per_thread_store
+        try:
+            out["shared_file"] = measure(concurrent)
+        finally:
+            idempotency.get_idempotency_store = original
+    print(json.dumps(out, indent=2))
+
+    problems = []
+    for name in ("retries", "concurrent", "shared_file"):
+        r = out[name]
+        if r["raw_reports"] != 1 or r["processed_incidents"] != 1 or r["llm_calls"] != 1:
+            problems.append(f"{name}: pipeline ran more than once")
+        if r["statuses"] != [200] or not r["same_body"] or r["replayed"] != (args.retries if name == "retries" else args.concurrency) - 1:
+            problems.append(f"{name}: repeats did not get the original response")
+    if out["conflict"]["statuses"] != [200, 422] or out["conflict"]["raw_reports"] != 1:
+        problems.append("conflict: key reuse with a different body not rejected")
+    if out["no_key"]["raw_reports"] != 2:
+        problems.append("no_key: submissions without a key were deduplicated")
+    if out["fail_before"]["statuses"] != [200, 500] or out["fail_before"]["raw_reports"] != 1:
+        problems.append("fail_before: key not released after a failure that stored nothing")
+    for name in ("fail_after", "fail_triage"):
+        r = out[name]
+        if r["statuses"] != [200, 500] or r["raw_reports"] != 1 or r["replayed"] != 1:
+            problems.append(f"{name}: retry after a failure that stored the report was not pinned to it")
+        if r["processed_incidents"] != 1:
+            problems.append(f"{name}: the stored report was not processed on retry")
+    print(json.dumps({"problems": problems}))
+    sys.exit(1 if problems else 0)
+
+
+if __name__ == "__main__":
+    main()
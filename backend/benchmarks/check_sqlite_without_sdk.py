@@ -0,0 +1,113 @@
+# backend/benchmarks/check_sqlite_without_sdk.py
+
+"""
+The SQLite backend (CRISISMAP_DB_BACKEND=sqlite) with the Firebase / Google Cloud SDKs
+unavailable, as on a field laptop without them installed.
+
+Imports of firebase_admin and google.* are blocked before the app is loaded. The script
+then drives, through the API on a temporary SQLite file: report submission, status
+updates, team creation / login / logout (token revocation and the deny-list sync),
+road closures, an auto-dispatch commit (DELETE_FIELD / Increment counter writes), a
+rebalancer swap through commit_reassignment, and the listings that order by time.
+
+Exits non-zero if any step fails, or if any firebase_admin / google module got imported.
+
+Usage (from backend/):
+    python benchmarks/check_sqlite_without_sdk.py
+"""
+
+import importlib.abc
+import json
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+BLOCKED = ("firebase_admin", "google")
+
+
+class _Block(importlib.abc.MetaPathFinder):
+    def find_spec(self, name, path=None, target=None):
+        if name.split(".")[0] in BLOCKED:
+            raise ImportError(f"{name} blocked (no SDK)")
+        return None
+
+
+sys.meta_path.insert(0, _Block())
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+tmp = tempfile.TemporaryDirectory()
+os.environ.update({"CRISISMAP_DB_BACKEND": "sqlite", "CRISISMAP_SQLITE_PATH": os.path.join(tmp.name, "crisismap.db"),
+                   "ANALYSIS_TIERED": "1", "TRIAGE_ENABLED": "0", "AUTH_SECRET_KEY": "check-without-sdk-" + "0" * 32})
+
+from app import create_app  # noqa: E402
+
+
+def main():
+    import auth_store
+    from services.dispatch_service import commit_reassignment, assignment_version
+    from services.firestore_service import get_incidents_by_ids, update_team_location
+
+    client = create_app(warm_up=False).test_client()
+    steps, problems = {}, []
+
+    def step(name, resp, expect=200):
+        steps[name] = resp.status_code
+        if resp.status_code != expect:
+            problems.append(f"{name}: {resp.status_code} {resp.get_data(as_text=True)[:200]}")
+        return resp.get_json(silent=True) or {}
+
+    for k in range(4):
+        step(f"submit_{k}", client.post("/api/submit-report", content_type="multipart/form-data", data={
+            "name": f"c{k}", "phone": f"+91900000000{k}", "location": f"ward {k}", "lat": "12.97", "lng": f"77.5{k}",
+            "description": "house flooded, water rising, family on the roof" if k % 2 else "tree fell on the road"}))
+    admin = {"x-admin-token": step("admin_login", client.post("/api/login", json={"username": "admin", "password": "password123"}))["token"]}
+    incident_ids = [i["_id"] for i in step("incidents", client.get("/api/incidents", headers=admin))]
+    step("update_status", client.post("/api/update-status", json={"id": incident_ids[0], "status": "in_progress"}, headers=admin))
+
+    for k, name in enumerate(("alpha", "bravo")):
+        team_id = step(f"create_{name}", client.post("/api/teams", json={"name": name, "password": "pw", "contact": "x"},
+                                                     headers=admin)).get("team_id")
+        update_team_location(team_id, 12.97, 77.5 + k * 0.03)
+    token = step("team_login", client.post("/api/team/login", json={"name": "alpha", "password": "pw"}))["team_token"]
+    team = {"x-team-token": token}
+    step("team_location", client.post("/api/team/update-location", json={"lat": 12.97, "lng": 77.5}, headers=team))
+    step("team_logout", client.post("/api/team/logout", headers=team))
+    step("revoked_token", client.get("/api/team/dispatches", headers=team), expect=401)
+    auth_store._REVOKED.clear()  # as on a worker that has not seen the logout yet
+    auth_store._SYNC.update(since=None, failures=0)
+    steps["sync_delay_s"] = auth_store.sync_revocations()
+    step("revoked_after_sync", client.get("/api/team/dispatches", headers=team), expect=401)
+
+    closure = step("add_closure", client.post("/api/roads/closures", json={"lat": 12.97, "lng": 77.5, "radius_km": 0.2},
+                                              headers=admin))
+    if closure.get("closure"):
+        step("remove_closure", client.delete(f"/api/roads/closures/{closure['closure']['id']}", headers=admin))
+
+    step("auto_dispatch", client.post("/api/auto-dispatch-ai", json={"max_per_team": 2}, headers=admin))
+    step("team_loads", client.get("/api/team-loads", headers=admin))
+    by_team = {}
+    for i, d in get_incidents_by_ids(incident_ids).items():
+        if d.get("assigned_team"):
+            by_team.setdefault(d["assigned_team"], (i, d))
+    if len(by_team) < 2:
+        problems.append("auto-dispatch did not assign incidents to both teams")
+    else:
+        (a, da), (b, db_) = list(by_team.values())[:2]
+        docs = [{"dispatch_id": f"dispatch_swap_{k}", "team_id": t, "status": "assigned", "incidents": [{"_id": i}]}
+                for k, (i, t) in enumerate(((a, db_["assigned_team"]), (b, da["assigned_team"])))]
+        commit_reassignment(docs, {a: assignment_version(da), b: assignment_version(db_)})
+        after = get_incidents_by_ids([a, b])
+        steps["swap"] = after[a]["assigned_team"] == db_["assigned_team"] and after[b]["assigned_team"] == da["assigned_team"]
+        if not steps["swap"]:
+            problems.append("swap: assignments not exchanged")
+
+    loaded = sorted(m for m in sys.modules if m.split(".")[0] in BLOCKED)
+    if loaded:
+        problems.append(f"SDK modules imported: {loaded[:5]}")
+    print(json.dumps({"steps": steps, "sdk_modules": loaded}, indent=2))
+    print(json.dumps({"problems": problems}))
+    sys.exit(1 if problems else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,325 @@
+# backend/benchmarks/replay.py
+
+"""
+Historical replay / traffic generator for capacity testing, against the local stand-ins
+(benchmarks/standins.py: Firestore, Storage and Gemini; see bench_e2e.Harness).
+
+Citizen reports are driven open-loop at scheduled arrival times:
+  - synthetic (default): Poisson arrivals in stages of increasing rate (--rates reports
+    per minute, --stage-seconds each), texts from severity_data.csv, positions scattered
+    around the city;
+  - replay (--replay FILE): an export of reports (.jsonl, .csv or .parquet, e.g. an
+    archive partition) re-sent with their original spacing divided by --speedup; stages
+    are --stage-seconds windows of the replay.
+Meanwhile admin dashboards poll GET /api/incidents, team dashboards poll their active
+dispatches, and auto-dispatch runs every --dispatch-interval seconds.
+
+Latency is measured from the scheduled arrival, so time spent queued behind a saturated
+worker pool counts (no coordinated omission). Per stage and endpoint the report has
+request count, p50/p95/p99, error rate and status codes; a stage passes when
+submit-report p95 <= --slo-ms, its error rate <= --max-error-rate and at least 90% of
+the offered reports completed within the stage. The saturation point is the highest
+offered rate before the first failing stage.
+
+Usage (from backend/):
+    python benchmarks/replay.py [--rates 30,60,120,240,480,960] [--stage-seconds 15] [--concurrency 32]
+        [--replay reports.jsonl --speedup 10] [--out report.json] [--report-md report.md]
+"""
+
+import argparse
+import csv
+import json
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from benchmarks.bench_e2e import Harness, percentiles, git_commit, citizen_ip
+from services import rollups
+
+SUBMIT = "POST /api/submit-report"
+ADMIN_POLL = "GET /api/incidents"
+TEAM_POLL = "GET /api/team/dispatches"
+DISPATCH = "POST /api/auto-dispatch-ai"
+
+
+# ---------------------------
+# Arrival schedules: [(offset seconds, stage index, report form fields)]
+# ---------------------------
+
+def synthetic_schedule(h, rates, stage_seconds, rnd):
+    out = []
+    for stage, rpm in enumerate(rates):
+        t, end = stage * stage_seconds, (stage + 1) * stage_seconds
+        while rpm > 0:
+            t += rnd.expovariate(rpm / 60.0)
+            if t >= end:
+                break
+            text, _ = h.templates[rnd.randrange(len(h.templates))]
+            lat, lng = h.scatter()
+            n = len(out)
+            out.append((t, stage, {"name": f"citizen{n}", "phone": f"+91{n:010d}", "location": f"replay-{n}",
+                                   "description": text, "lat": str(lat), "lng": str(lng)}))
+    return out
+
+
+def load_export(path):
+    """Report dicts from a .jsonl / .csv / .parquet export (raw_reports, processed_incidents or archive rows)."""
+    path = Path(path)
+    if path.suffix == ".parquet":
+        import pandas as pd
+        return pd.read_parquet(path).to_dict("records")
+    with open(path) as f:
+        if path.suffix == ".csv":
+            return list(csv.DictReader(f))
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def replay_schedule(records, speedup, stage_seconds, limit=None):
+    rows = []
+    for r in records:
+        ts = rollups.as_utc(r.get("timestamp"))  # pandas Timestamps are datetimes
+        if ts is None or not (r.get("description") or "").strip():
+            continue
+        rows.append((ts, {"name": r.get("reporter_name") or r.get("name") or "replay",
+                          "phone": r.get("reporter_phone") or r.get("phone") or "",
+                          "location": r.get("location") or "", "description": r["description"],
+                          "lat": "" if r.get("lat") is None else str(r["lat"]),
+                          "lng": "" if r.get("lng") is None else str(r["lng"])}))
+    rows.sort(key=lambda x: x[0])
+    rows = rows[:limit] if limit else rows
+    if not rows:
+        return []
+    t0 = rows[0][0]
+    out = []
+    for ts, form in rows:
+        offset = (ts - t0).total_seconds() / speedup
+        out.append((offset, int(offset // stage_seconds), form))
+    return out
+
+
+# ---------------------------
+# Recording
+# ---------------------------
+
+class Recorder:
+    def __init__(self, t0, stage_seconds):
+        self.t0 = t0
+        self.stage_seconds = stage_seconds
+        self.samples = {}  # (stage, endpoint) -> [(latency_s, status)]
+        self.lock = threading.Lock()
+
+    def stage_at(self, t):
+        return int(max(0.0, t - self.t0) // self.stage_seconds)
+
+    def record(self, stage, endpoint, latency, status):
+        with self.lock:
+            self.samples.setdefault((stage, endpoint), []).append((latency, status))
+
+    def call(self, endpoint, fn, due=None, stage=None):
+        start = time.perf_counter()
+        due = start if due is None else due
+        stage = self.stage_at(due) if stage is None else stage
+        try:
+            status = fn()
+        except Exception as e:  # noqa: BLE001
+            status = type(e).__name__
+        self.record(stage, endpoint, time.perf_counter() - due, status)
+
+
+def _is_error(status):
+    return not isinstance(status, int) or status >= 400
+
+
+def summarize(rec, schedule, stage_count, rates, args):
+    offered = {}
+    for _, stage, _ in schedule:
+        offered[stage] = offered.get(stage, 0) + 1
+    stages, saturation, first_fail = [], None, None
+    for stage in range(stage_count):
+        row = {"stage": stage, "offered": offered.get(stage, 0),
+               "offered_rpm": round(offered.get(stage, 0) * 60.0 / args.stage_seconds, 1), "endpoints": {}}
+        if rates:
+            row["target_rpm"] = rates[stage]
+        for (s, endpoint), samples in sorted(rec.samples.items()):
+            if s != stage:
+                continue
+            lat = [x[0] for x in samples]
+            statuses = {}
+            for _, st in samples:
+                statuses[str(st)] = statuses.get(str(st), 0) + 1
+            errors = sum(1 for _, st in samples if _is_error(st))
+            row["endpoints"][endpoint] = {"requests": len(samples), **percentiles(lat),
+                                          "error_rate": round(errors / len(samples), 4), "statuses": statuses}
+        sub = row["endpoints"].get(SUBMIT)
+        completed = sum(1 for lat, _ in rec.samples.get((stage, SUBMIT), []) if lat <= args.stage_seconds)
+        row["completed_in_stage"] = round(completed / row["offered"], 3) if row["offered"] else None
+        reasons = []
+        if sub and sub["p95_ms"] is not None and sub["p95_ms"] > args.slo_ms:
+            reasons.append(f"p95 {sub['p95_ms']}ms > {args.slo_ms}ms")
+        if sub and sub["error_rate"] > args.max_error_rate:
+            reasons.append(f"error rate {sub['error_rate']} > {args.max_error_rate}")
+        if row["offered"] and row["completed_in_stage"] < 0.9:
+            reasons.append(f"only {row['completed_in_stage']:.0%} completed within the stage")
+        row["ok"] = not reasons
+        row["reasons"] = reasons
+        if reasons and first_fail is None:
+            first_fail = stage
+        if not reasons and first_fail is None and row["offered"]:
+            saturation = max(saturation or 0, row["offered_rpm"])
+        stages.append(row)
+    curves = {}
+    for row in stages:
+        for endpoint, m in row["endpoints"].items():
+            curves.setdefault(endpoint, []).append({"stage": row["stage"], "offered_rpm": row["offered_rpm"],
+                                                    "p95_ms": m["p95_ms"], "error_rate": m["error_rate"]})
+    return {"stages": stages, "curves": curves,
+            "saturation": {"max_sustained_rpm": saturation,
+                           "first_failing_stage": first_fail,
+                           "failure": stages[first_fail]["reasons"] if first_fail is not None else None}}
+
+
+def markdown(report):
+    lines = [f"# CrisisMap saturation report ({report['commit'] or 'unknown commit'}, {report['timestamp']})", ""]
+    sat = report["saturation"]
+    lines.append(f"Max sustained submit rate: **{sat['max_sustained_rpm']} reports/min**"
+                 + (f"; first failing stage {sat['first_failing_stage']}: {', '.join(sat['failure'])}" if sat["failure"] else ""))
+    lines += ["", "| stage | offered rpm | endpoint | requests | p50 ms | p95 ms | p99 ms | error rate | ok |",
+              "|---|---|---|---|---|---|---|---|---|"]
+    for row in report["stages"]:
+        for endpoint, m in row["endpoints"].items():
+            lines.append(f"| {row['stage']} | {row['offered_rpm']} | {endpoint} | {m['requests']} | {m['p50_ms']} | "
+                         f"{m['p95_ms']} | {m['p99_ms']} | {m['error_rate']} | {'yes' if row['ok'] else 'no'} |")
+    return "\n".join(lines) + "\n"
+
+
+# ---------------------------
+# Driver
+# ---------------------------
+
+def run(h, schedule, stage_count, args):
+    from auth_store import issue_token, ROLE_TEAM
+    stop = threading.Event()
+    t0 = time.perf_counter() + 0.2
+    rec = Recorder(t0, args.stage_seconds)
+    team_tokens = [issue_token(ROLE_TEAM, t, team_id=t) for t in h.team_ids]
+    admin = {"x-admin-token": h.admin_token}
+
+    def submit(form, n):
+        return h.client().post("/api/submit-report", data=form, content_type="multipart/form-data",
+                               environ_base={"REMOTE_ADDR": citizen_ip(n)}).status_code
+
+    def poller(endpoint, fn, offset):
+        time.sleep(offset)
+        while not stop.is_set():
+            rec.call(endpoint, fn)
+            stop.wait(args.poll_interval)
+
+    threads = []
+    for i in range(args.admin_pollers):
+        threads.append(threading.Thread(target=poller, daemon=True, args=(
+            ADMIN_POLL, lambda: h.client().get("/api/incidents", headers=admin).status_code, i * args.poll_interval / max(1, args.admin_pollers))))
+    for i in range(args.team_pollers):
+        tok = team_tokens[i % len(team_tokens)]
+        threads.append(threading.Thread(target=poller, daemon=True, args=(
+            TEAM_POLL, lambda tok=tok: h.client().get("/api/team/dispatches?active=1&summary=1&limit=50",
+                                                      headers={"x-team-token": tok}).status_code,
+            i * args.poll_interval / max(1, args.team_pollers))))
+    if args.dispatch_interval > 0:
+        threads.append(threading.Thread(target=poller, daemon=True, args=(
+            DISPATCH, lambda: h.client().post("/api/auto-dispatch-ai", json={"statuses": ["new"]}, headers=admin).status_code,
+            args.dispatch_interval)))
+
+    pool = ThreadPoolExecutor(max_workers=args.concurrency)
+    for t in threads:
+        t.start()
+    failing = 0
+    last_stage = -1
+    for n, (offset, stage, form) in enumerate(schedule):
+        if stage != last_stage and args.stop_after_failing and stage > 1:
+            # stop early once the system has clearly saturated; a stage is judged one stage
+            # after it ends so its last reports have had time to complete
+            judged = summarize(rec, [s for s in schedule if s[1] < stage - 1], stage - 1, None, args)["stages"]
+            failing = failing + 1 if judged and not judged[-1]["ok"] else 0
+            if failing >= args.stop_after_failing:
+                stage_count = stage
+                break
+        last_stage = stage
+        due = t0 + offset
+        delay = due - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+        pool.submit(rec.call, SUBMIT, lambda form=form, n=n: submit(form, n), due, stage)
+    pool.shutdown(wait=True)
+    stop.set()
+    for t in threads:
+        t.join(timeout=args.poll_interval + 30)
+    return rec, min(stage_count, max((s for _, s, _ in schedule), default=-1) + 1)
+
+
+def main():
+    p = argparse.ArgumentParser()
+    p.add_argument("--rates", default="30,60,120,240,480,960", help="synthetic reports per minute, one per stage")
+    p.add_argument("--stage-seconds", type=float, default=15.0)
+    p.add_argument("--replay", default=None, help="exported reports (.jsonl/.csv/.parquet) to replay instead")
+    p.add_argument("--speedup", type=float, default=1.0)
+    p.add_argument("--max-reports", type=int, default=None)
+    p.add_argument("--concurrency", type=int, default=32, help="worker threads sending reports")
+    p.add_argument("--admin-pollers", type=int, default=2)
+    p.add_argument("--team-pollers", type=int, default=4)
+    p.add_argument("--poll-interval", type=float, default=5.0)
+    p.add_argument("--dispatch-interval", type=float, default=30.0, help="seconds between auto-dispatch runs (0 = off)")
+    p.add_argument("--teams", type=int, default=10)
+    p.add_argument("--seed-incidents", type=int, default=200, help="open incidents present before the run")
+    p.add_argument("--slo-ms", type=float, default=2000.0)
+    p.add_argument("--max-error-rate", type=float, default=0.01)
+    p.add_argument("--stop-after-failing", type=int, default=2, help="stop after N consecutive failing stages (0 = never)")
+    p.add_argument("--fs-latency-ms", type=float, default=2.0)
+    p.add_argument("--storage-latency-ms", type=float, default=20.0)
+    p.add_argument("--llm-latency-ms", type=float, default=50.0)
+    p.add_argument("--llm-jitter-ms", type=float, default=20.0)
+    p.add_argument("--llm-fail-rate", type=float, default=0.0)
+    p.add_argument("--seed", type=int, default=0)
+    p.add_argument("--out", default=None)
+    p.add_argument("--report-md", default=None)
+    args = p.parse_args()
+
+    out = Path(args.out).resolve() if args.out else None
+    md = Path(args.report_md).resolve() if args.report_md else None
+    os.chdir(tempfile.mkdtemp(prefix="crisismap_replay_"))  # local image copies land here
+    h = Harness(args)
+    h.team_ids = h.seed_teams(args.teams)
+    h.seed_incidents(args.seed_incidents)
+    rnd = random.Random(args.seed)
+
+    rates = None
+    if args.replay:
+        schedule = replay_schedule(load_export(args.replay), args.speedup, args.stage_seconds, args.max_reports)
+        stage_count = max((s for _, s, _ in schedule), default=-1) + 1
+    else:
+        rates = [float(r) for r in args.rates.split(",") if r.strip()]
+        schedule = synthetic_schedule(h, rates, args.stage_seconds, rnd)
+        stage_count = len(rates)
+
+    started = time.perf_counter()
+    rec, stage_count = run(h, schedule, stage_count, args)
+    report = {"commit": git_commit(), "timestamp": datetime.utcnow().isoformat(), "params": vars(args),
+              "wall_seconds": round(time.perf_counter() - started, 1), "reports_scheduled": len(schedule),
+              **summarize(rec, schedule, stage_count, rates, args)}
+    text = json.dumps(report, indent=2, default=str)
+    if out:
+        out.write_text(text)
+    if md:
+        md.write_text(markdown(report))
+    print(text)
+
+
+if __name__ == "__main__":
+    main()
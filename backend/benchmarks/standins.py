@@ -0,0 +1,500 @@
+# backend/benchmarks/standins.py
+
+"""
+Local stand-ins for the Google services, so the backend can be benchmarked and
+load-tested without network access or credentials:
+
+- FakeFirestore: in-memory, thread-safe subset of the Firestore client API used by
+  services/firestore_service (collections, documents, where/order_by/limit/start_after,
+  stream/get, add/set(merge)/update/delete, get_all, batch, DELETE_FIELD / Increment /
+  SERVER_TIMESTAMP, dotted update paths). Optional per-round-trip latency.
+- FakeBucket: Storage bucket whose blobs just count uploaded bytes.
+- FakeLLM: stand-in for the Gemini GenerativeModel with configurable latency and
+  failure rate. Replays recorded responses (JSON-lines with a "text" field) in order,
+  or synthesizes plausible analysis / plan JSON from the prompt.
+
+install_standins() wires all three into the app via the override hooks
+(firestore_service.use_client, storage_service.use_bucket, GEMINI.override).
+"""
+
+import copy
+import json
+import random
+import re
+import threading
+import time
+import uuid
+from datetime import datetime
+
+# the same sentinels and errors as the SQLite store: the SDK's, or its stand-ins without the SDK
+from services.sqlite_store import transforms as _fs_transforms, NotFound, AlreadyExists
+
+
+def _is_delete(v):
+    return v is _fs_transforms.DELETE_FIELD
+
+
+def _is_server_ts(v):
+    return v is _fs_transforms.SERVER_TIMESTAMP
+
+
+def _is_increment(v):
+    return isinstance(v, _fs_transforms.Increment)
+
+
+def _get_path(d, path):
+    cur = d
+    for part in path.split("."):
+        if not isinstance(cur, dict) or part not in cur:
+            return None
+        cur = cur[part]
+    return cur
+
+
+def _apply_value(target, key, v):
+    if _is_delete(v):
+        target.pop(key, None)
+    elif _is_server_ts(v):
+        target[key] = datetime.utcnow()
+    elif _is_increment(v):
+        target[key] = (target.get(key) or 0) + v.value
+    else:
+        target[key] = copy.deepcopy(v)
+
+
+def _apply_update(doc, updates):
+    for path, v in updates.items():
+        parts = path.split(".")
+        cur = doc
+        for p in parts[:-1]:
+            nxt = cur.get(p)
+            if not isinstance(nxt, dict):
+                nxt = cur[p] = {}
+            cur = nxt
+        _apply_value(cur, parts[-1], v)
+
+
+def _merge(doc, data):
+    for k, v in data.items():
+        if isinstance(v, dict) and isinstance(doc.get(k), dict):
+            _merge(doc[k], v)
+        else:
+            _apply_value(doc, k, v)
+
+
+class FakeSnapshot:
+    def __init__(self, ref, data):
+        self.reference = ref
+        self.id = ref.id
+        self._data = data
+        self.exists = data is not None
+
+    def to_dict(self):
+        return copy.deepcopy(self._data) if self._data is not None else None
+
+    def get(self, field):
+        return _get_path(self._data or {}, field)
+
+
+class FakeDocumentRef:
+    def __init__(self, db, collection, doc_id):
+        self._db = db
+        self._collection = collection
+        self.id = doc_id
+        self.path = f"{collection}/{doc_id}"
+
+    def _store(self):
+        return self._db._data.setdefault(self._collection, {})
+
+    def get(self, *args, **kwargs):
+        self._db._round_trip("get")
+        with self._db._lock:
+            data = self._store().get(self.id)
+            return FakeSnapshot(self, copy.deepcopy(data) if data is not None else None)
+
+    def set(self, data, merge=False):
+        self._db._round_trip("write")
+        with self._db._lock:
+            self._set_nolock(data, merge)
+
+    def _set_nolock(self, data, merge=False):
+        store = self._store()
+        if merge and self.id in store:
+            _merge(store[self.id], data)
+        else:
+            doc = {}
+            _merge(doc, data)
+            store[self.id] = doc
+
+    def create(self, data):
+        self._db._round_trip("write")
+        with self._db._lock:
+            self._create_nolock(data)
+
+    def _create_nolock(self, data):
+        if self.id in self._store():
+            raise AlreadyExists(self.path)
+        self._set_nolock(data)
+
+    def update(self, updates):
+        self._db._round_trip("write")
+        with self._db._lock:
+            self._update_nolock(updates)
+
+    def _update_nolock(self, updates):
+        store = self._store()
+        if self.id not in store:
+            raise NotFound(f"No document to update: {self.path}")
+        _apply_update(store[self.id], updates)
+
+    def delete(self):
+        self._db._round_trip("write")
+        with self._db._lock:
+            self._store().pop(self.id, None)
+
+    def collection(self, name):
+        return FakeCollection(self._db, f"{self.path}/{name}")
+
+
+_OPS = {
+    "==": lambda a, b: a == b,
+    "!=": lambda a, b: a != b,
+    "<": lambda a, b: a is not None and a < b,
+    "<=": lambda a, b: a is not None and a <= b,
+    ">": lambda a, b: a is not None and a > b,
+    ">=": lambda a, b: a is not None and a >= b,
+    "in": lambda a, b: a in b,
+    "not-in": lambda a, b: a not in b,
+    "array_contains": lambda a, b: isinstance(a, list) and b in a,
+    "array_contains_any": lambda a, b: isinstance(a, list) and any(x in a for x in b),
+}
+
+
+class FakeQuery:
+    def __init__(self, db, collection, filters=(), orders=(), limit=None, start_after=None, projection=None):
+        self._db = db
+        self._collection = collection
+        self._filters = tuple(filters)
+        self._orders = tuple(orders)
+        self._limit = limit
+        self._start_after = start_after
+        self._projection = projection
+
+    def _copy(self, **kw):
+        args = dict(filters=self._filters, orders=self._orders, limit=self._limit,
+                    start_after=self._start_after, projection=self._projection)
+        args.update(kw)
+        return FakeQuery(self._db, self._collection, **args)
+
+    def where(self, field=None, op=None, value=None, filter=None):
+        if filter is not None:
+            field, op, value = filter.field_path, filter.op_string, filter.value
+        return self._copy(filters=self._filters + ((field, op, value),))
+
+    def order_by(self, field, direction="ASCENDING"):
+        return self._copy(orders=self._orders + ((field, str(direction).upper().startswith("DESC")),))
+
+    def limit(self, n):
+        return self._copy(limit=n)
+
+    def start_after(self, snapshot):
+        return self._copy(start_after=snapshot)
+
+    def select(self, fields):
+        return self._copy(projection=list(fields))
+
+    def _run(self):
+        with self._db._lock:
+            items = list(self._db._data.get(self._collection, {}).items())
+            # filter before copying so a selective query does not copy the whole collection
+            for field, op, value in self._filters:
+                fn = _OPS[op]
+                items = [(k, v) for k, v in items if fn(k if field == "__name__" else _get_path(v, field), value)]
+            items = [(k, copy.deepcopy(v)) for k, v in items]
+        for field, desc in reversed(self._orders):
+            key = (lambda kv: kv[0]) if field == "__name__" else (lambda kv, f=field: _sort_key(_get_path(kv[1], f)))
+            if field != "__name__":
+                # Firestore omits documents missing the order_by field
+                items = [kv for kv in items if _get_path(kv[1], field) is not None]
+            items.sort(key=key, reverse=desc)
+        if not self._orders:
+            items.sort(key=lambda kv: kv[0])
+        if self._start_after is not None:
+            ids = [k for k, _ in items]
+            if self._start_after.id in ids:
+                items = items[ids.index(self._start_after.id) + 1:]
+        if self._limit is not None:
+            items = items[:self._limit]
+        out = []
+        for k, v in items:
+            if self._projection is not None:
+                v = {f: _get_path(v, f) for f in self._projection if _get_path(v, f) is not None}
+            out.append(FakeSnapshot(FakeDocumentRef(self._db, self._collection, k), v))
+        return out
+
+    def stream(self, *args, **kwargs):
+        self._db._round_trip("query")
+        return iter(self._run())
+
+    def get(self, *args, **kwargs):
+        self._db._round_trip("query")
+        return self._run()
+
+
+def _sort_key(v):
+    # mixed types sort by type name first so comparisons never fail
+    if isinstance(v, datetime):
+        return ("datetime", v.isoformat())
+    return (type(v).__name__, v)
+
+
+class FakeCollection(FakeQuery):
+    def __init__(self, db, name):
+        super().__init__(db, name)
+        self.id = name.split("/")[-1]
+
+    def document(self, doc_id=None):
+        return FakeDocumentRef(self._db, self._collection, doc_id or uuid.uuid4().hex[:20])
+
+    def add(self, data, document_id=None):
+        ref = self.document(document_id)
+        ref.set(data)
+        return datetime.utcnow(), ref
+
+
+class FakeBatch:
+    def __init__(self, db):
+        self._db = db
+        self._ops = []
+
+    def set(self, ref, data, merge=False):
+        self._ops.append(("set", ref, data, merge))
+        return self
+
+    def update(self, ref, updates):
+        self._ops.append(("update", ref, updates, None))
+        return self
+
+    def create(self, ref, data):
+        self._ops.append(("create", ref, data, None))
+        return self
+
+    def delete(self, ref):
+        self._ops.append(("delete", ref, None, None))
+        return self
+
+    def commit(self):
+        if len(self._ops) > 500:
+            raise ValueError("maximum 500 writes allowed per batch")
+        self._db._round_trip("commit")
+        with self._db._lock:
+            # validate first so a failing batch applies nothing (atomic)
+            for op, ref, data, _ in self._ops:
+                if op == "update" and ref.id not in ref._store():
+                    raise NotFound(f"No document to update: {ref.path}")
+                if op == "create" and ref.id in ref._store():
+                    raise AlreadyExists(ref.path)
+            for op, ref, data, merge in self._ops:
+                if op == "set":
+                    ref._set_nolock(data, merge)
+                elif op == "update":
+                    ref._update_nolock(data)
+                elif op == "create":
+                    ref._create_nolock(data)
+                else:
+                    ref._store().pop(ref.id, None)
+        return [None] * len(self._ops)
+
+
+class FakeFirestore:
+    """In-memory Firestore client. latency_ms is added to every round trip."""
+
+    def __init__(self, latency_ms=0.0, fail_rate=0.0, seed=0):
+        self._data = {}
+        self._lock = threading.RLock()
+        self.latency_ms = latency_ms
+        self.fail_rate = fail_rate
+        self._rnd = random.Random(seed)
+        self.ops = {"get": 0, "query": 0, "write": 0, "commit": 0, "get_all": 0}
+
+    def _round_trip(self, kind):
+        with self._lock:
+            self.ops[kind] = self.ops.get(kind, 0) + 1
+        if self.latency_ms:
+            time.sleep(self.latency_ms / 1000.0)
+        if kind in ("write", "commit"):
+            self._maybe_fail()
+
+    def _maybe_fail(self):
+        if self.fail_rate and self._rnd.random() < self.fail_rate:
+            from google.api_core.exceptions import ServiceUnavailable
+            raise ServiceUnavailable("injected failure")
+
+    def collection(self, name):
+        return FakeCollection(self, name)
+
+    def document(self, path):
+        col, doc_id = path.rsplit("/", 1)
+        return FakeDocumentRef(self, col, doc_id)
+
+    def get_all(self, refs, field_paths=None, transaction=None):
+        self._round_trip("get_all")
+        with self._lock:
+            snaps = []
+            for r in refs:
+                data = r._store().get(r.id)
+                if data is not None and field_paths is not None:
+                    data = {f: _get_path(data, f) for f in field_paths if _get_path(data, f) is not None}
+                snaps.append(FakeSnapshot(r, copy.deepcopy(data) if data is not None else None))
+        return iter(snaps)
+
+    def batch(self):
+        return FakeBatch(self)
+
+    def reset_ops(self):
+        with self._lock:
+            for k in self.ops:
+                self.ops[k] = 0
+
+    def op_counts(self):
+        with self._lock:
+            d = dict(self.ops)
+        d["round_trips"] = sum(d.values())
+        return d
+
+
+class FakeBlob:
+    def __init__(self, bucket, name):
+        self.bucket = bucket
+        self.name = name
+        self.public_url = None
+
+    def upload_from_file(self, file_obj, content_type=None):
+        data = file_obj.read()
+        if self.bucket.latency_ms:
+            time.sleep(self.bucket.latency_ms / 1000.0)
+        with self.bucket._lock:
+            self.bucket.uploads += 1
+            self.bucket.bytes_uploaded += len(data)
+
+    def make_public(self):
+        self.public_url = f"https://storage.local/{self.bucket.name}/{self.name}"
+
+
+class FakeBucket:
+    def __init__(self, name="crisismap-bench", latency_ms=0.0):
+        self.name = name
+        self.latency_ms = latency_ms
+        self.uploads = 0
+        self.bytes_uploaded = 0
+        self._lock = threading.Lock()
+
+    def blob(self, name):
+        return FakeBlob(self, name)
+
+
+class _LLMResponse:
+    def __init__(self, text):
+        self.text = text
+
+
+INCIDENT_TYPES = [("flood", ["flood", "water", "boat", "sinking", "drown"]), ("fire", ["fire", "blaze", "smoke", "burning"]),
+                  ("medical", ["injur", "bleed", "unconscious", "hurt", "fracture"]), ("power", ["power", "electric", "outage"]),
+                  ("shelter", ["shelter", "homeless", "roof"])]
+
+
+class FakeLLM:
+    """
+    Gemini GenerativeModel stand-in. latency_ms (+ uniform jitter_ms) per call plus
+    per_kchar_ms per 1000 prompt characters, fail_rate of calls raise; with
+    batch_drop_rate, that share of elements in a batch answer comes back invalid. If `recorded` (list of texts or a JSON-lines path with a
+    "text" field) is given, responses are replayed in order (cycling).
+    """
+
+    def __init__(self, latency_ms=0.0, jitter_ms=0.0, fail_rate=0.0, recorded=None, seed=0,
+                 per_kchar_ms=0.0, batch_drop_rate=0.0):
+        self.latency_ms = latency_ms
+        self.per_kchar_ms = per_kchar_ms
+        self.batch_drop_rate = batch_drop_rate
+        self.jitter_ms = jitter_ms
+        self.fail_rate = fail_rate
+        self._rnd = random.Random(seed)
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.prompt_chars = 0
+        if isinstance(recorded, str):
+            with open(recorded) as f:
+                recorded = [json.loads(line)["text"] for line in f if line.strip()]
+        self._recorded = list(recorded or [])
+
+    def generate_content(self, prompt, *args, **kwargs):
+        with self._lock:
+            self.calls += 1
+            self.prompt_chars += len(prompt)
+            n = self.calls
+            fail = self.fail_rate and self._rnd.random() < self.fail_rate
+            jitter = self._rnd.uniform(0, self.jitter_ms) if self.jitter_ms else 0.0
+        delay = (self.latency_ms + jitter + self.per_kchar_ms * len(prompt) / 1000.0) / 1000.0
+        if delay:
+            time.sleep(delay)
+        if fail:
+            raise RuntimeError("FakeLLM injected failure")
+        if self._recorded:
+            return _LLMResponse(self._recorded[(n - 1) % len(self._recorded)])
+        return _LLMResponse(self._synthesize(prompt))
+
+    def _synthesize(self, prompt):
+        if "Reports:" in prompt:
+            m = re.search(r"Reports:\s*(\[.*?\])\n", prompt, flags=re.S)
+            reports = json.loads(m.group(1)) if m else []
+            out = []
+            for r in reports:
+                item = dict(self.analysis_for(r.get("description", "")), report_id=r.get("report_id"))
+                with self._lock:
+                    drop = self.batch_drop_rate and self._rnd.random() < self.batch_drop_rate
+                if drop:
+                    item["severity"] = "unknown"
+                out.append(item)
+            return json.dumps(out)
+        if "operations planner" in prompt:
+            m = re.search(r"Incidents:\s*(\[.*\])", prompt, flags=re.S)
+            incidents = []
+            if m:
+                try:
+                    incidents = json.loads(m.group(1))
+                except ValueError:
+                    incidents = []
+            return json.dumps({
+                "summary": f"Visit {len(incidents)} incidents in priority order.",
+                "route": [{"location": i.get("location"), "lat": i.get("lat"), "lng": i.get("lng"), "reason": f"severity {i.get('severity')}"} for i in incidents],
+                "resources": ["Ambulance", "Medical Kit"],
+            })
+        m = re.search(r"Description:\s*(.*?)\n", prompt)
+        desc = (m.group(1) if m else prompt).lower()
+        return json.dumps(self.analysis_for(desc))
+
+    @staticmethod
+    def analysis_for(desc):
+        desc = desc.lower()
+        itype = next((t for t, kws in INCIDENT_TYPES if any(k in desc for k in kws)), "other")
+        severe = any(k in desc for k in ["child", "sinking", "trapped", "unconscious", "collapse"])
+        return {
+            "incident_type": itype,
+            "severity": "high" if severe else "medium",
+            "urgency_score": 0.8 if severe else 0.5,
+            "affected_people_estimate": None,
+            "follow_up_questions": ["How many people are affected?"],
+            "summary": desc[:80],
+        }
+
+
+def install_standins(firestore=None, bucket=None, llm=None):
+    """Route the app's Firestore, Storage and Gemini access to the given stand-ins."""
+    from services import firestore_service, storage_service, gemini_service
+    firestore = firestore if firestore is not None else FakeFirestore()
+    bucket = bucket if bucket is not None else FakeBucket()
+    llm = llm if llm is not None else FakeLLM()
+    firestore_service.use_client(firestore)
+    storage_service.use_bucket(bucket)
+    gemini_service.GEMINI.override(llm)
+    return firestore, bucket, llm
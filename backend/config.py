@@ -11,8 +11,37 @@ load_dotenv(root / ".env")
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
 GOOGLE_MAPS_API_KEY = os.getenv("GOOGLE_MAPS_API_KEY")
 
+# Firebase Admin service account key (relative to backend/)
+FIREBASE_ADMIN_KEY_PATH = os.getenv("FIREBASE_ADMIN_KEY_PATH", "firebase_admin_key.json")
+
 # Firebase Storage bucket name (e.g. "your-project-id.appspot.com")
 FIREBASE_STORAGE_BUCKET = os.getenv("FIREBASE_STORAGE_BUCKET")
 
+# Storage backend: "firestore" (default) or "sqlite" (embedded, offline; see services/sqlite_store.py)
+DB_BACKEND = os.getenv("CRISISMAP_DB_BACKEND", "firestore").lower()
+SQLITE_PATH = os.getenv("CRISISMAP_SQLITE_PATH", str(Path(__file__).resolve().parent / "crisismap.db"))
+
+# Per-collection change counters behind the listing ETags, shared by the workers of a host
+# (see services/http_cache.py; "" keeps them in process memory, single-worker only)
+VERSIONS_PATH = os.getenv("CRISISMAP_VERSIONS_PATH", str(Path(__file__).resolve().parent / "crisismap_versions.db"))
+
+# Versioned ML model artifacts (see services/model_registry.py)
+MODELS_DIR = os.getenv("CRISISMAP_MODELS_DIR", str(Path(__file__).resolve().parent / "services" / "models"))
+
+# Partitioned Parquet archive of closed incidents / dispatches (see services/archive_service.py)
+ARCHIVE_DIR = os.getenv("CRISISMAP_ARCHIVE_DIR", str(Path(__file__).resolve().parent / "archive"))
+
+# Local OpenStreetMap extract (.osm / .osm.bz2 / .osm.gz, or .osm.pbf with pyosmium) for
+# travel-time dispatch scoring (see services/road_network.py; "" = straight-line km only)
+ROAD_NETWORK_PATH = os.getenv("CRISISMAP_ROAD_NETWORK_PATH", "")
+
 # Where uploaded images are saved locally (kept for fallback / debugging)
-UPLOAD_FOLDER = "uploads"
\ No newline at end of file
+UPLOAD_FOLDER = "uploads"
+
+# Signing key for stateless auth tokens. Must be identical on every worker/node.
+AUTH_SECRET_KEY = os.getenv("AUTH_SECRET_KEY")
+AUTH_TOKEN_TTL_SECONDS = int(os.getenv("AUTH_TOKEN_TTL_SECONDS", str(12 * 60 * 60)))
+
+
+# Load heavy clients/models in a background thread right after startup ("0" to disable)
+WARMUP_ON_START = os.getenv("CRISISMAP_WARMUP", "1") != "0"
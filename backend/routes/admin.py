@@ -8,15 +8,28 @@ from services.firestore_service import (
     search_incidents_by_text,
     create_team,
     get_all_teams,
-    create_dispatch,
-    update_incident_assignment
+    get_team_by_id,
+    get_team_loads,
+    reconcile_team_loads,
+    rebuild_tile_aggregates,
+    get_analytics,
+    rebuild_rollups,
 )
+from services.dispatch_service import commit_dispatch, get_committed_dispatch, DispatchCommitError
 from services.gemini_service import generate_action_plan, load_assignment_model
-from datetime import datetime
+from services import model_registry, fast_severity
+from services.rollups import as_utc
+from services import archive_service
+from services.http_cache import conditional
+from services.rebalancer import get_rebalancer
+from services.dispatch_scoring import ScoreParams, sev_norm, team_coords, incident_coords, coords_array, distance_matrix, team_scores
+from services import road_network
+from datetime import datetime, timedelta
 import uuid
 from werkzeug.security import generate_password_hash
-from auth_store import ACTIVE_ADMIN_TOKENS
+from auth_store import issue_token, verify_token, revoke_token, ROLE_ADMIN
 import math
+import numpy as np
 import traceback
 import logging
 
@@ -27,9 +40,12 @@ ADMIN_USERS = {
     "ops": "rescue2025"
 }
 
+def _admin_token(req):
+    return req.headers.get("x-admin-token") or req.args.get("token")
+
 def require_auth(req):
-    token = req.headers.get("x-admin-token") or req.args.get("token")
-    return token if token in ACTIVE_ADMIN_TOKENS else None
+    token = _admin_token(req)
+    return token if verify_token(token, role=ROLE_ADMIN) else None
 
 @admin_bp.route("/login", methods=["POST"])
 def login():
@@ -39,12 +55,19 @@ def login():
     if not username or not password:
         return jsonify({"error":"username and password required"}), 400
     if username in ADMIN_USERS and ADMIN_USERS[username] == password:
-        token = uuid.uuid4().hex
-        ACTIVE_ADMIN_TOKENS[token] = {"user": username, "login_at": datetime.utcnow().isoformat()}
+        token = issue_token(ROLE_ADMIN, username)
         return jsonify({"token": token, "user": username})
     return jsonify({"error":"invalid credentials"}), 401
 
+@admin_bp.route("/logout", methods=["POST"])
+def logout():
+    if not require_auth(request):
+        return jsonify({"error":"unauthorized"}), 401
+    revoke_token(_admin_token(request))
+    return jsonify({"ok": True})
+
 @admin_bp.route("/incidents", methods=["GET"])
+@conditional("processed_incidents")
 def incidents():
     status = request.args.get("status")
     q = request.args.get("q")
@@ -68,6 +91,7 @@ def update_status():
         return jsonify({"error":"id and status required"}), 400
     try:
         update_incident_status(doc_id, new_status)
+        get_rebalancer().notify("incident_status", doc_id, new_status)
         return jsonify({"ok": True})
     except Exception as e:
         return jsonify({"error": str(e)}), 500
@@ -79,6 +103,12 @@ def generate_plan():
     payload = request.get_json() or {}
     statuses = payload.get("statuses", ["new"])
     team_id = payload.get("team_id")
+    # a client-supplied dispatch_id makes retries of this request idempotent
+    dispatch_id = payload.get("dispatch_id") or f"dispatch_{uuid.uuid4().hex[:10]}"
+    existing = get_committed_dispatch(payload.get("dispatch_id"))
+    if existing:
+        coords = [i for i in existing.get("incidents", []) if i.get("lat") is not None and i.get("lng") is not None]
+        return jsonify({"dispatch_id": dispatch_id, "plan": existing.get("plan_text"), "incidents": coords, "replayed": True})
     try:
         incidents = get_incidents_by_status(statuses)
     except Exception as e:
@@ -86,10 +116,9 @@ def generate_plan():
     if not incidents:
         return jsonify({"error":"no incidents for given statuses"}), 400
     try:
-        plan_text = generate_action_plan(incidents)
+        plan_text = generate_action_plan(incidents, start=team_coords(get_team_by_id(team_id) or {}))
     except Exception as e:
         return jsonify({"error": f"AI plan generation failed: {e}"}), 500
-    dispatch_id = f"dispatch_{uuid.uuid4().hex[:10]}"
     dispatch_doc = {
         "dispatch_id": dispatch_id,
         "team_id": team_id,
@@ -108,20 +137,13 @@ def generate_plan():
         ]
     }
     try:
-        create_dispatch(dispatch_doc)
-    except Exception as e:
+        result = commit_dispatch(dispatch_doc, team_id=team_id)
+    except DispatchCommitError as e:
         return jsonify({"error": f"Failed to create dispatch: {e}"}), 500
-    failed_updates = []
-    for it in incidents:
-        try:
-            if it.get("_id"):
-                update_incident_assignment(it["_id"], dispatch_id=dispatch_id, team_id=team_id, new_status="rescue_dispatched")
-        except Exception as e:
-            failed_updates.append({"id": it.get("_id"), "error": str(e)})
     coords = [{"_id": i.get("_id"), "lat": i.get("lat"), "lng": i.get("lng"), "severity": (i.get("analysis") or {}).get("severity")} for i in incidents if i.get("lat") is not None and i.get("lng") is not None]
     resp = {"dispatch_id": dispatch_id, "plan": plan_text, "incidents": coords}
-    if failed_updates:
-        resp["warning"] = {"failed_updates": failed_updates}
+    if result["skipped"]:
+        resp["warning"] = {"skipped_incidents": result["skipped"]}
     return jsonify(resp)
 
 @admin_bp.route("/teams", methods=["POST"])
@@ -139,12 +161,209 @@ def create_team_api():
     return jsonify({"team_id": team_id})
 
 @admin_bp.route("/teams", methods=["GET"])
+@conditional("teams", identity=lambda: ROLE_ADMIN if require_auth(request) else None)
 def list_teams_api():
     if not require_auth(request):
         return jsonify({"error": "unauthorized"}), 401
     teams = get_all_teams()
     return jsonify(teams)
 
+@admin_bp.route("/team-loads", methods=["GET"])
+def team_loads_api():
+    if not require_auth(request):
+        return jsonify({"error": "unauthorized"}), 401
+    teams = get_all_teams()
+    return jsonify(get_team_loads([t["_id"] for t in teams]))
+
+@admin_bp.route("/team-loads/reconcile", methods=["POST"])
+def team_loads_reconcile():
+    if not require_auth(request):
+        return jsonify({"error": "unauthorized"}), 401
+    return jsonify({"ok": True, "drift": reconcile_team_loads()})
+
+@admin_bp.route("/rebalance/proposals", methods=["GET"])
+def rebalance_proposals():
+    if not require_auth(request):
+        return jsonify({"error": "unauthorized"}), 401
+    try:
+        limit = max(1, int(request.args.get("limit", 100)))
+    except ValueError:
+        return jsonify({"error": "invalid limit"}), 400
+    rebalancer = get_rebalancer()
+    return jsonify({"proposals": rebalancer.recent(limit), "stats": rebalancer.stats()})
+
+@admin_bp.route("/rebalance/apply", methods=["POST"])
+def rebalance_apply():
+    if not require_auth(request):
+        return jsonify({"error": "unauthorized"}), 401
+    proposal = get_rebalancer().find((request.get_json() or {}).get("id"))
+    if proposal is None:
+        return jsonify({"error": "no open proposal with that id"}), 404
+    proposal = get_rebalancer().apply(proposal)
+    return jsonify({"ok": proposal["status"] == "applied", "proposal": proposal}), 200 if proposal["status"] == "applied" else 409
+
+@admin_bp.route("/roads", methods=["GET"])
+def roads_status():
+    if not require_auth(request):
+        return jsonify({"error": "unauthorized"}), 401
+    net = road_network.get_road_network()
+    return jsonify({"loaded": net is not None, **(net.stats() if net else {}), "closures": road_network.list_closures()})
+
+@admin_bp.route("/roads/closures", methods=["POST"])
+def roads_close():
+    """Body: { way_ids: [...] } and / or { lat, lng, radius_km }, optional note (e.g. "flooded")."""
+    if not require_auth(request):
+        return jsonify({"error": "unauthorized"}), 401
+    payload = request.get_json() or {}
+    try:
+        way_ids = [int(w) for w in payload.get("way_ids") or []]
+        lat = float(payload["lat"]) if payload.get("lat") is not None else None
+        lng = float(payload["lng"]) if payload.get("lng") is not None else None
+        radius_km = float(payload.get("radius_km", 0.2))
+    except (TypeError, ValueError):
+        return jsonify({"error": "invalid way_ids / lat / lng / radius_km"}), 400
+    if not way_ids and (lat is None or lng is None):
+        return jsonify({"error": "way_ids or lat and lng required"}), 400
+    closure = road_network.add_closure(way_ids, lat, lng, radius_km if lat is not None else None, payload.get("note"))
+    net = road_network.get_road_network()
+    return jsonify({"ok": True, "closure": closure, "closed_edges": int(net.closure_edges(closure).sum()) if net else None})
+
+@admin_bp.route("/roads/closures/<closure_id>", methods=["DELETE"])
+def roads_reopen(closure_id):
+    if not require_auth(request):
+        return jsonify({"error": "unauthorized"}), 401
+    if not road_network.remove_closure(closure_id):
+        return jsonify({"error": "not found"}), 404
+    return jsonify({"ok": True})
+
+@admin_bp.route("/tiles/rebuild", methods=["POST"])
+def tiles_rebuild():
+    """Backfill / repair the map tile aggregates from processed_incidents."""
+    if not require_auth(request):
+        return jsonify({"error": "unauthorized"}), 401
+    return jsonify({"ok": True, **rebuild_tile_aggregates()})
+
+ANALYTICS_MAX_DAYS = 366
+
+@admin_bp.route("/analytics", methods=["GET"])
+def analytics():
+    """
+    Incidents per hour/day by type, severity and status plus time-to-dispatch / time-to-close
+    quantiles, from the hourly rollups. ?from=&to= are ISO datetimes (UTC, default: last 24h),
+    ?bucket=hour|day.
+    """
+    if not require_auth(request):
+        return jsonify({"error": "unauthorized"}), 401
+    end = as_utc(request.args["to"]) if request.args.get("to") else datetime.utcnow()
+    start = as_utc(request.args["from"]) if request.args.get("from") else (end and end - timedelta(hours=24))
+    if start is None or end is None:
+        return jsonify({"error": "from/to must be ISO datetimes"}), 400
+    bucket = request.args.get("bucket", "hour")
+    if bucket not in ("hour", "day") or start > end or end - start > timedelta(days=ANALYTICS_MAX_DAYS):
+        return jsonify({"error": f"bucket must be hour|day and from..to at most {ANALYTICS_MAX_DAYS} days"}), 400
+    return jsonify(get_analytics(start, end, bucket))
+
+def _archive_range():
+    """(start, end) from ?from=&to= (either may be None), or None if one is not an ISO datetime."""
+    start = as_utc(request.args["from"]) if request.args.get("from") else None
+    end = as_utc(request.args["to"]) if request.args.get("to") else None
+    if (request.args.get("from") and start is None) or (request.args.get("to") and end is None):
+        return None
+    return start, end
+
+def _page_args():
+    return max(0, int(request.args.get("offset", 0))), min(max(1, int(request.args.get("limit", 100))), 1000)
+
+@admin_bp.route("/archive/incidents", methods=["GET"])
+def archive_incidents():
+    """Historical search over archived incidents: ?q=&from=&to=&status=&team=&type=&severity=&limit=&offset=&full=1"""
+    if not require_auth(request):
+        return jsonify({"error": "unauthorized"}), 401
+    rng = _archive_range()
+    if rng is None:
+        return jsonify({"error": "from/to must be ISO datetimes"}), 400
+    try:
+        offset, limit = _page_args()
+    except ValueError:
+        return jsonify({"error": "invalid limit/offset"}), 400
+    a = request.args
+    return jsonify(archive_service.search_archive(
+        q=a.get("q"), start=rng[0], end=rng[1], status=a.get("status"), team_id=a.get("team"),
+        incident_type=a.get("type"), severity=a.get("severity"), limit=limit, offset=offset, full=a.get("full") == "1"))
+
+@admin_bp.route("/archive/dispatches", methods=["GET"])
+def archive_dispatches():
+    if not require_auth(request):
+        return jsonify({"error": "unauthorized"}), 401
+    rng = _archive_range()
+    if rng is None:
+        return jsonify({"error": "from/to must be ISO datetimes"}), 400
+    try:
+        offset, limit = _page_args()
+    except ValueError:
+        return jsonify({"error": "invalid limit/offset"}), 400
+    return jsonify(archive_service.search_archived_dispatches(
+        team_id=request.args.get("team"), start=rng[0], end=rng[1], limit=limit, offset=offset,
+        full=request.args.get("full") == "1"))
+
+@admin_bp.route("/archive/stats", methods=["GET"])
+def archive_stats():
+    if not require_auth(request):
+        return jsonify({"error": "unauthorized"}), 401
+    rng = _archive_range()
+    bucket = request.args.get("bucket", "day")
+    if rng is None or bucket not in ("hour", "day"):
+        return jsonify({"error": "from/to must be ISO datetimes and bucket hour|day"}), 400
+    return jsonify({**archive_service.archive_stats(rng[0], rng[1], bucket), "files": archive_service.archive_info()})
+
+@admin_bp.route("/archive/run", methods=["POST"])
+def archive_run():
+    """Body (optional): { older_than_days, dry_run, limit }"""
+    if not require_auth(request):
+        return jsonify({"error": "unauthorized"}), 401
+    payload = request.get_json(silent=True) or {}
+    try:
+        result = archive_service.run_archive(payload.get("older_than_days"), bool(payload.get("dry_run")), payload.get("limit"))
+    except (TypeError, ValueError) as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify({"ok": True, **result})
+
+@admin_bp.route("/analytics/rebuild", methods=["POST"])
+def analytics_rebuild():
+    """One-time backfill (or repair) of the hourly rollups from the incident history."""
+    if not require_auth(request):
+        return jsonify({"error": "unauthorized"}), 401
+    return jsonify({"ok": True, **rebuild_rollups()})
+
+# -----------------------
+# ML model registry (loaded version, load time, hot-swap)
+# -----------------------
+@admin_bp.route("/models", methods=["GET"])
+def models_info():
+    if not require_auth(request):
+        return jsonify({"error": "unauthorized"}), 401
+    return jsonify(model_registry.info())
+
+@admin_bp.route("/models/<name>/activate", methods=["POST"])
+def models_activate(name):
+    if not require_auth(request):
+        return jsonify({"error": "unauthorized"}), 401
+    version = (request.get_json() or {}).get("version")
+    if not version:
+        return jsonify({"error": "version required"}), 400
+    try:
+        model_registry.activate_version(name, version)
+    except FileNotFoundError as e:
+        return jsonify({"error": str(e)}), 404
+    if name == "severity":
+        # keep the compact scorer in lock-step with the sklearn model it was exported from
+        if version in model_registry.list_versions(fast_severity.COMPACT_NAME):
+            model_registry.activate_version(fast_severity.COMPACT_NAME, version)
+        else:
+            model_registry.deactivate(fast_severity.COMPACT_NAME)
+    model_registry.get(name)
+    return jsonify({"ok": True, "model": name, "info": model_registry.info().get(name)})
+
 # -----------------------
 # Auto-dispatch (uses assignment model if present; else fall back)
 # -----------------------
@@ -154,16 +373,7 @@ def auto_dispatch_ai():
         return jsonify({"error":"unauthorized"}), 401
     payload = request.get_json() or {}
     statuses = payload.get("statuses", ["new"])
-    try:
-        max_per_team = int(payload.get("max_per_team", 8))
-    except Exception:
-        max_per_team = 8
-
-    w_sev = float(payload.get("weights", {}).get("severity", 1.0))
-    w_dist = float(payload.get("weights", {}).get("distance", 0.6))
-    w_load = float(payload.get("weights", {}).get("load", 0.8))
-    DIST_SCALE = float(payload.get("dist_scale_km", 50.0))
-    MAX_DISTANCE_KM = float(payload.get("max_distance_km", 40.0))
+    params = ScoreParams.from_payload(payload)
 
     # load assignment model (best effort)
     try:
@@ -181,98 +391,32 @@ def auto_dispatch_ai():
     if not teams:
         return jsonify({"error": "no teams available"}), 400
 
+    # active incidents per team from the materialized counters (one get_all, O(teams))
     try:
-        all_incidents = get_all_incidents()
+        loads = get_team_loads([t["_id"] for t in teams])
     except Exception:
-        all_incidents = []
-
-    loads = {t["_id"]: 0 for t in teams}
-    for inc in all_incidents:
-        at = inc.get("assigned_team")
-        st = (inc.get("status") or "").lower()
-        if at and at in loads and st != "closed":
-            loads[at] = loads.get(at, 0) + 1
-
-    def sev_norm(it):
-        sev = (it.get("analysis") or {}).get("severity") or it.get("severity") or "medium"
-        m = {"critical":5,"high":4,"medium":3,"low":2}
-        val = m.get(str(sev).lower(), 3)
-        return (val - 2) / 3.0
-
-    # build team coords map
-    team_coords = {}
-    for t in teams:
-        lat = t.get("base_lat"); lng = t.get("base_lng")
-        if lat is not None and lng is not None:
-            try: team_coords[t["_id"]] = (float(lat), float(lng))
-            except: team_coords[t["_id"]] = None
-        else:
-            team_coords[t["_id"]] = None
+        loads = {t["_id"]: 0 for t in teams}
 
-    incidents_sorted = sorted(incidents, key=lambda x: sev_norm(x), reverse=True)
-    assignments = {t["_id"]: [] for t in teams}
     team_ids = [t["_id"] for t in teams]
+    team_xy = coords_array([team_coords(t) for t in teams])
+    assignments = {tid: [] for tid in team_ids}
+    incidents = sorted(incidents, key=sev_norm, reverse=True)
+    # (teams x incidents) km or road minutes, one matrix for the whole run
+    dist_mat = distance_matrix(params, team_xy, coords_array([incident_coords(i) for i in incidents]))
 
-    from math import radians, sin, cos, sqrt, atan2
-    def haversine(lat1, lng1, lat2, lng2):
-        R = 6371
-        dlat = radians(lat2 - lat1); dlng = radians(lng2 - lng1)
-        a = sin(dlat/2)**2 + cos(radians(lat1))*cos(radians(lat2))*sin(dlng/2)**2
-        return R * 2 * atan2(sqrt(a), sqrt(1-a))
-
-    for inc in incidents_sorted:
-        best_team = None; best_score = -1e9
-        sev_val = sev_norm(inc)
-        lat = inc.get("lat"); lng = inc.get("lng")
-        for tid in team_ids:
-            load = loads.get(tid,0)
-            load_norm = min(load / float(payload.get("load_scale", 10.0)), 5.0)
-            coords = team_coords.get(tid)
-            if coords and lat is not None and lng is not None:
-                try: dist_km = haversine(coords[0], coords[1], lat, lng)
-                except: dist_km = DIST_SCALE*2
-                dist_norm = min(dist_km / DIST_SCALE, 5.0)
-            else:
-                dist_km = DIST_SCALE*2; dist_norm = 5.0
-
-            distance_penalty = 0.0
-            if dist_km > MAX_DISTANCE_KM:
-                distance_penalty = ((dist_km - MAX_DISTANCE_KM) / (DIST_SCALE or 1.0)) * 1.5
-
-            score = -1e9
-            if assign_model is not None:
-                try:
-                    feat = [[sev_val, float(dist_km), float(load)]]
-                    if hasattr(assign_model, "predict_proba"):
-                        probs = assign_model.predict_proba(feat)[0]
-                        pos_idx = 1 if (hasattr(assign_model, "classes_") and 1 in list(assign_model.classes_)) else (1 if len(probs)>1 else 0)
-                        score = float(probs[pos_idx])
-                    else:
-                        sc = assign_model.predict(feat)[0]
-                        score = float(sc)
-                except Exception:
-                    score = -1e9
-
-            if score == -1e9:
-                score = (w_sev * sev_val) - (w_dist * dist_norm) - (w_load * load_norm)
-
-            score -= distance_penalty
-            if load < max_per_team: score += 0.2
-
-            if score > best_score:
-                best_score = score; best_team = tid
-
-        if best_team is None:
-            best_team = sorted(team_ids, key=lambda x: loads.get(x,0))[0]
+    # most severe first, each to its best-scoring team given the loads so far
+    for k, inc in enumerate(incidents):
+        scores = team_scores(params, sev_norm(inc), dist_mat[:, k], [loads.get(tid, 0) for tid in team_ids], assign_model)
+        best_team = team_ids[int(np.argmax(scores))]
         assignments[best_team].append(inc)
-        loads[best_team] = loads.get(best_team,0) + 1
+        loads[best_team] = loads.get(best_team, 0) + 1
 
-    from services.firestore_service import update_incident_assignment
     created = []
+    starts = dict(zip(team_ids, (team_coords(t) for t in teams)))
     for tid, inc_list in assignments.items():
         if not inc_list: continue
         try:
-            plan_text = generate_action_plan(inc_list)
+            plan_text = generate_action_plan(inc_list, start=starts.get(tid))
         except Exception as e:
             plan_text = f"Auto-dispatch for team {tid}: {len(inc_list)} incidents. (Plan generator failed: {e})"
         dispatch_id = f"dispatch_{uuid.uuid4().hex[:10]}"
@@ -286,19 +430,12 @@ def auto_dispatch_ai():
             "incidents": [{"_id": i.get("_id"), "location": i.get("location"), "lat": i.get("lat"), "lng": i.get("lng"), "severity": (i.get("analysis") or {}).get("severity")} for i in inc_list]
         }
         try:
-            create_dispatch(dispatch_doc)
-        except Exception as e:
+            result = commit_dispatch(dispatch_doc, team_id=tid)
+        except DispatchCommitError as e:
             created.append({"team_id": tid, "dispatch_id": None, "error": str(e), "count": len(inc_list)})
             continue
-        failed_updates = []
-        for it in inc_list:
-            try:
-                if it.get("_id"):
-                    update_incident_assignment(it["_id"], dispatch_id=dispatch_id, team_id=tid, new_status="rescue_dispatched")
-            except Exception as e:
-                failed_updates.append({"id": it.get("_id"), "error": str(e)})
         entry = {"team_id": tid, "dispatch_id": dispatch_id, "count": len(inc_list), "plan_text": plan_text, "incidents": dispatch_doc["incidents"]}
-        if failed_updates: entry["failed_updates"] = failed_updates
+        if result["skipped"]: entry["skipped_incidents"] = result["skipped"]
         created.append(entry)
 
-    return jsonify({"ok": True, "dispatches": created})
+    return jsonify({"ok": True, "distance_unit": params.unit, "dispatches": created})
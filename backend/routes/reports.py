@@ -11,28 +11,331 @@ Accepts multipart/form-data:
 - description (required)
 - lat, lng (optional)
 - image (optional file)
+
+Responses: 200 with the analysis; 202 when the report is stored but still queued for
+triage, or accepted in degraded mode (keyword analysis now, image upload and full
+analysis deferred); 429 / 503 with Retry-After when rate limited / shed under
+overload (services/admission.py).
+
+Send an Idempotency-Key header (one per form submission, reused on retries) to make
+retries safe: repeats get the original response instead of a second report
+(services/idempotency.py). A retry after a failure that left the raw report stored but
+unprocessed processes that stored report. The processed incident is keyed by the raw
+report's id, so it is never written twice.
 """
 
 from flask import Blueprint, request, jsonify, current_app
 import os
+import time
 import uuid
+import socket
+import logging
+import functools
+import threading
 from datetime import datetime
-from config import UPLOAD_FOLDER, FIREBASE_STORAGE_BUCKET
-from services.firestore_service import save_raw_report, save_processed_incident
-from services.gemini_service import analyze_incident
-
-from firebase_admin import storage as fb_storage
+from config import UPLOAD_FOLDER
+from services.firestore_service import (save_raw_report, save_processed_incident, update_incident_image,
+                                        finish_incident_enrichment, claim_pending_enrichments, get_raw_report,
+                                        get_processed_incident)
+from services.storage_service import get_bucket
+from services.gemini_service import analyze_incident, analyze_incident_tiered
+from services.analysis_batcher import get_batcher, refine_in_background
+from services.triage_queue import get_triage_queue
+from services import admission
+from services.admission import get_admission, keyword_analysis, ROUTE_DEGRADED, ROUTE_SHED, ROUTE_RATE_LIMITED
+from services.idempotency import idempotent, record_write, write_recorder
+from services.rebalancer import get_rebalancer
+from concurrent.futures import TimeoutError as FutureTimeout
+from services import metrics
+from services.metrics import timed
 
 reports_bp = Blueprint("reports", __name__)
 
+# skip Gemini when the local model is confident; escalate the rest (optionally in the background)
+ANALYSIS_TIERED = os.getenv("ANALYSIS_TIERED", "1") == "1"
+ANALYSIS_ESCALATE_ASYNC = os.getenv("ANALYSIS_ESCALATE_ASYNC", "0") == "1"
+# priority queue in front of analysis; requests wait this long for their turn before getting 202
+TRIAGE_ENABLED = os.getenv("TRIAGE_ENABLED", "1") == "1"
+TRIAGE_RESPONSE_TIMEOUT_SECONDS = float(os.getenv("TRIAGE_RESPONSE_TIMEOUT_SECONDS", "30"))
+# take the client IP for rate limiting from X-Forwarded-For (only behind a trusted proxy)
+ADMISSION_TRUST_PROXY = os.getenv("ADMISSION_TRUST_PROXY", "0") == "1"
+# degraded reports still marked enrichment_pending are queued again by a sweep every
+# ENRICHMENT_SWEEP_SECONDS (0 disables) once their last claim is ENRICHMENT_STALE_SECONDS old
+ENRICHMENT_SWEEP_SECONDS = float(os.getenv("ENRICHMENT_SWEEP_SECONDS", "60"))
+ENRICHMENT_STALE_SECONDS = float(os.getenv("ENRICHMENT_STALE_SECONDS", "600"))
+# a deferred upload waits in this host's UPLOAD_FOLDER, so only this host's sweep takes the
+# job - until its last claim is ENRICHMENT_ORPHAN_SECONDS old (host gone): then any host
+# finishes the analysis and the incident is marked image_lost
+ENRICHMENT_HOST = os.getenv("ENRICHMENT_HOST_ID") or socket.gethostname()
+ENRICHMENT_ORPHAN_SECONDS = float(os.getenv("ENRICHMENT_ORPHAN_SECONDS", "3600"))
+IMAGES_LOST = metrics.counter("crisismap_enrichment_images_lost_total",
+                              "Deferred uploads whose file was gone when the enrichment ran")
+
 def _log(msg, *args):
     try:
         current_app.logger.info(msg % args if args else msg)
     except Exception:
         print(msg % args if args else msg)
 
+class ProcessingError(Exception):
+    pass
+
+def _analyze(raw_report, local=None):
+    """Analysis of a raw report (tiered / batched Gemini, best-effort); local = triage pre-score."""
+    try:
+        # during bursts, reports are packed into one Gemini prompt (ANALYSIS_BATCH_SIZE > 1)
+        batcher = get_batcher()
+        escalate = batcher.analyze if batcher else analyze_incident
+        with timed("pipeline.analyze_incident"):
+            if ANALYSIS_TIERED:
+                return analyze_incident_tiered(raw_report, escalate=escalate, escalate_async=ANALYSIS_ESCALATE_ASYNC,
+                                               local=local)
+            return escalate(raw_report)
+    except Exception as e:
+        _log("AI analysis failed: %s", e)
+        return {
+            "incident_type": "other",
+            "severity": "medium",
+            "urgency_score": 0.5,
+            "affected_people_estimate": 0,
+            "follow_up_questions": [],
+            "summary": f"AI analysis failed: {e}"
+        }
+
+def _process_report(raw_report, triage=None, raw_id=None, record=record_write):
+    """
+    Analyze a saved raw report and write the processed incident (under the raw report's id
+    when given); returns the analysis. record notes the write for the Idempotency-Key.
+    """
+    triage = dict(triage) if triage else None
+    analysis = _analyze(raw_report, local=triage.pop("analysis", None) if triage else None)
+    if triage:
+        analysis["triage"] = triage
+
+    processed = { **raw_report, "analysis": analysis }
+
+    # save processed incident
+    try:
+        _, ref = save_processed_incident(processed, doc_id=raw_id)
+        record("processed_incidents", ref.id)
+        _log("Processed incident saved to Firestore")
+        get_rebalancer().notify("incident_created", {**processed, "_id": ref.id})
+        if analysis.get("llm_pending"):
+            refine_in_background(ref.id, raw_report)
+    except Exception as e:
+        if raw_id and type(e).__name__ == "AlreadyExists":
+            # processed concurrently by another retry of the same submission; that one stands
+            record("processed_incidents", raw_id)
+            return (get_processed_incident(raw_id) or processed)["analysis"]
+        _log("Failed to save processed incident: %s", e)
+        raise ProcessingError(f"Failed to save processed incident: {e}")
+    return analysis
+
+def _client_ip():
+    if ADMISSION_TRUST_PROXY and request.headers.get("X-Forwarded-For"):
+        return request.headers["X-Forwarded-For"].split(",")[0].strip()
+    return request.remote_addr
+
+def _save_image_locally(image):
+    """Save the upload under UPLOAD_FOLDER; returns (unique filename, local path or None)."""
+    # ensure uploads directory exists (local fallback)
+    os.makedirs(UPLOAD_FOLDER, exist_ok=True)
+
+    # build unique filename
+    ext = image.filename.rsplit(".", 1)[-1] if "." in image.filename else "jpg"
+    unique_name = f"{datetime.utcnow().strftime('%Y%m%d_%H%M%S')}_{uuid.uuid4().hex}.{ext}"
+
+    # save locally for debug
+    local_path = os.path.join(UPLOAD_FOLDER, unique_name)
+    try:
+        image.save(local_path)
+        _log("Saved image locally to %s", local_path)
+    except Exception as e:
+        _log("Failed to save image locally: %s", e)
+        local_path = None
+    return unique_name, local_path
+
+def _upload_image(unique_name, stream, content_type):
+    """Upload to Firebase Storage if configured; returns the public URL or None."""
+    image_url = None
+    try:
+        bucket = get_bucket()
+        if bucket is not None:
+            blob = bucket.blob(f"incidents/{unique_name}")
+
+            # reset file pointer then upload
+            try:
+                stream.seek(0)
+            except Exception:
+                pass
+
+            with timed("storage.upload_image"):
+                blob.upload_from_file(stream, content_type=content_type)
+            try:
+                with timed("storage.make_public"):
+                    blob.make_public()
+                image_url = blob.public_url
+            except Exception:
+                image_url = None
+            _log("Uploaded image to Firebase: %s", image_url or "<no-public-url>")
+        else:
+            _log("FIREBASE_STORAGE_BUCKET not configured; skipping cloud upload")
+    except Exception as e:
+        _log("Firebase Storage upload failed: %s", e)
+        # continue - we keep local_path copy
+        image_url = None
+    return image_url
+
+def _enrich_deferred(job):
+    """Deferred part of a degraded-mode submission: image upload and full analysis."""
+    doc_id, raw_report = job["doc_id"], job["raw_report"]
+    image_lost = False
+    if job.get("local_path"):
+        if os.path.exists(job["local_path"]):
+            with open(job["local_path"], "rb") as f:
+                image_url = _upload_image(raw_report["image_filename"], f, job.get("content_type"))
+            if image_url:
+                update_incident_image(doc_id, image_url)
+        else:
+            image_lost = True
+            IMAGES_LOST.inc()
+            logging.error("Deferred upload of incident %s is gone (%s on host %s); finishing without the image",
+                          doc_id, job["local_path"], job.get("host") or "?")
+    analysis = _analyze(raw_report)
+    finish_incident_enrichment(doc_id, analysis, image_lost=image_lost)
+    if analysis.get("llm_pending"):
+        refine_in_background(doc_id, raw_report)
+
+def _defer_enrichment(priority, job):
+    """Queue a degraded report's enrichment; if the queue is full, run it now instead."""
+    if get_admission().defer(priority, _enrich_deferred, job, key=job["doc_id"]):
+        return
+    try:
+        _enrich_deferred(job)
+    except Exception as e:
+        # still marked enrichment_pending on the document; the sweep will retry it
+        _log("Inline enrichment of %s failed: %s", job["doc_id"], e)
+
+# fields of a processed incident that are not part of its raw report
+_PROCESSED_FIELDS = ("_id", "analysis", "enrichment", "enrichment_pending", "quadkey")
+
+def requeue_pending_enrichments(older_than_seconds=ENRICHMENT_STALE_SECONDS):
+    """Queue the enrichment of stored degraded reports that are pending but not queued (e.g. after a restart)."""
+    docs = claim_pending_enrichments(older_than_seconds, host=ENRICHMENT_HOST, orphan_seconds=ENRICHMENT_ORPHAN_SECONDS)
+    for doc in docs:
+        enrichment = doc.get("enrichment") or {}
+        raw_report = {k: v for k, v in doc.items() if k not in _PROCESSED_FIELDS}
+        get_admission().defer(float(enrichment.get("priority") or 0), _enrich_deferred,
+                              {"doc_id": doc["_id"], "raw_report": raw_report, "local_path": enrichment.get("local_path"),
+                               "content_type": enrichment.get("content_type"), "host": enrichment.get("host")},
+                              key=doc["_id"])
+    return len(docs)
+
+_SWEEPER = None
+
+def start_enrichment_sweeper(interval=ENRICHMENT_SWEEP_SECONDS):
+    """Run requeue_pending_enrichments() now and every `interval` seconds in a daemon thread (0 disables)."""
+    global _SWEEPER
+    if interval <= 0 or (_SWEEPER is not None and _SWEEPER.is_alive()):
+        return _SWEEPER
+
+    def loop():
+        while True:
+            try:
+                requeue_pending_enrichments()
+            except Exception:
+                logging.exception("Pending enrichment sweep failed")
+            time.sleep(interval)
+
+    _SWEEPER = threading.Thread(target=loop, name="enrichment-sweeper", daemon=True)
+    _SWEEPER.start()
+    return _SWEEPER
+
+def _raw_report(name, phone, email, location, description, lat, lng, image_filename, image_url):
+    return {
+        "reporter_name": name,
+        "reporter_phone": phone,
+        "reporter_email": email or None,
+        "location": location,
+        "description": description,
+        "lat": float(lat) if lat else None,
+        "lng": float(lng) if lng else None,
+        "image_filename": image_filename,
+        "image_url": image_url,
+        "timestamp": datetime.utcnow(),
+        "status": "new"
+    }
+
+def _submit_degraded(ticket, fields, image):
+    """Store the report with keyword analysis only; upload and LLM analysis run later."""
+    image_filename, local_path = _save_image_locally(image) if image else (None, None)
+    raw_report = _raw_report(*fields, image_filename, None)
+    content_type = image.content_type if image else None
+    # recorded on the document so the sweep can redo the enrichment if this process dies first
+    enrichment = {"priority": ticket.priority, "local_path": local_path, "content_type": content_type,
+                  "host": ENRICHMENT_HOST if local_path else None, "queued_at": time.time()}
+    try:
+        raw_id = save_raw_report(raw_report)[1].id
+        record_write("raw_reports", raw_id)
+        analysis = keyword_analysis(raw_report, ticket.severity)
+        _, ref = save_processed_incident({**raw_report, "analysis": analysis, "enrichment_pending": True,
+                                          "enrichment": enrichment}, doc_id=raw_id)
+        record_write("processed_incidents", ref.id)
+    except Exception as e:
+        _log("Failed to save degraded report: %s", e)
+        return jsonify({"error": f"Failed to save report: {e}"}), 500
+    get_rebalancer().notify("incident_created", {**raw_report, "analysis": analysis, "_id": ref.id})
+    _defer_enrichment(ticket.priority, {"doc_id": ref.id, "raw_report": raw_report, "local_path": local_path,
+                                        "content_type": content_type})
+    return jsonify({"ok": True, "degraded": True, "analysis": analysis, "image_url": None}), 202
+
+def _run_pipeline(raw_report, raw_id, image_url):
+    """Analysis + processed_incidents write of a stored raw report, ordered by triage priority during surges."""
+    if TRIAGE_ENABLED:
+        process = functools.partial(_process_report, raw_id=raw_id, record=write_recorder())
+        fut = get_triage_queue().submit(raw_report, process)
+        try:
+            analysis = fut.result(timeout=TRIAGE_RESPONSE_TIMEOUT_SECONDS)
+        except FutureTimeout:
+            # still queued behind more urgent reports; it will be processed, don't hold the client
+            return jsonify({"ok": True, "queued": True, "image_url": image_url}), 202
+    else:
+        analysis = _process_report(raw_report, raw_id=raw_id)
+
+    # return success and analysis summary
+    return jsonify({
+        "ok": True,
+        "analysis": analysis,
+        "image_url": image_url
+    }), 200
+
+def _resume_report(writes):
+    """Retry of a submission whose raw report was stored but never processed: process it now."""
+    stored = {w["collection"]: w["id"] for w in writes}
+    raw_id = stored.get("raw_reports")
+    if not raw_id or "processed_incidents" in stored:
+        return None
+    try:
+        incident = get_processed_incident(raw_id)
+        if incident is not None:
+            # processed after all (the triage worker finished after the request gave up)
+            return jsonify({"ok": True, "analysis": incident.get("analysis"),
+                            "image_url": incident.get("image_url")}), 200
+        raw_report = get_raw_report(raw_id)
+        if raw_report is None:
+            return None
+        _log("Resuming processing of stored raw report %s", raw_id)
+        return _run_pipeline(raw_report, raw_id, raw_report.get("image_url"))
+    except ProcessingError as e:
+        return jsonify({"error": str(e)}), 500
+    except Exception as unknown:
+        _log("Unhandled error resuming report %s: %s", raw_id, unknown)
+        return jsonify({"error": f"Unhandled server error: {unknown}"}), 500
+
 @reports_bp.route("/submit-report", methods=["POST"])
+@idempotent(resume=_resume_report)
 def submit_report():
+    ticket = None
     try:
         # get fields
         name = (request.form.get("name") or "").strip()
@@ -56,108 +359,44 @@ def submit_report():
 
         _log("Submit-report received: name=%s phone=%s location=%s image=%s", name, phone, location, bool(image))
 
+        # rate limits, then full pipeline / degraded (store now, enrich later) / shed
+        if admission.ADMISSION_ENABLED:
+            ticket = get_admission().admit(_client_ip(), phone, description)
+            if ticket.route in (ROUTE_SHED, ROUTE_RATE_LIMITED):
+                resp = jsonify({"error": "too many reports, please retry" if ticket.route == ROUTE_RATE_LIMITED
+                                else "server overloaded, please retry", "retry_after": ticket.retry_after})
+                resp.headers["Retry-After"] = str(ticket.retry_after)
+                return resp, (429 if ticket.route == ROUTE_RATE_LIMITED else 503)
+            if ticket.route == ROUTE_DEGRADED:
+                return _submit_degraded(ticket, (name, phone, email, location, description, lat, lng), image)
+
         # prepare image upload variables
         image_filename = None
         image_url = None
 
         if image:
-            # ensure uploads directory exists (local fallback)
-            os.makedirs(UPLOAD_FOLDER, exist_ok=True)
-
-            # build unique filename
-            ext = image.filename.rsplit(".", 1)[-1] if "." in image.filename else "jpg"
-            unique_name = f"{datetime.utcnow().strftime('%Y%m%d_%H%M%S')}_{uuid.uuid4().hex}.{ext}"
-            image_filename = unique_name
-
-            # save locally for debug
-            local_path = os.path.join(UPLOAD_FOLDER, unique_name)
-            try:
-                image.save(local_path)
-                _log("Saved image locally to %s", local_path)
-            except Exception as e:
-                _log("Failed to save image locally: %s", e)
-
-            # upload to Firebase Storage if configured
-            try:
-                if FIREBASE_STORAGE_BUCKET:
-                    bucket = fb_storage.bucket()
-                    blob = bucket.blob(f"incidents/{unique_name}")
-
-                    # reset file pointer then upload
-                    try:
-                        image.stream.seek(0)
-                    except Exception:
-                        pass
-
-                    blob.upload_from_file(image.stream, content_type=image.content_type)
-                    try:
-                        blob.make_public()
-                        image_url = blob.public_url
-                    except Exception:
-                        image_url = None
-                    _log("Uploaded image to Firebase: %s", image_url or "<no-public-url>")
-                else:
-                    _log("FIREBASE_STORAGE_BUCKET not configured; skipping cloud upload")
-            except Exception as e:
-                _log("Firebase Storage upload failed: %s", e)
-                # continue - we keep local_path copy
-                image_url = None
+            image_filename, _ = _save_image_locally(image)
+            image_url = _upload_image(image_filename, image.stream, image.content_type)
 
         # build raw report
-        now = datetime.utcnow()
-        raw_report = {
-            "reporter_name": name,
-            "reporter_phone": phone,
-            "reporter_email": email or None,
-            "location": location,
-            "description": description,
-            "lat": float(lat) if lat else None,
-            "lng": float(lng) if lng else None,
-            "image_filename": image_filename,
-            "image_url": image_url,
-            "timestamp": now,
-            "status": "new"
-        }
+        raw_report = _raw_report(name, phone, email, location, description, lat, lng, image_filename, image_url)
 
         # save raw report
         try:
-            save_raw_report(raw_report)
+            raw_id = save_raw_report(raw_report)[1].id
+            record_write("raw_reports", raw_id)
             _log("Raw report saved to Firestore")
         except Exception as e:
             _log("Failed to save raw report: %s", e)
             return jsonify({"error": f"Failed to save raw report: {e}"}), 500
 
-        # analyze with Gemini (best-effort)
-        try:
-            analysis = analyze_incident(raw_report)
-        except Exception as e:
-            _log("AI analysis failed: %s", e)
-            analysis = {
-                "incident_type": "other",
-                "severity": "medium",
-                "urgency_score": 0.5,
-                "affected_people_estimate": 0,
-                "follow_up_questions": [],
-                "summary": f"AI analysis failed: {e}"
-            }
-
-        processed = { **raw_report, "analysis": analysis }
-
-        # save processed incident
-        try:
-            save_processed_incident(processed)
-            _log("Processed incident saved to Firestore")
-        except Exception as e:
-            _log("Failed to save processed incident: %s", e)
-            return jsonify({"error": f"Failed to save processed incident: {e}"}), 500
-
-        # return success and analysis summary
-        return jsonify({
-            "ok": True,
-            "analysis": analysis,
-            "image_url": image_url
-        }), 200
+        return _run_pipeline(raw_report, raw_id, image_url)
 
+    except ProcessingError as e:
+        return jsonify({"error": str(e)}), 500
     except Exception as unknown:
         _log("Unhandled error in submit_report: %s", unknown)
         return jsonify({"error": f"Unhandled server error: {unknown}"}), 500
+    finally:
+        if ticket is not None:
+            get_admission().release(ticket)
@@ -1,10 +1,16 @@
 # backend/routes/speech_stt.py
 
 from flask import Blueprint, request, jsonify
-from google.cloud import speech
+from services.registry import register
+from services.metrics import timed
 
 speech_bp = Blueprint("speech_stt", __name__)
-client = speech.SpeechClient()
+
+def _make_client():
+    from google.cloud import speech
+    return speech.SpeechClient()
+
+SPEECH_CLIENT = register("speech", _make_client)
 
 @speech_bp.route("/stt", methods=["POST"])
 def speech_to_text():
@@ -18,6 +24,12 @@ def speech_to_text():
     if "audio" not in request.files:
         return jsonify({"error": "audio file required (form field 'audio')"}), 400
 
+    try:
+        from google.cloud import speech
+        client = SPEECH_CLIENT.get()
+    except Exception as e:
+        return jsonify({"error": f"Speech service unavailable: {e}"}), 503
+
     audio_file = request.files["audio"]
     audio_bytes = audio_file.read()
 
@@ -37,7 +49,8 @@ def speech_to_text():
     audio = speech.RecognitionAudio(content=audio_bytes)
 
     try:
-        response = client.recognize(config=config, audio=audio)
+        with timed("speech.recognize"):
+            response = client.recognize(config=config, audio=audio)
     except Exception as e:
         return jsonify({"error": f"Speech recognition failed: {e}"}), 500
 
@@ -1,17 +1,20 @@
 # backend/routes/team.py
 
 from flask import Blueprint, request, jsonify
-from services.firestore_service import get_team_by_name, get_dispatches_by_team, get_db, update_incident_status
-import uuid
+from services.firestore_service import (
+    get_team_by_name, get_dispatches_by_team, get_dispatch_view, get_dispatch, mark_dispatch_completed,
+    update_incident_status, update_team_location
+)
 from werkzeug.security import check_password_hash
-from datetime import datetime
+from services.http_cache import conditional
+from services.rebalancer import get_rebalancer
 
 team_bp = Blueprint("team", __name__)
-from auth_store import ACTIVE_TEAM_TOKENS
+from auth_store import issue_token, verify_token, revoke_token, ROLE_TEAM
 
 def require_team_auth(req):
-    token = req.headers.get("x-team-token")
-    return ACTIVE_TEAM_TOKENS.get(token)
+    claims = verify_token(req.headers.get("x-team-token"), role=ROLE_TEAM)
+    return claims.get("team_id") if claims else None
 
 @team_bp.route("/team/login", methods=["POST"])
 def team_login():
@@ -21,7 +24,7 @@ def team_login():
     if not name or not password:
         return jsonify({"error": "name and password required"}), 400
 
-    team = get_team_by_name(name)
+    team = get_team_by_name(name, use_cache=True)
     if not team:
         return jsonify({"error":"invalid credentials"}), 401
 
@@ -29,35 +32,71 @@ def team_login():
     if not stored_hash or not check_password_hash(stored_hash, password):
         return jsonify({"error":"invalid credentials"}), 401
 
-    token = uuid.uuid4().hex
-    ACTIVE_TEAM_TOKENS[token] = team["_id"]
+    token = issue_token(ROLE_TEAM, team["_id"], team_id=team["_id"])
     return jsonify({"team_token": token, "team_id": team["_id"], "team_name": team.get("name")})
 
+@team_bp.route("/team/logout", methods=["POST"])
+def team_logout():
+    if not require_team_auth(request):
+        return jsonify({"error":"unauthorized"}), 401
+    revoke_token(request.headers.get("x-team-token"))
+    return jsonify({"ok": True})
+
 
 @team_bp.route("/team/dispatches", methods=["GET"])
+@conditional("dispatches", identity=lambda: require_team_auth(request))
 def team_dispatches():
     team_id = require_team_auth(request)
     if not team_id:
         return jsonify({"error":"unauthorized"}), 401
 
-    dispatches = get_dispatches_by_team(team_id)
+    # ?active=1 skips completed dispatches, ?summary=1 leaves out plan_text,
+    # ?limit=N[&cursor=<last id>] paginates and returns {"items", "next_cursor"}
+    try:
+        limit = min(int(request.args.get("limit", 0)), 200)
+    except ValueError:
+        return jsonify({"error": "invalid limit"}), 400
+    dispatches = get_dispatches_by_team(
+        team_id,
+        active_only=request.args.get("active") == "1",
+        summary=request.args.get("summary") == "1",
+        limit=limit or None,
+        cursor=request.args.get("cursor"),
+    )
     return jsonify(dispatches)
 
+@team_bp.route("/team/dispatches/<dispatch_id>/view", methods=["GET"])
+def team_dispatch_view(dispatch_id):
+    """Dispatch with its incidents' live status / report fields embedded (one batched read)."""
+    team_id = require_team_auth(request)
+    if not team_id:
+        return jsonify({"error":"unauthorized"}), 401
+
+    view = get_dispatch_view(dispatch_id)
+    if view is None:
+        return jsonify({"error":"not found"}), 404
+    if view.get("team_id") != team_id:
+        return jsonify({"error":"forbidden"}), 403
+    if view["all_closed"] and view.get("status") == "assigned":
+        try:
+            mark_dispatch_completed(dispatch_id)
+            view["status"] = "completed"
+        except Exception:
+            pass
+    return jsonify(view)
+
 @team_bp.route("/team/dispatches/<dispatch_id>", methods=["GET"])
 def team_dispatch_detail(dispatch_id):
     team_id = require_team_auth(request)
     if not team_id:
         return jsonify({"error":"unauthorized"}), 401
 
-    db = get_db()
-    doc = db.collection("dispatches").document(dispatch_id).get()
-    if not doc.exists:
+    d = get_dispatch(dispatch_id)
+    if d is None:
         return jsonify({"error":"not found"}), 404
-    d = doc.to_dict() or {}
     # ensure this dispatch belongs to the team
     if d.get("team_id") != team_id:
         return jsonify({"error":"forbidden"}), 403
-    d["_id"] = doc.id
     return jsonify(d)
 
 @team_bp.route("/team/update-incident-status", methods=["POST"])
@@ -79,11 +118,9 @@ def team_update_incident_status():
         return jsonify({"error":"dispatch_id, incident_id and new_status required"}), 400
 
     # verify dispatch exists and belongs to team
-    db = get_db()
-    doc = db.collection("dispatches").document(dispatch_id).get()
-    if not doc.exists:
+    dd = get_dispatch(dispatch_id)
+    if dd is None:
         return jsonify({"error":"dispatch not found"}), 404
-    dd = doc.to_dict() or {}
     if dd.get("team_id") != team_id:
         return jsonify({"error":"forbidden"}), 403
 
@@ -91,6 +128,7 @@ def team_update_incident_status():
     try:
         # use update_incident_status which sets dispatched_at for rescue_dispatched
         update_incident_status(incident_id, new_status)
+        get_rebalancer().notify("incident_status", incident_id, new_status)
         return jsonify({"ok": True})
     except Exception as e:
         return jsonify({"error": str(e)}), 500
@@ -122,13 +160,9 @@ def team_update_location():
         except Exception:
             return jsonify({"error": "invalid lat/lng"}), 400
 
-        db = get_db()
         # update the team doc with base location and timestamp
-        db.collection("teams").document(team_id).update({
-            "base_lat": lat,
-            "base_lng": lng,
-            "updated_at": datetime.utcnow().isoformat()
-        })
+        update_team_location(team_id, lat, lng)
+        get_rebalancer().notify("team_moved", team_id, lat, lng)
         return jsonify({"ok": True, "team_id": team_id, "base_lat": lat, "base_lng": lng})
     except Exception as e:
         return jsonify({"error": str(e)}), 500
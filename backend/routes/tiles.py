@@ -0,0 +1,19 @@
+# backend/routes/tiles.py
+
+from flask import Blueprint, jsonify
+from services.firestore_service import get_tile
+
+tiles_bp = Blueprint("tiles", __name__)
+
+MAX_ZOOM = 22
+
+@tiles_bp.route("/tiles/<int:z>/<int:x>/<int:y>", methods=["GET"])
+def tile(z, x, y):
+    """
+    Incidents in one XYZ map tile: {"mode": "aggregate", "cells": [...]} with counts by
+    severity / status per cell when zoomed out, {"mode": "points", "points": [...]} when
+    zoomed in. Dashboards fetch only the tiles covering their viewport.
+    """
+    if z > MAX_ZOOM or x >= (1 << z) or y >= (1 << z):
+        return jsonify({"error": "invalid tile"}), 400
+    return jsonify(get_tile(z, x, y))
@@ -3,9 +3,8 @@
 from flask import Blueprint, request, jsonify
 import os
 import math
-
-# Use the official google cloud library for Translate v3
-from google.cloud import translate_v3 as translate
+from services.registry import register
+from services.metrics import timed
 
 translate_bp = Blueprint("translate", __name__)
 
@@ -15,8 +14,12 @@ LOCATION = os.environ.get("GOOGLE_TRANSLATE_LOCATION", "global")
 
 def make_client():
     # Requires GOOGLE_APPLICATION_CREDENTIALS env var pointing to service account JSON
+    # Use the official google cloud library for Translate v3 (imported lazily; heavy)
+    from google.cloud import translate_v3 as translate
     return translate.TranslationServiceClient()
 
+TRANSLATE_CLIENT = register("translate", make_client)
+
 @translate_bp.route("/translate/batch", methods=["POST"])
 def translate_batch():
     """
@@ -37,7 +40,7 @@ def translate_batch():
         if not PROJECT_ID:
             return jsonify({"error":"Server not configured with project ID (set GOOGLE_CLOUD_PROJECT)"}), 500
 
-        client = make_client()
+        client = TRANSLATE_CLIENT.get()
         parent = f"projects/{PROJECT_ID}/locations/{LOCATION}"
 
         MAX_CHARS = 20000
@@ -64,7 +67,8 @@ def translate_batch():
                 "mime_type": "text/plain",
                 "target_language_code": target
             }
-            resp = client.translate_text(request=request_obj)
+            with timed("translate.translate_text"):
+                resp = client.translate_text(request=request_obj)
             for tr in resp.translations:
                 all_translations.append(tr.translated_text)
         return jsonify({"translations": all_translations, "warnings": warnings}), 200
@@ -0,0 +1,276 @@
+# backend/services/admission.py
+
+"""
+Admission control and load shedding for POST /api/submit-report.
+
+Every submission passes admit() before any expensive work:
+
+1. Token buckets per client IP and per reporter phone (ADMISSION_IP_* / ADMISSION_PHONE_*);
+   an empty bucket gets 429 with Retry-After.
+2. A keyword priority (severity heuristics on the description: people counts, children,
+   water / fire / collapse, injuries; no ML, no LLM) decides who goes first.
+3. Route by load:
+   - "full": the normal pipeline (image upload, triage queue, analysis). At most
+     ADMISSION_MAX_FULL requests run it at once, and only in normal mode.
+   - "degraded": the report is stored with keyword analysis only, its image is kept on
+     local disk instead of being uploaded, and the upload + LLM analysis are deferred
+     to a background worker that runs once load is back to normal. Used in degraded
+     mode and when every full slot is busy, as long as the deferred queue has room
+     (ADMISSION_DEFERRED_MAX; beyond it reports are shed). The pending enrichment is
+     also recorded on the stored document, so a restart loses nothing: a periodic sweep
+     (routes.reports.start_enrichment_sweeper) queues it again.
+   - "shed": 503 with Retry-After. Once ADMISSION_MAX_INFLIGHT requests are in flight
+     (half of that for low-priority reports in degraded mode), new reports are shed,
+     lowest priority first: reports at or above ADMISSION_HIGH_PRIORITY can still use
+     ADMISSION_PRIORITY_RESERVE extra slots.
+
+Degraded mode starts when the p95 latency of full-pipeline submissions over the last
+ADMISSION_WINDOW_SECONDS exceeds ADMISSION_SLO_MS, and lasts at least
+ADMISSION_MIN_DEGRADED_SECONDS. stats() (on /healthz) and /metrics report the mode,
+in-flight counts and the deferred enrichment queue.
+"""
+
+import os
+import time
+import heapq
+import logging
+import threading
+import itertools
+from collections import deque
+
+from cachetools import TTLCache
+
+from services import metrics
+from services.gemini_service import heuristic_adjust_severity, _fallback_parsed, local_incident_type, SEV_LABEL_TO_NUM
+
+ADMISSION_ENABLED = os.getenv("ADMISSION_ENABLED", "1") == "1"
+ADMISSION_MAX_INFLIGHT = int(os.getenv("ADMISSION_MAX_INFLIGHT", "64"))
+ADMISSION_MAX_FULL = int(os.getenv("ADMISSION_MAX_FULL", str(2 * int(os.getenv("TRIAGE_WORKERS", "8")))))
+ADMISSION_PRIORITY_RESERVE = int(os.getenv("ADMISSION_PRIORITY_RESERVE", "16"))
+ADMISSION_HIGH_PRIORITY = float(os.getenv("ADMISSION_HIGH_PRIORITY", "3.5"))
+ADMISSION_LOW_PRIORITY = float(os.getenv("ADMISSION_LOW_PRIORITY", "2.5"))
+ADMISSION_SLO_MS = float(os.getenv("ADMISSION_SLO_MS", "2000"))
+ADMISSION_WINDOW_SECONDS = float(os.getenv("ADMISSION_WINDOW_SECONDS", "10"))
+ADMISSION_MIN_DEGRADED_SECONDS = float(os.getenv("ADMISSION_MIN_DEGRADED_SECONDS", "5"))
+ADMISSION_IP_RATE_PER_MINUTE = float(os.getenv("ADMISSION_IP_RATE_PER_MINUTE", "60"))
+ADMISSION_IP_BURST = float(os.getenv("ADMISSION_IP_BURST", "30"))
+ADMISSION_PHONE_RATE_PER_MINUTE = float(os.getenv("ADMISSION_PHONE_RATE_PER_MINUTE", "6"))
+ADMISSION_PHONE_BURST = float(os.getenv("ADMISSION_PHONE_BURST", "5"))
+ADMISSION_DEFERRED_MAX = int(os.getenv("ADMISSION_DEFERRED_MAX", "10000"))
+ADMISSION_RETRY_AFTER_SECONDS = int(os.getenv("ADMISSION_RETRY_AFTER_SECONDS", "5"))
+
+MODE_NORMAL = "normal"
+MODE_DEGRADED = "degraded"
+ROUTE_FULL = "full"
+ROUTE_DEGRADED = "degraded"
+ROUTE_SHED = "shed"
+ROUTE_RATE_LIMITED = "rate_limited"
+
+DECISIONS = metrics.counter("crisismap_admission_decisions_total", "submit-report admission decisions", ("decision",))
+INFLIGHT = metrics.gauge("crisismap_admission_inflight", "submit-report requests in flight", ("route",))
+DEGRADED = metrics.gauge("crisismap_admission_degraded", "1 while submit-report runs in degraded mode")
+DEFERRED_DEPTH = metrics.gauge("crisismap_admission_deferred_depth", "Degraded reports waiting for enrichment")
+DEFERRED = metrics.counter("crisismap_admission_deferred_total", "Deferred enrichment jobs", ("outcome",))
+
+
+def keyword_priority(description):
+    """(severity label, priority ~1..5) from the keyword heuristics alone."""
+    adjusted = heuristic_adjust_severity(_fallback_parsed(""), description or "")
+    sev = adjusted["severity"]
+    return sev, SEV_LABEL_TO_NUM.get(sev, 2) + float(adjusted.get("urgency_score") or 0.5)
+
+
+def keyword_analysis(raw_report, severity):
+    """Analysis stored for a degraded-mode report until its enrichment runs."""
+    description = raw_report.get("description") or ""
+    itype = local_incident_type(description)
+    parsed = heuristic_adjust_severity(_fallback_parsed(" ".join(description.split())[:160]), description)
+    parsed.update({"incident_type": itype, "severity": severity, "analysis_tier": "deferred", "enrichment_pending": True})
+    return parsed
+
+
+class TokenBuckets:
+    """Token bucket per key (rate per minute, burst capacity), idle keys expire."""
+
+    def __init__(self, rate_per_minute, burst, maxsize=100000):
+        self.rate = rate_per_minute / 60.0
+        self.burst = burst
+        self._buckets = TTLCache(maxsize=maxsize, ttl=max(60.0, burst / self.rate if self.rate else 60.0))
+        self._lock = threading.Lock()
+
+    def take(self, key, now=None):
+        """0.0 if a token was taken, else seconds until one is available."""
+        if not key or self.rate <= 0:
+            return 0.0
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            tokens, last = self._buckets.get(key, (self.burst, now))
+            tokens = min(self.burst, tokens + (now - last) * self.rate)
+            if tokens >= 1.0:
+                self._buckets[key] = (tokens - 1.0, now)
+                return 0.0
+            self._buckets[key] = (tokens, now)
+            return (1.0 - tokens) / self.rate
+
+
+class Ticket:
+    def __init__(self, route, severity, priority, retry_after=None, reason=None):
+        self.route = route
+        self.severity = severity
+        self.priority = priority
+        self.retry_after = retry_after
+        self.reason = reason
+        self.started = time.monotonic()
+
+
+class AdmissionController:
+    def __init__(self):
+        self.ip_buckets = TokenBuckets(ADMISSION_IP_RATE_PER_MINUTE, ADMISSION_IP_BURST)
+        self.phone_buckets = TokenBuckets(ADMISSION_PHONE_RATE_PER_MINUTE, ADMISSION_PHONE_BURST)
+        self._lock = threading.Lock()
+        self._inflight = {ROUTE_FULL: 0, ROUTE_DEGRADED: 0}
+        self._latencies = deque()  # (finished_at, seconds) of full-pipeline requests
+        self._degraded_until = 0.0
+        self._deferred = []
+        self._deferred_keys = set()  # keys of queued or running deferred jobs
+        self._seq = itertools.count()
+        self._deferred_cond = threading.Condition()
+        self._worker = None
+
+    # ---- mode ----
+    def _window_p95(self, now):
+        while self._latencies and self._latencies[0][0] < now - ADMISSION_WINDOW_SECONDS:
+            self._latencies.popleft()
+        if not self._latencies:
+            return None
+        s = sorted(x for _, x in self._latencies)
+        return s[min(len(s) - 1, int(0.95 * len(s)))]
+
+    def _mode(self, now):
+        p95 = self._window_p95(now)
+        if p95 is not None and p95 * 1000 > ADMISSION_SLO_MS and now >= self._degraded_until:
+            self._degraded_until = now + ADMISSION_MIN_DEGRADED_SECONDS
+            # start the next normal period from fresh measurements
+            self._latencies.clear()
+            logging.warning("submit-report degraded: p95 %.0f ms > SLO %.0f ms", p95 * 1000, ADMISSION_SLO_MS)
+        mode = MODE_DEGRADED if now < self._degraded_until else MODE_NORMAL
+        DEGRADED.set(1 if mode == MODE_DEGRADED else 0)
+        return mode
+
+    def mode(self):
+        with self._lock:
+            return self._mode(time.monotonic())
+
+    # ---- admission ----
+    def admit(self, ip, phone, description):
+        """Ticket with route full / degraded / shed / rate_limited; release() it when done."""
+        sev, priority = keyword_priority(description)
+        wait = max(self.ip_buckets.take(f"ip:{ip}" if ip else None),
+                   self.phone_buckets.take("phone:" + "".join(c for c in phone or "" if c.isdigit())[-10:] if phone else None))
+        if wait > 0:
+            DECISIONS.inc(decision=ROUTE_RATE_LIMITED)
+            return Ticket(ROUTE_RATE_LIMITED, sev, priority, retry_after=max(1, int(wait + 0.999)), reason="rate limit")
+        with self._lock:
+            now = time.monotonic()
+            mode = self._mode(now)
+            inflight = sum(self._inflight.values())
+            limit = ADMISSION_MAX_INFLIGHT
+            if priority >= ADMISSION_HIGH_PRIORITY:
+                limit += ADMISSION_PRIORITY_RESERVE
+            elif mode == MODE_DEGRADED and priority < ADMISSION_LOW_PRIORITY:
+                limit = ADMISSION_MAX_INFLIGHT // 2
+            if inflight >= limit:
+                route = ROUTE_SHED
+            elif mode == MODE_NORMAL and self._inflight[ROUTE_FULL] < ADMISSION_MAX_FULL:
+                route = ROUTE_FULL
+            elif len(self._deferred) >= ADMISSION_DEFERRED_MAX:
+                # nowhere to queue the enrichment of a degraded report
+                route = ROUTE_SHED
+            else:
+                route = ROUTE_DEGRADED
+            if route != ROUTE_SHED:
+                self._inflight[route] += 1
+                INFLIGHT.set(self._inflight[route], route=route)
+        DECISIONS.inc(decision=route)
+        if route == ROUTE_SHED:
+            return Ticket(route, sev, priority, retry_after=ADMISSION_RETRY_AFTER_SECONDS, reason="overloaded")
+        return Ticket(route, sev, priority)
+
+    def release(self, ticket):
+        if ticket.route not in self._inflight:
+            return
+        now = time.monotonic()
+        with self._lock:
+            self._inflight[ticket.route] -= 1
+            INFLIGHT.set(self._inflight[ticket.route], route=ticket.route)
+            if ticket.route == ROUTE_FULL:
+                self._latencies.append((now, now - ticket.started))
+
+    # ---- deferred enrichment ----
+    def defer(self, priority, fn, job, key=None):
+        """
+        Queue fn(job) for when load allows (most urgent first); False if the queue is full.
+        A job whose key is already queued or running is not queued twice (returns True).
+        """
+        with self._deferred_cond:
+            if key is not None and key in self._deferred_keys:
+                return True
+            if len(self._deferred) >= ADMISSION_DEFERRED_MAX:
+                DEFERRED.inc(outcome="dropped")
+                return False
+            if key is not None:
+                self._deferred_keys.add(key)
+            heapq.heappush(self._deferred, (-priority, next(self._seq), fn, job, key))
+            DEFERRED_DEPTH.set(len(self._deferred))
+            self._deferred_cond.notify()
+            if self._worker is None:
+                self._worker = threading.Thread(target=self._enrich_loop, name="admission-enrich", daemon=True)
+                self._worker.start()
+        return True
+
+    def _enrich_loop(self):
+        while True:
+            with self._deferred_cond:
+                while not self._deferred:
+                    self._deferred_cond.wait()
+            # only catch up while the full pipeline has headroom
+            if self.mode() != MODE_NORMAL or self._inflight[ROUTE_FULL] >= ADMISSION_MAX_FULL // 2:
+                time.sleep(0.5)
+                continue
+            with self._deferred_cond:
+                _, _, fn, job, key = heapq.heappop(self._deferred)
+                DEFERRED_DEPTH.set(len(self._deferred))
+            try:
+                fn(job)
+                DEFERRED.inc(outcome="ok")
+            except Exception:
+                logging.exception("Deferred enrichment failed for %s", job.get("doc_id"))
+                DEFERRED.inc(outcome="error")
+            finally:
+                with self._deferred_cond:
+                    self._deferred_keys.discard(key)
+
+    def stats(self):
+        with self._lock:
+            now = time.monotonic()
+            mode = self._mode(now)
+            p95 = self._window_p95(now)
+            inflight = dict(self._inflight)
+        with self._deferred_cond:
+            deferred = len(self._deferred)
+        return {"enabled": ADMISSION_ENABLED, "mode": mode, "inflight": inflight,
+                "max_inflight": ADMISSION_MAX_INFLIGHT, "max_full": ADMISSION_MAX_FULL,
+                "full_p95_ms": round(p95 * 1000, 1) if p95 is not None else None, "slo_ms": ADMISSION_SLO_MS,
+                "deferred_depth": deferred,
+                "decisions": {k[0]: v for k, v in DECISIONS.values.items()}}
+
+
+_CONTROLLER = None
+_CONTROLLER_LOCK = threading.Lock()
+
+def get_admission():
+    global _CONTROLLER
+    with _CONTROLLER_LOCK:
+        if _CONTROLLER is None:
+            _CONTROLLER = AdmissionController()
+        return _CONTROLLER
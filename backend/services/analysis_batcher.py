@@ -0,0 +1,142 @@
+# backend/services/analysis_batcher.py
+
+"""
+Queue-based ingestion worker for incident analysis.
+
+Requests enqueue their raw report and wait on a Future. A collector thread takes up
+to ANALYSIS_BATCH_SIZE queued reports (or whatever arrived within ANALYSIS_BATCH_WAIT_MS
+of the first one) and sends them to Gemini as ONE prompt via analyze_incidents_batch(),
+so a burst of N reports costs ~1 LLM call instead of N. When traffic is light a batch
+of one is sent right after the wait window, so the added latency is bounded by it.
+
+If the caller's deadline passes before its batch returns, it gets the local
+ML + heuristic analysis instead (the batch result is then discarded).
+
+refine_in_background() is the asynchronous escalation path of the tiered analyzer:
+the incident is saved with its local analysis and the LLM answer replaces it later.
+"""
+
+import os
+import time
+import uuid
+import queue
+import logging
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeout
+
+from services import metrics
+from services.gemini_service import analyze_incident, analyze_incidents_batch, analyze_incident_local
+from services.firestore_service import update_incident_analysis
+
+ANALYSIS_BATCH_SIZE = int(os.getenv("ANALYSIS_BATCH_SIZE", "1"))
+ANALYSIS_BATCH_WAIT_MS = float(os.getenv("ANALYSIS_BATCH_WAIT_MS", "250"))
+ANALYSIS_BATCH_WORKERS = int(os.getenv("ANALYSIS_BATCH_WORKERS", "4"))
+ANALYSIS_BATCH_DEADLINE_SECONDS = float(os.getenv("ANALYSIS_BATCH_DEADLINE_SECONDS", "25"))
+ANALYSIS_REFINE_WORKERS = int(os.getenv("ANALYSIS_REFINE_WORKERS", "4"))
+
+BATCH_SIZE_HIST = metrics.histogram(
+    "crisismap_analysis_batch_size", "Reports per batched analysis prompt",
+    buckets=(1, 2, 4, 8, 16, 32, 64))
+QUEUE_GAUGE = metrics.gauge("crisismap_analysis_queue_depth", "Reports waiting for batched analysis")
+TIMEOUTS = metrics.counter("crisismap_analysis_batch_timeouts_total", "Callers that gave up on their batch and used local analysis")
+
+
+class AnalysisBatcher:
+    def __init__(self, analyze_batch=analyze_incidents_batch, max_batch=ANALYSIS_BATCH_SIZE,
+                 max_wait_ms=ANALYSIS_BATCH_WAIT_MS, workers=ANALYSIS_BATCH_WORKERS):
+        self.analyze_batch = analyze_batch
+        self.max_batch = max(1, int(max_batch))
+        self.max_wait = max_wait_ms / 1000.0
+        self._queue = queue.Queue()
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="analysis-batch")
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def _ensure_started(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._collect, name="analysis-collector", daemon=True)
+                self._thread.start()
+
+    def submit(self, raw_report, report_id=None):
+        """Queue one report; returns a Future resolving to its analysis dict."""
+        self._ensure_started()
+        fut = Future()
+        self._queue.put((str(report_id or uuid.uuid4().hex), raw_report, fut))
+        QUEUE_GAUGE.set(self._queue.qsize())
+        return fut
+
+    def analyze(self, raw_report, timeout=ANALYSIS_BATCH_DEADLINE_SECONDS):
+        """Blocking helper for request handlers; falls back to local analysis at the deadline."""
+        fut = self.submit(raw_report)
+        try:
+            return fut.result(timeout=timeout)
+        except FutureTimeout:
+            TIMEOUTS.inc()
+            fut.cancel()
+            return analyze_incident_local(raw_report)
+
+    def _collect(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.max_wait
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            QUEUE_GAUGE.set(self._queue.qsize())
+            batch = [item for item in batch if item[2].set_running_or_notify_cancel()]
+            if batch:
+                BATCH_SIZE_HIST.observe(len(batch))
+                self._pool.submit(self._run, batch)
+
+    def _run(self, batch):
+        try:
+            results = self.analyze_batch([(rid, report) for rid, report, _ in batch])
+        except Exception as e:
+            logging.exception("Batched analysis failed")
+            for _, _, fut in batch:
+                fut.set_exception(e)
+            return
+        for rid, report, fut in batch:
+            if rid in results:
+                fut.set_result(results[rid])
+            else:
+                fut.set_result(analyze_incident_local(report))
+
+
+_BATCHER = None
+_BATCHER_LOCK = threading.Lock()
+
+def get_batcher():
+    """Process-wide batcher, or None when batching is disabled (ANALYSIS_BATCH_SIZE <= 1)."""
+    global _BATCHER
+    if ANALYSIS_BATCH_SIZE <= 1:
+        return None
+    with _BATCHER_LOCK:
+        if _BATCHER is None:
+            _BATCHER = AnalysisBatcher()
+        return _BATCHER
+
+
+_REFINE_POOL = ThreadPoolExecutor(max_workers=ANALYSIS_REFINE_WORKERS, thread_name_prefix="analysis-refine")
+REFINED = metrics.counter("crisismap_analysis_refined_total", "Background LLM refinements of locally analysed incidents", ("outcome",))
+
+def _refine(doc_id, raw_report):
+    try:
+        batcher = get_batcher()
+        analysis = batcher.analyze(raw_report) if batcher else analyze_incident(raw_report)
+        analysis["analysis_tier"] = "llm_async"
+        update_incident_analysis(doc_id, analysis)
+        REFINED.inc(outcome="ok")
+    except Exception:
+        logging.exception("Background analysis refinement failed for %s", doc_id)
+        REFINED.inc(outcome="error")
+
+def refine_in_background(doc_id, raw_report):
+    """Run the LLM analysis for an already-saved incident and store it when done."""
+    return _REFINE_POOL.submit(_refine, doc_id, raw_report)
@@ -0,0 +1,338 @@
+# backend/services/archive_service.py
+
+"""
+Hot/cold tiering for processed_incidents and dispatches.
+
+run_archive() moves incidents that have been closed for more than ARCHIVE_AFTER_DAYS
+out of Firestore into local Parquet files, together with every dispatch none of whose
+incidents is still in the hot collection (and completed dispatches older than the
+cutoff). Files are partitioned by month of the incident timestamp / dispatch
+created_at:
+
+    ARCHIVE_DIR/incidents/year=2025/month=07/part-<run>.parquet
+    ARCHIVE_DIR/dispatches/year=2025/month=07/part-<run>.parquet
+
+Files are written (tmp + rename) before the Firestore deletes, so a crash in between
+leaves a record in both tiers, never in neither; readers drop duplicate ids. The
+deletes take the incidents out of the map tile counters in the same batches; the
+hourly analytics rollups keep them (rebuild_rollups() reads the archive too).
+
+search_archive(), search_archived_dispatches() and archive_stats() query the archive
+with month-partition pruning; partitions are cached in memory by file mtime.
+"""
+
+import os
+import glob
+import json
+import time
+import uuid
+import logging
+import threading
+from datetime import datetime, timedelta
+from functools import lru_cache
+
+from config import ARCHIVE_DIR
+from services import rollups
+from services.firestore_service import get_db, incident_deltas, merge_deltas, apply_incident_deltas, counter_chunks
+from services.metrics import instrumented
+
+ARCHIVE_AFTER_DAYS = float(os.getenv("ARCHIVE_AFTER_DAYS", "30"))
+# background archiver period; 0 (default) = only on demand via POST /api/archive/run
+ARCHIVE_INTERVAL_SECONDS = float(os.getenv("ARCHIVE_INTERVAL_SECONDS", "0"))
+
+INCIDENTS = "incidents"
+DISPATCHES = "dispatches"
+_TIME_COLUMN = {INCIDENTS: "timestamp", DISPATCHES: "created_at"}
+_INCIDENT_FIELDS = ["status", "location", "description", "lat", "lng", "reporter_name", "reporter_phone",
+                    "assigned_team", "dispatch_id", "image_url", "quadkey"]
+_DATE_FIELDS = {INCIDENTS: ["timestamp", "dispatched_at", "closed_at", "status_updated_at"],
+                DISPATCHES: ["created_at", "committed_at", "completed_at", "archived_at"]}
+
+_LOCK = threading.Lock()
+
+
+def _json_default(v):
+    return v.isoformat() if hasattr(v, "isoformat") else str(v)
+
+
+def _closed_at(data):
+    return rollups.as_utc(data.get("closed_at")) or rollups.as_utc(data.get("status_updated_at")) \
+        or rollups.as_utc(data.get("timestamp"))
+
+
+def _incident_row(doc_id, data, now):
+    analysis = data.get("analysis") or {}
+    row = {"id": doc_id, **{f: data.get(f) for f in _INCIDENT_FIELDS},
+           "severity": analysis.get("severity") or data.get("severity"),
+           "incident_type": analysis.get("incident_type"), "summary": analysis.get("summary"),
+           "archived_at": now, "doc": json.dumps(data, default=_json_default)}
+    for f in _DATE_FIELDS[INCIDENTS]:
+        row[f] = rollups.as_utc(data.get(f))
+    return row
+
+
+def _dispatch_row(doc_id, data, now):
+    ids = [i.get("_id") for i in data.get("incidents") or [] if i.get("_id")]
+    row = {"id": doc_id, "team_id": data.get("team_id"), "created_by": data.get("created_by"),
+           "status": data.get("status"), "commit_state": data.get("commit_state"),
+           "plan_preview": data.get("plan_preview"), "incident_ids": json.dumps(ids), "incident_count": len(ids),
+           "doc": json.dumps(data, default=_json_default)}
+    for f in _DATE_FIELDS[DISPATCHES]:
+        row[f] = rollups.as_utc(data.get(f))
+    row["archived_at"] = now
+    return row
+
+
+def _write_partitions(kind, rows, run_id):
+    """Write rows as one Parquet file per month partition; returns the file paths."""
+    import pandas as pd
+    by_month = {}
+    for row in rows:
+        t = row.get(_TIME_COLUMN[kind]) or row["archived_at"]
+        by_month.setdefault((t.year, t.month), []).append(row)
+    paths = []
+    for (year, month), part in sorted(by_month.items()):
+        folder = os.path.join(ARCHIVE_DIR, kind, f"year={year}", f"month={month:02d}")
+        os.makedirs(folder, exist_ok=True)
+        df = pd.DataFrame(part)
+        for f in _DATE_FIELDS[kind] + ["archived_at"]:
+            if f in df:
+                df[f] = pd.to_datetime(df[f], errors="coerce")
+        path = os.path.join(folder, f"part-{run_id}.parquet")
+        df.to_parquet(path + ".tmp", index=False)
+        os.replace(path + ".tmp", path)
+        paths.append(path)
+    return paths
+
+
+def _select_dispatches(db, archived, cutoff):
+    """Dispatch docs to archive: none of their incidents left in the hot collection."""
+    col = db.collection("dispatches")
+    candidates = {d.get("dispatch_id") for d in archived.values() if d.get("dispatch_id")}
+    for snap in col.where("status", "==", "completed").stream():
+        created = rollups.as_utc((snap.to_dict() or {}).get("created_at"))
+        if created is not None and created < cutoff:
+            candidates.add(snap.id)
+    selected = {}
+    incidents = db.collection("processed_incidents")
+    ids = sorted(candidates)
+    for i in range(0, len(ids), 100):
+        for snap in db.get_all([col.document(d) for d in ids[i:i + 100]]):
+            if not snap.exists:
+                continue
+            data = snap.to_dict() or {}
+            hot = [e["_id"] for e in data.get("incidents") or [] if e.get("_id") and e["_id"] not in archived]
+            still_hot = False
+            for j in range(0, len(hot), 100):
+                if any(s.exists for s in db.get_all([incidents.document(x) for x in hot[j:j + 100]], field_paths=["status"])):
+                    still_hot = True
+                    break
+            if not still_hot:
+                selected[snap.id] = data
+    return selected
+
+
+@instrumented("archive.run")
+def run_archive(older_than_days=None, dry_run=False, limit=None):
+    """
+    Move incidents closed more than older_than_days ago (and their finished dispatches) to
+    the Parquet archive. Returns {"incidents", "dispatches", "files", "cutoff", "dry_run"}.
+    """
+    days = ARCHIVE_AFTER_DAYS if older_than_days is None else float(older_than_days)
+    now = datetime.utcnow()
+    cutoff = now - timedelta(days=days)
+    db = get_db()
+    with _LOCK:
+        archived = {}
+        for snap in db.collection("processed_incidents").where("status", "==", "closed").stream():
+            data = snap.to_dict() or {}
+            closed = _closed_at(data)
+            if closed is not None and closed < cutoff:
+                archived[snap.id] = data
+                if limit and len(archived) >= limit:
+                    break
+        dispatches = _select_dispatches(db, archived, cutoff)
+        result = {"incidents": len(archived), "dispatches": len(dispatches), "files": [],
+                  "cutoff": cutoff.isoformat(), "dry_run": bool(dry_run)}
+        if dry_run or not (archived or dispatches):
+            return result
+
+        run_id = f"{now.strftime('%Y%m%dT%H%M%S')}-{uuid.uuid4().hex[:6]}"
+        if archived:
+            result["files"] += _write_partitions(INCIDENTS, [_incident_row(i, d, now) for i, d in archived.items()], run_id)
+        if dispatches:
+            result["files"] += _write_partitions(DISPATCHES, [_dispatch_row(i, d, now) for i, d in dispatches.items()], run_id)
+
+        # analytics rollups keep archived incidents; every other counter drops them
+        def deltas_of(i):
+            return {k: v for k, v in incident_deltas(archived[i], {}).items() if k[0] != rollups.ROLLUPS_COLLECTION}
+
+        col = db.collection("processed_incidents")
+        for chunk in counter_chunks(list(archived), deltas_of, 400):
+            batch = db.batch()
+            total = {}
+            for i in chunk:
+                batch.delete(col.document(i))
+                merge_deltas(total, deltas_of(i))
+            apply_incident_deltas(batch, total)
+            batch.commit()
+        ids = list(dispatches)
+        for i in range(0, len(ids), 400):
+            batch = db.batch()
+            for d in ids[i:i + 400]:
+                batch.delete(db.collection("dispatches").document(d))
+            batch.commit()
+    logging.info("Archived %d incidents and %d dispatches (closed before %s)", len(archived), len(dispatches), cutoff)
+    return result
+
+
+# ---------------------------
+# Archive queries
+# ---------------------------
+
+@lru_cache(maxsize=128)
+def _read_file(path, mtime):
+    import pandas as pd
+    return pd.read_parquet(path)
+
+
+def _partition_files(kind, start=None, end=None):
+    files = []
+    for path in glob.glob(os.path.join(ARCHIVE_DIR, kind, "year=*", "month=*", "*.parquet")):
+        parts = path.split(os.sep)
+        year, month = int(parts[-3][5:]), int(parts[-2][6:])
+        if start is not None and (year, month) < (start.year, start.month):
+            continue
+        if end is not None and (year, month) > (end.year, end.month):
+            continue
+        files.append(path)
+    return sorted(files)
+
+
+def load_archive(kind, start=None, end=None):
+    """DataFrame of archived records of `kind` with their time column in [start, end]."""
+    import pandas as pd
+    frames = [_read_file(p, os.path.getmtime(p)) for p in _partition_files(kind, start, end)]
+    if not frames:
+        return pd.DataFrame()
+    df = pd.concat(frames, ignore_index=True).drop_duplicates("id", keep="last")
+    col = df[_TIME_COLUMN[kind]]
+    if start is not None:
+        df = df[col >= start]
+        col = df[_TIME_COLUMN[kind]]
+    if end is not None:
+        df = df[col <= end]
+    return df
+
+
+def _records(df, full):
+    import pandas as pd
+    out = []
+    for row in df.to_dict("records"):
+        doc = row.pop("doc", None)
+        item = json.loads(doc) if full and doc else {}
+        for k, v in row.items():
+            if v is None or (not isinstance(v, (list, dict, str)) and pd.isna(v)):
+                v = None
+            elif hasattr(v, "isoformat"):
+                v = v.isoformat()
+            elif hasattr(v, "item"):
+                v = v.item()
+            item.setdefault(k, v)
+        item["_id"] = item.pop("id")
+        out.append(item)
+    return out
+
+
+@instrumented("archive.search")
+def search_archive(q=None, start=None, end=None, status=None, team_id=None, incident_type=None, severity=None,
+                   limit=100, offset=0, full=False):
+    """Archived incidents matching the filters, newest first: {"items", "total"}."""
+    df = load_archive(INCIDENTS, start, end)
+    if df.empty:
+        return {"items": [], "total": 0}
+    for col, val in (("status", status), ("assigned_team", team_id), ("incident_type", incident_type), ("severity", severity)):
+        if val:
+            df = df[df[col] == val]
+    if q:
+        text = df["location"].fillna("") + " " + df["description"].fillna("") + " " + df["summary"].fillna("")
+        df = df[text.str.contains(q, case=False, regex=False)]
+    df = df.sort_values("timestamp", ascending=False)
+    return {"items": _records(df.iloc[offset:offset + limit], full), "total": int(len(df))}
+
+
+@instrumented("archive.search_dispatches")
+def search_archived_dispatches(team_id=None, start=None, end=None, limit=100, offset=0, full=False):
+    df = load_archive(DISPATCHES, start, end)
+    if df.empty:
+        return {"items": [], "total": 0}
+    if team_id:
+        df = df[df["team_id"] == team_id]
+    df = df.sort_values("created_at", ascending=False)
+    items = _records(df.iloc[offset:offset + limit], full)
+    for item in items:
+        item["incident_ids"] = json.loads(item.get("incident_ids") or "[]")
+    return {"items": items, "total": int(len(df))}
+
+
+@instrumented("archive.stats")
+def archive_stats(start=None, end=None, bucket="day"):
+    """Counts by type / severity / status per bucket and exact duration quantiles over the archive."""
+    df = load_archive(INCIDENTS, start, end)
+    out = {"bucket": bucket, "series": [], "totals": {"count": int(len(df))}}
+    if df.empty:
+        return out
+    freq = "h" if bucket == "hour" else "D"
+    keys = df["timestamp"].dt.floor(freq)
+    for name, col in (("incident_type", "incident_type"), ("severity", "severity"), ("status", "status")):
+        out["totals"][name] = {str(k): int(v) for k, v in df[col].fillna("unknown").value_counts().items()}
+    out["series"] = [{"bucket": k.isoformat(), "count": int(v)} for k, v in keys.value_counts().sort_index().items()]
+    for name, end_col in (("time_to_dispatch", "dispatched_at"), ("time_to_close", "closed_at")):
+        secs = ((df[end_col] - df["timestamp"]).dt.total_seconds()).dropna().clip(lower=0)
+        stats = {"count": int(len(secs)), "mean_seconds": round(float(secs.mean()), 1) if len(secs) else None}
+        for q in rollups.QUANTILES:
+            if len(secs):
+                stats[f"p{int(q * 100)}"] = round(float(secs.quantile(q, interpolation="lower")), 1)
+        out[name] = stats
+    return out
+
+
+def archived_incident_docs():
+    """Archived incidents as minimal incident dicts (for rebuild_rollups())."""
+    df = load_archive(INCIDENTS)
+    if df.empty:
+        return []
+    cols = ["id", "timestamp", "status", "severity", "incident_type", "dispatched_at", "closed_at", "status_updated_at"]
+    docs = _records(df[[c for c in cols if c in df]], False)
+    for d in docs:
+        d["analysis"] = {"severity": d.pop("severity", None), "incident_type": d.pop("incident_type", None)}
+    return docs
+
+
+def archive_info():
+    info = {}
+    for kind in (INCIDENTS, DISPATCHES):
+        files = _partition_files(kind)
+        info[kind] = {"files": len(files), "bytes": sum(os.path.getsize(p) for p in files)}
+    return info
+
+
+_ARCHIVER = None
+
+def start_archiver(interval=ARCHIVE_INTERVAL_SECONDS):
+    """Run run_archive() every `interval` seconds in a daemon thread (0 disables)."""
+    global _ARCHIVER
+    if interval <= 0 or (_ARCHIVER is not None and _ARCHIVER.is_alive()):
+        return _ARCHIVER
+
+    def loop():
+        while True:
+            time.sleep(interval)
+            try:
+                run_archive()
+            except Exception:
+                logging.exception("Archive run failed")
+
+    _ARCHIVER = threading.Thread(target=loop, name="archiver", daemon=True)
+    _ARCHIVER.start()
+    return _ARCHIVER
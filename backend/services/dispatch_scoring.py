@@ -0,0 +1,166 @@
+# backend/services/dispatch_scoring.py
+
+"""
+Team <-> incident scoring used by auto-dispatch (routes/admin.py) and the incremental
+rebalancer (services/rebalancer.py).
+
+score = P(good assignment | severity, distance, load) from the assignment model when it
+is available, else  w_sev * severity - w_dist * distance - w_load * load  (normalized),
+minus a penalty beyond the maximum distance, plus 0.2 while the team is under max_per_team.
+team_scores() / score_matrix() score one or many incidents against many teams with a
+single model call.
+
+Distance is straight-line km by default, or road travel minutes (services/road_network.py)
+with unit "minutes" (DISPATCH_DISTANCE_UNIT, or "distance_unit" in the auto-dispatch
+payload); then dist_scale / max_distance are minutes too.
+"""
+
+import os
+from math import radians, sin, cos, sqrt, atan2
+
+import numpy as np
+
+from services import road_network
+
+SEVERITY_RANK = {"critical": 5, "high": 4, "medium": 3, "low": 2}
+EARTH_RADIUS_KM = 6371
+DISPATCH_DISTANCE_UNIT = os.getenv("DISPATCH_DISTANCE_UNIT", "km")
+
+
+class ScoreParams:
+    """Weights / limits of one dispatch run (the auto-dispatch request payload)."""
+
+    def __init__(self, w_sev=1.0, w_dist=0.6, w_load=0.8, dist_scale=None, max_distance=None,
+                 load_scale=10.0, max_per_team=8, unit=None):
+        self.unit = unit or DISPATCH_DISTANCE_UNIT
+        minutes = self.unit == "minutes"
+        self.w_sev = w_sev
+        self.w_dist = w_dist
+        self.w_load = w_load
+        self.dist_scale = dist_scale if dist_scale is not None else (60.0 if minutes else 50.0)
+        self.max_distance = max_distance if max_distance is not None else (45.0 if minutes else 40.0)
+        self.load_scale = load_scale
+        self.max_per_team = max_per_team
+        # the assignment model was trained on km: minutes are fed to it as km at the nominal speed
+        self.model_km_per_unit = road_network.ROUTING_FALLBACK_KMH / 60.0 if minutes else 1.0
+
+    @classmethod
+    def from_payload(cls, payload):
+        weights = payload.get("weights", {})
+        try:
+            max_per_team = int(payload.get("max_per_team", 8))
+        except Exception:
+            max_per_team = 8
+        unit = payload.get("distance_unit") or DISPATCH_DISTANCE_UNIT
+        if unit == "minutes":
+            scale, limit = payload.get("time_scale_minutes", 60.0), payload.get("max_travel_minutes", 45.0)
+        else:
+            scale, limit = payload.get("dist_scale_km", 50.0), payload.get("max_distance_km", 40.0)
+        return cls(w_sev=float(weights.get("severity", 1.0)), w_dist=float(weights.get("distance", 0.6)),
+                   w_load=float(weights.get("load", 0.8)), dist_scale=float(scale), max_distance=float(limit),
+                   load_scale=float(payload.get("load_scale", 10.0)), max_per_team=max_per_team,
+                   unit="minutes" if unit == "minutes" else "km")
+
+
+def sev_norm(it):
+    """Incident severity mapped to 0..1 (low..critical)."""
+    sev = (it.get("analysis") or {}).get("severity") or it.get("severity") or "medium"
+    return (SEVERITY_RANK.get(str(sev).lower(), 3) - 2) / 3.0
+
+
+def haversine(lat1, lng1, lat2, lng2):
+    R = EARTH_RADIUS_KM
+    dlat = radians(lat2 - lat1); dlng = radians(lng2 - lng1)
+    a = sin(dlat/2)**2 + cos(radians(lat1))*cos(radians(lat2))*sin(dlng/2)**2
+    return R * 2 * atan2(sqrt(a), sqrt(1-a))
+
+
+def team_coords(team):
+    lat = team.get("base_lat"); lng = team.get("base_lng")
+    if lat is None or lng is None:
+        return None
+    try:
+        return float(lat), float(lng)
+    except (TypeError, ValueError):
+        return None
+
+
+def incident_coords(it):
+    try:
+        return float(it.get("lat")), float(it.get("lng"))
+    except (TypeError, ValueError):
+        return None
+
+
+def coords_array(coords):
+    """(n, 2) float array of (lat, lng), NaN rows for unknown positions."""
+    return np.array([c if c else (np.nan, np.nan) for c in coords], dtype=float).reshape(-1, 2)
+
+
+def distances_km(team_xy, lat, lng):
+    """km from every team in team_xy (coords_array) to (lat, lng); NaN where a position is unknown."""
+    try:
+        lat, lng = float(lat), float(lng)
+    except (TypeError, ValueError):
+        return np.full(len(team_xy), np.nan)
+    return km_matrix(team_xy, np.array([[lat, lng]]))[:, 0]
+
+
+def km_matrix(team_xy, inc_xy):
+    """(teams x incidents) straight-line km between two coords_array()s."""
+    lat1, lng1 = np.radians(team_xy[:, 0])[:, None], np.radians(team_xy[:, 1])[:, None]
+    lat2, lng2 = np.radians(inc_xy[:, 0])[None, :], np.radians(inc_xy[:, 1])[None, :]
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lng2 - lng1) / 2) ** 2
+    return EARTH_RADIUS_KM * 2 * np.arctan2(np.sqrt(a), np.sqrt(1 - a))
+
+
+def distance_matrix(params, team_xy, inc_xy):
+    """
+    (teams x incidents) in params.unit: km, or road minutes - where a point is off the road
+    network (or none is loaded) straight-line km at ROUTING_FALLBACK_KMH. NaN = unknown
+    position, inf = unreachable (e.g. every road across is closed).
+    """
+    km = km_matrix(team_xy, inc_xy)
+    if params.unit != "minutes":
+        return km
+    fallback = km / road_network.ROUTING_FALLBACK_KMH * 60.0
+    minutes = road_network.travel_minutes(team_xy, inc_xy)
+    return fallback if minutes is None else np.where(np.isnan(minutes), fallback, minutes)
+
+
+def team_scores(params, sev_val, dists, loads, model=None):
+    """
+    Scores of one incident (severity sev_val) for teams at `dists` (NaN = unknown position:
+    counted as 2 x dist_scale, normalized distance 5; inf = unreachable: 5 x dist_scale)
+    with active `loads`.
+    """
+    return score_matrix(params, [sev_val], np.asarray(dists, dtype=float)[None, :], loads, model)[0]
+
+
+def score_matrix(params, sev_vals, dists, loads, model=None):
+    """Scores of incidents (rows: sev_vals, dists[i, :]) for teams (columns: loads) in one model call."""
+    dists = np.asarray(dists, dtype=float)
+    n, m = dists.shape
+    sev = np.broadcast_to(np.asarray(sev_vals, dtype=float)[:, None], (n, m))
+    loads = np.broadcast_to(np.asarray(loads, dtype=float), (n, m))
+    unknown = np.isnan(dists)
+    dists = np.where(unknown, params.dist_scale * 2, np.where(np.isinf(dists), params.dist_scale * 5, dists))
+    scores = None
+    if model is not None and dists.size:
+        try:
+            feats = np.column_stack([sev.ravel(), dists.ravel() * params.model_km_per_unit, loads.ravel()])
+            if hasattr(model, "predict_proba"):
+                probs = model.predict_proba(feats)
+                pos_idx = 1 if (hasattr(model, "classes_") and 1 in list(model.classes_)) else (1 if probs.shape[1] > 1 else 0)
+                scores = probs[:, pos_idx].astype(float).reshape(n, m)
+            else:
+                scores = np.asarray(model.predict(feats), dtype=float).reshape(n, m)
+        except Exception:
+            scores = None
+    if scores is None:
+        dist_norm = np.where(unknown, 5.0, np.minimum(dists / params.dist_scale, 5.0))
+        load_norm = np.minimum(loads / params.load_scale, 5.0)
+        scores = params.w_sev * sev - params.w_dist * dist_norm - params.w_load * load_norm
+    over = dists > params.max_distance
+    scores = scores - np.where(over, (dists - params.max_distance) / (params.dist_scale or 1.0) * 1.5, 0.0)
+    return scores + np.where(loads < params.max_per_team, 0.2, 0.0)
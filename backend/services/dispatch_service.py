@@ -0,0 +1,318 @@
+# backend/services/dispatch_service.py
+
+"""
+Dispatch commit service: writes a dispatch document and all of its incident
+assignments together, instead of one update_incident_assignment round trip per
+incident.
+
+- Existence and prior state of the incidents are read with one get_all per chunk.
+- When the dispatch doc, every assignment and the counter updates fit in
+  MAX_BATCH_WRITES, they go into ONE WriteBatch, so the commit is atomic.
+- Larger dispatches are written as a "pending" dispatch doc, chunked assignment
+  batches, and a final batch that flips the doc to "committed". If a chunk still
+  fails after its retries, the chunks already applied are reverted to the prior
+  incident state and the dispatch is marked "failed", so no incident is left
+  pointing at a dispatch that did not commit.
+- Team load counters (team_counters/*), map tile cells (incident_tiles/*) and
+  hourly rollups (incident_rollups/*) are incremented in the same batch as the
+  assignments they account for (and decremented again by a rollback); chunks are
+  sized so assignments plus counter writes stay within MAX_BATCH_WRITES.
+- Every batch is retried with exponential backoff + jitter on transient errors.
+- Idempotent on dispatch_id: re-committing a committed dispatch is a no-op that
+  returns the stored result; re-committing a pending/failed one runs it again
+  (assignment writes are idempotent). The pending doc keeps the incidents'
+  assignments from before the dispatch (prior_assignments), so a re-commit that
+  fails rolls the incidents an earlier attempt already assigned back to that state,
+  not to the half-applied one it read.
+- commit_reassignment() moves already-assigned incidents (the rebalancer's moves and
+  swaps) as several one-incident dispatches in ONE batch, guarded by a claim doc per
+  prior assignment (dispatch_claims/*) that the batch creates: of two reassignments
+  of the same assignment only the first commits, the other fails as a whole.
+"""
+
+import os
+import json
+import time
+import random
+import hashlib
+import logging
+from datetime import datetime
+
+from services.firestore_service import (
+    get_db, get_dispatch, get_incidents_by_ids, _transforms, incident_deltas, merge_deltas, delta_writes, apply_incident_deltas, counter_chunks, MAX_BATCH_WRITES
+)
+from services.metrics import instrumented
+
+DISPATCH_CHUNK_SIZE = int(os.getenv("DISPATCH_CHUNK_SIZE", "450"))  # upper bound; counter writes shrink chunks further
+DISPATCH_RETRIES = int(os.getenv("DISPATCH_RETRIES", "4"))
+DISPATCH_BACKOFF_SECONDS = float(os.getenv("DISPATCH_BACKOFF_SECONDS", "0.1"))
+
+STATE_PENDING = "pending"
+STATE_COMMITTED = "committed"
+STATE_FAILED = "failed"
+
+# one doc per reassigned assignment version (see commit_reassignment)
+CLAIMS = "dispatch_claims"
+
+# errors that will not go away by retrying the same batch
+_PERMANENT_ERRORS = {"NotFound", "AlreadyExists", "InvalidArgument", "PermissionDenied", "FailedPrecondition", "ValueError"}
+_ASSIGNMENT_FIELDS = ("dispatch_id", "assigned_team", "status", "status_updated_at", "dispatched_at")
+# also kept from the prior incident state: what the tile / rollup counters are keyed on
+_COUNTER_FIELDS = ("lat", "lng", "analysis", "severity", "timestamp", "closed_at")
+
+
+class DispatchCommitError(Exception):
+    """The dispatch could not be committed; incidents were left (or put back) unassigned by it."""
+
+
+class StaleAssignment(DispatchCommitError):
+    """A reassignment's incident is no longer on the assignment it was planned against."""
+
+
+def _with_retry(fn, what):
+    delay = DISPATCH_BACKOFF_SECONDS
+    for attempt in range(DISPATCH_RETRIES + 1):
+        try:
+            return fn()
+        except Exception as e:
+            if type(e).__name__ in _PERMANENT_ERRORS or attempt == DISPATCH_RETRIES:
+                raise
+            logging.warning("%s failed (attempt %d): %s; retrying in %.2fs", what, attempt + 1, e, delay)
+            time.sleep(delay * (0.5 + random.random()))
+            delay *= 2
+
+
+def _assignment_update(dispatch_id, team_id, new_status, now):
+    update = {"dispatch_id": dispatch_id}
+    if isinstance(team_id, str) and team_id.strip():
+        update["assigned_team"] = team_id.strip()
+    if new_status is not None:
+        update["status"] = new_status
+        update["status_updated_at"] = now
+        if new_status == "rescue_dispatched":
+            update["dispatched_at"] = now
+    return update
+
+
+def _revert_update(prior):
+    delete = _transforms().DELETE_FIELD
+    return {f: prior[f] if f in prior else delete for f in _ASSIGNMENT_FIELDS}
+
+
+def _read_existing(incident_ids):
+    """{id: prior assignment + counter fields} for the incidents that exist (one get_all per 100 ids)."""
+    return {i: {f: data[f] for f in _ASSIGNMENT_FIELDS + _COUNTER_FIELDS if f in data}
+            for i, data in get_incidents_by_ids(incident_ids).items()}
+
+
+def plan_preview(plan_text, length=160):
+    """Short text for dispatch lists, so they can skip the full plan_text."""
+    text = plan_text or ""
+    parsed = text
+    if isinstance(text, str):
+        try:
+            parsed = json.loads(text)
+        except ValueError:
+            pass
+    if isinstance(parsed, dict) and parsed.get("summary"):
+        text = parsed["summary"]
+    text = " ".join(str(text).split())
+    return text if len(text) <= length else text[:length - 3] + "..."
+
+
+def get_committed_dispatch(dispatch_id):
+    """The stored dispatch doc if dispatch_id was already committed, else None."""
+    data = get_dispatch(dispatch_id)
+    if data:
+        data.pop("_id", None)
+    return data if data and data.get("commit_state") == STATE_COMMITTED else None
+
+
+@instrumented("dispatch.commit")
+def commit_dispatch(dispatch_doc, team_id=None, new_status="rescue_dispatched"):
+    """
+    Write dispatch_doc (keyed by dispatch_doc["dispatch_id"]) and assign every incident in
+    dispatch_doc["incidents"] to it. Returns
+    {"dispatch_id", "assigned": [...], "skipped": [...missing ids], "batches": n, "replayed": bool}.
+    Raises DispatchCommitError if it could not be committed.
+    """
+    db = get_db()
+    dispatch_id = dispatch_doc["dispatch_id"]
+    dref = db.collection("dispatches").document(dispatch_id)
+
+    snap = dref.get()
+    stored = (snap.to_dict() or {}) if snap.exists else {}
+    if stored.get("commit_state") == STATE_COMMITTED:
+        return {"dispatch_id": dispatch_id, "assigned": stored.get("assigned_incident_ids", []),
+                "skipped": stored.get("skipped_incident_ids", []), "batches": 0, "replayed": True}
+
+    incident_ids = list(dict.fromkeys(i.get("_id") for i in dispatch_doc.get("incidents", []) if i.get("_id")))
+    existing = _read_existing(incident_ids)
+    assigned = [i for i in incident_ids if i in existing]
+    skipped = [i for i in incident_ids if i not in existing]
+    before = _state_before(dispatch_id, existing, assigned, stored.get("prior_assignments") or {})
+
+    now = datetime.utcnow()
+    update = _assignment_update(dispatch_id, team_id, new_status, now)
+    col = db.collection("processed_incidents")
+    final_doc = {**dispatch_doc, "plan_preview": plan_preview(dispatch_doc.get("plan_text")),
+                 "commit_state": STATE_COMMITTED, "committed_at": now.isoformat(),
+                 "assigned_incident_ids": assigned, "skipped_incident_ids": skipped}
+
+    per_incident = {}
+
+    def deltas_of(i):
+        if i not in per_incident:
+            per_incident[i] = incident_deltas(existing[i], {**existing[i], **update})
+        return per_incident[i]
+
+    def deltas_for(ids):
+        total = {}
+        for i in ids:
+            merge_deltas(total, deltas_of(i))
+        return total
+
+    def commit(ops):
+        def run():
+            batch = db.batch()
+            for op in ops:
+                op(batch)
+            batch.commit()
+        return run
+
+    # small dispatch: one atomic batch
+    all_deltas = deltas_for(assigned)
+    if 1 + len(assigned) + delta_writes(all_deltas) <= MAX_BATCH_WRITES:
+        ops = [lambda b: b.set(dref, final_doc)] + [lambda b, i=i: b.update(col.document(i), update) for i in assigned]
+        ops.append(lambda b: apply_incident_deltas(b, all_deltas))
+        try:
+            _with_retry(commit(ops), f"dispatch {dispatch_id}")
+        except Exception as e:
+            raise DispatchCommitError(f"dispatch {dispatch_id} not committed: {e}") from e
+        return {"dispatch_id": dispatch_id, "assigned": assigned, "skipped": skipped, "batches": 1, "replayed": False}
+
+    # large dispatch: pending doc -> chunked assignments -> committed flag, revert on failure
+    done = []
+    batches = 0
+    try:
+        pending_doc = {**dispatch_doc, "commit_state": STATE_PENDING,
+                       "prior_assignments": {i: {f: before[i][f] for f in _ASSIGNMENT_FIELDS if f in before[i]} for i in assigned}}
+        _with_retry(commit([lambda b: b.set(dref, pending_doc)]), f"dispatch {dispatch_id} intent")
+        batches += 1
+        for chunk in counter_chunks(assigned, deltas_of, DISPATCH_CHUNK_SIZE):
+            ops = [lambda b, i=i: b.update(col.document(i), update) for i in chunk]
+            ops.append(lambda b, chunk=chunk: apply_incident_deltas(b, deltas_for(chunk)))
+            _with_retry(commit(ops), f"dispatch {dispatch_id} chunk")
+            done.extend(chunk)
+            batches += 1
+        _with_retry(commit([lambda b: b.set(dref, final_doc)]), f"dispatch {dispatch_id} finalize")
+        batches += 1
+    except Exception as e:
+        # this attempt's chunks, plus the incidents an earlier attempt of this dispatch left assigned
+        applied = set(done)
+        current = {i: {**existing[i], **update} if i in applied else existing[i] for i in assigned
+                   if i in applied or existing[i].get("dispatch_id") == dispatch_id}
+        _rollback(db, dref, current, before, e)
+        raise DispatchCommitError(f"dispatch {dispatch_id} not committed: {e}") from e
+    return {"dispatch_id": dispatch_id, "assigned": assigned, "skipped": skipped, "batches": batches, "replayed": False}
+
+
+def _state_before(dispatch_id, existing, assigned, prior_assignments):
+    """
+    {id: incident state before this dispatch}. Incidents an earlier (pending) attempt of the
+    same dispatch_id already assigned get their assignment fields from the snapshot that
+    attempt stored in the pending doc; the rest are as read.
+    """
+    before = {}
+    for i in assigned:
+        prior = prior_assignments.get(i)
+        if prior is not None and existing[i].get("dispatch_id") == dispatch_id:
+            before[i] = {**{f: v for f, v in existing[i].items() if f not in _ASSIGNMENT_FIELDS}, **prior}
+        else:
+            before[i] = existing[i]
+    return before
+
+
+def _rollback(db, dref, current, before, error):
+    """Put the incidents in `current` back to their state `before` the dispatch, counters included."""
+    col = db.collection("processed_incidents")
+    reverts = {i: incident_deltas(state, before[i]) for i, state in current.items()}
+    try:
+        for chunk in counter_chunks(list(current), reverts.__getitem__, DISPATCH_CHUNK_SIZE):
+            def run(chunk=chunk):
+                batch = db.batch()
+                total = {}
+                for i in chunk:
+                    batch.update(col.document(i), _revert_update(before[i]))
+                    merge_deltas(total, reverts[i])
+                apply_incident_deltas(batch, total)
+                batch.commit()
+            _with_retry(run, "dispatch rollback")
+        _with_retry(lambda: dref.set({"commit_state": STATE_FAILED, "commit_error": str(error),
+                                      "prior_assignments": _transforms().DELETE_FIELD}, merge=True), "dispatch mark failed")
+    except Exception:
+        # the dispatch doc stays "pending"; committing the same dispatch_id again rolls it forward
+        logging.exception("Dispatch rollback incomplete for %s", dref.id)
+
+
+def assignment_version(incident):
+    """Opaque version of an incident's current assignment (changes with every dispatch / status change)."""
+    stamp = incident.get("status_updated_at")
+    stamp = stamp.isoformat() if hasattr(stamp, "isoformat") else str(stamp or "")
+    return f"{incident.get('dispatch_id') or 'none'}|{stamp}"
+
+
+def _claim_id(incident_id, version):
+    return f"{incident_id}-{hashlib.sha1(version.encode('utf-8')).hexdigest()[:16]}"
+
+
+@instrumented("dispatch.commit_reassignment")
+def commit_reassignment(dispatch_docs, expected, new_status="rescue_dispatched"):
+    """
+    Commit one-incident dispatch_docs (each with "team_id") together in ONE batch, e.g. both
+    legs of a swap: all of them are applied or none. expected = {incident_id: version} as
+    read by the caller (assignment_version()); an incident that moved on since raises
+    StaleAssignment, both on the read here and - for a concurrent reassignment of the same
+    assignment - at commit, through the claim doc the batch creates. Returns the incident ids.
+    """
+    db = get_db()
+    col = db.collection("processed_incidents")
+    incident_ids = [d["incidents"][0]["_id"] for d in dispatch_docs]
+    existing = _read_existing(incident_ids)
+    for i in incident_ids:
+        if i not in existing or assignment_version(existing[i]) != expected.get(i):
+            raise StaleAssignment(f"incident {i} changed since it was read")
+
+    now = datetime.utcnow()
+    ops, deltas, claims = [], {}, []
+    for doc, i in zip(dispatch_docs, incident_ids):
+        dispatch_id = doc["dispatch_id"]
+        update = _assignment_update(dispatch_id, doc["team_id"], new_status, now)
+        claim = db.collection(CLAIMS).document(_claim_id(i, expected[i]))
+        claims.append((claim, dispatch_id))
+        final_doc = {**doc, "plan_preview": plan_preview(doc.get("plan_text")), "commit_state": STATE_COMMITTED,
+                     "committed_at": now.isoformat(), "assigned_incident_ids": [i], "skipped_incident_ids": []}
+        ops.append(lambda b, claim=claim, dispatch_id=dispatch_id, i=i: b.create(
+            claim, {"incident_id": i, "dispatch_id": dispatch_id, "created_at": now.isoformat()}))
+        ops.append(lambda b, ref=db.collection("dispatches").document(dispatch_id), final_doc=final_doc: b.set(ref, final_doc))
+        ops.append(lambda b, ref=col.document(i), update=update: b.update(ref, update))
+        merge_deltas(deltas, incident_deltas(existing[i], {**existing[i], **update}))
+    ops.append(lambda b: apply_incident_deltas(b, deltas))
+    if len(ops) - 1 + delta_writes(deltas) > MAX_BATCH_WRITES:
+        raise DispatchCommitError(f"reassignment of {len(incident_ids)} incidents does not fit one batch")
+
+    def run():
+        batch = db.batch()
+        for op in ops:
+            op(batch)
+        batch.commit()
+    try:
+        _with_retry(run, "reassignment")
+    except Exception as e:
+        if type(e).__name__ == "AlreadyExists":
+            # a retried commit that had in fact gone through finds its own claims
+            if all(((c.get().to_dict() or {}).get("dispatch_id") == d) for c, d in claims):
+                return incident_ids
+            raise StaleAssignment(f"incidents {incident_ids} were reassigned concurrently") from e
+        raise DispatchCommitError(f"reassignment of {incident_ids} not committed: {e}") from e
+    return incident_ids
@@ -0,0 +1,161 @@
+# backend/services/fast_severity.py
+
+"""
+Compact, array-backed severity scorer.
+
+Exports a trained TF-IDF + linear model (LogisticRegression / SGD log_loss) into plain
+arrays: vocabulary (term -> column), idf weights and the coefficient matrix. Scoring a
+description is then one regex tokenization pass, dict lookups for the uni/bi-grams and
+a dot product over the handful of features present - no sklearn validation, no sparse
+matrix construction, and no sklearn import in the serving process (numpy + joblib only).
+
+Only vocabulary-based vectorizers can be exported; HashingVectorizer models (streaming
+training) keep using the sklearn path in gemini_service.ml_predict_severity.
+
+    python services/fast_severity.py export [--version V]   # compact copy of the active severity model
+"""
+
+import re
+import math
+
+import numpy as np
+
+COMPACT_NAME = "severity_compact"
+
+
+def export_compact(vectorizer, clf, source_version=None):
+    """Build the compact artifact (a dict of plain python/numpy values) from sklearn objects."""
+    if not hasattr(vectorizer, "vocabulary_"):
+        raise ValueError(f"{type(vectorizer).__name__} has no vocabulary; only TF-IDF/Count vectorizers can be exported")
+    if vectorizer.analyzer != "word" or vectorizer.stop_words or vectorizer.strip_accents or vectorizer.tokenizer or vectorizer.preprocessor:
+        raise ValueError("only the default word analyzer (no stop words / accents / custom tokenizer) is supported")
+    n_features = len(vectorizer.vocabulary_)
+    use_idf = bool(getattr(vectorizer, "use_idf", False))
+    idf = np.asarray(vectorizer.idf_, dtype=np.float64) if use_idf else np.ones(n_features, dtype=np.float64)
+
+    coef = np.asarray(clf.coef_, dtype=np.float64)
+    intercept = np.asarray(clf.intercept_, dtype=np.float64)
+    classes = [str(c) for c in clf.classes_]
+    if len(classes) == 2:
+        proba = "binary"
+    elif (type(clf).__name__ == "LogisticRegression" and getattr(clf, "multi_class", "auto") != "ovr"
+          and getattr(clf, "solver", "lbfgs") != "liblinear"):
+        proba = "softmax"
+    else:
+        proba = "ovr"
+
+    return {
+        "format": 1,
+        "source_version": source_version,
+        "vocabulary": {str(k): int(v) for k, v in vectorizer.vocabulary_.items()},
+        "token_pattern": vectorizer.token_pattern,
+        "lowercase": bool(vectorizer.lowercase),
+        "ngram_range": tuple(vectorizer.ngram_range),
+        "binary": bool(getattr(vectorizer, "binary", False)),
+        "sublinear_tf": bool(getattr(vectorizer, "sublinear_tf", False)),
+        "norm": getattr(vectorizer, "norm", None),
+        "idf": idf,
+        # transposed: one row of per-class weights per feature, gathered by index at score time
+        "coef_t": np.ascontiguousarray(coef.T),
+        "intercept": intercept,
+        "classes": classes,
+        "proba": proba,
+    }
+
+
+class CompactSeverityScorer:
+    def __init__(self, artifact):
+        self.artifact = artifact
+        self.vocab = artifact["vocabulary"]
+        self.token_re = re.compile(artifact["token_pattern"])
+        self.lowercase = artifact["lowercase"]
+        self.min_n, self.max_n = artifact["ngram_range"]
+        self.binary = artifact["binary"]
+        self.sublinear_tf = artifact["sublinear_tf"]
+        self.norm = artifact["norm"]
+        self.idf = artifact["idf"]
+        self.coef_t = artifact["coef_t"]
+        self.intercept = artifact["intercept"]
+        self.classes = artifact["classes"]
+        self.proba_mode = artifact["proba"]
+        self.source_version = artifact.get("source_version")
+
+    def _features(self, text):
+        """term counts keyed by column index (same n-gram rules as sklearn's word analyzer)."""
+        if self.lowercase:
+            text = text.lower()
+        tokens = self.token_re.findall(text)
+        vocab = self.vocab
+        counts = {}
+        n_tok = len(tokens)
+        for n in range(self.min_n, self.max_n + 1):
+            for i in range(n_tok - n + 1):
+                idx = vocab.get(tokens[i] if n == 1 else " ".join(tokens[i:i + n]))
+                if idx is not None:
+                    counts[idx] = counts.get(idx, 0) + 1
+        return counts
+
+    def decision_function(self, text):
+        counts = self._features(text or "")
+        if not counts:
+            return self.intercept.copy()
+        idx = np.fromiter(counts.keys(), dtype=np.intp, count=len(counts))
+        tf = np.fromiter(counts.values(), dtype=np.float64, count=len(counts))
+        if self.binary:
+            tf = np.ones_like(tf)
+        elif self.sublinear_tf:
+            tf = np.log(tf) + 1.0
+        vals = tf * self.idf[idx]
+        if self.norm == "l2":
+            n = math.sqrt(float(vals @ vals))
+            if n > 0:
+                vals /= n
+        elif self.norm == "l1":
+            n = float(np.abs(vals).sum())
+            if n > 0:
+                vals /= n
+        return vals @ self.coef_t[idx] + self.intercept
+
+    def predict_proba(self, text):
+        d = self.decision_function(text)
+        if self.proba_mode == "binary":
+            p1 = 1.0 / (1.0 + math.exp(-float(d[0])))
+            return np.array([1.0 - p1, p1])
+        if self.proba_mode == "softmax":
+            e = np.exp(d - d.max())
+            return e / e.sum()
+        p = 1.0 / (1.0 + np.exp(-d))
+        s = p.sum()
+        return p / s if s > 0 else np.full_like(p, 1.0 / len(p))
+
+    def predict(self, text):
+        """(label, probability) - same contract as gemini_service.ml_predict_severity."""
+        probs = self.predict_proba(text)
+        i = int(np.argmax(probs))
+        return self.classes[i], float(probs[i])
+
+
+def export_active(version=None):
+    """Export the active (or given) severity model version as a compact artifact with the same version label."""
+    from services import model_registry
+    import joblib
+    version = version or model_registry.current_version("severity")
+    if version is None:
+        raise FileNotFoundError("no severity model to export")
+    data = joblib.load(model_registry.artifact_path("severity", version))
+    artifact = export_compact(data["vectorizer"], data["model"], source_version=version)
+    out_version = version if version != model_registry.LEGACY_VERSION else None
+    return model_registry.save_model(COMPACT_NAME, artifact, version=out_version)
+
+
+if __name__ == "__main__":
+    import sys
+    import argparse
+    from pathlib import Path
+    sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+    p = argparse.ArgumentParser()
+    sub = p.add_subparsers(dest="command", required=True)
+    ep = sub.add_parser("export")
+    ep.add_argument("--version", default=None)
+    args = p.parse_args()
+    print(f"Saved {COMPACT_NAME} version {export_active(args.version)}")
@@ -0,0 +1,334 @@
+# backend/services/firestore_profiler.py
+
+"""
+Firestore access profiler.
+
+get_db() hands out a ProfiledClient that wraps the real client. Every terminal call
+(document get, query stream, add/set/update/delete, get_all, batch commit) is counted
+as reads / writes / round trips against the active profile - one per Flask request,
+or an explicit `with profile("name") as p:` block (usable from tests/benchmarks:
+`p.assert_max_round_trips(3)`).
+
+A query "shape" (collection path, filter fields/ops, ordering, limit - never values)
+seen N_PLUS_ONE_THRESHOLD or more times in one profile is flagged as an N+1 pattern:
+logged, counted in /metrics and listed in GET /debug/firestore.
+
+on_write(fn) registers a callback that gets the top-level collection names after every
+successful write (used by services/http_cache.py to version listings).
+"""
+
+import os
+import logging
+import threading
+import contextvars
+from collections import deque, Counter as _Counter
+
+from services import metrics
+
+N_PLUS_ONE_THRESHOLD = int(os.getenv("FIRESTORE_N_PLUS_ONE_THRESHOLD", "5"))
+RECENT_PROFILES = 50
+
+READS = metrics.counter("crisismap_firestore_reads_total", "Firestore documents read", ("route",))
+WRITES = metrics.counter("crisismap_firestore_writes_total", "Firestore documents written", ("route",))
+ROUND_TRIPS = metrics.counter("crisismap_firestore_round_trips_total", "Firestore RPC round trips", ("route",))
+N_PLUS_ONE = metrics.counter("crisismap_firestore_n_plus_one_total", "Requests with a repeated query shape", ("route", "shape"))
+
+_current = contextvars.ContextVar("firestore_profile", default=None)
+_recent = deque(maxlen=RECENT_PROFILES)
+_recent_lock = threading.Lock()
+_write_listeners = []
+
+
+class FirestoreBudgetExceeded(AssertionError):
+    pass
+
+
+class Profile:
+    def __init__(self, name):
+        self.name = name
+        self.reads = 0
+        self.writes = 0
+        self.round_trips = 0
+        self.shapes = _Counter()
+
+    def record(self, shape, reads=0, writes=0):
+        self.reads += reads
+        self.writes += writes
+        self.round_trips += 1
+        self.shapes[shape] += 1
+        READS.inc(reads, route=self.name)
+        WRITES.inc(writes, route=self.name)
+        ROUND_TRIPS.inc(route=self.name)
+
+    def n_plus_one(self, threshold=None):
+        threshold = threshold or N_PLUS_ONE_THRESHOLD
+        return {shape: n for shape, n in self.shapes.items() if n >= threshold}
+
+    def summary(self):
+        return {
+            "name": self.name,
+            "reads": self.reads,
+            "writes": self.writes,
+            "round_trips": self.round_trips,
+            "n_plus_one": self.n_plus_one(),
+            "shapes": dict(self.shapes.most_common(10)),
+        }
+
+    def assert_max_round_trips(self, n):
+        if self.round_trips > n:
+            raise FirestoreBudgetExceeded(f"{self.name}: {self.round_trips} round trips > {n}: {dict(self.shapes)}")
+
+    def assert_max_reads(self, n):
+        if self.reads > n:
+            raise FirestoreBudgetExceeded(f"{self.name}: {self.reads} reads > {n}")
+
+    def assert_no_n_plus_one(self):
+        found = self.n_plus_one()
+        if found:
+            raise FirestoreBudgetExceeded(f"{self.name}: N+1 query shapes {found}")
+
+
+def start(name):
+    """Begin a profile in the current context; returns (profile, token for finish())."""
+    p = Profile(name)
+    return p, _current.set(p)
+
+
+def finish(p, token):
+    try:
+        _current.reset(token)
+    except ValueError:
+        # finished from a different context (e.g. teardown on another thread)
+        _current.set(None)
+    found = p.n_plus_one()
+    for shape, n in found.items():
+        logging.warning("Firestore N+1 in %s: %r repeated %d times", p.name, shape, n)
+        N_PLUS_ONE.inc(route=p.name, shape=shape)
+    if p.round_trips:
+        with _recent_lock:
+            _recent.append(p.summary())
+    return p
+
+
+class profile:
+    """with profile("name") as p: ...  (explicit profile for tests / jobs)"""
+    def __init__(self, name="adhoc"):
+        self.name = name
+
+    def __enter__(self):
+        self.p, self._token = start(self.name)
+        return self.p
+
+    def __exit__(self, *exc):
+        finish(self.p, self._token)
+        return False
+
+
+def current():
+    return _current.get()
+
+
+def recent():
+    with _recent_lock:
+        return list(_recent)
+
+
+def _record(shape, reads=0, writes=0):
+    p = _current.get()
+    if p is not None:
+        p.record(shape, reads=reads, writes=writes)
+    else:
+        READS.inc(reads, route="<background>")
+        WRITES.inc(writes, route="<background>")
+        ROUND_TRIPS.inc(route="<background>")
+
+
+def on_write(fn):
+    """Call fn(collections) after every successful write through a ProfiledClient."""
+    if fn not in _write_listeners:
+        _write_listeners.append(fn)
+
+
+def _written(collections):
+    for fn in _write_listeners:
+        try:
+            fn(collections)
+        except Exception as e:
+            logging.warning("Firestore write listener failed: %s", e)
+
+
+def _root(shape_or_path):
+    """Top-level collection of a shape ("teams/{id}", "dispatches where ...") or document path."""
+    return shape_or_path.split("/", 1)[0].split(" ", 1)[0]
+
+
+# ---------------------------
+# Client / reference proxies
+# ---------------------------
+
+def _filter_shape(args, kwargs):
+    if args:
+        return f"{args[0]} {args[1] if len(args) > 1 else '?'}"
+    flt = kwargs.get("filter")
+    if flt is not None:
+        return f"{getattr(flt, 'field_path', '?')} {getattr(flt, 'op_string', '?')}"
+    return "?"
+
+
+class _Ref:
+    """Wraps a collection / query / document reference, tracking its shape."""
+    _BUILDERS = {"order_by", "limit", "limit_to_last", "offset", "start_after", "start_at", "end_before", "end_at", "select"}
+
+    def __init__(self, target, shape):
+        self._target = target
+        self._shape = shape
+
+    def __getattr__(self, item):
+        return getattr(self._target, item)
+
+    # builders
+    def where(self, *args, **kwargs):
+        return _Ref(self._target.where(*args, **kwargs), f"{self._shape} where {_filter_shape(args, kwargs)}")
+
+    def document(self, *args):
+        return _Ref(self._target.document(*args), f"{self._shape}/{{id}}")
+
+    def collection(self, name):
+        return _Ref(self._target.collection(name), f"{self._shape}/{name}")
+
+    def _builder(self, name, *args, **kwargs):
+        res = getattr(self._target, name)(*args, **kwargs)
+        if name in ("order_by",):
+            return _Ref(res, f"{self._shape} order_by {args[0] if args else '?'}")
+        if name in ("limit", "limit_to_last"):
+            return _Ref(res, f"{self._shape} {name}")
+        return _Ref(res, self._shape)
+
+    def order_by(self, *a, **k): return self._builder("order_by", *a, **k)
+    def limit(self, *a, **k): return self._builder("limit", *a, **k)
+    def limit_to_last(self, *a, **k): return self._builder("limit_to_last", *a, **k)
+    def offset(self, *a, **k): return self._builder("offset", *a, **k)
+    def start_after(self, *a, **k): return self._builder("start_after", *a, **k)
+    def start_at(self, *a, **k): return self._builder("start_at", *a, **k)
+    def end_before(self, *a, **k): return self._builder("end_before", *a, **k)
+    def end_at(self, *a, **k): return self._builder("end_at", *a, **k)
+    def select(self, *a, **k): return self._builder("select", *a, **k)
+
+    # terminal calls
+    def stream(self, *args, **kwargs):
+        n = 0
+        try:
+            for d in self._target.stream(*args, **kwargs):
+                n += 1
+                yield d
+        finally:
+            _record(f"stream {self._shape}", reads=max(n, 1))
+
+    def get(self, *args, **kwargs):
+        res = self._target.get(*args, **kwargs)
+        if isinstance(res, list):
+            _record(f"get {self._shape}", reads=max(len(res), 1))
+        else:
+            _record(f"get {self._shape}", reads=1)
+        return res
+
+    def _write(self, name, *args, **kwargs):
+        _record(f"{name} {self._shape}", writes=1)
+        res = getattr(self._target, name)(*args, **kwargs)
+        _written((_root(self._shape),))
+        return res
+
+    def add(self, *a, **k): return self._write("add", *a, **k)
+    def set(self, *a, **k): return self._write("set", *a, **k)
+    def update(self, *a, **k): return self._write("update", *a, **k)
+    def delete(self, *a, **k): return self._write("delete", *a, **k)
+
+
+def _unwrap(ref):
+    return ref._target if isinstance(ref, _Ref) else ref
+
+
+class _Batch:
+    def __init__(self, target):
+        self._target = target
+        self._n = 0
+        self._collections = set()
+
+    def __getattr__(self, item):
+        return getattr(self._target, item)
+
+    def _op(self, name, ref, *args, **kwargs):
+        self._n += 1
+        self._collections.add(_root(ref._shape if isinstance(ref, _Ref) else getattr(ref, "path", "")))
+        getattr(self._target, name)(_unwrap(ref), *args, **kwargs)
+        return self
+
+    def set(self, ref, *a, **k): return self._op("set", ref, *a, **k)
+    def update(self, ref, *a, **k): return self._op("update", ref, *a, **k)
+    def delete(self, ref, *a, **k): return self._op("delete", ref, *a, **k)
+    def create(self, ref, *a, **k): return self._op("create", ref, *a, **k)
+
+    def commit(self, *args, **kwargs):
+        _record("batch.commit", writes=self._n)
+        res = self._target.commit(*args, **kwargs)
+        if self._collections:
+            _written(tuple(self._collections))
+        return res
+
+
+class ProfiledClient:
+    def __init__(self, client):
+        self._client = client
+
+    def __getattr__(self, item):
+        return getattr(self._client, item)
+
+    @property
+    def raw(self):
+        return self._client
+
+    def collection(self, name):
+        return _Ref(self._client.collection(name), name)
+
+    def document(self, path):
+        return _Ref(self._client.document(path), path.split("/")[0] + "/{id}")
+
+    def get_all(self, refs, *args, **kwargs):
+        refs = [_unwrap(r) for r in refs]
+        n = 0
+        try:
+            for snap in self._client.get_all(refs, *args, **kwargs):
+                n += 1
+                yield snap
+        finally:
+            _record("get_all", reads=max(n, 1))
+
+    def batch(self):
+        return _Batch(self._client.batch())
+
+
+# ---------------------------
+# Flask integration
+# ---------------------------
+
+def _before_request():
+    from flask import g, request
+    rule = request.url_rule.rule if request.url_rule is not None else "<unmatched>"
+    g._fs_profile = start(f"{request.method} {rule}")
+
+
+def _teardown_request(exc):
+    from flask import g
+    started = g.pop("_fs_profile", None)
+    if started is not None:
+        finish(*started)
+
+
+def init_app(app):
+    app.before_request(_before_request)
+    app.teardown_request(_teardown_request)
+
+    @app.route("/debug/firestore")
+    def firestore_debug():
+        from flask import jsonify
+        return jsonify({"n_plus_one_threshold": N_PLUS_ONE_THRESHOLD, "recent": recent()})
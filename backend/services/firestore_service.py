@@ -1,22 +1,192 @@
 # backend/services/firestore_service.py
 
-from firebase_admin import firestore
-from datetime import datetime, timedelta
+import os
+import time
 import uuid
+import logging
+import threading
+from datetime import datetime, timedelta
+from cachetools import TTLCache
+from config import FIREBASE_ADMIN_KEY_PATH, FIREBASE_STORAGE_BUCKET, DB_BACKEND, SQLITE_PATH
+from services.registry import register
+from services.metrics import instrumented
+from services.firestore_profiler import ProfiledClient
+from services import geo_tiles, rollups
 
 # How long before dispatched incidents auto-close (demo): 30 minutes
 AUTO_CLOSE_AFTER_SECONDS = 30 * 60  # change as needed
 
+def _init_firebase():
+    """Initialize the Firebase Admin app (service account file must be in backend/)."""
+    import firebase_admin
+    from firebase_admin import credentials
+    if firebase_admin._apps:
+        return firebase_admin.get_app()
+    if not os.path.exists(FIREBASE_ADMIN_KEY_PATH):
+        raise FileNotFoundError(f"Place {FIREBASE_ADMIN_KEY_PATH} in backend/ before running.")
+    cred = credentials.Certificate(FIREBASE_ADMIN_KEY_PATH)
+    if FIREBASE_STORAGE_BUCKET:
+        return firebase_admin.initialize_app(cred, {"storageBucket": FIREBASE_STORAGE_BUCKET})
+    # initialize without storage bucket (will error if you try to use storage)
+    return firebase_admin.initialize_app(cred)
+
+FIREBASE = register("firebase", _init_firebase, required=DB_BACKEND != "sqlite")
+
+def _init_sqlite():
+    from services.sqlite_store import SqliteStore
+    return SqliteStore(SQLITE_PATH)
+
+# the functions below are the storage interface for incidents, teams, dispatches and raw
+# reports; they run unchanged on Firestore or on the embedded SQLite store
+SQLITE = register("sqlite", _init_sqlite, required=True) if DB_BACKEND == "sqlite" else None
+
+def _firestore():
+    # imported lazily, and only for the Firestore backend: google.cloud.firestore is slow to import
+    from firebase_admin import firestore
+    return firestore
+
+def _transforms():
+    """DELETE_FIELD / Increment sentinels understood by both backends (no Firebase SDK needed for SQLite)."""
+    from services.sqlite_store import transforms
+    return transforms
+
+DESCENDING = "DESCENDING"  # Query.DESCENDING, without importing the SDK
+
+_PROFILED = None
+_CLIENT_OVERRIDE = None
+
+def use_client(client):
+    """Serve get_db() from `client` (e.g. benchmarks.standins.FakeFirestore or a SqliteStore); None restores Firebase."""
+    global _CLIENT_OVERRIDE
+    _CLIENT_OVERRIDE = client
+    if client is not None:
+        FIREBASE.override(None)
+    else:
+        FIREBASE.reset()
+
 def get_db():
-    return firestore.client()
+    """Storage client (Firestore or SqliteStore) wrapped by the access profiler (reads/writes/round trips per request)."""
+    global _PROFILED
+    if _CLIENT_OVERRIDE is not None:
+        client = _CLIENT_OVERRIDE
+    elif SQLITE is not None:
+        client = SQLITE.get()
+    else:
+        FIREBASE.get()
+        client = _firestore().client()
+    if _PROFILED is None or _PROFILED.raw is not client:
+        _PROFILED = ProfiledClient(client)
+    return _PROFILED
 
+@instrumented("firestore.save_raw_report")
 def save_raw_report(data):
     db = get_db()
     return db.collection("raw_reports").add(data)
 
-def save_processed_incident(data):
+@instrumented("firestore.get_raw_report")
+def get_raw_report(doc_id):
+    """Stored raw report, or None."""
+    snap = get_db().collection("raw_reports").document(doc_id).get()
+    return (snap.to_dict() or {}) if snap.exists else None
+
+@instrumented("firestore.get_processed_incident")
+def get_processed_incident(doc_id):
+    """Stored processed incident (with _id), or None."""
+    snap = get_db().collection("processed_incidents").document(doc_id).get()
+    if not snap.exists:
+        return None
+    d = snap.to_dict() or {}
+    d["_id"] = snap.id
+    return d
+
+@instrumented("firestore.get_incidents_by_ids")
+def get_incidents_by_ids(ids):
+    """{id: doc} of the processed incidents that exist among `ids` (one get_all per 100 ids)."""
+    db = get_db()
+    col = db.collection("processed_incidents")
+    ids = list(dict.fromkeys(ids))
+    out = {}
+    for k in range(0, len(ids), 100):
+        for snap in db.get_all([col.document(i) for i in ids[k:k + 100]]):
+            if snap.exists:
+                out[snap.id] = snap.to_dict() or {}
+    return out
+
+@instrumented("firestore.save_processed_incident")
+def save_processed_incident(data, doc_id=None):
+    """
+    Add the incident (with its map quadkey) and its counter increments in one batch; returns
+    (time, ref). With doc_id (the raw report's id) the incident is created under that id and
+    the batch fails with AlreadyExists if it was processed already.
+    """
+    db = get_db()
+    qk = geo_tiles.incident_quadkey(data)
+    if qk:
+        data = {**data, "quadkey": qk}
+    batch = db.batch()
+    if doc_id:
+        ref = db.collection("processed_incidents").document(doc_id)
+        batch.create(ref, data)
+    else:
+        ref = db.collection("processed_incidents").document()
+        batch.set(ref, data)
+    apply_incident_deltas(batch, incident_deltas({}, data))
+    results = batch.commit()
+    return getattr(results[0], "update_time", None) or datetime.utcnow(), ref
+
+@instrumented("firestore.update_incident_analysis")
+def update_incident_analysis(doc_id, analysis):
+    """Replace the analysis of a processed incident (e.g. after a background LLM refinement)."""
+    db = get_db()
+    ref = db.collection("processed_incidents").document(doc_id)
+    before = ref.get().to_dict() or {}
+    _write_incident_update(ref, before, {"analysis": analysis})
+    return True
+
+@instrumented("firestore.finish_incident_enrichment")
+def finish_incident_enrichment(doc_id, analysis, image_lost=False):
+    """Store the deferred analysis of a degraded-mode report and clear its pending flag (image_lost: upload gone)."""
+    ref = get_db().collection("processed_incidents").document(doc_id)
+    before = ref.get().to_dict() or {}
+    update = {"analysis": analysis, "enrichment_pending": False}
+    if image_lost:
+        update["image_lost"] = True
+    _write_incident_update(ref, before, update)
+    return True
+
+@instrumented("firestore.claim_pending_enrichments")
+def claim_pending_enrichments(older_than_seconds, limit=200, host=None, orphan_seconds=None):
+    """
+    Processed incidents still waiting for their deferred enrichment whose last claim is
+    older than `older_than_seconds`; each returned doc is re-claimed (enrichment.queued_at
+    set to now) so other workers' sweeps leave it alone for that long. With `host`, a job
+    owned by another host (enrichment.host) is only taken once its last claim is
+    `orphan_seconds` old.
+    """
     db = get_db()
-    return db.collection("processed_incidents").add(data)
+    now = time.time()
+    docs = []
+    for doc in db.collection("processed_incidents").where("enrichment_pending", "==", True).stream():
+        d = doc.to_dict() or {}
+        enrichment = d.get("enrichment") or {}
+        age = now - float(enrichment.get("queued_at") or 0)
+        if age < older_than_seconds:
+            continue
+        owner = enrichment.get("host")
+        if host and owner and owner != host and (orphan_seconds is None or age < orphan_seconds):
+            continue
+        doc.reference.update({"enrichment": {**enrichment, "queued_at": now}})
+        d["_id"] = doc.id
+        docs.append(d)
+        if len(docs) >= limit:
+            break
+    return docs
+
+@instrumented("firestore.update_incident_image")
+def update_incident_image(doc_id, image_url):
+    """Set the image URL of a processed incident (after a deferred upload)."""
+    get_db().collection("processed_incidents").document(doc_id).update({"image_url": image_url})
+    return True
 
 def _parse_maybe_datetime(val):
     if val is None:
@@ -30,19 +200,23 @@ def _parse_maybe_datetime(val):
         return None
 
 def _close_old_dispatched(doc_ref, doc_data):
+    if (doc_data.get("status") or "").lower() == "closed":
+        # already closed: rewriting closed_at would keep resetting its age
+        return False
     dispatched_at = doc_data.get("dispatched_at")
     dispatched_dt = _parse_maybe_datetime(dispatched_at)
     if dispatched_dt is None:
         return False
     age = datetime.utcnow() - dispatched_dt
     if age.total_seconds() >= AUTO_CLOSE_AFTER_SECONDS:
-        doc_ref.update({"status": "closed", "closed_at": datetime.utcnow()})
+        _write_incident_update(doc_ref, doc_data, {"status": "closed", "closed_at": datetime.utcnow()})
         return True
     return False
 
+@instrumented("firestore.get_all_incidents")
 def get_all_incidents():
     db = get_db()
-    docs = db.collection("processed_incidents").order_by("timestamp", direction=firestore.Query.DESCENDING).stream()
+    docs = db.collection("processed_incidents").order_by("timestamp", direction=DESCENDING).stream()
     items = []
     for d in docs:
         item = d.to_dict() or {}
@@ -74,6 +248,22 @@ def get_all_incidents():
             items.append(item)
     return items
 
+def iter_incidents(page_size=1000):
+    """Yield every processed incident (dict with _id), paged by document id."""
+    db = get_db()
+    last = None
+    while True:
+        q = db.collection("processed_incidents").order_by("__name__").limit(page_size)
+        if last is not None:
+            q = q.start_after(last)
+        page = list(q.stream())
+        if not page:
+            return
+        for d in page:
+            yield {**(d.to_dict() or {}), "_id": d.id}
+        last = page[-1]
+
+@instrumented("firestore.get_incidents_by_status")
 def get_incidents_by_status(statuses):
     db = get_db()
     if not statuses:
@@ -84,7 +274,7 @@ def get_incidents_by_status(statuses):
     if len(statuses) == 1:
         try:
             q = db.collection("processed_incidents").where("status", "==", statuses[0])
-            docs = q.order_by("timestamp", direction=firestore.Query.DESCENDING).stream()
+            docs = q.order_by("timestamp", direction=DESCENDING).stream()
         except Exception as e:
             # fallback: stream without ordering and sort in Python
             docs = db.collection("processed_incidents").where("status", "==", statuses[0]).stream()
@@ -102,7 +292,7 @@ def get_incidents_by_status(statuses):
             try:
                 try:
                     q = db.collection("processed_incidents").where("status", "==", s)
-                    docs = q.order_by("timestamp", direction=firestore.Query.DESCENDING).stream()
+                    docs = q.order_by("timestamp", direction=DESCENDING).stream()
                 except Exception:
                     docs = db.collection("processed_incidents").where("status", "==", s).stream()
                 for d in docs:
@@ -127,6 +317,7 @@ def get_incidents_by_status(statuses):
     return items
 
 
+@instrumented("firestore.update_incident_status")
 def update_incident_status(doc_id, new_status):
     """
     Update status; if new_status == rescue_dispatched, set dispatched_at timestamp.
@@ -136,9 +327,13 @@ def update_incident_status(doc_id, new_status):
     update = {"status": new_status, "status_updated_at": datetime.utcnow()}
     if new_status == "rescue_dispatched":
         update["dispatched_at"] = datetime.utcnow()
-    ref.update(update)
+    elif new_status == "closed":
+        update["closed_at"] = datetime.utcnow()
+    before = ref.get().to_dict() or {}
+    _write_incident_update(ref, before, update)
     return True
 
+@instrumented("firestore.search_incidents_by_text")
 def search_incidents_by_text(query_text):
     """
     Simple substring search on location + description/summary. Not scalable but fine for MVP.
@@ -166,6 +361,7 @@ def search_incidents_by_text(query_text):
 # Teams and dispatch helpers
 # ---------------------------
 
+@instrumented("firestore.create_team")
 def create_team(name, contact, password):
     db = get_db()
     team_id = f"team_{uuid.uuid4().hex[:8]}"
@@ -178,8 +374,10 @@ def create_team(name, contact, password):
         "status": "ready"
     }
     db.collection("teams").document(team_id).set(doc)
+    _forget_team(team_id, name)
     return team_id
 
+@instrumented("firestore.get_all_teams")
 def get_all_teams():
     db = get_db()
     teams = []
@@ -190,15 +388,38 @@ def get_all_teams():
         teams.append(d)
     return teams
 
-def get_team_by_name(name):
+# name -> team doc (incl. password hash), so repeated logins skip the Firestore query. Team
+# writes through the helpers below drop this worker's entry; other workers' copies of a
+# changed team live at most TEAM_BY_NAME_CACHE_SECONDS
+TEAM_BY_NAME_CACHE_SECONDS = float(os.getenv("TEAM_BY_NAME_CACHE_SECONDS", "60"))
+TEAM_BY_NAME_CACHE = TTLCache(maxsize=1024, ttl=TEAM_BY_NAME_CACHE_SECONDS)
+_TEAM_BY_NAME_LOCK = threading.Lock()
+
+def _forget_team(team_id=None, name=None):
+    """Drop the cached login doc of a team that was just written."""
+    with _TEAM_BY_NAME_LOCK:
+        for key, d in list(TEAM_BY_NAME_CACHE.items()):
+            if key == name or d.get("_id") == team_id:
+                TEAM_BY_NAME_CACHE.pop(key, None)
+
+@instrumented("firestore.get_team_by_name")
+def get_team_by_name(name, use_cache=False):
+    if use_cache:
+        with _TEAM_BY_NAME_LOCK:
+            cached = TEAM_BY_NAME_CACHE.get(name)
+        if cached is not None:
+            return dict(cached)
     db = get_db()
     q = db.collection("teams").where("name", "==", name).limit(1).stream()
     for doc in q:
         d = doc.to_dict() or {}
         d["_id"] = doc.id
+        with _TEAM_BY_NAME_LOCK:
+            TEAM_BY_NAME_CACHE[name] = dict(d)
         return d
     return None
 
+@instrumented("firestore.get_team_by_id")
 def get_team_by_id(team_id):
     if not team_id:
         return None
@@ -211,6 +432,7 @@ def get_team_by_id(team_id):
     d.pop("password", None)
     return d
 
+@instrumented("firestore.set_team_status")
 def set_team_status(team_id, status):
     """
     Mark team status (example values: 'busy', 'ready').
@@ -219,6 +441,7 @@ def set_team_status(team_id, status):
         return False
     db = get_db()
     ref = db.collection("teams").document(team_id)
+    _forget_team(team_id)
     try:
         ref.update({"status": status, "status_updated_at": datetime.utcnow().isoformat()})
         return True
@@ -230,22 +453,446 @@ def set_team_status(team_id, status):
         except Exception:
             return False
 
+@instrumented("firestore.update_team_location")
+def update_team_location(team_id, lat, lng):
+    get_db().collection("teams").document(team_id).update({
+        "base_lat": lat,
+        "base_lng": lng,
+        "updated_at": datetime.utcnow().isoformat()
+    })
+    _forget_team(team_id)
+    return True
+
+# ---------------------------
+# Revoked auth tokens (auth_store.py keeps the in-process deny-list)
+# ---------------------------
+REVOKED_TOKENS = "revoked_tokens"
+
+@instrumented("firestore.save_token_revocation")
+def save_token_revocation(jti, exp):
+    """Record a revoked token's jti until its expiry, and drop a batch of revocations that have expired."""
+    revoked = get_db().collection(REVOKED_TOKENS)
+    now = int(time.time())
+    revoked.document(jti).set({"exp": exp, "revoked_at": now})
+    # entries for tokens that have expired anyway are dead weight
+    for doc in revoked.where("exp", "<", now).limit(100).stream():
+        doc.reference.delete()
+
+@instrumented("firestore.get_token_revocations")
+def get_token_revocations(revoked_since=None):
+    """{jti: exp} of revocations recorded at or after revoked_since, or of every unexpired one when None."""
+    revoked = get_db().collection(REVOKED_TOKENS)
+    if revoked_since is None:
+        q = revoked.where("exp", ">", int(time.time()))
+    else:
+        q = revoked.where("revoked_at", ">=", revoked_since)
+    return {doc.id: (doc.to_dict() or {}).get("exp", 0) for doc in q.stream()}
+
+# ---------------------------
+# Road closures (services/road_network.py applies them to the graph)
+# ---------------------------
+ROAD_CLOSURES = "road_closures"
+
+@instrumented("firestore.list_road_closures")
+def list_road_closures():
+    out = []
+    for d in get_db().collection(ROAD_CLOSURES).stream():
+        item = d.to_dict() or {}
+        item["id"] = d.id
+        out.append(item)
+    return out
+
+@instrumented("firestore.save_road_closure")
+def save_road_closure(closure_id, doc):
+    get_db().collection(ROAD_CLOSURES).document(closure_id).set(doc)
+
+@instrumented("firestore.delete_road_closure")
+def delete_road_closure(closure_id):
+    """False if there is no such closure."""
+    ref = get_db().collection(ROAD_CLOSURES).document(closure_id)
+    if not ref.get().exists:
+        return False
+    ref.delete()
+    return True
+
+@instrumented("firestore.create_dispatch")
 def create_dispatch(dispatch):
     db = get_db()
     dispatch_id = dispatch["dispatch_id"]
     db.collection("dispatches").document(dispatch_id).set(dispatch)
     return dispatch_id
 
-def get_dispatches_by_team(team_id):
+@instrumented("firestore.get_dispatch")
+def get_dispatch(dispatch_id):
+    """Stored dispatch doc (with _id), or None."""
+    if not dispatch_id:
+        return None
+    snap = get_db().collection("dispatches").document(dispatch_id).get()
+    if not snap.exists:
+        return None
+    d = snap.to_dict() or {}
+    d["_id"] = snap.id
+    return d
+
+# ---------------------------
+# Counters maintained on every incident write
+# team_counters/{team_id}.active_incidents = number of non-closed incidents assigned to
+# the team, incident_tiles/{quadkey} = per-map-cell counts by severity / status
+# (services/geo_tiles.py) and incident_rollups/{hour} = hourly counts and duration
+# sketches (services/rollups.py). Every incident write adds firestore.Increment
+# deltas for all of them in the same batch as the incident itself;
+# reconcile_team_loads(), rebuild_tile_aggregates() and rebuild_rollups() recount
+# from scratch to fix any drift (concurrent updates, writes made outside these helpers).
+# ---------------------------
+TEAM_COUNTERS = "team_counters"
+TEAM_LOAD_RECONCILE_SECONDS = float(os.getenv("TEAM_LOAD_RECONCILE_SECONDS", "900"))
+TILE_POINTS_LIMIT = int(os.getenv("TILE_POINTS_LIMIT", "500"))
+
+def _is_active(status):
+    return (status or "").lower() != "closed"
+
+def team_load_deltas(before, after):
+    """{team_id: +/-n} for one incident going from `before` to `after` (dicts with assigned_team/status)."""
+    deltas = {}
+    old_team = before.get("assigned_team") if _is_active(before.get("status")) else None
+    new_team = after.get("assigned_team") if _is_active(after.get("status")) else None
+    if old_team != new_team:
+        if old_team:
+            deltas[old_team] = deltas.get(old_team, 0) - 1
+        if new_team:
+            deltas[new_team] = deltas.get(new_team, 0) + 1
+    return deltas
+
+def incident_deltas(before, after):
+    """{(collection, doc_id): {field: n}} counter changes for one incident going from `before` to `after`."""
+    out = {}
+    for tid, n in team_load_deltas(before or {}, after or {}).items():
+        if n:
+            out[(TEAM_COUNTERS, tid)] = {"active_incidents": n}
+    for cell, fields in geo_tiles.incident_tile_deltas(before, after).items():
+        out[(geo_tiles.TILES_COLLECTION, cell)] = fields
+    for hour, fields in rollups.incident_rollup_deltas(before, after).items():
+        out[(rollups.ROLLUPS_COLLECTION, hour)] = fields
+    return out
+
+def merge_deltas(total, deltas):
+    for key, fields in deltas.items():
+        cur = total.setdefault(key, {})
+        for f, n in fields.items():
+            cur[f] = cur.get(f, 0) + n
+    return total
+
+def delta_writes(deltas):
+    """Number of counter docs apply_incident_deltas() will write."""
+    return sum(1 for fields in deltas.values() if any(fields.values()))
+
+MAX_BATCH_WRITES = 500
+
+def counter_chunks(ids, deltas_of, size):
+    """Split ids into chunks of at most `size` whose writes + counter writes fit one batch."""
+    chunk, keys = [], set()
+    for i in ids:
+        new_keys = set(deltas_of(i)) - keys
+        if chunk and (len(chunk) >= size or len(chunk) + 1 + len(keys) + len(new_keys) > MAX_BATCH_WRITES):
+            yield chunk
+            chunk, keys, new_keys = [], set(), set(deltas_of(i))
+        chunk.append(i)
+        keys |= new_keys
+    if chunk:
+        yield chunk
+
+def apply_incident_deltas(batch, deltas):
+    """Add one Increment merge-set per touched counter doc to `batch` (a WriteBatch / transaction)."""
+    db = get_db()
+    inc = _transforms().Increment
+    for (col, doc_id), fields in deltas.items():
+        data = {f: inc(n) for f, n in fields.items() if n}
+        if not data:
+            continue
+        if col == geo_tiles.TILES_COLLECTION:
+            data.update({"z": len(doc_id), "qk": doc_id})
+        elif col == rollups.ROLLUPS_COLLECTION:
+            data.update(rollups.doc_fields(doc_id))
+        batch.set(db.collection(col).document(doc_id), data, merge=True)
+
+def _write_incident_update(ref, before, update):
+    """ref.update(update), adjusting the counters in the same batch when they change."""
+    deltas = incident_deltas(before, {**before, **update})
+    if not deltas:
+        ref.update(update)
+        return
+    batch = get_db().batch()
+    batch.update(ref, update)
+    apply_incident_deltas(batch, deltas)
+    batch.commit()
+
+@instrumented("firestore.get_team_loads")
+def get_team_loads(team_ids):
+    """{team_id: active incident count} with one get_all over the counter docs (O(T))."""
+    db = get_db()
+    loads = {tid: 0 for tid in team_ids}
+    if not team_ids:
+        return loads
+    refs = [db.collection(TEAM_COUNTERS).document(tid) for tid in team_ids]
+    for snap in db.get_all(refs):
+        if snap.exists:
+            loads[snap.id] = max(0, int((snap.to_dict() or {}).get("active_incidents") or 0))
+    return loads
+
+@instrumented("firestore.reconcile_team_loads")
+def reconcile_team_loads():
+    """Recount active incidents per team and overwrite the counters; returns {team_id: drift}."""
+    db = get_db()
+    actual = {}
+    for d in db.collection("processed_incidents").select(["assigned_team", "status"]).stream():
+        item = d.to_dict() or {}
+        if item.get("assigned_team") and _is_active(item.get("status")):
+            actual[item["assigned_team"]] = actual.get(item["assigned_team"], 0) + 1
+    stored = {}
+    for d in db.collection(TEAM_COUNTERS).stream():
+        stored[d.id] = int((d.to_dict() or {}).get("active_incidents") or 0)
+    drift = {tid: actual.get(tid, 0) - stored.get(tid, 0) for tid in set(actual) | set(stored)}
+    changed = [tid for tid, n in drift.items() if n]
+    for i in range(0, len(changed), 400):
+        batch = db.batch()
+        for tid in changed[i:i + 400]:
+            batch.set(db.collection(TEAM_COUNTERS).document(tid),
+                      {"active_incidents": actual.get(tid, 0), "reconciled_at": datetime.utcnow()}, merge=True)
+        batch.commit()
+    if changed:
+        logging.warning("Team load counters drifted: %s", {t: drift[t] for t in changed})
+    return {t: drift[t] for t in changed}
+
+_RECONCILER = None
+
+def start_team_load_reconciler(interval=TEAM_LOAD_RECONCILE_SECONDS):
+    """Run reconcile_team_loads() now and every `interval` seconds in a daemon thread (0 disables)."""
+    global _RECONCILER
+    if interval <= 0 or (_RECONCILER is not None and _RECONCILER.is_alive()):
+        return _RECONCILER
+
+    def loop():
+        while True:
+            try:
+                reconcile_team_loads()
+            except Exception:
+                logging.exception("Team load reconciliation failed")
+            time.sleep(interval)
+
+    _RECONCILER = threading.Thread(target=loop, name="team-load-reconciler", daemon=True)
+    _RECONCILER.start()
+    return _RECONCILER
+
+# fields returned for each incident when a map tile is served as points
+TILE_POINT_FIELDS = ["lat", "lng", "status", "analysis", "location", "timestamp"]
+
+@instrumented("firestore.get_tile")
+def get_tile(z, x, y, points_limit=TILE_POINTS_LIMIT):
+    """
+    Map tile z/x/y (XYZ scheme). Zoomed out: the pre-aggregated cells under the tile at
+    the next stored level (one range query, O(cells)). From TILE_POINTS_ZOOM in: the
+    incidents inside the tile (one range query on their quadkey, at most points_limit).
+    """
+    db = get_db()
+    qk = geo_tiles.quadkey(x, y, z)
+    tile = {"z": z, "x": x, "y": y, "quadkey": qk}
+    level = geo_tiles.aggregate_level(z)
+    if level is not None:
+        start, end = geo_tiles.prefix_range(qk)
+        q = (db.collection(geo_tiles.TILES_COLLECTION).where("z", "==", level)
+             .where("qk", ">=", start).where("qk", "<", end))
+        cells = []
+        for d in q.stream():
+            cell = geo_tiles.cell_summary(d.id, d.to_dict() or {})
+            if cell["count"] > 0:
+                cells.append(cell)
+        return {**tile, "mode": "aggregate", "level": level, "cells": cells, "total": sum(c["count"] for c in cells)}
+
+    start, end = geo_tiles.prefix_range(qk[:geo_tiles.POINT_QUADKEY_LEVEL])
+    q = (db.collection("processed_incidents").where("quadkey", ">=", start).where("quadkey", "<", end)
+         .select(TILE_POINT_FIELDS).limit(points_limit + 1))
+    points = []
+    for d in q.stream():
+        item = d.to_dict() or {}
+        # below the stored quadkey level the prefix only narrows it down to the parent cell
+        if z > geo_tiles.POINT_QUADKEY_LEVEL and geo_tiles.tile_xy(item["lat"], item["lng"], z) != (x, y):
+            continue
+        item["_id"] = d.id
+        item["severity"] = (item.pop("analysis", None) or {}).get("severity")
+        if hasattr(item.get("timestamp"), "isoformat"):
+            item["timestamp"] = item["timestamp"].isoformat()
+        points.append(item)
+    return {**tile, "mode": "points", "points": points[:points_limit], "truncated": len(points) > points_limit}
+
+@instrumented("firestore.rebuild_tile_aggregates")
+def rebuild_tile_aggregates():
+    """
+    Backfill / repair: recompute every tile cell from processed_incidents, overwrite the
+    stored cells, delete cells that no longer have incidents, and set the quadkey field on
+    incidents that lack it. Returns {"incidents", "cells", "quadkeys_set", "cells_deleted"}.
+    """
+    db = get_db()
+    cells, missing_qk = {}, []
+    incidents = 0
+    for d in db.collection("processed_incidents").select(["lat", "lng", "status", "analysis", "severity", "quadkey"]).stream():
+        item = d.to_dict() or {}
+        incidents += 1
+        qk = geo_tiles.incident_quadkey(item)
+        if qk and item.get("quadkey") != qk:
+            missing_qk.append((d.id, qk))
+        for cell, fields in geo_tiles.incident_tile_deltas({}, item).items():
+            cur = cells.setdefault(cell, {})
+            for f, n in fields.items():
+                cur[f] = cur.get(f, 0) + n
+    stale = [d.id for d in db.collection(geo_tiles.TILES_COLLECTION).select(["z"]).stream() if d.id not in cells]
+
+    writes = [("set", db.collection(geo_tiles.TILES_COLLECTION).document(c), {**f, "z": len(c), "qk": c}) for c, f in cells.items()]
+    writes += [("update", db.collection("processed_incidents").document(i), {"quadkey": qk}) for i, qk in missing_qk]
+    writes += [("delete", db.collection(geo_tiles.TILES_COLLECTION).document(c), None) for c in stale]
+    _commit_writes(db, writes)
+    return {"incidents": incidents, "cells": len(cells), "quadkeys_set": len(missing_qk), "cells_deleted": len(stale)}
+
+def _commit_writes(db, writes):
+    """Commit ("set" | "update" | "delete", ref, data) writes in batches of 400."""
+    for i in range(0, len(writes), 400):
+        batch = db.batch()
+        for op, ref, data in writes[i:i + 400]:
+            if op == "set":
+                batch.set(ref, data)
+            elif op == "update":
+                batch.update(ref, data)
+            else:
+                batch.delete(ref)
+        batch.commit()
+
+@instrumented("firestore.get_analytics")
+def get_analytics(start, end, bucket="hour"):
+    """
+    Incident analytics for [start, end] (UTC datetimes) from the hourly rollups: one range
+    query over at most one doc per hour (per shard), never the incidents themselves.
+    """
+    db = get_db()
+    q = (db.collection(rollups.ROLLUPS_COLLECTION).where("hour", ">=", rollups.hour_key(start))
+         .where("hour", "<=", rollups.hour_key(end)))
+    docs = {d.id: d.to_dict() or {} for d in q.stream()}
+    return {"from": start.isoformat(), "to": end.isoformat(), "bucket": bucket, "docs_read": len(docs),
+            **rollups.summarize(docs, bucket)}
+
+@instrumented("firestore.rebuild_rollups")
+def rebuild_rollups():
+    """
+    Backfill / repair: recompute every hourly rollup from processed_incidents (one projected
+    scan) plus the incident archive, overwrite the stored docs and delete hours that no
+    longer have incidents. Returns {"incidents" (hot), "hours", "hours_deleted"}.
+    """
+    db = get_db()
+    hours = {}
+    fields = ["timestamp", "status", "analysis", "severity", "dispatched_at", "closed_at", "status_updated_at"]
+    hot = set()
+
+    def add(doc):
+        for hour, deltas in rollups.incident_rollup_deltas({}, doc).items():
+            cur = hours.setdefault(hour, {})
+            for f, n in deltas.items():
+                cur[f] = cur.get(f, 0) + n
+
+    for d in db.collection("processed_incidents").select(fields).stream():
+        hot.add(d.id)
+        add(d.to_dict() or {})
+    # archived incidents keep counting in the analytics (services/archive_service.py)
+    from services.archive_service import archived_incident_docs
+    for doc in archived_incident_docs():
+        if doc["_id"] not in hot:
+            add(doc)
+    incidents = len(hot)
+    stale = [d.id for d in db.collection(rollups.ROLLUPS_COLLECTION).select(["hour"]).stream() if d.id not in hours]
+    writes = [("set", db.collection(rollups.ROLLUPS_COLLECTION).document(h), {**f, **rollups.doc_fields(h)}) for h, f in hours.items()]
+    writes += [("delete", db.collection(rollups.ROLLUPS_COLLECTION).document(h), None) for h in stale]
+    _commit_writes(db, writes)
+    return {"incidents": incidents, "hours": len(hours), "hours_deleted": len(stale)}
+
+# fields of a dispatch doc returned in summary mode (everything but the large plan_text)
+DISPATCH_SUMMARY_FIELDS = ["dispatch_id", "team_id", "created_by", "created_at", "status", "plan_preview",
+                           "incidents", "commit_state"]
+# live incident fields embedded in the joined dispatch view
+DISPATCH_VIEW_INCIDENT_FIELDS = ["location", "description", "lat", "lng", "status", "status_updated_at",
+                                 "dispatched_at", "analysis", "image_url", "reporter_name", "reporter_phone", "timestamp"]
+
+@instrumented("firestore.get_dispatches_by_team")
+def get_dispatches_by_team(team_id, active_only=False, summary=False, limit=None, cursor=None):
+    """
+    Dispatches of a team. With no options: every dispatch, full documents (as before).
+    active_only skips completed dispatches, summary leaves out plan_text, and limit/cursor
+    paginate newest-first (cursor = last dispatch id of the previous page); with limit the
+    result is {"items": [...], "next_cursor": id or None}.
+    """
     db = get_db()
+    col = db.collection("dispatches")
+    q = col.where("team_id", "==", team_id)
+    if active_only:
+        q = q.where("status", "==", "assigned")
+    if limit:
+        q = q.order_by("created_at", direction=DESCENDING)
+        if cursor:
+            snap = col.document(cursor).get()
+            if snap.exists:
+                q = q.start_after(snap)
+        q = q.limit(int(limit))
+    if summary:
+        q = q.select(DISPATCH_SUMMARY_FIELDS)
     res = []
-    q = db.collection("dispatches").where("team_id", "==", team_id).stream()
-    for doc in q:
+    for doc in q.stream():
         d = doc.to_dict() or {}
         d["_id"] = doc.id
         res.append(d)
-    return res
+    if not limit:
+        return res
+    return {"items": res, "next_cursor": res[-1]["_id"] if len(res) == int(limit) else None}
+
+@instrumented("firestore.get_dispatch_view")
+def get_dispatch_view(dispatch_id):
+    """
+    Dispatch doc with each incident's live fields embedded, read with one batched
+    get_all over the incident refs. Returns None if the dispatch does not exist.
+    """
+    db = get_db()
+    snap = db.collection("dispatches").document(dispatch_id).get()
+    if not snap.exists:
+        return None
+    d = snap.to_dict() or {}
+    d["_id"] = snap.id
+    entries = [i for i in d.get("incidents") or [] if i.get("_id")]
+    refs = [db.collection("processed_incidents").document(i["_id"]) for i in entries]
+    live = {}
+    if refs:
+        for s in db.get_all(refs, field_paths=DISPATCH_VIEW_INCIDENT_FIELDS):
+            if s.exists:
+                live[s.id] = s.to_dict() or {}
+    incidents = []
+    for entry in d.get("incidents") or []:
+        item = dict(entry)
+        cur = live.get(entry.get("_id"))
+        if cur is not None:
+            item.update(cur)
+            item["severity"] = (cur.get("analysis") or {}).get("severity") or entry.get("severity")
+        else:
+            item["missing"] = True
+        for k in ("timestamp", "status_updated_at", "dispatched_at"):
+            if hasattr(item.get(k), "isoformat"):
+                item[k] = item[k].isoformat()
+        incidents.append(item)
+    d["incidents"] = incidents
+    d["all_closed"] = bool(incidents) and all((i.get("status") or "").lower() == "closed" for i in incidents)
+    return d
+
+@instrumented("firestore.mark_dispatch_completed")
+def mark_dispatch_completed(dispatch_id):
+    """Flag a dispatch whose incidents are all closed, so active-only listings skip it."""
+    db = get_db()
+    db.collection("dispatches").document(dispatch_id).update({"status": "completed", "completed_at": datetime.utcnow().isoformat()})
+    return True
 
+@instrumented("firestore.update_incident_assignment")
 def update_incident_assignment(doc_id, dispatch_id=None, team_id=None, new_status=None):
     """
     Update incident assignment fields.
@@ -263,11 +910,9 @@ def update_incident_assignment(doc_id, dispatch_id=None, team_id=None, new_statu
 
     # Only set assigned_team if team_id is a non-empty string (truthy)
     # If you want to explicitly remove assigned_team, pass team_id=False
-    from firebase_admin import firestore as _firestore
-
     if team_id is False:
         # Explicit remove/unassign
-        update["assigned_team"] = _firestore.DELETE_FIELD
+        update["assigned_team"] = _transforms().DELETE_FIELD
     elif team_id is not None:
         # If team_id provided but empty string, treat as "do not set"
         if isinstance(team_id, str) and team_id.strip() != "":
@@ -281,8 +926,17 @@ def update_incident_assignment(doc_id, dispatch_id=None, team_id=None, new_statu
         update["status_updated_at"] = datetime.utcnow()
         if new_status == "rescue_dispatched":
             update["dispatched_at"] = datetime.utcnow()
+        elif new_status == "closed":
+            update["closed_at"] = datetime.utcnow()
 
     if update:
-        ref.update(update)
+        before = ref.get().to_dict() or {}
+        after = dict(before, **update)
+        if team_id is False:
+            after.pop("assigned_team", None)
+        batch = db.batch()
+        batch.update(ref, update)
+        apply_incident_deltas(batch, incident_deltas(before, after))
+        batch.commit()
     return True
 
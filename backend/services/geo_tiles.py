@@ -0,0 +1,125 @@
+# backend/services/geo_tiles.py
+
+"""
+Web-Mercator tile math for the incident map aggregates (no Firestore access here).
+
+Tiles use the usual XYZ scheme (same z/x/y as Google / OSM tiles) and are keyed by
+their quadkey, so every descendant of a tile shares its quadkey as a prefix and a
+viewport tile's cells / points can be fetched with one prefix range query.
+
+Aggregates are kept at TILE_LEVELS; each incident with coordinates counts in one
+cell per level (count, per-severity, per-status, and coordinate sums for the
+cell centroid). incident_tile_deltas() turns an incident write into the
+Increment deltas for those cells.
+"""
+
+import os
+import math
+
+TILE_LEVELS = tuple(int(z) for z in os.getenv("TILE_LEVELS", "4,6,8,10,12,14").split(","))
+# at and above this zoom GET /api/tiles returns individual incidents
+TILE_POINTS_ZOOM = int(os.getenv("TILE_POINTS_ZOOM", "13"))
+# quadkey level stored on each incident for point queries
+POINT_QUADKEY_LEVEL = 18
+MAX_LAT = 85.05112878
+
+TILES_COLLECTION = "incident_tiles"
+
+
+def tile_xy(lat, lng, z):
+    lat = max(-MAX_LAT, min(MAX_LAT, float(lat)))
+    n = 1 << z
+    x = int((float(lng) + 180.0) / 360.0 * n)
+    s = math.sin(math.radians(lat))
+    y = int((0.5 - math.log((1 + s) / (1 - s)) / (4 * math.pi)) * n)
+    return min(max(x, 0), n - 1), min(max(y, 0), n - 1)
+
+
+def quadkey(x, y, z):
+    digits = []
+    for i in range(z, 0, -1):
+        mask = 1 << (i - 1)
+        digits.append(str((1 if x & mask else 0) + (2 if y & mask else 0)))
+    return "".join(digits)
+
+
+def quadkey_to_xyz(qk):
+    x = y = 0
+    z = len(qk)
+    for i, c in enumerate(qk):
+        mask = 1 << (z - i - 1)
+        d = int(c)
+        if d & 1:
+            x |= mask
+        if d & 2:
+            y |= mask
+    return x, y, z
+
+
+def prefix_range(qk):
+    """(start, end) bounds for a `>= start, < end` range query over quadkeys under qk."""
+    return qk, qk + "4"
+
+
+def incident_quadkey(data):
+    """Level-POINT_QUADKEY_LEVEL quadkey of an incident, or None without coordinates."""
+    lat, lng = data.get("lat"), data.get("lng")
+    if lat is None or lng is None:
+        return None
+    try:
+        return quadkey(*tile_xy(lat, lng, POINT_QUADKEY_LEVEL), POINT_QUADKEY_LEVEL)
+    except (TypeError, ValueError):
+        return None
+
+
+def field_key(value):
+    """Counter field name fragment for a category value ("In Progress" -> "in_progress")."""
+    return "".join(c if c.isalnum() else "_" for c in str(value or "unknown").lower())
+
+
+def _contribution(data):
+    """{cell doc id: {field: n}} for one incident (empty when it has no coordinates)."""
+    qk = incident_quadkey(data or {})
+    if qk is None:
+        return {}
+    sev = field_key((data.get("analysis") or {}).get("severity") or data.get("severity"))
+    status = field_key(data.get("status") or "new")
+    lat, lng = float(data["lat"]), float(data["lng"])
+    fields = {"count": 1, f"sev_{sev}": 1, f"status_{status}": 1, "sum_lat": lat, "sum_lng": lng}
+    return {qk[:z]: dict(fields) for z in TILE_LEVELS}
+
+
+def incident_tile_deltas(before, after):
+    """{cell doc id: {field: delta}} turning `before` into `after` (either may be {} / None)."""
+    out = {}
+    for sign, data in ((-1, before), (1, after)):
+        for cell, fields in _contribution(data).items():
+            cur = out.setdefault(cell, {})
+            for f, v in fields.items():
+                cur[f] = cur.get(f, 0) + sign * v
+    # drop zero deltas (e.g. a status change leaves count / sums untouched)
+    out = {c: {f: v for f, v in fs.items() if abs(v) > 1e-12} for c, fs in out.items()}
+    return {c: fs for c, fs in out.items() if fs}
+
+
+def aggregate_level(z):
+    """Stored level to answer a zoom-z tile with (16-64 cells per tile), or None for points."""
+    if z >= TILE_POINTS_ZOOM:
+        return None
+    for level in TILE_LEVELS:
+        if level >= z + 2:
+            return level
+    return TILE_LEVELS[-1] if TILE_LEVELS[-1] > z else None
+
+
+def cell_summary(cell_id, data):
+    """API shape of one stored cell."""
+    x, y, z = quadkey_to_xyz(cell_id)
+    count = int(data.get("count") or 0)
+    sev = {k[4:]: int(v) for k, v in data.items() if k.startswith("sev_") and v}
+    status = {k[7:]: int(v) for k, v in data.items() if k.startswith("status_") and v}
+    out = {"quadkey": cell_id, "z": z, "x": x, "y": y, "count": count, "severity": sev, "status": status}
+    if count:
+        out["lat"] = round(float(data.get("sum_lat") or 0.0) / count, 6)
+        out["lng"] = round(float(data.get("sum_lng") or 0.0) / count, 6)
+    return out
@@ -0,0 +1,268 @@
+# backend/services/http_cache.py
+
+"""
+Conditional GET and compression for the polled listing endpoints.
+
+Versions: every write through get_db() bumps a change counter for its top-level
+collection (firestore_profiler.on_write). The counters live in a small SQLite file
+shared by the worker processes of a host (config.VERSIONS_PATH), or in process memory
+when that is "".
+
+@conditional("processed_incidents", identity=...) gives a route a weak ETag made of a
+version key (those counters, the request path and the caller's identity) plus a digest of
+the body rendered for it. The version is read before the handler runs, so a write racing
+with the query only makes the next poll refetch. The rendered body of the current version
+is kept, so while it is fresh a matching If-None-Match gets 304 without running the
+handler (no Firestore query, no serialization) and other pollers of the same version skip
+the query too. Each rendered version is fresh for ETAG_MAX_AGE_SECONDS from when it was
+rendered (the max-age of the server-side copy); after that the next poll runs the handler
+once, which bounds staleness from writes this host cannot see (other hosts, the console)
+and lets time-based changes such as the auto-close in get_all_incidents happen. If the
+body came out the same the ETag is unchanged and revalidations still get 304; if it
+changed, so does the digest, and every poller holding the old ETag gets the new body.
+Versions are rendered at different times, so their validators do not all expire together.
+
+init_app() compresses JSON / text responses of at least COMPRESS_MIN_BYTES with brotli
+(when the optional `brotli` package is installed and the client accepts it) or gzip.
+"""
+
+import os
+import gzip
+import time
+import uuid
+import sqlite3
+import hashlib
+import logging
+import functools
+import threading
+
+from cachetools import TTLCache
+from flask import request, g, current_app
+
+from config import VERSIONS_PATH
+from services import metrics, firestore_profiler
+
+ETAG_ENABLED = os.getenv("ETAG_ENABLED", "1") == "1"
+ETAG_MAX_AGE_SECONDS = float(os.getenv("ETAG_MAX_AGE_SECONDS", "60"))
+RENDERED_CACHE_SIZE = int(os.getenv("ETAG_RENDERED_CACHE_SIZE", "256"))
+COMPRESS_ENABLED = os.getenv("COMPRESS_ENABLED", "1") == "1"
+COMPRESS_MIN_BYTES = int(os.getenv("COMPRESS_MIN_BYTES", "1024"))
+GZIP_LEVEL = int(os.getenv("COMPRESS_GZIP_LEVEL", "5"))
+BROTLI_QUALITY = int(os.getenv("COMPRESS_BROTLI_QUALITY", "4"))
+COMPRESSIBLE = ("application/json", "text/")
+
+CONDITIONAL = metrics.counter("crisismap_http_conditional_total", "Conditional GET outcomes", ("route", "result"))
+COMPRESSED = metrics.counter("crisismap_http_compressed_total", "Compressed responses", ("encoding",))
+
+try:
+    import brotli
+except ImportError:  # optional
+    brotli = None
+
+
+class MemoryVersions:
+    """Change counters in process memory (only sees this process's writes)."""
+
+    def __init__(self):
+        self.epoch = uuid.uuid4().hex
+        self._versions = {}
+        self._lock = threading.Lock()
+
+    def bump(self, collections):
+        with self._lock:
+            for c in collections:
+                self._versions[c] = self._versions.get(c, 0) + 1
+
+    def get(self, collections):
+        with self._lock:
+            return tuple(self._versions.get(c, 0) for c in collections)
+
+
+class SqliteVersions:
+    """Change counters in a local SQLite file shared by the worker processes of a host."""
+
+    def __init__(self, path):
+        self.path = str(path)
+        self._local = threading.local()
+        conn = self._conn()
+        conn.execute("CREATE TABLE IF NOT EXISTS versions (collection TEXT PRIMARY KEY, version INTEGER NOT NULL) WITHOUT ROWID")
+        # a recreated file starts a new epoch, so its counters can never repeat an old ETag
+        conn.execute("INSERT OR IGNORE INTO versions VALUES ('', ?)", (int.from_bytes(os.urandom(6), "big"),))
+        self.epoch = conn.execute("SELECT version FROM versions WHERE collection = ''").fetchone()[0]
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30.0, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def bump(self, collections):
+        self._conn().executemany(
+            "INSERT INTO versions VALUES (?, 1) ON CONFLICT(collection) DO UPDATE SET version = version + 1",
+            [(c,) for c in collections if c])
+
+    def get(self, collections):
+        rows = dict(self._conn().execute(
+            f"SELECT collection, version FROM versions WHERE collection IN ({','.join('?' * len(collections))})",
+            collections).fetchall())
+        return tuple(rows.get(c, 0) for c in collections)
+
+
+_VERSIONS = None
+_VERSIONS_LOCK = threading.Lock()
+
+def get_versions():
+    global _VERSIONS
+    with _VERSIONS_LOCK:
+        if _VERSIONS is None:
+            _VERSIONS = SqliteVersions(VERSIONS_PATH) if VERSIONS_PATH else MemoryVersions()
+        return _VERSIONS
+
+def _on_write(collections):
+    get_versions().bump(collections)
+
+firestore_profiler.on_write(_on_write)
+
+
+# rendered 200 bodies by version key: {"etag", "body", "mimetype", "encoded": {encoding: bytes}, "fresh_until"}
+_RENDERED = TTLCache(maxsize=RENDERED_CACHE_SIZE, ttl=ETAG_MAX_AGE_SECONDS * 4)
+_RENDERED_LOCK = threading.Lock()
+_RENDERING = {}  # version key -> lock held while one request re-renders it
+
+
+def _version_key(collections, identity):
+    versions = get_versions()
+    key = (versions.epoch, versions.get(collections), request.full_path, identity)
+    return hashlib.blake2b(repr(key).encode("utf-8"), digest_size=12).hexdigest()
+
+
+def _etag(vkey, body):
+    return f"{vkey}.{hashlib.blake2b(body, digest_size=6).hexdigest()}"
+
+
+def _fresh_entry(vkey):
+    with _RENDERED_LOCK:
+        entry = _RENDERED.get(vkey)
+    return entry if entry is not None and entry["fresh_until"] > time.monotonic() else None
+
+
+def _cacheable(resp, etag):
+    resp.set_etag(etag, weak=True)
+    # browsers keep the body and revalidate with If-None-Match on every poll
+    resp.headers["Cache-Control"] = "private, max-age=0, must-revalidate"
+    resp.vary.update(("x-admin-token", "x-team-token"))
+    return resp
+
+
+def _not_modified(route, etag):
+    CONDITIONAL.inc(route=route, result="not_modified")
+    return _cacheable(current_app.response_class(status=304), etag)
+
+
+def conditional(*collections, identity=None):
+    """
+    Route decorator: ETag from the change counters of `collections` and the rendered body.
+    identity() returns who the response is for (e.g. the team id), or None when
+    unauthorized - then the view runs as usual and answers 401 itself.
+    """
+    collections = tuple(sorted(collections))
+
+    def deco(view):
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            if not ETAG_ENABLED or request.method != "GET":
+                return view(*args, **kwargs)
+            who = identity() if identity else ""
+            if who is None:
+                return view(*args, **kwargs)
+            route = request.url_rule.rule
+            vkey = _version_key(collections, who)
+            entry = _fresh_entry(vkey)
+            if entry is None:
+                # one request re-renders an expired version; concurrent pollers wait for it
+                with _RENDERED_LOCK:
+                    lock = _RENDERING.setdefault(vkey, threading.Lock())
+                with lock:
+                    entry = _fresh_entry(vkey)
+                    if entry is None:
+                        try:
+                            resp = current_app.make_response(view(*args, **kwargs))
+                        finally:
+                            with _RENDERED_LOCK:
+                                _RENDERING.pop(vkey, None)
+                        if resp.status_code != 200:
+                            return resp
+                        CONDITIONAL.inc(route=route, result="rendered")
+                        body = resp.get_data()
+                        etag = _etag(vkey, body)
+                        with _RENDERED_LOCK:
+                            old = _RENDERED.get(vkey)
+                            if old is not None and old["etag"] == etag:
+                                # same version re-rendered after max-age with nothing changed
+                                old["fresh_until"] = time.monotonic() + ETAG_MAX_AGE_SECONDS
+                                entry = old
+                            else:
+                                entry = {"etag": etag, "body": body, "mimetype": resp.mimetype, "encoded": {},
+                                         "fresh_until": time.monotonic() + ETAG_MAX_AGE_SECONDS}
+                                _RENDERED[vkey] = entry
+                        if request.if_none_match.contains_weak(etag):
+                            return _not_modified(route, etag)
+                        g._rendered_entry = entry
+                        return _cacheable(resp, etag)
+            if request.if_none_match.contains_weak(entry["etag"]):
+                return _not_modified(route, entry["etag"])
+            CONDITIONAL.inc(route=route, result="cached")
+            g._rendered_entry = entry
+            return _cacheable(current_app.response_class(entry["body"], mimetype=entry["mimetype"]), entry["etag"])
+        return wrapper
+    return deco
+
+
+def _encoding():
+    accept = request.accept_encodings
+    if brotli is not None and accept["br"]:
+        return "br"
+    if accept["gzip"]:
+        return "gzip"
+    return None
+
+
+def _encode(data, encoding):
+    if encoding == "br":
+        return brotli.compress(data, quality=BROTLI_QUALITY)
+    return gzip.compress(data, compresslevel=GZIP_LEVEL, mtime=0)
+
+
+def _compress(response):
+    if (response.status_code != 200 or response.direct_passthrough or response.is_streamed
+            or "Content-Encoding" in response.headers or not (response.mimetype or "").startswith(COMPRESSIBLE)):
+        return response
+    response.vary.add("Accept-Encoding")
+    encoding = _encoding()
+    if encoding is None:
+        return response
+    data = response.get_data()
+    if len(data) < COMPRESS_MIN_BYTES:
+        return response
+    entry = g.get("_rendered_entry")
+    encoded = entry["encoded"].get(encoding) if entry is not None else None
+    if encoded is None:
+        try:
+            encoded = _encode(data, encoding)
+        except Exception as e:
+            logging.warning("Compression failed: %s", e)
+            return response
+        if entry is not None:
+            entry["encoded"][encoding] = encoded
+    response.set_data(encoded)
+    response.headers["Content-Encoding"] = encoding
+    COMPRESSED.inc(encoding=encoding)
+    return response
+
+
+def init_app(app):
+    if COMPRESS_ENABLED:
+        app.after_request(_compress)
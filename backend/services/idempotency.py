@@ -0,0 +1,303 @@
+# backend/services/idempotency.py
+
+"""
+Idempotency-Key support for POST endpoints (used by /api/submit-report).
+
+A client sends the same Idempotency-Key header on every retry of one submission. The
+first request with a key claims it and runs; its 2xx response is recorded for
+IDEMPOTENCY_TTL_SECONDS and returned verbatim (plus "Idempotent-Replayed: true") to
+every repeat, without running the handler again. A repeat that arrives while the first
+request is still running waits up to IDEMPOTENCY_WAIT_SECONDS for its result (409 with
+Retry-After if it is still running after that). Non-2xx responses and exceptions release
+the claim so a retry runs normally - unless the handler already stored something
+(record_write()): then the key is pinned to the stored document ids, so a retry does not
+write a second copy. Instead the retry is handed to the route's resume(writes) hook,
+which finishes the work from what was stored. For submit-report, that means processing
+the stored raw report. Whatever resume returns is recorded as the key's response; with
+no hook, or nothing left to resume, the retry gets a 202 "stored" answer. Reusing a key
+with a different request body gets 422.
+
+Keys live in process memory by default. With IDEMPOTENCY_DB_PATH set they are kept in a
+local SQLite file instead, shared by every worker process on the host (retries may land
+on a different gunicorn worker); waiters in other processes poll it. A claim whose worker
+died is taken over after IDEMPOTENCY_PENDING_SECONDS.
+"""
+
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import logging
+import functools
+import threading
+
+from cachetools import TTLCache
+from flask import request, jsonify, current_app, g, has_request_context
+
+from services import metrics
+
+IDEMPOTENCY_ENABLED = os.getenv("IDEMPOTENCY_ENABLED", "1") == "1"
+IDEMPOTENCY_TTL_SECONDS = float(os.getenv("IDEMPOTENCY_TTL_SECONDS", str(24 * 3600)))
+IDEMPOTENCY_WAIT_SECONDS = float(os.getenv("IDEMPOTENCY_WAIT_SECONDS", "30"))
+IDEMPOTENCY_PENDING_SECONDS = float(os.getenv("IDEMPOTENCY_PENDING_SECONDS", "120"))
+IDEMPOTENCY_MAX_KEYS = int(os.getenv("IDEMPOTENCY_MAX_KEYS", "100000"))
+IDEMPOTENCY_DB_PATH = os.getenv("IDEMPOTENCY_DB_PATH", "")
+IDEMPOTENCY_POLL_SECONDS = 0.05
+MAX_KEY_LENGTH = 255
+
+NEW = "new"
+REPLAY = "replay"
+CONFLICT = "conflict"
+BUSY = "busy"
+
+PENDING = "pending"
+DONE = "done"
+
+OUTCOMES = metrics.counter("crisismap_idempotency_total", "Requests carrying an Idempotency-Key", ("outcome",))
+
+
+class MemoryBackend:
+    """Records in a TTLCache; only dedupes within this process."""
+
+    shared = False
+
+    def __init__(self, ttl=IDEMPOTENCY_TTL_SECONDS, maxsize=IDEMPOTENCY_MAX_KEYS):
+        self._records = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._lock = threading.Lock()
+
+    def claim(self, key, fingerprint, now):
+        """None if the key was claimed for this request, else the existing record."""
+        with self._lock:
+            rec = self._records.get(key)
+            if rec is None or (rec["state"] == PENDING and now - rec["claimed_at"] > IDEMPOTENCY_PENDING_SECONDS):
+                self._records[key] = {"fingerprint": fingerprint, "state": PENDING, "claimed_at": now}
+                return None
+            return dict(rec)
+
+    def complete(self, key, response):
+        with self._lock:
+            rec = self._records.get(key)
+            if rec is not None:
+                self._records[key] = {**rec, "state": DONE, "response": response}
+
+    def release(self, key):
+        with self._lock:
+            self._records.pop(key, None)
+
+
+class SqliteBackend:
+    """Records in a local SQLite file shared by the worker processes of one host."""
+
+    shared = True
+
+    def __init__(self, path, ttl=IDEMPOTENCY_TTL_SECONDS):
+        self.path = str(path)
+        self.ttl = ttl
+        self._local = threading.local()
+        self._last_purge = 0.0
+        self._conn().execute("""CREATE TABLE IF NOT EXISTS idempotency_keys (
+            key TEXT PRIMARY KEY, fingerprint TEXT NOT NULL, state TEXT NOT NULL,
+            claimed_at REAL NOT NULL, expires_at REAL NOT NULL, response TEXT) WITHOUT ROWID""")
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30.0, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def claim(self, key, fingerprint, now):
+        conn = self._conn()
+        if now - self._last_purge > 60:
+            self._last_purge = now
+            conn.execute("DELETE FROM idempotency_keys WHERE expires_at < ?", (now,))
+        # insert, or take over an expired record / a pending claim whose worker died
+        cur = conn.execute(
+            """INSERT INTO idempotency_keys (key, fingerprint, state, claimed_at, expires_at) VALUES (?, ?, ?, ?, ?)
+               ON CONFLICT(key) DO UPDATE SET fingerprint = excluded.fingerprint, state = excluded.state,
+                   claimed_at = excluded.claimed_at, expires_at = excluded.expires_at, response = NULL
+               WHERE idempotency_keys.expires_at < excluded.claimed_at
+                  OR (idempotency_keys.state = ? AND idempotency_keys.claimed_at < ?)""",
+            (key, fingerprint, PENDING, now, now + self.ttl, PENDING, now - IDEMPOTENCY_PENDING_SECONDS))
+        if cur.rowcount == 1:
+            return None
+        row = conn.execute("SELECT fingerprint, state, claimed_at, response FROM idempotency_keys WHERE key = ?",
+                           (key,)).fetchone()
+        if row is None:  # released in between; try again
+            return self.claim(key, fingerprint, now)
+        return {"fingerprint": row[0], "state": row[1], "claimed_at": row[2],
+                "response": json.loads(row[3]) if row[3] else None}
+
+    def complete(self, key, response):
+        self._conn().execute("UPDATE idempotency_keys SET state = ?, response = ? WHERE key = ?",
+                             (DONE, json.dumps(response), key))
+
+    def release(self, key):
+        self._conn().execute("DELETE FROM idempotency_keys WHERE key = ? AND state = ?", (key, PENDING))
+
+
+class IdempotencyStore:
+    def __init__(self, backend):
+        self.backend = backend
+        self._events = {}  # key -> Event, wakes same-process waiters
+        self._lock = threading.Lock()
+
+    def begin(self, key, fingerprint, wait=IDEMPOTENCY_WAIT_SECONDS):
+        """(outcome, saved response): NEW (caller runs, then finish/abandon), REPLAY, CONFLICT or BUSY."""
+        deadline = time.monotonic() + wait
+        while True:
+            with self._lock:
+                rec = self.backend.claim(key, fingerprint, time.time())
+                if rec is None:
+                    self._events[key] = threading.Event()
+                    return NEW, None
+                event = self._events.get(key)
+            if rec["fingerprint"] != fingerprint:
+                return CONFLICT, None
+            if rec["state"] == DONE:
+                return REPLAY, rec["response"]
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return BUSY, None
+            if event is not None:
+                event.wait(remaining)
+            else:  # claimed by another process
+                time.sleep(min(remaining, IDEMPOTENCY_POLL_SECONDS))
+
+    def finish(self, key, response):
+        self.backend.complete(key, response)
+        self._wake(key)
+
+    def abandon(self, key):
+        self.backend.release(key)
+        self._wake(key)
+
+    def _wake(self, key):
+        with self._lock:
+            event = self._events.pop(key, None)
+        if event is not None:
+            event.set()
+
+
+_STORE = None
+_STORE_LOCK = threading.Lock()
+
+def get_idempotency_store():
+    global _STORE
+    with _STORE_LOCK:
+        if _STORE is None:
+            _STORE = IdempotencyStore(SqliteBackend(IDEMPOTENCY_DB_PATH) if IDEMPOTENCY_DB_PATH else MemoryBackend())
+        return _STORE
+
+
+def form_fingerprint():
+    """Hash of the form fields and uploaded file names/types of the current request."""
+    h = hashlib.sha256()
+    for k in sorted(request.form):
+        for v in request.form.getlist(k):
+            h.update(f"{k}={v}\0".encode("utf-8"))
+    for k in sorted(request.files):
+        for f in request.files.getlist(k):
+            h.update(f"{k}@{f.filename}:{f.mimetype}\0".encode("utf-8"))
+    return h.hexdigest()
+
+
+def record_write(collection, doc_id):
+    """Note a document stored by the current request, so a failure after it does not free the key."""
+    if has_request_context():
+        g.setdefault("idempotent_writes", []).append({"collection": collection, "id": doc_id})
+
+
+def write_recorder():
+    """record_write() bound to the current request, for work it hands to another thread."""
+    writes = g.setdefault("idempotent_writes", []) if has_request_context() else None
+
+    def record(collection, doc_id):
+        if writes is not None:
+            writes.append({"collection": collection, "id": doc_id})
+    return record
+
+
+def _stored_response(writes):
+    """Recorded for a key whose request failed after storing documents; "writes" feeds resume()."""
+    return {"status": 202, "mimetype": "application/json", "writes": writes,
+            "body": json.dumps({"ok": True, "stored": True, "documents": writes,
+                                "warning": "the report was stored but its processing did not complete"})}
+
+
+def _finish(store, key, resp):
+    """Record a 2xx response for the key (left as it was if that fails)."""
+    try:
+        store.finish(key, {"status": resp.status_code, "mimetype": resp.mimetype, "body": resp.get_data(as_text=True)})
+    except Exception as e:
+        logging.warning("Could not record Idempotency-Key result: %s", e)
+        return False
+    return True
+
+
+def _settle_failed(store, key, writes):
+    """Free the key of a failed request, or pin it to what the request already stored."""
+    if not writes:
+        store.abandon(key)
+        return
+    try:
+        store.finish(key, _stored_response(writes))
+    except Exception as e:
+        logging.warning("Could not record Idempotency-Key result: %s", e)
+        store.abandon(key)
+
+
+def idempotent(fingerprint=form_fingerprint, resume=None):
+    """
+    Route decorator: dedupe requests by Idempotency-Key (see module docstring). resume(writes)
+    is called for a retry of a key pinned to stored documents; it returns a response, or None
+    when there is nothing left to do.
+    """
+    def deco(view):
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            key = (request.headers.get("Idempotency-Key") or "").strip()
+            if not IDEMPOTENCY_ENABLED or not key:
+                return view(*args, **kwargs)
+            if len(key) > MAX_KEY_LENGTH:
+                return jsonify({"error": f"Idempotency-Key longer than {MAX_KEY_LENGTH} characters"}), 400
+            scoped = f"{request.endpoint}:{key}"
+            store = get_idempotency_store()
+            outcome, saved = store.begin(scoped, fingerprint())
+            OUTCOMES.inc(outcome=outcome)
+            if outcome == REPLAY and resume is not None and saved.get("writes"):
+                g.idempotent_writes = list(saved["writes"])
+                result = resume(saved["writes"])
+                if result is not None:
+                    resp = current_app.make_response(result)
+                    if 200 <= resp.status_code < 300:
+                        _finish(store, scoped, resp)
+                    return resp
+            if outcome == REPLAY:
+                resp = current_app.response_class(saved["body"], status=saved["status"], mimetype=saved["mimetype"])
+                resp.headers["Idempotent-Replayed"] = "true"
+                return resp
+            if outcome == CONFLICT:
+                return jsonify({"error": "Idempotency-Key was already used for a different request"}), 422
+            if outcome == BUSY:
+                retry_after = max(1, int(IDEMPOTENCY_WAIT_SECONDS // 10))
+                resp = jsonify({"error": "the original request is still being processed", "retry_after": retry_after})
+                resp.headers["Retry-After"] = str(retry_after)
+                return resp, 409
+            g.idempotent_writes = []
+            try:
+                resp = current_app.make_response(view(*args, **kwargs))
+            except BaseException:
+                _settle_failed(store, scoped, g.idempotent_writes)
+                raise
+            if 200 <= resp.status_code < 300:
+                if not _finish(store, scoped, resp):
+                    store.abandon(scoped)
+            else:
+                _settle_failed(store, scoped, g.idempotent_writes)
+            return resp
+        return wrapper
+    return deco
@@ -0,0 +1,211 @@
+# backend/services/llm_gateway.py
+
+"""
+LLM gateway: every Gemini call goes through LLMGateway.generate(), which applies
+
+- a token-bucket rate limiter (requests/second + burst),
+- an AIMD adaptive concurrency limit (grow by ~1 per window of fast successes,
+  halve on timeout/error/slow call); callers wait at most queue_seconds for a slot,
+- a per-call deadline (the call runs on a worker thread; the caller stops waiting
+  at the deadline and the slot is released only when the call actually returns,
+  so abandoned calls still count against the limit),
+- a circuit breaker (open after N consecutive failures, half-open probe after a
+  cooldown).
+
+When a call is not admitted it raises LLMUnavailable immediately, and callers fall
+back to the ML + heuristic path instead of blocking a Flask worker.
+"""
+
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+
+from services import metrics
+
+STATE_CLOSED = "closed"
+STATE_OPEN = "open"
+STATE_HALF_OPEN = "half_open"
+
+REJECTED = metrics.counter("crisismap_llm_rejected_total", "LLM calls not admitted (fell back immediately)", ("reason",))
+OUTCOMES = metrics.counter("crisismap_llm_calls_total", "LLM calls by outcome", ("outcome",))
+LIMIT_GAUGE = metrics.gauge("crisismap_llm_concurrency_limit", "Current adaptive LLM concurrency limit")
+INFLIGHT_GAUGE = metrics.gauge("crisismap_llm_inflight", "LLM calls currently running (incl. abandoned)")
+BREAKER_GAUGE = metrics.gauge("crisismap_llm_breaker_open", "1 when the LLM circuit breaker is open / half-open")
+
+
+class LLMUnavailable(Exception):
+    """Raised when the gateway refuses or abandons a call; callers should fall back."""
+
+
+class TokenBucket:
+    def __init__(self, rate, burst):
+        self.rate = float(rate)
+        self.capacity = float(burst)
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def try_acquire(self, n=1.0):
+        if self.rate <= 0:
+            return True
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= n:
+                self.tokens -= n
+                return True
+            return False
+
+
+class AIMDLimiter:
+    def __init__(self, initial, min_limit=1, max_limit=64, backoff=0.5, slow_seconds=None):
+        self.limit = float(initial)
+        self.min_limit = float(min_limit)
+        self.max_limit = float(max_limit)
+        self.backoff = backoff
+        self.slow_seconds = slow_seconds
+        self.inflight = 0
+        self._cond = threading.Condition()
+
+    def try_acquire(self, wait_seconds=0.0):
+        """Take a slot, waiting at most wait_seconds for one to free up."""
+        deadline = time.monotonic() + wait_seconds
+        with self._cond:
+            while self.inflight >= int(self.limit):
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+            self.inflight += 1
+            return True
+
+    def release(self, ok, latency):
+        with self._cond:
+            self.inflight -= 1
+            self._cond.notify()
+            if ok and (self.slow_seconds is None or latency <= self.slow_seconds):
+                # additive increase: +1 per `limit` successes
+                self.limit = min(self.max_limit, self.limit + 1.0 / self.limit)
+            else:
+                self.limit = max(self.min_limit, self.limit * self.backoff)
+
+
+class CircuitBreaker:
+    def __init__(self, failure_threshold=5, cooldown_seconds=30.0):
+        self.failure_threshold = failure_threshold
+        self.cooldown_seconds = cooldown_seconds
+        self.state = STATE_CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._probe_inflight = False
+        self._lock = threading.Lock()
+
+    def allow(self):
+        with self._lock:
+            if self.state == STATE_CLOSED:
+                return True
+            if self.state == STATE_OPEN and time.monotonic() - self.opened_at >= self.cooldown_seconds:
+                self.state = STATE_HALF_OPEN
+                self._probe_inflight = False
+            if self.state == STATE_HALF_OPEN and not self._probe_inflight:
+                self._probe_inflight = True
+                return True
+            return False
+
+    def cancel_probe(self):
+        """The admitted half-open probe was not sent after all (rejected further down)."""
+        with self._lock:
+            self._probe_inflight = False
+
+    def record(self, ok):
+        with self._lock:
+            if ok:
+                self.failures = 0
+                self.state = STATE_CLOSED
+            else:
+                self.failures += 1
+                if self.state == STATE_HALF_OPEN or self.failures >= self.failure_threshold:
+                    self.state = STATE_OPEN
+                    self.opened_at = time.monotonic()
+            self._probe_inflight = False
+
+
+class LLMGateway:
+    def __init__(self, get_model, timeout_seconds=10.0, max_concurrency=16, initial_concurrency=4,
+                 rate_per_second=5.0, burst=10, failure_threshold=5, cooldown_seconds=30.0, slow_seconds=None,
+                 queue_seconds=0.2):
+        self.get_model = get_model
+        self.timeout_seconds = timeout_seconds
+        self.queue_seconds = queue_seconds
+        self.bucket = TokenBucket(rate_per_second, burst)
+        self.limiter = AIMDLimiter(initial_concurrency, max_limit=max_concurrency,
+                                   slow_seconds=slow_seconds if slow_seconds is not None else timeout_seconds / 2.0)
+        self.breaker = CircuitBreaker(failure_threshold, cooldown_seconds)
+        # sized to the max limit; abandoned calls keep their thread (and slot) until they return
+        self._pool = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix="llm")
+
+    def _reject(self, reason):
+        REJECTED.inc(reason=reason)
+        raise LLMUnavailable(reason)
+
+    def generate(self, prompt, timeout=None, stage="gemini.generate_content"):
+        """Return the model's response text, or raise LLMUnavailable."""
+        model = self.get_model()
+        if model is None:
+            raise LLMUnavailable("not configured")
+        if not self.breaker.allow():
+            self._reject("circuit_open")
+        if not self.bucket.try_acquire():
+            self.breaker.cancel_probe()
+            self._reject("rate_limited")
+        if not self.limiter.try_acquire(self.queue_seconds):
+            self.breaker.cancel_probe()
+            self._reject("concurrency")
+        self._publish()
+
+        deadline = timeout or self.timeout_seconds
+        abandoned = threading.Event()
+        t0 = time.perf_counter()
+
+        def call():
+            ok = False
+            try:
+                with metrics.timed(stage):
+                    resp = model.generate_content(prompt, request_options={"timeout": deadline})
+                ok = True
+                return resp
+            finally:
+                # the slot is released when the call really returns, even if the caller gave up
+                self.limiter.release(ok and not abandoned.is_set(), time.perf_counter() - t0)
+                self._publish()
+
+        future = self._pool.submit(call)
+        try:
+            resp = future.result(timeout=deadline)
+        except FutureTimeout:
+            abandoned.set()
+            self.breaker.record(False)
+            OUTCOMES.inc(outcome="timeout")
+            raise LLMUnavailable(f"timed out after {deadline:.1f}s")
+        except Exception as e:
+            self.breaker.record(False)
+            OUTCOMES.inc(outcome="error")
+            raise LLMUnavailable(f"call failed: {e}") from e
+        self.breaker.record(True)
+        OUTCOMES.inc(outcome="ok")
+        return resp.text
+
+    def _publish(self):
+        LIMIT_GAUGE.set(round(self.limiter.limit, 2))
+        INFLIGHT_GAUGE.set(self.limiter.inflight)
+        BREAKER_GAUGE.set(0 if self.breaker.state == STATE_CLOSED else 1)
+
+    def status(self):
+        return {
+            "breaker": self.breaker.state,
+            "consecutive_failures": self.breaker.failures,
+            "concurrency_limit": round(self.limiter.limit, 2),
+            "inflight": self.limiter.inflight,
+            "tokens": round(self.bucket.tokens, 2),
+        }
@@ -0,0 +1,214 @@
+# backend/services/metrics.py
+
+"""
+Lightweight in-process instrumentation: counters and latency histograms with labels,
+rendered in Prometheus text format at /metrics.
+
+    with timed("gemini.generate_content"):          # stage timer (+ error counter)
+        ...
+    @instrumented("firestore.save_raw_report")       # same, as a decorator
+
+Every stage timing also feeds an optional request-scoped Server-Timing header (enable
+with SERVER_TIMING=1 or per request with the `X-Server-Timing: 1` header). Per-route
+latency is recorded by the hooks installed with init_app(app).
+"""
+
+import os
+import time
+import bisect
+import functools
+import threading
+
+from flask import g, request, has_request_context, Response
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+SERVER_TIMING_DEFAULT = os.getenv("SERVER_TIMING", "0") == "1"
+
+_lock = threading.Lock()
+
+
+class Counter:
+    def __init__(self, name, help_text, labelnames=()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self.values = {}
+
+    def inc(self, amount=1, **labels):
+        key = tuple(labels.get(n, "") for n in self.labelnames)
+        with _lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        for key, v in sorted(self.values.items()):
+            lines.append(f"{self.name}{_fmt_labels(self.labelnames, key)} {v}")
+        return lines
+
+
+class Gauge(Counter):
+    def set(self, value, **labels):
+        key = tuple(labels.get(n, "") for n in self.labelnames)
+        with _lock:
+            self.values[key] = value
+
+    def render(self):
+        lines = super().render()
+        lines[1] = f"# TYPE {self.name} gauge"
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, help_text, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self.values = {}  # key -> [bucket counts..., +Inf count, sum]
+
+    def observe(self, value, **labels):
+        key = tuple(labels.get(n, "") for n in self.labelnames)
+        i = bisect.bisect_left(self.buckets, value)
+        with _lock:
+            row = self.values.get(key)
+            if row is None:
+                row = self.values[key] = [0] * (len(self.buckets) + 2)
+            row[i] += 1
+            row[-1] += value
+
+    def snapshot(self, **labels):
+        """(count, sum, per-bucket counts) for one label set."""
+        key = tuple(labels.get(n, "") for n in self.labelnames)
+        row = self.values.get(key) or [0] * (len(self.buckets) + 2)
+        return sum(row[:-1]), row[-1], list(row[:-1])
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for key, row in sorted(self.values.items()):
+            cumulative = 0
+            for le, c in zip(self.buckets + ("+Inf",), row[:-1]):
+                cumulative += c
+                lines.append(f"{self.name}_bucket{_fmt_labels(self.labelnames + ('le',), key + (str(le),))} {cumulative}")
+            lines.append(f"{self.name}_sum{_fmt_labels(self.labelnames, key)} {row[-1]:.6f}")
+            lines.append(f"{self.name}_count{_fmt_labels(self.labelnames, key)} {cumulative}")
+        return lines
+
+
+def _fmt_labels(names, values):
+    if not names:
+        return ""
+    parts = []
+    for n, v in zip(names, values):
+        v = str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        parts.append(f'{n}="{v}"')
+    return "{" + ",".join(parts) + "}"
+
+
+REGISTRY = []
+
+
+def counter(name, help_text, labelnames=()):
+    m = Counter(name, help_text, labelnames)
+    REGISTRY.append(m)
+    return m
+
+
+def gauge(name, help_text, labelnames=()):
+    m = Gauge(name, help_text, labelnames)
+    REGISTRY.append(m)
+    return m
+
+
+def histogram(name, help_text, labelnames=(), buckets=DEFAULT_BUCKETS):
+    m = Histogram(name, help_text, labelnames, buckets)
+    REGISTRY.append(m)
+    return m
+
+
+STAGE_SECONDS = histogram("crisismap_stage_seconds", "Latency of external calls / pipeline stages", ("stage",))
+STAGE_ERRORS = counter("crisismap_stage_errors_total", "Exceptions raised inside a stage", ("stage",))
+HTTP_SECONDS = histogram("crisismap_http_request_seconds", "Request latency per route", ("route", "method", "status"))
+
+
+def render():
+    lines = []
+    for m in REGISTRY:
+        lines.extend(m.render())
+    return "\n".join(lines) + "\n"
+
+
+# ---------------------------
+# Stage timers
+# ---------------------------
+
+class timed:
+    """Context manager recording a stage's latency (and errors) under `stage`."""
+    __slots__ = ("stage", "t0")
+
+    def __init__(self, stage):
+        self.stage = stage
+
+    def __enter__(self):
+        self.t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        dt = time.perf_counter() - self.t0
+        STAGE_SECONDS.observe(dt, stage=self.stage)
+        if exc_type is not None:
+            STAGE_ERRORS.inc(stage=self.stage)
+        if has_request_context():
+            st = g.get("_server_timing")
+            if st is not None:
+                st.append((self.stage, dt))
+        return False
+
+
+def instrumented(stage):
+    """Decorator form of timed()."""
+    def deco(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with timed(stage):
+                return fn(*args, **kwargs)
+        return wrapper
+    return deco
+
+
+# ---------------------------
+# Flask integration
+# ---------------------------
+
+def _before_request():
+    g._req_t0 = time.perf_counter()
+    if SERVER_TIMING_DEFAULT or request.headers.get("X-Server-Timing") == "1":
+        g._server_timing = []
+
+
+def _after_request(response):
+    t0 = g.get("_req_t0")
+    if t0 is None:
+        return response
+    dt = time.perf_counter() - t0
+    route = request.url_rule.rule if request.url_rule is not None else "<unmatched>"
+    HTTP_SECONDS.observe(dt, route=route, method=request.method, status=str(response.status_code))
+    st = g.get("_server_timing")
+    if st is not None:
+        entries = [f'{_timing_token(name)};dur={d * 1000:.2f}' for name, d in st]
+        entries.append(f"total;dur={dt * 1000:.2f}")
+        response.headers["Server-Timing"] = ", ".join(entries)
+    return response
+
+
+def _timing_token(name):
+    # Server-Timing metric names are tokens: keep alnum, '-', '_'
+    return "".join(c if (c.isalnum() or c in "-_") else "_" for c in name)
+
+
+def init_app(app):
+    app.before_request(_before_request)
+    app.after_request(_after_request)
+
+    @app.route("/metrics")
+    def metrics_endpoint():
+        return Response(render(), mimetype="text/plain; version=0.0.4")
@@ -0,0 +1,204 @@
+# backend/services/model_registry.py
+
+"""
+Versioned model registry.
+
+Layout under MODELS_DIR (config.MODELS_DIR, default backend/services/models):
+    <name>/<version>/model.joblib     uncompressed joblib -> numpy arrays load via mmap
+    <name>/CURRENT                    text file holding the active version
+    <name>_model.joblib               legacy flat artifact (used when no versions exist)
+
+Artifacts are loaded with mmap_mode="r", so forked workers share the weight pages
+instead of each holding a private unpickled copy. Activating a new version (or
+writing a new CURRENT from another process) is picked up on the next get() without
+a restart.
+"""
+
+import os
+import time
+import logging
+import threading
+from datetime import datetime
+from pathlib import Path
+
+from config import MODELS_DIR
+
+ARTIFACT_FILE = "model.joblib"
+CARD_FILE = "model_card.json"
+CURRENT_FILE = "CURRENT"
+LEGACY_VERSION = "legacy"
+DISABLED = "none"  # CURRENT value meaning "serve nothing for this model"
+
+# how often get() re-checks CURRENT for a hot swap
+CHECK_INTERVAL_SECONDS = 5.0
+
+_lock = threading.Lock()
+_loaded = {}  # name -> {"obj", "version", "path", "loaded_at", "load_seconds", "checked_at"}
+
+
+def models_dir():
+    return Path(MODELS_DIR)
+
+
+def _legacy_path(name):
+    return models_dir() / f"{name}_model.joblib"
+
+
+def list_versions(name):
+    d = models_dir() / name
+    if not d.is_dir():
+        return []
+    return sorted(p.name for p in d.iterdir() if (p / ARTIFACT_FILE).exists())
+
+
+def current_version(name):
+    """Active version per CURRENT, else the newest version, else legacy/None."""
+    pointer = models_dir() / name / CURRENT_FILE
+    try:
+        v = pointer.read_text().strip()
+        if v == DISABLED:
+            return None
+        if v and (models_dir() / name / v / ARTIFACT_FILE).exists():
+            return v
+    except OSError:
+        pass
+    versions = list_versions(name)
+    if versions:
+        return versions[-1]
+    if _legacy_path(name).exists():
+        return LEGACY_VERSION
+    return None
+
+
+def artifact_path(name, version):
+    if version == LEGACY_VERSION:
+        return _legacy_path(name)
+    return models_dir() / name / version / ARTIFACT_FILE
+
+
+def save_model(name, obj, version=None, activate=True):
+    """Write a new version (uncompressed, so it can be memory-mapped) and optionally activate it."""
+    import joblib
+    version = version or datetime.utcnow().strftime("%Y%m%dT%H%M%S")
+    path = artifact_path(name, version)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(".tmp")
+    joblib.dump(obj, tmp, compress=0)
+    os.replace(tmp, path)
+    if activate:
+        activate_version(name, version)
+    return version
+
+
+def write_model_card(name, version, card):
+    """Store a JSON model card (metrics, data source, latency) next to the artifact."""
+    import json
+    path = artifact_path(name, version).parent / CARD_FILE
+    path.write_text(json.dumps(card, indent=2, default=str))
+    return path
+
+
+def read_model_card(name, version):
+    import json
+    try:
+        return json.loads((artifact_path(name, version).parent / CARD_FILE).read_text())
+    except (OSError, ValueError):
+        return None
+
+
+def activate_version(name, version):
+    """Point CURRENT at `version`; every process picks it up on its next check."""
+    if version != LEGACY_VERSION and not artifact_path(name, version).exists():
+        raise FileNotFoundError(f"model {name} has no version {version}")
+    d = models_dir() / name
+    d.mkdir(parents=True, exist_ok=True)
+    tmp = d / (CURRENT_FILE + ".tmp")
+    tmp.write_text(version)
+    os.replace(tmp, d / CURRENT_FILE)
+    with _lock:
+        entry = _loaded.get(name)
+        if entry:
+            entry["checked_at"] = 0.0
+    return version
+
+
+def deactivate(name):
+    """Stop serving `name` (until a version is activated again)."""
+    d = models_dir() / name
+    if not d.is_dir():
+        return
+    tmp = d / (CURRENT_FILE + ".tmp")
+    tmp.write_text(DISABLED)
+    os.replace(tmp, d / CURRENT_FILE)
+    with _lock:
+        entry = _loaded.get(name)
+        if entry:
+            entry["checked_at"] = 0.0
+
+
+def _load(name, version):
+    import joblib
+    path = artifact_path(name, version)
+    t0 = time.perf_counter()
+    obj = joblib.load(path, mmap_mode="r")
+    entry = {
+        "obj": obj,
+        "version": version,
+        "path": str(path),
+        "loaded_at": datetime.utcnow().isoformat(),
+        "load_seconds": round(time.perf_counter() - t0, 4),
+        "checked_at": time.monotonic(),
+    }
+    logging.info("Loaded model %s version %s from %s", name, version, path)
+    return entry
+
+
+def get(name):
+    """Return the active model object for `name` (None if no artifact exists)."""
+    now = time.monotonic()
+    entry = _loaded.get(name)
+    if entry and now - entry["checked_at"] < CHECK_INTERVAL_SECONDS:
+        return entry["obj"]
+    with _lock:
+        entry = _loaded.get(name)
+        if entry and now - entry["checked_at"] < CHECK_INTERVAL_SECONDS:
+            return entry["obj"]
+        version = current_version(name)
+        if version is None:
+            _loaded.pop(name, None)
+            return None
+        if entry and entry["version"] == version:
+            entry["checked_at"] = now
+            return entry["obj"]
+        try:
+            _loaded[name] = _load(name, version)
+        except Exception as e:
+            logging.exception("Failed to load model %s version %s: %s", name, version, e)
+            if entry:
+                # keep serving the previous version rather than dropping to no model
+                entry["checked_at"] = now
+                return entry["obj"]
+            return None
+        return _loaded[name]["obj"]
+
+
+def info():
+    """Loaded version / load time per model, plus what is available on disk."""
+    out = {}
+    names = set(_loaded.keys())
+    d = models_dir()
+    if d.is_dir():
+        names.update(p.name for p in d.iterdir() if p.is_dir())
+        names.update(p.name[:-len("_model.joblib")] for p in d.glob("*_model.joblib"))
+    for name in sorted(names):
+        entry = _loaded.get(name) or {}
+        out[name] = {
+            "loaded_version": entry.get("version"),
+            "loaded_at": entry.get("loaded_at"),
+            "load_seconds": entry.get("load_seconds"),
+            "path": entry.get("path"),
+            "current_version": current_version(name),
+            "available_versions": list_versions(name),
+            "card": read_model_card(name, entry["version"]) if entry.get("version") not in (None, LEGACY_VERSION) else None,
+        }
+    return out
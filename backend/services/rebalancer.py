@@ -0,0 +1,369 @@
+# backend/services/rebalancer.py
+
+"""
+Incremental re-dispatch when conditions change.
+
+auto-dispatch assigns whatever is `new` in one pass and never looks back. The rebalancer
+keeps an in-memory view of the open assignments (incident position / severity / team,
+bucketed into a lat/lng grid) plus team positions and loads, and reacts to three events:
+
+- incident_created  an urgent (>= REBALANCE_URGENT_SEVERITY) incident is placed with its
+                    best team right away
+- team_moved        after /team/update-location
+- incident_closed   the team has capacity again
+
+For each event only the neighbourhood is re-scored: the REBALANCE_MAX_INCIDENTS movable
+incidents (status rescue_dispatched - teams already on site are left alone) nearest to the
+event within REBALANCE_RADIUS_KM, against the nearest REBALANCE_MAX_TEAMS teams plus the
+teams currently holding them, with the auto-dispatch scoring (services/dispatch_scoring.py;
+straight-line km or road minutes per DISPATCH_DISTANCE_UNIT).
+A greedy local search then picks single moves (incident to another team) and pairwise swaps
+whose score gain exceeds REBALANCE_THRESHOLD, at most REBALANCE_MAX_MOVES per event, each
+incident at most once.
+
+Results are proposals (GET /api/rebalance/proposals, applied with POST /api/rebalance/apply);
+with REBALANCE_APPLY=1 they are applied immediately. A proposal is applied as
+one-incident dispatches committed in one batch (dispatch_service.commit_reassignment), so
+both legs of a swap land or neither does, and one that lost a race is reported "stale". Events from request handlers are queued to one background worker; the
+state is reloaded from Firestore every REBALANCE_REFRESH_SECONDS.
+"""
+
+import os
+import math
+import time
+import uuid
+import queue
+import logging
+import threading
+from collections import defaultdict, deque
+from datetime import datetime
+
+import numpy as np
+
+from services import metrics
+from services.dispatch_scoring import (
+    SEVERITY_RANK, ScoreParams, sev_norm, team_coords, coords_array, distances_km, distance_matrix, score_matrix,
+)
+
+REBALANCE_ENABLED = os.getenv("REBALANCE_ENABLED", "1") == "1"
+REBALANCE_APPLY = os.getenv("REBALANCE_APPLY", "0") == "1"
+REBALANCE_THRESHOLD = float(os.getenv("REBALANCE_THRESHOLD", "0.1"))
+REBALANCE_RADIUS_KM = float(os.getenv("REBALANCE_RADIUS_KM", "15"))
+REBALANCE_MAX_INCIDENTS = int(os.getenv("REBALANCE_MAX_INCIDENTS", "150"))
+REBALANCE_MAX_TEAMS = int(os.getenv("REBALANCE_MAX_TEAMS", "10"))
+REBALANCE_MAX_MOVES = int(os.getenv("REBALANCE_MAX_MOVES", "5"))
+REBALANCE_URGENT_SEVERITY = os.getenv("REBALANCE_URGENT_SEVERITY", "high")
+REBALANCE_REFRESH_SECONDS = float(os.getenv("REBALANCE_REFRESH_SECONDS", "300"))
+REBALANCE_PROPOSALS_KEPT = int(os.getenv("REBALANCE_PROPOSALS_KEPT", "500"))
+
+MOVABLE_STATUSES = ("rescue_dispatched",)
+ACTIVE_STATUSES = ("rescue_dispatched", "in_progress")
+CELL_DEG = 0.1  # grid cell ~11 km
+
+EVENTS = metrics.counter("crisismap_rebalance_events_total", "Rebalancer events", ("event",))
+PROPOSALS = metrics.counter("crisismap_rebalance_proposals_total", "Rebalancer proposals", ("kind", "outcome"))
+EVENT_SECONDS = metrics.histogram("crisismap_rebalance_event_seconds", "Rebalancer time per event", ("event",))
+
+
+def _cell(lat, lng):
+    return int(math.floor(lat / CELL_DEG)), int(math.floor(lng / CELL_DEG))
+
+
+class Rebalancer:
+    def __init__(self, params=None, model=None):
+        self.params = params or ScoreParams()
+        self.model = model
+        self.incidents = {}             # id -> {"lat", "lng", "sev", "team", "status"}
+        self.cells = defaultdict(set)   # grid cell -> incident ids with a position
+        self.by_team = defaultdict(set) # team id -> incident ids
+        self.teams = {}                 # id -> (lat, lng) or None
+        self.loads = {}                 # id -> active incidents
+        self.proposals = deque(maxlen=REBALANCE_PROPOSALS_KEPT)
+        self.loaded_at = 0.0
+        self._lock = threading.RLock()
+        self._queue = queue.Queue()
+        self._worker = None
+
+    # ---- state ----
+    def load(self, incidents, teams, loads):
+        """Replace the state: open incidents (dicts with _id), team docs and {team_id: load}."""
+        with self._lock:
+            self.incidents, self.cells, self.by_team = {}, defaultdict(set), defaultdict(set)
+            for inc in incidents:
+                if inc.get("assigned_team") and inc.get("status") in ACTIVE_STATUSES:
+                    self._put(inc["_id"], inc, inc["assigned_team"])
+            self.teams = {t["_id"]: team_coords(t) for t in teams}
+            self.loads = {tid: int(loads.get(tid, 0)) for tid in self.teams}
+            self.loaded_at = time.monotonic()
+
+    def refresh(self):
+        from services.firestore_service import get_incidents_by_status, get_all_teams, get_team_loads
+        from services.gemini_service import load_assignment_model
+        try:
+            self.model = load_assignment_model()
+        except Exception:
+            self.model = None
+        teams = get_all_teams() or []
+        self.load(get_incidents_by_status(list(ACTIVE_STATUSES)), teams, get_team_loads([t["_id"] for t in teams]))
+
+    def _put(self, inc_id, inc, team, status=None):
+        try:
+            lat, lng = float(inc.get("lat")), float(inc.get("lng"))
+        except (TypeError, ValueError):
+            lat = lng = None
+        self._drop(inc_id)
+        self.incidents[inc_id] = {"lat": lat, "lng": lng, "sev": sev_norm(inc), "team": team,
+                                  "status": status or inc.get("status")}
+        self.by_team[team].add(inc_id)
+        if lat is not None:
+            self.cells[_cell(lat, lng)].add(inc_id)
+
+    def _drop(self, inc_id):
+        old = self.incidents.pop(inc_id, None)
+        if old:
+            self.by_team[old["team"]].discard(inc_id)
+            if old["lat"] is not None:
+                self.cells[_cell(old["lat"], old["lng"])].discard(inc_id)
+        return old
+
+    # ---- events ----
+    def incident_created(self, incident):
+        """Place an urgent new incident with its best nearby team; returns proposals."""
+        sev = (incident.get("analysis") or {}).get("severity") or incident.get("severity") or "medium"
+        if SEVERITY_RANK.get(str(sev).lower(), 3) < SEVERITY_RANK.get(REBALANCE_URGENT_SEVERITY, 4):
+            return []
+        try:
+            lat, lng = float(incident.get("lat")), float(incident.get("lng"))
+        except (TypeError, ValueError):
+            return []
+        return self._rebalance("incident_created", lat, lng, new_incident=incident)
+
+    def team_moved(self, team_id, lat, lng):
+        with self._lock:
+            self.teams[team_id] = (float(lat), float(lng))
+            self.loads.setdefault(team_id, 0)
+        return self._rebalance("team_moved", float(lat), float(lng), focus_team=team_id)
+
+    def incident_status(self, incident_id, status):
+        """Status change from an admin / team; only closing frees capacity."""
+        if status == "closed":
+            return self.incident_closed(incident_id)
+        with self._lock:
+            if incident_id in self.incidents:
+                self.incidents[incident_id]["status"] = status
+        return []
+
+    def incident_closed(self, incident_id):
+        with self._lock:
+            old = self._drop(incident_id)
+            if old is None:
+                return []
+            if old["team"] and self.loads.get(old["team"], 0) > 0:
+                self.loads[old["team"]] -= 1
+        if old["lat"] is None:
+            return []
+        return self._rebalance("incident_closed", old["lat"], old["lng"], focus_team=old["team"])
+
+    # ---- neighbourhood + local search ----
+    def _nearby_incidents(self, lat, lng, focus_team=None):
+        dlat = REBALANCE_RADIUS_KM / 111.0
+        dlng = REBALANCE_RADIUS_KM / (111.0 * max(0.1, math.cos(math.radians(lat))))
+        (c0, c1), (c2, c3) = _cell(lat - dlat, lng - dlng), _cell(lat + dlat, lng + dlng)
+        ids = [i for x in range(c0, c2 + 1) for y in range(c1, c3 + 1) for i in self.cells.get((x, y), ())
+               if self.incidents[i]["status"] in MOVABLE_STATUSES]
+        if focus_team:
+            # a moved team's own incidents may be far from where it is now
+            near = set(ids)
+            ids += [i for i in self.by_team.get(focus_team, ())
+                    if i not in near and self.incidents[i]["status"] in MOVABLE_STATUSES][:REBALANCE_MAX_INCIDENTS]
+        if not ids:
+            return []
+        xy = np.array([(self.incidents[i]["lat"], self.incidents[i]["lng"]) if self.incidents[i]["lat"] is not None
+                       else (np.nan, np.nan) for i in ids])
+        d = distances_km(xy, lat, lng)
+        d = np.where(np.isnan(d), 0.0, d)  # focus-team incidents without a position stay in
+        order = [k for k in np.argsort(d) if d[k] <= REBALANCE_RADIUS_KM or self.incidents[ids[k]]["team"] == focus_team]
+        return [ids[k] for k in order[:REBALANCE_MAX_INCIDENTS]]
+
+    def _nearby_teams(self, lat, lng, holders):
+        ids = list(self.teams)
+        if not ids:
+            return []
+        d = distances_km(coords_array([self.teams[t] for t in ids]), lat, lng)
+        d = np.where(np.isnan(d), np.inf, d)
+        nearest = [ids[k] for k in np.argsort(d)[:REBALANCE_MAX_TEAMS]]
+        return nearest + [t for t in dict.fromkeys(holders) if t not in nearest and t in self.teams]
+
+    def _rebalance(self, event, lat, lng, new_incident=None, focus_team=None):
+        t0 = time.perf_counter()
+        with self._lock:
+            proposals = self._search(event, lat, lng, new_incident, focus_team)
+            for p in proposals:
+                self.proposals.append(p)
+        EVENTS.inc(event=event)
+        EVENT_SECONDS.observe(time.perf_counter() - t0, event=event)
+        for p in proposals:
+            PROPOSALS.inc(kind=p["kind"], outcome="proposed")
+        if REBALANCE_APPLY:
+            for p in proposals:
+                self.apply(p)
+        return proposals
+
+    def _search(self, event, lat, lng, new_incident, focus_team):
+        inc_ids = self._nearby_incidents(lat, lng, focus_team)
+        holders = [self.incidents[i]["team"] for i in inc_ids]
+        team_ids = self._nearby_teams(lat, lng, holders + ([focus_team] if focus_team else []))
+        if not team_ids:
+            return []
+        col = {t: k for k, t in enumerate(team_ids)}
+        inc_ids = [i for i in inc_ids if self.incidents[i]["team"] in col]  # held by a team no longer listed
+        loads = np.array([self.loads.get(t, 0) for t in team_ids], dtype=float)
+        now = datetime.utcnow().isoformat()
+        proposals = []
+
+        def proposal(kind, incident_id, from_team, to_team, gain, **extra):
+            return {"id": uuid.uuid4().hex[:12], "event": event, "kind": kind, "incident_id": incident_id,
+                    "from_team": from_team, "to_team": to_team, "gain": round(float(gain), 4),
+                    "created_at": now, "status": "proposed", **extra}
+
+        if new_incident is not None:
+            dists = distance_matrix(self.params, coords_array([self.teams[t] for t in team_ids]), np.array([[lat, lng]]))
+            scores = score_matrix(self.params, [sev_norm(new_incident)], dists.T, loads, self.model)[0]
+            best = int(np.argmax(scores))
+            proposals.append(proposal("assign", new_incident["_id"], None, team_ids[best], scores[best]))
+            loads[best] += 1
+
+        if inc_ids:
+            team_xy = coords_array([self.teams[t] for t in team_ids])
+            inc_xy = np.array([(self.incidents[i]["lat"], self.incidents[i]["lng"]) if self.incidents[i]["lat"] is not None
+                               else (np.nan, np.nan) for i in inc_ids])
+            dists = distance_matrix(self.params, team_xy, inc_xy).T  # (incidents x teams)
+            sevs = [self.incidents[i]["sev"] for i in inc_ids]
+            cur = np.array([col[self.incidents[i]["team"]] for i in inc_ids])
+            rows = np.arange(len(inc_ids))
+            moved = np.zeros(len(inc_ids), dtype=bool)
+            for _ in range(REBALANCE_MAX_MOVES):
+                # staying / joining a team: scored as if assigned last, like auto-dispatch
+                s_stay = score_matrix(self.params, sevs, dists, np.maximum(loads - 1, 0), self.model)
+                s_join = score_matrix(self.params, sevs, dists, loads, self.model)
+                base = s_stay[rows, cur]
+                move_gain = s_join - base[:, None]
+                move_gain[rows, cur] = -np.inf
+                move_gain[moved] = -np.inf
+                # swap i <-> j: each takes the other's slot, loads unchanged
+                swap_gain = s_stay[:, cur] + s_stay[:, cur].T - base[:, None] - base[None, :]
+                swap_gain[cur[:, None] == cur[None, :]] = -np.inf
+                swap_gain[moved, :] = -np.inf
+                swap_gain[:, moved] = -np.inf
+                bm = np.unravel_index(np.argmax(move_gain), move_gain.shape)
+                bs = np.unravel_index(np.argmax(swap_gain), swap_gain.shape)
+                if max(move_gain[bm], swap_gain[bs]) <= REBALANCE_THRESHOLD:
+                    break
+                if move_gain[bm] >= swap_gain[bs]:
+                    i, c = int(bm[0]), int(bm[1])
+                    proposals.append(proposal("move", inc_ids[i], team_ids[cur[i]], team_ids[c], move_gain[bm]))
+                    loads[cur[i]] -= 1
+                    loads[c] += 1
+                    cur[i] = c
+                    moved[i] = True
+                else:
+                    i, j = int(bs[0]), int(bs[1])
+                    proposals.append(proposal("swap", inc_ids[i], team_ids[cur[i]], team_ids[cur[j]], swap_gain[bs],
+                                              incident_id_2=inc_ids[j]))
+                    cur[i], cur[j] = cur[j], cur[i]
+                    moved[i] = moved[j] = True
+        return proposals
+
+    # ---- applying ----
+    def apply(self, proposal):
+        """
+        Commit a proposal - both legs of a swap together - as one-incident dispatches in one
+        batch; returns it with its new status. "stale" when an incident moved on since it
+        was proposed, also if another apply of it (admin or auto-apply) committed first.
+        """
+        from services.dispatch_service import commit_reassignment, assignment_version, DispatchCommitError, StaleAssignment
+        from services.firestore_service import get_incidents_by_ids
+        legs = [(proposal["incident_id"], proposal["from_team"], proposal["to_team"])]
+        if proposal["kind"] == "swap":
+            legs.append((proposal["incident_id_2"], proposal["to_team"], proposal["from_team"]))
+        snaps = get_incidents_by_ids([i for i, _, _ in legs])
+        docs, expected = [], {}
+        for inc_id, from_team, to_team in legs:
+            cur = snaps.get(inc_id, {})
+            if cur.get("assigned_team") != from_team or (from_team and cur.get("status") not in MOVABLE_STATUSES):
+                return self._settle(proposal, "stale")
+            expected[inc_id] = assignment_version(cur)
+            note = f"reassigned from {from_team}" if from_team else "urgent incident placed"
+            docs.append({
+                "dispatch_id": f"dispatch_{uuid.uuid4().hex[:10]}", "team_id": to_team, "created_by": "rebalancer",
+                "created_at": datetime.utcnow().isoformat(), "status": "assigned",
+                "plan_text": f"Rebalancer: {note} (score +{proposal['gain']:.2f}).",
+                "incidents": [{"_id": inc_id, "location": cur.get("location"), "lat": cur.get("lat"), "lng": cur.get("lng"),
+                               "severity": (cur.get("analysis") or {}).get("severity")}],
+            })
+        try:
+            commit_reassignment(docs, expected)
+        except StaleAssignment as e:
+            logging.info("Rebalancer proposal %s is stale: %s", proposal["id"], e)
+            return self._settle(proposal, "stale")
+        except DispatchCommitError as e:
+            logging.warning("Rebalancer could not apply %s: %s", proposal["id"], e)
+            return self._settle(proposal, "failed")
+        with self._lock:
+            for inc_id, from_team, to_team in legs:
+                self._put(inc_id, snaps[inc_id], to_team, status="rescue_dispatched")
+                if from_team:
+                    self.loads[from_team] = max(0, self.loads.get(from_team, 0) - 1)
+                self.loads[to_team] = self.loads.get(to_team, 0) + 1
+        return self._settle(proposal, "applied")
+
+    def _settle(self, proposal, outcome):
+        proposal["status"] = outcome
+        PROPOSALS.inc(kind=proposal["kind"], outcome=outcome)
+        return proposal
+
+    def find(self, proposal_id):
+        with self._lock:
+            return next((p for p in reversed(self.proposals) if p["id"] == proposal_id and p["status"] == "proposed"), None)
+
+    def recent(self, limit=100):
+        with self._lock:
+            return [p for p in list(self.proposals)[-limit:] if p["status"] == "proposed"]
+
+    def stats(self):
+        with self._lock:
+            return {"open_incidents": len(self.incidents), "teams": len(self.teams), "apply": REBALANCE_APPLY,
+                    "threshold": REBALANCE_THRESHOLD, "queued_events": self._queue.qsize(),
+                    "state_age_s": round(time.monotonic() - self.loaded_at, 1) if self.loaded_at else None}
+
+    # ---- background worker ----
+    def notify(self, event, *args):
+        """Queue an event from a request handler (no-op when disabled)."""
+        if not REBALANCE_ENABLED:
+            return
+        self._queue.put((event, args))
+        with self._lock:
+            if self._worker is None:
+                self._worker = threading.Thread(target=self._loop, name="rebalancer", daemon=True)
+                self._worker.start()
+
+    def _loop(self):
+        while True:
+            event, args = self._queue.get()
+            try:
+                if not self.loaded_at or time.monotonic() - self.loaded_at > REBALANCE_REFRESH_SECONDS:
+                    self.refresh()
+                getattr(self, event)(*args)
+            except Exception:
+                logging.exception("Rebalancer event %s failed", event)
+
+
+_REBALANCER = None
+_REBALANCER_LOCK = threading.Lock()
+
+def get_rebalancer():
+    global _REBALANCER
+    with _REBALANCER_LOCK:
+        if _REBALANCER is None:
+            _REBALANCER = Rebalancer()
+        return _REBALANCER
@@ -0,0 +1,122 @@
+# backend/services/registry.py
+
+"""
+Lazy service registry.
+Heavy clients (Firebase, Speech, Translate, Gemini, ML models) are registered here with a
+loader function and only built on first use (or by the background warm-up thread).
+A failing optional service no longer prevents the app from starting; its error is
+reported by /healthz instead.
+"""
+
+import time
+import logging
+import threading
+
+STATUS_NOT_LOADED = "not_loaded"
+STATUS_LOADING = "loading"
+STATUS_READY = "ready"
+STATUS_FAILED = "failed"
+
+
+class LazyService:
+    def __init__(self, name, loader, required=False, retry_after=30.0):
+        self.name = name
+        self.loader = loader
+        self.required = required
+        self.retry_after = retry_after
+        self._failed_at = 0.0
+        self.status = STATUS_NOT_LOADED
+        self.error = None
+        self.load_seconds = None
+        self._value = None
+        self._lock = threading.Lock()
+
+    def get(self):
+        """Return the loaded value, loading it on first call. Re-raises load errors."""
+        if self.status == STATUS_READY:
+            return self._value
+        if self.status == STATUS_FAILED and time.monotonic() - self._failed_at < self.retry_after:
+            # don't hammer a missing SDK / bad credentials on every request
+            raise RuntimeError(self.error)
+        with self._lock:
+            if self.status == STATUS_READY:
+                return self._value
+            self.status = STATUS_LOADING
+            t0 = time.perf_counter()
+            try:
+                self._value = self.loader()
+                self.status = STATUS_READY
+                self.error = None
+            except Exception as e:
+                self.status = STATUS_FAILED
+                self.error = str(e)
+                self._failed_at = time.monotonic()
+                logging.warning("Service %s failed to load: %s", self.name, e)
+                raise
+            finally:
+                self.load_seconds = round(time.perf_counter() - t0, 4)
+            return self._value
+
+    def get_or_none(self):
+        try:
+            return self.get()
+        except Exception:
+            return None
+
+    def override(self, value):
+        """Install a ready value (e.g. a local stand-in) instead of running the loader."""
+        with self._lock:
+            self._value = value
+            self.status = STATUS_READY
+            self.error = None
+            self.load_seconds = 0.0
+
+    def reset(self):
+        with self._lock:
+            self._value = None
+            self.status = STATUS_NOT_LOADED
+            self.error = None
+            self.load_seconds = None
+
+    def describe(self):
+        return {
+            "status": self.status,
+            "required": self.required,
+            "load_seconds": self.load_seconds,
+            "error": self.error,
+        }
+
+
+SERVICES = {}
+
+
+def register(name, loader, required=False, retry_after=30.0):
+    """Register (or replace) a lazily loaded service and return it."""
+    svc = LazyService(name, loader, required=required, retry_after=retry_after)
+    SERVICES[name] = svc
+    return svc
+
+
+def get_service(name):
+    return SERVICES[name].get()
+
+
+def warm_up(names=None):
+    """Load the given services (all by default), swallowing failures."""
+    for name in list(names or SERVICES.keys()):
+        svc = SERVICES.get(name)
+        if svc is not None:
+            svc.get_or_none()
+
+
+def warm_up_async(names=None):
+    t = threading.Thread(target=warm_up, args=(names,), name="service-warmup", daemon=True)
+    t.start()
+    return t
+
+
+def readiness():
+    """(ready, details): ready when every required service has loaded."""
+    details = {name: svc.describe() for name, svc in SERVICES.items()}
+    ready = all(svc.status == STATUS_READY for svc in SERVICES.values() if svc.required)
+    return ready, details
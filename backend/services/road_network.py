@@ -0,0 +1,456 @@
+# backend/services/road_network.py
+
+"""
+Offline road-network travel times for dispatch scoring.
+
+The graph is built once from a local OpenStreetMap extract (config.ROAD_NETWORK_PATH):
+every way with a routable `highway` tag becomes directed edges weighted in minutes (maxspeed
+when tagged, else a per-class speed; oneway / roundabouts respected). The compiled arrays are
+saved next to the extract (<extract>.npz) and reused while the extract is unchanged.
+
+Queries are many-to-many from few sources (teams, a few hundred) to many targets (incidents):
+one bounded Dijkstra per source over the whole graph (scipy.sparse.csgraph, in C) gives that
+source's time to every node, so any set of incidents is then a column lookup. The per-source
+trees are kept in an LRU (ROUTING_CACHE_SOURCES) - team positions change rarely, incidents
+arrive all the time, so a cached tree answers every new incident without a search.
+
+Closures (flooded roads: way ids, or every road within a radius of a point) are stored in the
+`road_closures` collection so all workers see them. Applying one only masks edges - nothing is
+re-parsed or re-snapped - and only the cached trees that actually use a closed edge are
+dropped; a closure can only make other trees' paths longer if they used it. Reopening clears
+the cache.
+
+Points are snapped to the nearest graph node (KD-tree); the gap is driven at
+ROUTING_OFFROAD_KMH. Points further than ROUTING_SNAP_MAX_KM from any road come back as NaN
+(unknown - callers fall back to straight-line km), targets the search cannot reach within
+ROUTING_LIMIT_MINUTES (or at all, e.g. across a closed bridge) as inf.
+"""
+
+import os
+import bz2
+import gzip
+import time
+import uuid
+import logging
+import threading
+import xml.etree.ElementTree as ET
+from collections import OrderedDict
+from datetime import datetime
+
+import numpy as np
+
+from config import ROAD_NETWORK_PATH
+from services import metrics
+from services.registry import register
+
+ROUTING_CACHE_SOURCES = int(os.getenv("ROUTING_CACHE_SOURCES", "512"))
+ROUTING_LIMIT_MINUTES = float(os.getenv("ROUTING_LIMIT_MINUTES", "240"))
+ROUTING_FALLBACK_KMH = float(os.getenv("ROUTING_FALLBACK_KMH", "30"))
+ROUTING_OFFROAD_KMH = float(os.getenv("ROUTING_OFFROAD_KMH", "10"))
+ROUTING_SNAP_MAX_KM = float(os.getenv("ROUTING_SNAP_MAX_KM", "3"))
+ROUTING_CLOSURE_SYNC_SECONDS = float(os.getenv("ROUTING_CLOSURE_SYNC_SECONDS", "30"))
+ROUTING_BATCH = 16  # sources per Dijkstra call (bounds the float64 scratch matrix)
+# plans with more stops (plus the start) than one Dijkstra batch keep their priority order
+ROUTING_ORDER_MAX_STOPS = int(os.getenv("ROUTING_ORDER_MAX_STOPS", str(ROUTING_BATCH - 1)))
+EARTH_RADIUS_KM = 6371.0
+
+# km/h when a way has no usable maxspeed
+SPEEDS_KMH = {
+    "motorway": 90, "motorway_link": 45, "trunk": 70, "trunk_link": 40, "primary": 55, "primary_link": 35,
+    "secondary": 45, "secondary_link": 30, "tertiary": 35, "tertiary_link": 25, "unclassified": 25,
+    "residential": 20, "living_street": 10, "service": 15, "road": 20, "track": 10,
+}
+ONEWAY_BY_DEFAULT = ("motorway", "motorway_link")
+
+MATRIX_SECONDS = metrics.histogram("crisismap_routing_matrix_seconds", "Travel-time matrix computation")
+TREES = metrics.counter("crisismap_routing_trees_total", "Per-source shortest-path trees", ("result",))
+
+
+# ---------------------------
+# OSM parsing
+# ---------------------------
+def _speed(tags):
+    raw = tags.get("maxspeed")
+    if raw:
+        try:
+            v = float(raw.split()[0])
+            if v > 0:
+                return v * 1.609 if "mph" in raw else v
+        except ValueError:
+            pass
+    return SPEEDS_KMH[tags["highway"]]
+
+
+def _direction(tags):
+    """1 forward only, -1 backward only, 0 both ways."""
+    oneway = tags.get("oneway", "")
+    if oneway in ("yes", "1", "true"):
+        return 1
+    if oneway == "-1":
+        return -1
+    if oneway == "no":
+        return 0
+    if tags.get("highway") in ONEWAY_BY_DEFAULT or tags.get("junction") in ("roundabout", "circular"):
+        return 1
+    return 0
+
+
+def _routable(tags):
+    return (tags.get("highway") in SPEEDS_KMH and tags.get("access") not in ("no", "private")
+            and tags.get("area") != "yes")
+
+
+def _open(path):
+    if path.endswith(".bz2"):
+        return bz2.open(path, "rb")
+    if path.endswith(".gz"):
+        return gzip.open(path, "rb")
+    return open(path, "rb")
+
+
+def parse_osm_xml(path):
+    """({node_id: (lat, lng)}, [(way_id, [node ids], tags)]) of the routable ways."""
+    coords, ways = {}, []
+    refs, tags = [], {}
+    root = None
+    with _open(path) as f:
+        for event, elem in ET.iterparse(f, events=("start", "end")):
+            if event == "start":
+                if root is None:
+                    root = elem
+                continue
+            if elem.tag == "nd":
+                refs.append(int(elem.get("ref")))
+                continue
+            if elem.tag == "tag":
+                tags[elem.get("k")] = elem.get("v")
+                continue
+            if elem.tag == "node":
+                coords[int(elem.get("id"))] = (float(elem.get("lat")), float(elem.get("lon")))
+            elif elem.tag == "way" and _routable(tags):
+                ways.append((int(elem.get("id")), refs, tags))
+            elif elem.tag not in ("way", "relation"):
+                continue
+            refs, tags = [], {}
+            root.clear()  # drop finished top-level elements
+    return coords, ways
+
+
+def parse_osm_pbf(path):
+    """Same as parse_osm_xml for .osm.pbf; needs the optional `osmium` package (pyosmium)."""
+    import osmium
+
+    coords, ways = {}, []
+
+    class Handler(osmium.SimpleHandler):
+        def way(self, w):
+            tags = {t.k: t.v for t in w.tags}
+            if not _routable(tags):
+                return
+            refs = []
+            for n in w.nodes:
+                if n.location.valid():
+                    coords[n.ref] = (n.location.lat, n.location.lon)
+                    refs.append(n.ref)
+            ways.append((w.id, refs, tags))
+
+    Handler().apply_file(path, locations=True)
+    return coords, ways
+
+
+def _haversine(lat1, lng1, lat2, lng2):
+    lat1, lng1, lat2, lng2 = map(np.radians, (lat1, lng1, lat2, lng2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lng2 - lng1) / 2) ** 2
+    return EARTH_RADIUS_KM * 2 * np.arctan2(np.sqrt(a), np.sqrt(1 - a))
+
+
+def build_arrays(coords, ways):
+    """Compact node / directed edge arrays from parsed ways."""
+    index, lat, lng = {}, [], []
+    u, v, speed, direction, way = [], [], [], [], []
+    for way_id, refs, tags in ways:
+        refs = [r for r in refs if r in coords]
+        kmh, d = _speed(tags), _direction(tags)
+        for a, b in zip(refs, refs[1:]):
+            if a == b:
+                continue
+            for r in (a, b):
+                if r not in index:
+                    index[r] = len(lat)
+                    lat.append(coords[r][0])
+                    lng.append(coords[r][1])
+            u.append(index[a]); v.append(index[b]); speed.append(kmh); direction.append(d); way.append(way_id)
+    lat, lng = np.array(lat), np.array(lng)
+    u, v, speed, direction, way = (np.array(x) for x in (u, v, speed, direction, way))
+    if not len(u):
+        raise ValueError("no routable ways in the extract")
+    minutes = np.maximum(_haversine(lat[u], lng[u], lat[v], lng[v]) / speed * 60.0, 1e-4)
+    fwd, back = direction >= 0, direction <= 0
+    return {"lat": lat, "lng": lng,
+            "u": np.concatenate([u[fwd], v[back]]).astype(np.int32),
+            "v": np.concatenate([v[fwd], u[back]]).astype(np.int32),
+            "minutes": np.concatenate([minutes[fwd], minutes[back]]),
+            "way": np.concatenate([way[fwd], way[back]]).astype(np.int64)}
+
+
+# ---------------------------
+# Engine
+# ---------------------------
+class RoadNetwork:
+    def __init__(self, lat, lng, u, v, minutes, way):
+        from scipy.spatial import cKDTree
+        self.lat, self.lng = np.asarray(lat, dtype=float), np.asarray(lng, dtype=float)
+        self.u, self.v = np.asarray(u, dtype=np.int32), np.asarray(v, dtype=np.int32)
+        self.minutes, self.way = np.asarray(minutes, dtype=float), np.asarray(way, dtype=np.int64)
+        self.closed = np.zeros(len(self.u), dtype=bool)
+        self.closures = []
+        self.synced_at = 0.0
+        self._lat0 = float(np.mean(self.lat))
+        self._kd = cKDTree(self._project(self.lat, self.lng))
+        self._csr = None
+        self._trees = OrderedDict()  # source node -> (minutes float32, predecessor int32)
+        self._lock = threading.RLock()
+
+    @classmethod
+    def from_osm(cls, path):
+        path = str(path)
+        coords, ways = parse_osm_pbf(path) if path.endswith(".pbf") else parse_osm_xml(path)
+        return cls(**build_arrays(coords, ways))
+
+    @classmethod
+    def load(cls, path):
+        """Build from the extract, or from its compiled <extract>.npz when that is current."""
+        path = str(path)
+        compiled = path + ".npz"
+        stamp = np.array([os.path.getsize(path), int(os.path.getmtime(path))], dtype=np.int64)
+        if os.path.exists(compiled):
+            try:
+                with np.load(compiled) as z:
+                    if np.array_equal(z["stamp"], stamp):
+                        return cls(**{k: z[k] for k in ("lat", "lng", "u", "v", "minutes", "way")})
+            except Exception as e:
+                logging.warning("Ignoring compiled road network %s: %s", compiled, e)
+        net = cls.from_osm(path)
+        try:
+            np.savez(compiled, stamp=stamp, lat=net.lat, lng=net.lng, u=net.u, v=net.v, minutes=net.minutes, way=net.way)
+        except OSError as e:
+            logging.warning("Could not save compiled road network %s: %s", compiled, e)
+        return net
+
+    def _project(self, lat, lng):
+        """Local equirectangular km, good enough for nearest-node lookups within a region."""
+        return np.column_stack([np.asarray(lng) * 111.32 * np.cos(np.radians(self._lat0)), np.asarray(lat) * 110.574])
+
+    def _graph(self):
+        from scipy.sparse import csr_matrix
+        if self._csr is None:
+            keep = np.flatnonzero(~self.closed)
+            # parallel edges: keep the fastest open one (csr_matrix would add them up)
+            keep = keep[np.lexsort((self.minutes[keep], self.v[keep], self.u[keep]))]
+            pairs = self.u[keep].astype(np.int64) * len(self.lat) + self.v[keep]
+            keep = keep[np.concatenate([[True], pairs[1:] != pairs[:-1]])] if len(keep) else keep
+            n = len(self.lat)
+            self._csr = csr_matrix((self.minutes[keep], (self.u[keep], self.v[keep])), shape=(n, n))
+        return self._csr
+
+    def snap(self, xy):
+        """(nodes, off-road minutes) for an (n, 2) lat/lng array; node -1 where unknown / off the network."""
+        xy = np.asarray(xy, dtype=float).reshape(-1, 2)
+        nodes = np.full(len(xy), -1, dtype=np.int64)
+        offroad = np.zeros(len(xy))
+        ok = ~np.isnan(xy).any(axis=1)
+        if ok.any():
+            dist, idx = self._kd.query(self._project(xy[ok, 0], xy[ok, 1]), distance_upper_bound=ROUTING_SNAP_MAX_KM)
+            near = np.isfinite(dist)
+            rows = np.flatnonzero(ok)[near]
+            nodes[rows] = idx[near]
+            offroad[rows] = dist[near] / ROUTING_OFFROAD_KMH * 60.0
+        return nodes, offroad
+
+    def trees(self, sources, cache=True):
+        """{source node: minutes to every node} - cached trees, the rest in batched searches."""
+        from scipy.sparse.csgraph import dijkstra
+        out, missing = {}, []
+        with self._lock:
+            for s in dict.fromkeys(int(s) for s in sources):
+                hit = self._trees.get(s)
+                if hit is not None:
+                    self._trees.move_to_end(s)
+                    out[s] = hit[0]
+                else:
+                    missing.append(s)
+            graph = self._graph()
+        TREES.inc(len(out), result="cached")
+        TREES.inc(len(missing), result="computed")
+        for k in range(0, len(missing), ROUTING_BATCH):
+            batch = missing[k:k + ROUTING_BATCH]
+            dist, pred = dijkstra(graph, directed=True, indices=batch, return_predecessors=True, limit=ROUTING_LIMIT_MINUTES)
+            with self._lock:
+                for s, d, p in zip(batch, dist.astype(np.float32), pred.astype(np.int32)):
+                    out[s] = d
+                    if cache and graph is self._csr:  # not if a closure landed meanwhile
+                        self._trees[s] = (d, p)
+                while len(self._trees) > ROUTING_CACHE_SOURCES:
+                    self._trees.popitem(last=False)
+        return out
+
+    def matrix(self, src_xy, dst_xy, cache=True):
+        """(sources x targets) minutes; NaN = point not on the network, inf = unreachable."""
+        t0 = time.perf_counter()
+        s_nodes, s_off = self.snap(src_xy)
+        d_nodes, d_off = self.snap(dst_xy)
+        out = np.full((len(s_nodes), len(d_nodes)), np.nan)
+        cols = np.flatnonzero(d_nodes >= 0)
+        trees = self.trees(s_nodes[s_nodes >= 0], cache=cache)
+        for i in np.flatnonzero(s_nodes >= 0):
+            out[i, cols] = trees[int(s_nodes[i])][d_nodes[cols]] + s_off[i] + d_off[cols]
+        MATRIX_SECONDS.observe(time.perf_counter() - t0)
+        return out
+
+    def among(self, xy):
+        """(n x n) minutes between the points themselves: one search from their nodes, nothing cached."""
+        from scipy.sparse.csgraph import dijkstra
+        nodes, off = self.snap(xy)
+        out = np.full((len(nodes), len(nodes)), np.nan)
+        ok = np.flatnonzero(nodes >= 0)
+        if len(ok):
+            uniq, inv = np.unique(nodes[ok], return_inverse=True)
+            with self._lock:
+                graph = self._graph()
+            dist = dijkstra(graph, directed=True, indices=uniq, limit=ROUTING_LIMIT_MINUTES)[:, uniq]
+            out[np.ix_(ok, ok)] = dist[np.ix_(inv, inv)] + off[ok][:, None] + off[ok][None, :]
+        return out
+
+    # ---- closures ----
+    def closure_edges(self, closure):
+        """Edge mask of one closure: {"way_ids": [...]} and / or {"lat", "lng", "radius_km"}."""
+        mask = np.zeros(len(self.u), dtype=bool)
+        if closure.get("way_ids"):
+            mask |= np.isin(self.way, np.asarray(closure["way_ids"], dtype=np.int64))
+        if closure.get("lat") is not None and closure.get("lng") is not None:
+            inside = np.zeros(len(self.lat), dtype=bool)
+            inside[self._kd.query_ball_point(self._project([float(closure["lat"])], [float(closure["lng"])])[0],
+                                             float(closure.get("radius_km") or 0.2))] = True
+            mask |= inside[self.u] | inside[self.v]
+        return mask
+
+    def apply_closures(self, closures):
+        """Make exactly `closures` closed; returns (newly closed, reopened) edge counts."""
+        closed = np.zeros(len(self.u), dtype=bool)
+        for c in closures:
+            closed |= self.closure_edges(c)
+        with self._lock:
+            newly, reopened = closed & ~self.closed, self.closed & ~closed
+            self.closures = list(closures)
+            self.synced_at = time.monotonic()
+            if not newly.any() and not reopened.any():
+                return 0, 0
+            self.closed = closed
+            self._csr = None
+            if reopened.any():
+                self._trees.clear()
+            else:
+                cu, cv = self.u[newly], self.v[newly]
+                for s in [s for s, (_, pred) in self._trees.items() if np.any(pred[cv] == cu)]:
+                    del self._trees[s]
+            return int(newly.sum()), int(reopened.sum())
+
+    def stats(self):
+        with self._lock:
+            return {"nodes": len(self.lat), "edges": len(self.u), "closed_edges": int(self.closed.sum()),
+                    "closures": len(self.closures), "cached_trees": len(self._trees)}
+
+
+def _load_road_network():
+    if not ROAD_NETWORK_PATH:
+        return None
+    net = RoadNetwork.load(ROAD_NETWORK_PATH)
+    logging.info("Road network %s: %s", ROAD_NETWORK_PATH, net.stats())
+    return net
+
+ROADS = register("road_network", _load_road_network, retry_after=300.0)
+
+
+def get_road_network():
+    """The loaded RoadNetwork with current closures, or None (not configured / failed)."""
+    net = ROADS.get_or_none()
+    if net is not None and time.monotonic() - net.synced_at > ROUTING_CLOSURE_SYNC_SECONDS:
+        try:
+            net.apply_closures(list_closures())
+        except Exception as e:
+            net.synced_at = time.monotonic()
+            logging.warning("Road closure sync failed: %s", e)
+    return net
+
+
+# ---------------------------
+# Closures (shared through the database)
+# ---------------------------
+def list_closures():
+    from services.firestore_service import list_road_closures
+    return list_road_closures()
+
+
+def add_closure(way_ids=None, lat=None, lng=None, radius_km=None, note=None):
+    from services.firestore_service import save_road_closure
+    closure_id = f"closure_{uuid.uuid4().hex[:10]}"
+    doc = {"way_ids": [int(w) for w in way_ids or []], "lat": lat, "lng": lng, "radius_km": radius_km,
+           "note": note, "created_at": datetime.utcnow().isoformat()}
+    save_road_closure(closure_id, doc)
+    _resync()
+    return {"id": closure_id, **doc}
+
+
+def remove_closure(closure_id):
+    from services.firestore_service import delete_road_closure
+    if not delete_road_closure(closure_id):
+        return False
+    _resync()
+    return True
+
+
+def _resync():
+    net = ROADS.get_or_none()
+    if net is not None:
+        net.apply_closures(list_closures())
+
+
+# ---------------------------
+# Helpers for dispatch scoring / plans
+# ---------------------------
+def travel_minutes(src_xy, dst_xy, cache=True):
+    """Road minutes (sources x targets) or None when no network is loaded."""
+    net = get_road_network()
+    return None if net is None else net.matrix(src_xy, dst_xy, cache=cache)
+
+
+def order_stops(stops, ranks, start=None):
+    """
+    Visiting order for (lat, lng) stops: higher rank first, within a rank always the stop with
+    the shortest drive from the current position. Returns (order, minutes from the previous
+    stop or start, None where unknown), or None when no network is loaded or there are more
+    than ROUTING_ORDER_MAX_STOPS stops.
+    """
+    if len(stops) > ROUTING_ORDER_MAX_STOPS:
+        return None
+    net = get_road_network()
+    if net is None:
+        return None
+    points = list(stops) + ([start] if start else [])
+    minutes = net.among(np.array([p if p else (np.nan, np.nan) for p in points], dtype=float).reshape(-1, 2))
+    cur = len(stops) if start else None
+    order, legs = [], []
+    for rank in sorted(set(ranks), reverse=True):
+        left = [k for k in range(len(stops)) if ranks[k] == rank]
+        while left:
+            if cur is None:
+                nxt = left[0]
+            else:
+                row = minutes[cur, left]
+                nxt = left[int(np.argmin(np.where(np.isnan(row), np.inf, row)))]
+            leg = minutes[cur, nxt] if cur is not None else np.nan
+            order.append(nxt)
+            legs.append(round(float(leg), 1) if np.isfinite(leg) else None)
+            left.remove(nxt)
+            cur = nxt
+    return order, legs
@@ -0,0 +1,190 @@
+# backend/services/rollups.py
+
+"""
+Hourly incident rollups for /api/analytics (no Firestore access here).
+
+Each incident counts in the rollup doc of the UTC hour it was reported in
+(incident_rollups/{YYYYMMDDHH}): count, per incident_type / severity / status, and
+DDSketch buckets of its time-to-dispatch (timestamp -> dispatched_at) and
+time-to-close (timestamp -> closed_at). DDSketch bucket counts are plain counters,
+so they are kept with the same Increment deltas as every other field and merge
+across hours by addition; quantiles come back within ROLLUP_SKETCH_ACCURACY
+relative error.
+
+incident_rollup_deltas() turns an incident write into the deltas for its hour doc;
+summarize() merges the docs of a time range into series, totals and quantiles.
+ROLLUP_SHARDS > 1 spreads each hour over that many docs for write-heavy bursts
+(a Firestore doc sustains about one write per second).
+"""
+
+import os
+import math
+import zlib
+from datetime import datetime, timezone
+
+from services.geo_tiles import field_key
+
+ROLLUPS_COLLECTION = "incident_rollups"
+ROLLUP_SHARDS = int(os.getenv("ROLLUP_SHARDS", "1"))
+ROLLUP_SKETCH_ACCURACY = float(os.getenv("ROLLUP_SKETCH_ACCURACY", "0.01"))
+QUANTILES = (0.5, 0.9, 0.99)
+
+_GAMMA = (1 + ROLLUP_SKETCH_ACCURACY) / (1 - ROLLUP_SKETCH_ACCURACY)
+_LOG_GAMMA = math.log(_GAMMA)
+# duration sketches: field prefix -> API name
+DURATIONS = {"ttd": "time_to_dispatch", "ttc": "time_to_close"}
+
+
+def as_utc(val):
+    """Naive UTC datetime from a datetime / Firestore timestamp / ISO string, else None."""
+    if isinstance(val, str):
+        try:
+            val = datetime.fromisoformat(val)
+        except ValueError:
+            return None
+    if not isinstance(val, datetime):
+        return None
+    if val.tzinfo is not None:
+        val = val.astimezone(timezone.utc).replace(tzinfo=None)
+    return val
+
+
+def hour_key(dt):
+    return dt.strftime("%Y%m%d%H")
+
+
+def hour_start(key):
+    return datetime(int(key[:4]), int(key[4:6]), int(key[6:8]), int(key[8:10]))
+
+
+def doc_fields(doc_id):
+    """Non-counter fields stored on a rollup doc (queried by `hour`)."""
+    return {"hour": doc_id[:10], "start": hour_start(doc_id)}
+
+
+def sketch_key(seconds):
+    """DDSketch bucket of a duration; "z" holds everything under one second."""
+    if seconds < 1:
+        return "z"
+    return str(int(math.ceil(math.log(seconds) / _LOG_GAMMA)))
+
+
+def _bucket_value(key):
+    if key == "z":
+        return 0.0
+    return 2 * _GAMMA ** int(key) / (_GAMMA + 1)
+
+
+def sketch_quantiles(buckets, quantiles=QUANTILES):
+    """{q: seconds} from {bucket key: count}; empty dict for an empty sketch."""
+    items = sorted(((-1 if k == "z" else int(k)), k, n) for k, n in buckets.items() if n > 0)
+    total = sum(n for _, _, n in items)
+    if not total:
+        return {}
+    out = {}
+    for q in quantiles:
+        rank = q * (total - 1)
+        seen = 0
+        for _, k, n in items:
+            seen += n
+            if seen > rank:
+                out[q] = round(_bucket_value(k), 1)
+                break
+    return out
+
+
+def _durations(data, ts):
+    out = {}
+    dispatched = as_utc(data.get("dispatched_at"))
+    if dispatched is not None:
+        out["ttd"] = max(0.0, (dispatched - ts).total_seconds())
+    if (data.get("status") or "").lower() == "closed":
+        closed = as_utc(data.get("closed_at")) or as_utc(data.get("status_updated_at"))
+        if closed is not None:
+            out["ttc"] = max(0.0, (closed - ts).total_seconds())
+    return out
+
+
+def _contribution(data):
+    """{rollup doc id: {field: n}} for one incident (empty without a timestamp)."""
+    ts = as_utc((data or {}).get("timestamp"))
+    if ts is None:
+        return {}
+    doc_id = hour_key(ts)
+    if ROLLUP_SHARDS > 1:
+        doc_id += f"_{zlib.crc32(ts.isoformat().encode()) % ROLLUP_SHARDS}"
+    analysis = data.get("analysis") or {}
+    fields = {
+        "count": 1,
+        f"type_{field_key(analysis.get('incident_type') or 'other')}": 1,
+        f"sev_{field_key(analysis.get('severity') or data.get('severity'))}": 1,
+        f"status_{field_key(data.get('status') or 'new')}": 1,
+    }
+    for prefix, seconds in _durations(data, ts).items():
+        fields[f"{prefix}_{sketch_key(seconds)}"] = 1
+        fields[f"sum_{prefix}"] = seconds
+    return {doc_id: fields}
+
+
+def incident_rollup_deltas(before, after):
+    """{rollup doc id: {field: delta}} turning `before` into `after` (either may be {} / None)."""
+    out = {}
+    for sign, data in ((-1, before), (1, after)):
+        for doc_id, fields in _contribution(data).items():
+            cur = out.setdefault(doc_id, {})
+            for f, v in fields.items():
+                cur[f] = cur.get(f, 0) + sign * v
+    out = {d: {f: v for f, v in fs.items() if abs(v) > 1e-9} for d, fs in out.items()}
+    return {d: fs for d, fs in out.items() if fs}
+
+
+_GROUPS = {"type": "incident_type", "sev": "severity", "status": "status"}
+
+
+def _empty():
+    return {"count": 0, "incident_type": {}, "severity": {}, "status": {}}
+
+
+def _add(target, fields, sketches):
+    for f, v in fields.items():
+        if not v:
+            continue
+        head, _, tail = f.partition("_")
+        name = _GROUPS.get(head)
+        if name:
+            target[name][tail] = target[name].get(tail, 0) + int(v)
+        elif f == "count":
+            target["count"] += int(v)
+        elif head in DURATIONS:
+            sketches[head][tail] = sketches[head].get(tail, 0) + int(v)
+        elif head == "sum" and tail in DURATIONS:
+            sketches[f] = sketches.get(f, 0.0) + float(v)
+
+
+def summarize(docs, bucket="hour"):
+    """
+    Merge rollup docs ({doc id: fields}) into
+    {"series": [{"bucket", "count", "incident_type", "severity", "status"}], "totals": {...},
+     "time_to_dispatch": {"count", "mean_seconds", "p50", "p90", "p99"}, "time_to_close": {...}}.
+    bucket is "hour" or "day".
+    """
+    series = {}
+    sketches = {prefix: {} for prefix in DURATIONS}
+    for doc_id, fields in docs.items():
+        start = hour_start(doc_id)
+        if bucket == "day":
+            start = start.replace(hour=0)
+        _add(series.setdefault(start, _empty()), fields, sketches)
+    totals = _empty()
+    for entry in series.values():
+        totals["count"] += entry["count"]
+        for name in _GROUPS.values():
+            for k, n in entry[name].items():
+                totals[name][k] = totals[name].get(k, 0) + n
+    out = {"series": [{"bucket": k.isoformat(), **v} for k, v in sorted(series.items())], "totals": totals}
+    for prefix, name in DURATIONS.items():
+        n = sum(sketches[prefix].values())
+        q = sketch_quantiles(sketches[prefix])
+        out[name] = {"count": n, "mean_seconds": round(sketches.get("sum_" + prefix, 0.0) / n, 1) if n else None,
+                     **{f"p{int(k * 100)}": v for k, v in q.items()}}
+    return out
@@ -0,0 +1,583 @@
+# backend/services/sqlite_store.py
+
+"""
+Embedded SQLite storage backend (CRISISMAP_DB_BACKEND=sqlite), for field deployments
+without connectivity.
+
+SqliteStore implements the part of the Firestore client API that the repository
+functions in services/firestore_service use: collections / documents (get, set with
+merge, create, update with dotted paths, delete, add), queries (where, order_by, limit,
+start_after, select, stream / get), get_all, atomic write batches and the
+DELETE_FIELD / Increment / SERVER_TIMESTAMP sentinels. Counter deltas, dispatch
+commits and archiving therefore behave the same on both backends.
+
+Each collection is one table: id, the document as JSON, and a column per indexed field
+(INDEXED_FIELDS). Filters and orderings on those columns run in SQLite on its indexes
+(status, timestamp, assigned_team, team_id, ...); other filters are applied in Python
+to the rows SQLite returns. The database runs in WAL mode, so readers never block the
+single writer; writes are serialized per process and use BEGIN IMMEDIATE across
+processes.
+"""
+
+import json
+import uuid
+import sqlite3
+import logging
+import threading
+from collections import namedtuple
+from datetime import datetime, timezone
+
+try:
+    from google.cloud.firestore_v1 import transforms as _fs_transforms
+    from google.api_core.exceptions import NotFound, AlreadyExists
+except Exception:  # pragma: no cover - the store also works without the SDK
+    class _fs_transforms:
+        """Stand-ins for the SDK's write sentinels (only this store reads them then)."""
+        DELETE_FIELD = object()
+        SERVER_TIMESTAMP = object()
+
+        class Increment:
+            def __init__(self, value):
+                self.value = value
+
+    class NotFound(Exception):
+        pass
+
+    class AlreadyExists(Exception):
+        pass
+
+# the DELETE_FIELD / Increment / SERVER_TIMESTAMP sentinels to write with: the SDK's when it
+# is installed (Firestore needs those), else the stand-ins above
+transforms = _fs_transforms
+
+MAX_BATCH_WRITES = 500
+
+# collection -> fields kept in their own indexed column
+INDEXED_FIELDS = {
+    "processed_incidents": ("status", "timestamp", "assigned_team", "quadkey"),
+    "raw_reports": ("timestamp",),
+    "dispatches": ("team_id", "status", "created_at"),
+    "teams": ("name", "status"),
+    "incident_tiles": ("z", "qk"),
+    "incident_rollups": ("hour",),
+    "revoked_tokens": ("exp", "revoked_at"),
+}
+# collection -> indexes (column tuples) over those fields
+INDEXES = {
+    "processed_incidents": [("status", "timestamp"), ("timestamp",), ("assigned_team", "status"), ("quadkey",)],
+    "raw_reports": [("timestamp",)],
+    "dispatches": [("team_id", "status", "created_at"), ("team_id", "created_at"), ("status",)],
+    "teams": [("name",), ("status",)],
+    "incident_tiles": [("z", "qk")],
+    "incident_rollups": [("hour",)],
+    "revoked_tokens": [("exp",), ("revoked_at",)],
+}
+
+WriteResult = namedtuple("WriteResult", "update_time")
+
+_SQL_OPS = {"==": "=", "!=": "!=", "<": "<", "<=": "<=", ">": ">", ">=": ">="}
+
+
+def _is_delete(v):
+    return v is _fs_transforms.DELETE_FIELD
+
+
+def _is_server_ts(v):
+    return v is _fs_transforms.SERVER_TIMESTAMP
+
+
+def _is_increment(v):
+    return isinstance(v, _fs_transforms.Increment)
+
+
+def _utc_naive(dt):
+    if dt.tzinfo is not None:
+        dt = dt.astimezone(timezone.utc).replace(tzinfo=None)
+    return dt
+
+
+def _json_default(o):
+    if isinstance(o, datetime):
+        return {"__dt__": _utc_naive(o).isoformat()}
+    if hasattr(o, "isoformat"):
+        return o.isoformat()
+    return str(o)
+
+
+def _json_hook(d):
+    if len(d) == 1 and "__dt__" in d:
+        return datetime.fromisoformat(d["__dt__"])
+    return d
+
+
+def _dumps(doc):
+    return json.dumps(doc, default=_json_default, separators=(",", ":"))
+
+
+def _loads(text):
+    return json.loads(text, object_hook=_json_hook)
+
+
+def _column_value(v):
+    """SQL value of an indexed field; None for values SQLite cannot order like Firestore (maps, lists)."""
+    if isinstance(v, datetime):
+        return _utc_naive(v).isoformat(timespec="microseconds")
+    if isinstance(v, bool):
+        return int(v)
+    if isinstance(v, (int, float, str)):
+        return v
+    return None
+
+
+def _scalar(v):
+    return v is None or isinstance(v, (datetime, bool, int, float, str))
+
+
+def _get_path(d, path):
+    cur = d
+    for part in path.split("."):
+        if not isinstance(cur, dict) or part not in cur:
+            return None
+        cur = cur[part]
+    return cur
+
+
+def _apply_value(target, key, v):
+    if _is_delete(v):
+        target.pop(key, None)
+    elif _is_server_ts(v):
+        target[key] = datetime.utcnow()
+    elif _is_increment(v):
+        cur = target.get(key)
+        target[key] = (cur if isinstance(cur, (int, float)) and not isinstance(cur, bool) else 0) + v.value
+    elif isinstance(v, dict):
+        target[key] = _merge({}, v)
+    else:
+        target[key] = v
+
+
+def _merge(doc, data):
+    for k, v in data.items():
+        if isinstance(v, dict) and isinstance(doc.get(k), dict):
+            _merge(doc[k], v)
+        else:
+            _apply_value(doc, k, v)
+    return doc
+
+
+def _apply_update(doc, updates):
+    for path, v in updates.items():
+        parts = path.split(".")
+        cur = doc
+        for p in parts[:-1]:
+            nxt = cur.get(p)
+            if not isinstance(nxt, dict):
+                nxt = cur[p] = {}
+            cur = nxt
+        _apply_value(cur, parts[-1], v)
+    return doc
+
+
+def _project(doc, fields):
+    out = {}
+    for f in fields:
+        v = _get_path(doc, f)
+        if v is None:
+            continue
+        cur = out
+        parts = f.split(".")
+        for p in parts[:-1]:
+            cur = cur.setdefault(p, {})
+        cur[parts[-1]] = v
+    return out
+
+
+def _sort_key(v):
+    # mixed types sort by type name first so comparisons never fail
+    if isinstance(v, datetime):
+        return ("datetime", v.isoformat())
+    return (type(v).__name__, v)
+
+
+_PY_OPS = {
+    "==": lambda a, b: a == b,
+    "!=": lambda a, b: a is not None and a != b,
+    "<": lambda a, b: a is not None and a < b,
+    "<=": lambda a, b: a is not None and a <= b,
+    ">": lambda a, b: a is not None and a > b,
+    ">=": lambda a, b: a is not None and a >= b,
+    "in": lambda a, b: a in b,
+    "not-in": lambda a, b: a is not None and a not in b,
+    "array_contains": lambda a, b: isinstance(a, list) and b in a,
+    "array_contains_any": lambda a, b: isinstance(a, list) and any(x in a for x in b),
+}
+
+
+def _py_match(value, op, target):
+    try:
+        return _PY_OPS[op](value, target)
+    except TypeError:
+        return False
+
+
+class SqliteSnapshot:
+    def __init__(self, ref, raw, projection=None):
+        self.reference = ref
+        self.id = ref.id
+        self._raw = raw
+        self._projection = projection
+        self.exists = raw is not None
+
+    def to_dict(self):
+        if self._raw is None:
+            return None
+        doc = _loads(self._raw) if isinstance(self._raw, str) else dict(self._raw)
+        return _project(doc, self._projection) if self._projection is not None else doc
+
+    def get(self, field):
+        return _get_path(self.to_dict() or {}, field)
+
+
+class SqliteDocumentRef:
+    def __init__(self, store, collection, doc_id):
+        self._store = store
+        self._collection = collection
+        self.id = doc_id
+        self.path = f"{collection}/{doc_id}"
+
+    def get(self, field_paths=None, transaction=None, **kwargs):
+        raw = self._store._read(self._collection, self.id)
+        return SqliteSnapshot(self, raw, list(field_paths) if field_paths else None)
+
+    def set(self, data, merge=False):
+        return self._store.batch().set(self, data, merge=merge).commit()[0]
+
+    def create(self, data):
+        return self._store.batch().create(self, data).commit()[0]
+
+    def update(self, updates):
+        return self._store.batch().update(self, updates).commit()[0]
+
+    def delete(self):
+        return self._store.batch().delete(self).commit()[0]
+
+    def collection(self, name):
+        return SqliteCollection(self._store, f"{self.path}/{name}")
+
+
+class SqliteQuery:
+    def __init__(self, store, collection, filters=(), orders=(), limit=None, start_after=None, projection=None):
+        self._store = store
+        self._collection = collection
+        self._filters = tuple(filters)
+        self._orders = tuple(orders)
+        self._limit = limit
+        self._start_after = start_after
+        self._projection = projection
+
+    def _copy(self, **kw):
+        args = dict(filters=self._filters, orders=self._orders, limit=self._limit,
+                    start_after=self._start_after, projection=self._projection)
+        args.update(kw)
+        return SqliteQuery(self._store, self._collection, **args)
+
+    def where(self, field=None, op=None, value=None, filter=None):
+        if filter is not None:
+            field, op, value = filter.field_path, filter.op_string, filter.value
+        return self._copy(filters=self._filters + ((field, op, value),))
+
+    def order_by(self, field, direction="ASCENDING"):
+        return self._copy(orders=self._orders + ((field, str(direction).upper().startswith("DESC")),))
+
+    def limit(self, n):
+        return self._copy(limit=n)
+
+    def start_after(self, snapshot):
+        return self._copy(start_after=snapshot)
+
+    def select(self, fields):
+        return self._copy(projection=list(fields))
+
+    def stream(self, *args, **kwargs):
+        return iter(self._run())
+
+    def get(self, *args, **kwargs):
+        return self._run()
+
+    # ---- planning ----
+    def _column(self, field, indexed):
+        if field == "__name__":
+            return "id"
+        if field in indexed:
+            return f'"f_{field}"'
+        return None
+
+    def _sql_filter(self, field, op, value, indexed):
+        """(sql, params) for a filter SQLite can evaluate on an indexed column, else None."""
+        col = self._column(field, indexed)
+        if col is None:
+            return None
+        if field == "__name__":
+            value = [getattr(v, "id", v) for v in value] if op in ("in", "not-in") else getattr(value, "id", value)
+        if op in _SQL_OPS and _scalar(value):
+            if value is None:
+                return (f"{col} IS NULL", []) if op == "==" else None
+            null_guard = f"{col} IS NOT NULL AND " if op == "!=" else ""
+            return f"{null_guard}{col} {_SQL_OPS[op]} ?", [_column_value(value)]
+        if op in ("in", "not-in") and isinstance(value, (list, tuple)) and value and all(
+                v is not None and _scalar(v) for v in value):
+            marks = ",".join("?" * len(value))
+            if op == "in":
+                return f"{col} IN ({marks})", [_column_value(v) for v in value]
+            return f"{col} IS NOT NULL AND {col} NOT IN ({marks})", [_column_value(v) for v in value]
+        return None
+
+    def _run(self):
+        store = self._store
+        indexed = store._indexed(self._collection)
+        table = store._table(self._collection)
+        where, params, py_filters = [], [], []
+        for field, op, value in self._filters:
+            sql = self._sql_filter(field, op, value, indexed)
+            if sql is None:
+                py_filters.append((field, op, value))
+            else:
+                where.append(sql[0])
+                params.extend(sql[1])
+        sql_orders = all(self._column(f, indexed) for f, _ in self._orders)
+        pushed = not py_filters and sql_orders
+        order_sql = "id"
+        if sql_orders and self._orders:
+            for f, _ in self._orders:
+                col = self._column(f, indexed)
+                if col != "id":
+                    where.append(f"{col} IS NOT NULL")  # Firestore omits docs missing the order_by field
+            terms = [f"{self._column(f, indexed)} {'DESC' if desc else 'ASC'}" for f, desc in self._orders]
+            if all(self._column(f, indexed) != "id" for f, _ in self._orders):
+                terms.append(f"id {'DESC' if self._orders[-1][1] else 'ASC'}")
+            order_sql = ", ".join(terms)
+        limit_sql = ""
+        if pushed and self._start_after is not None:
+            cursor = self._cursor_sql(indexed)
+            if cursor is None:
+                pushed = False
+            else:
+                where.append(cursor[0])
+                params.extend(cursor[1])
+        if pushed and self._limit is not None:
+            limit_sql = f" LIMIT {int(self._limit)}"
+        sql = f'SELECT id, data FROM "{table}"'
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        sql += f" ORDER BY {order_sql}{limit_sql}"
+        rows = store._query(sql, params)
+        if pushed:
+            return [SqliteSnapshot(SqliteDocumentRef(store, self._collection, i), raw, self._projection) for i, raw in rows]
+        return self._run_python(rows, py_filters, sql_orders)
+
+    def _cursor_sql(self, indexed):
+        """Keyset condition for start_after when every ordering is on a column, else None."""
+        snap = self._start_after
+        data = snap.to_dict() or {}
+        orders = list(self._orders)
+        if all(self._column(f, indexed) != "id" for f, _ in orders):
+            orders.append(("__name__", orders[-1][1] if orders else False))
+        values = []
+        for f, _ in orders:
+            v = snap.id if f == "__name__" else _get_path(data, f)
+            if not _scalar(v) or v is None:
+                return None
+            values.append(_column_value(v))
+        ors, params = [], []
+        for i, (f, desc) in enumerate(orders):
+            terms = [f"{self._column(g, indexed)} = ?" for g, _ in orders[:i]]
+            terms.append(f"{self._column(f, indexed)} {'<' if desc else '>'} ?")
+            ors.append("(" + " AND ".join(terms) + ")")
+            params.extend(values[:i] + [values[i]])
+        return "(" + " OR ".join(ors) + ")", params
+
+    def _run_python(self, rows, py_filters, sql_ordered):
+        items = [(i, _loads(raw)) for i, raw in rows]
+        for field, op, value in py_filters:
+            items = [(k, v) for k, v in items if _py_match(k if field == "__name__" else _get_path(v, field), op, value)]
+        if not sql_ordered:
+            for field, desc in reversed(self._orders):
+                if field == "__name__":
+                    items.sort(key=lambda kv: kv[0], reverse=desc)
+                    continue
+                items = [kv for kv in items if _get_path(kv[1], field) is not None]
+                items.sort(key=lambda kv, f=field: _sort_key(_get_path(kv[1], f)), reverse=desc)
+        if self._start_after is not None:
+            ids = [k for k, _ in items]
+            if self._start_after.id in ids:
+                items = items[ids.index(self._start_after.id) + 1:]
+        if self._limit is not None:
+            items = items[:self._limit]
+        return [SqliteSnapshot(SqliteDocumentRef(self._store, self._collection, k), v, self._projection) for k, v in items]
+
+
+class SqliteCollection(SqliteQuery):
+    def __init__(self, store, name):
+        super().__init__(store, name)
+        self.id = name.split("/")[-1]
+
+    def document(self, doc_id=None):
+        return SqliteDocumentRef(self._store, self._collection, doc_id or uuid.uuid4().hex[:20])
+
+    def add(self, data, document_id=None):
+        ref = self.document(document_id)
+        result = ref.set(data)
+        return result.update_time, ref
+
+
+class SqliteBatch:
+    def __init__(self, store):
+        self._store = store
+        self._ops = []
+
+    def set(self, ref, data, merge=False):
+        self._ops.append(("set", ref, data, merge))
+        return self
+
+    def update(self, ref, updates):
+        self._ops.append(("update", ref, updates, None))
+        return self
+
+    def create(self, ref, data):
+        self._ops.append(("create", ref, data, None))
+        return self
+
+    def delete(self, ref):
+        self._ops.append(("delete", ref, None, None))
+        return self
+
+    def commit(self, *args, **kwargs):
+        if len(self._ops) > MAX_BATCH_WRITES:
+            raise ValueError(f"maximum {MAX_BATCH_WRITES} writes allowed per batch")
+        return self._store._commit(self._ops)
+
+
+class SqliteStore:
+    """Firestore-compatible document store in one SQLite file (WAL mode)."""
+
+    def __init__(self, path):
+        self.path = str(path)
+        self._local = threading.local()
+        self._write_lock = threading.RLock()
+        self._tables = {}
+        self._tables_lock = threading.Lock()
+        self._conn()  # create the file and switch it to WAL now rather than on the first request
+
+    # ---- connections / schema ----
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30.0, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA foreign_keys=OFF")
+            self._local.conn = conn
+        return conn
+
+    def _indexed(self, collection):
+        # subcollections are stored unindexed
+        return () if "/" in collection else INDEXED_FIELDS.get(collection, ())
+
+    def _table(self, collection):
+        table = self._tables.get(collection)
+        if table is not None:
+            return table
+        with self._tables_lock:
+            table = "c_" + collection.replace("/", "__").replace('"', "")
+            fields = self._indexed(collection)
+            cols = "".join(f', "f_{f}"' for f in fields)
+            with self._write_lock:
+                conn = self._conn()
+                conn.execute(f'CREATE TABLE IF NOT EXISTS "{table}" (id TEXT PRIMARY KEY, data TEXT NOT NULL{cols}) WITHOUT ROWID')
+                for idx in INDEXES.get(collection, []) if fields else []:
+                    idx_cols = ", ".join(f'"f_{c}"' for c in idx)
+                    conn.execute(f'CREATE INDEX IF NOT EXISTS "ix_{table}_{"_".join(idx)}" ON "{table}" ({idx_cols})')
+            self._tables[collection] = table
+            return table
+
+    def _query(self, sql, params=()):
+        return self._conn().execute(sql, params).fetchall()
+
+    def _read(self, collection, doc_id):
+        row = self._conn().execute(f'SELECT data FROM "{self._table(collection)}" WHERE id = ?', (doc_id,)).fetchone()
+        return row[0] if row else None
+
+    # ---- writes ----
+    def _commit(self, ops):
+        now = datetime.utcnow()
+        if not ops:
+            return []
+        tables = {ref._collection: self._table(ref._collection) for _, ref, _, _ in ops}
+        with self._write_lock:
+            conn = self._conn()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                for op, ref, data, merge in ops:
+                    table = tables[ref._collection]
+                    if op == "delete":
+                        conn.execute(f'DELETE FROM "{table}" WHERE id = ?', (ref.id,))
+                        continue
+                    row = conn.execute(f'SELECT data FROM "{table}" WHERE id = ?', (ref.id,)).fetchone()
+                    current = _loads(row[0]) if row else None
+                    if op == "create" and current is not None:
+                        raise AlreadyExists(f"Document already exists: {ref.path}")
+                    if op == "update":
+                        if current is None:
+                            raise NotFound(f"No document to update: {ref.path}")
+                        doc = _apply_update(current, data)
+                    elif op == "set" and merge:
+                        doc = _merge(current or {}, data)
+                    else:
+                        doc = _merge({}, data)
+                    self._put(conn, table, ref._collection, ref.id, doc)
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+        return [WriteResult(now)] * len(ops)
+
+    def _put(self, conn, table, collection, doc_id, doc):
+        fields = self._indexed(collection)
+        cols = "".join(f', "f_{f}"' for f in fields)
+        marks = ", ?" * len(fields)
+        conn.execute(f'INSERT OR REPLACE INTO "{table}" (id, data{cols}) VALUES (?, ?{marks})',
+                     [doc_id, _dumps(doc)] + [_column_value(_get_path(doc, f)) for f in fields])
+
+    # ---- client API ----
+    def collection(self, name):
+        return SqliteCollection(self, name)
+
+    def document(self, path):
+        col, doc_id = path.rsplit("/", 1)
+        return SqliteDocumentRef(self, col, doc_id)
+
+    def get_all(self, refs, field_paths=None, transaction=None):
+        refs = list(refs)
+        found = {}
+        by_col = {}
+        for r in refs:
+            by_col.setdefault(r._collection, []).append(r.id)
+        for col, ids in by_col.items():
+            table = self._table(col)
+            for i in range(0, len(ids), 500):
+                chunk = ids[i:i + 500]
+                rows = self._query(f'SELECT id, data FROM "{table}" WHERE id IN ({",".join("?" * len(chunk))})', chunk)
+                for doc_id, raw in rows:
+                    found[(col, doc_id)] = raw
+        projection = list(field_paths) if field_paths else None
+        return iter([SqliteSnapshot(r, found.get((r._collection, r.id)), projection) for r in refs])
+
+    def batch(self):
+        return SqliteBatch(self)
+
+    def close(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+        logging.info("Closed SQLite store %s", self.path)
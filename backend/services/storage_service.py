@@ -1,7 +1,25 @@
 # backend/services/storage_service.py
 
 import uuid
-from firebase_admin import storage
+from config import FIREBASE_STORAGE_BUCKET
+from services.firestore_service import FIREBASE
+
+_BUCKET_OVERRIDE = None
+
+def use_bucket(bucket):
+    """Serve get_bucket() from `bucket` (e.g. benchmarks.standins.FakeBucket); None restores Firebase."""
+    global _BUCKET_OVERRIDE
+    _BUCKET_OVERRIDE = bucket
+
+def get_bucket():
+    """Storage bucket, or None when FIREBASE_STORAGE_BUCKET is not configured."""
+    if _BUCKET_OVERRIDE is not None:
+        return _BUCKET_OVERRIDE
+    if not FIREBASE_STORAGE_BUCKET:
+        return None
+    from firebase_admin import storage
+    FIREBASE.get()
+    return storage.bucket()
 
 def upload_image_to_firebase(file):
     """
@@ -10,7 +28,7 @@ def upload_image_to_firebase(file):
     - public download URL
     """
 
-    bucket = storage.bucket()
+    bucket = get_bucket()
 
     unique_name = f"{uuid.uuid4()}.{file.filename.split('.')[-1]}"
     blob = bucket.blob(f"incidents/{unique_name}")
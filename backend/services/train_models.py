@@ -1,17 +1,48 @@
 # # backend/services/train_models.py
 
+"""
+Offline training for the severity and assignment models.
+
+    python backend/services/train_models.py                      # in-memory (TF-IDF + LogisticRegression)
+    python backend/services/train_models.py stream --source csv --sev_csv big.csv
+    python backend/services/train_models.py stream --source export --export incidents.jsonl
+    python backend/services/train_models.py stream --source firestore
+
+The `stream` mode is out-of-core: chunks are streamed from the source, hashed with
+HashingVectorizer (no vocabulary to hold in memory) and fed to SGDClassifier.partial_fit.
+K-fold cross-validation runs in parallel (one joblib worker per fold, each re-streaming
+the source), and a model card with accuracy and inference latency is written next to
+the saved artifact.
+"""
+
+import sys
+import json
+import time
 import pandas as pd
 from pathlib import Path
 import joblib
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.linear_model import LogisticRegression
+from joblib import Parallel, delayed
+from sklearn.feature_extraction.text import TfidfVectorizer, HashingVectorizer
+from sklearn.linear_model import LogisticRegression, SGDClassifier
+from sklearn.preprocessing import StandardScaler
+from sklearn.pipeline import Pipeline
 import numpy as np
 
-MODELS_DIR = Path("backend/services/models")
-MODELS_DIR.mkdir(parents=True, exist_ok=True)
+# allow `python backend/services/train_models.py` from the repo root
+BACKEND_DIR = Path(__file__).resolve().parents[1]
+if str(BACKEND_DIR) not in sys.path:
+    sys.path.insert(0, str(BACKEND_DIR))
+
+from services import model_registry
+from services import fast_severity
+
+DATA_DIR = Path(__file__).resolve().parent / "models"
+
+SEVERITY_CLASSES = np.array(["critical", "high", "low", "medium"])
+ASSIGNMENT_FEATURES = ['severity_norm', 'distance_km', 'team_load']
 
 # 1) Train severity model
-def train_severity(csv_path):
+def train_severity(csv_path, version=None):
     df = pd.read_csv(csv_path)
     texts = df['text'].fillna("").astype(str).tolist()
     labels = df['label'].astype(str).tolist()
@@ -19,24 +50,232 @@ def train_severity(csv_path):
     X = vec.fit_transform(texts)
     clf = LogisticRegression(max_iter=1000)
     clf.fit(X, labels)
-    joblib.dump({"model": clf, "vectorizer": vec}, MODELS_DIR / "severity_model.joblib")
-    print("Saved severity_model.joblib")
+    version = model_registry.save_model("severity", {"model": clf, "vectorizer": vec}, version=version)
+    # compact array-backed copy for the sklearn-free serving path
+    model_registry.save_model(fast_severity.COMPACT_NAME, fast_severity.export_compact(vec, clf, source_version=version), version=version)
+    print(f"Saved severity model version {version} (+ compact scorer)")
+    return version
 
 # 2) Train assignment model (binary label 0/1)
-def train_assignment(csv_path):
+def train_assignment(csv_path, version=None):
     df = pd.read_csv(csv_path)
-    X = df[['severity_norm','distance_km','team_load']].astype(float).values
+    X = df[ASSIGNMENT_FEATURES].astype(float).values
     y = df['label'].astype(int).values
     clf = LogisticRegression(max_iter=1000)
     clf.fit(X, y)
-    joblib.dump(clf, MODELS_DIR / "assignment_model.joblib")
-    print("Saved assignment_model.joblib")
+    version = model_registry.save_model("assignment", clf, version=version)
+    print(f"Saved assignment model version {version}")
+    return version
+
+# ---------------------------
+# Out-of-core (streaming) training
+# ---------------------------
+
+def iter_severity_csv(csv_path, chunksize):
+    """Yield (texts, labels) chunks from a text,label CSV."""
+    for df in pd.read_csv(csv_path, chunksize=chunksize, usecols=['text', 'label']):
+        yield df['text'].fillna("").astype(str).tolist(), df['label'].astype(str).str.lower().tolist()
+
+def _incident_to_example(item):
+    text = item.get("description") or (item.get("analysis") or {}).get("summary") or ""
+    label = (item.get("analysis") or {}).get("severity")
+    if not text or not label:
+        return None
+    return str(text), str(label).lower()
+
+def _chunk_examples(items, chunksize):
+    texts, labels = [], []
+    for item in items:
+        ex = _incident_to_example(item)
+        if ex is None:
+            continue
+        texts.append(ex[0]); labels.append(ex[1])
+        if len(texts) >= chunksize:
+            yield texts, labels
+            texts, labels = [], []
+    if texts:
+        yield texts, labels
+
+def iter_severity_export(export_path, chunksize):
+    """Yield chunks from a JSON-lines export of processed_incidents (one incident per line)."""
+    def items():
+        with open(export_path) as f:
+            for line in f:
+                line = line.strip()
+                if line:
+                    yield json.loads(line)
+    yield from _chunk_examples(items(), chunksize)
+
+def iter_severity_firestore(chunksize):
+    """Yield chunks straight from the live processed_incidents collection, paged by document id."""
+    from services.firestore_service import iter_incidents
+    yield from _chunk_examples(iter_incidents(chunksize), chunksize)
+
+def make_severity_source(args):
+    """Return a zero-arg callable producing a fresh chunk iterator (each CV fold re-streams)."""
+    if args.source == "csv":
+        return lambda: iter_severity_csv(args.sev_csv, args.chunksize)
+    if args.source == "export":
+        return lambda: iter_severity_export(args.export, args.chunksize)
+    if args.source == "firestore":
+        return lambda: iter_severity_firestore(args.chunksize)
+    raise ValueError(f"unknown source {args.source}")
+
+def make_hashing_vectorizer(n_features=2**20):
+    return HashingVectorizer(ngram_range=(1,2), n_features=n_features, alternate_sign=False, norm="l2")
+
+def make_sgd():
+    return SGDClassifier(loss="log_loss", alpha=1e-6, random_state=0)
+
+def _fold_of(offset, row_count, k):
+    # deterministic fold assignment by global row position
+    return np.arange(offset, offset + row_count) % k
+
+def _stream_fit(source, vec, clf, k=None, holdout_fold=None):
+    """Train on every row not in holdout_fold; return (clf, rows_seen)."""
+    offset = 0
+    seen = 0
+    for texts, labels in source():
+        labels = np.asarray(labels)
+        n = len(texts)
+        if k:
+            mask = _fold_of(offset, n, k) != holdout_fold
+        else:
+            mask = np.ones(n, dtype=bool)
+        mask &= np.isin(labels, SEVERITY_CLASSES)
+        offset += n
+        if not mask.any():
+            continue
+        X = vec.transform([t for t, m in zip(texts, mask) if m])
+        clf.partial_fit(X, labels[mask], classes=SEVERITY_CLASSES)
+        seen += int(mask.sum())
+    return clf, seen
+
+def _stream_score(source, vec, clf, k, fold):
+    offset = 0
+    correct = 0
+    total = 0
+    for texts, labels in source():
+        labels = np.asarray(labels)
+        n = len(texts)
+        mask = (_fold_of(offset, n, k) == fold) & np.isin(labels, SEVERITY_CLASSES)
+        offset += n
+        if not mask.any():
+            continue
+        X = vec.transform([t for t, m in zip(texts, mask) if m])
+        pred = clf.predict(X)
+        correct += int((pred == labels[mask]).sum())
+        total += int(mask.sum())
+    return correct, total
+
+def _cv_fold(source, n_features, epochs, k, fold):
+    vec = make_hashing_vectorizer(n_features)
+    clf = make_sgd()
+    for _ in range(epochs):
+        _stream_fit(source, vec, clf, k=k, holdout_fold=fold)
+    correct, total = _stream_score(source, vec, clf, k, fold)
+    return {"fold": fold, "accuracy": (correct / total) if total else None, "rows": total}
+
+def measure_inference_latency(model, vectorizer, samples, repeats=200):
+    """Single-description predict_proba latency (the runtime call pattern), in microseconds."""
+    samples = list(samples)[:50] or ["test"]
+    timings = []
+    for i in range(repeats):
+        t = samples[i % len(samples)]
+        t0 = time.perf_counter()
+        model.predict_proba(vectorizer.transform([t]))
+        timings.append((time.perf_counter() - t0) * 1e6)
+    timings.sort()
+    return {
+        "p50_us": round(timings[len(timings) // 2], 1),
+        "p95_us": round(timings[int(len(timings) * 0.95) - 1], 1),
+        "mean_us": round(sum(timings) / len(timings), 1),
+    }
+
+def train_severity_streaming(source, n_features=2**20, epochs=1, cv_folds=5, n_jobs=-1, version=None, source_desc=None):
+    t0 = time.perf_counter()
+    cv = []
+    if cv_folds and cv_folds > 1:
+        cv = Parallel(n_jobs=n_jobs)(delayed(_cv_fold)(source, n_features, epochs, cv_folds, f) for f in range(cv_folds))
+    cv_seconds = time.perf_counter() - t0
+
+    t1 = time.perf_counter()
+    vec = make_hashing_vectorizer(n_features)
+    clf = make_sgd()
+    seen = 0
+    for _ in range(epochs):
+        clf, seen = _stream_fit(source, vec, clf)
+    fit_seconds = time.perf_counter() - t1
+
+    first_texts = next(iter(source()), ([], []))[0]
+    accs = [f["accuracy"] for f in cv if f["accuracy"] is not None]
+    card = {
+        "model": "severity",
+        "algorithm": "HashingVectorizer(1-2 grams) + SGDClassifier(log_loss, partial_fit)",
+        "n_features": n_features,
+        "epochs": epochs,
+        "source": source_desc,
+        "rows_trained": seen,
+        "classes": [str(c) for c in clf.classes_],
+        "cv_folds": cv,
+        "cv_accuracy_mean": round(float(np.mean(accs)), 4) if accs else None,
+        "cv_accuracy_std": round(float(np.std(accs)), 4) if accs else None,
+        "cv_seconds": round(cv_seconds, 2),
+        "fit_seconds": round(fit_seconds, 2),
+        "inference_latency": measure_inference_latency(clf, vec, first_texts),
+        "trained_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+    }
+    version = model_registry.save_model("severity", {"model": clf, "vectorizer": vec}, version=version)
+    # hashed features can't be exported to the compact scorer; make sure a stale one isn't served
+    model_registry.deactivate(fast_severity.COMPACT_NAME)
+    card["version"] = version
+    model_registry.write_model_card("severity", version, card)
+    print(f"Saved severity model version {version} (cv accuracy {card['cv_accuracy_mean']})")
+    return version, card
+
+def train_assignment_streaming(csv_path, chunksize, version=None):
+    """Two passes over the CSV: fit the scaler, then partial_fit the classifier."""
+    scaler = StandardScaler()
+    for df in pd.read_csv(csv_path, chunksize=chunksize):
+        scaler.partial_fit(df[ASSIGNMENT_FEATURES].astype(float).values)
+    clf = SGDClassifier(loss="log_loss", random_state=0)
+    for df in pd.read_csv(csv_path, chunksize=chunksize):
+        X = scaler.transform(df[ASSIGNMENT_FEATURES].astype(float).values)
+        clf.partial_fit(X, df['label'].astype(int).values, classes=np.array([0, 1]))
+    pipe = Pipeline([("scaler", scaler), ("clf", clf)])
+    version = model_registry.save_model("assignment", pipe, version=version)
+    print(f"Saved assignment model version {version}")
+    return version
 
 if __name__ == "__main__":
     import argparse
     p = argparse.ArgumentParser()
-    p.add_argument("--sev_csv", default="backend/services/models/severity_data.csv")
-    p.add_argument("--ass_csv", default="backend/services/models/assignment_data.csv")
+    p.add_argument("--sev_csv", default=str(DATA_DIR / "severity_data.csv"))
+    p.add_argument("--ass_csv", default=str(DATA_DIR / "assignment_data.csv"))
+    p.add_argument("--version", default=None, help="version label (default: UTC timestamp)")
+    sub = p.add_subparsers(dest="command")
+    sp = sub.add_parser("stream", help="out-of-core training (HashingVectorizer + SGD partial_fit)")
+    sp.add_argument("--source", choices=["csv", "export", "firestore"], default="csv")
+    sp.add_argument("--export", help="JSON-lines export of processed_incidents (for --source export)")
+    sp.add_argument("--chunksize", type=int, default=50000)
+    sp.add_argument("--n_features", type=int, default=2**20)
+    sp.add_argument("--epochs", type=int, default=1)
+    sp.add_argument("--cv", type=int, default=5, help="k-fold CV (0/1 disables)")
+    sp.add_argument("--n_jobs", type=int, default=-1)
+    sp.add_argument("--skip_assignment", action="store_true")
     args = p.parse_args()
-    train_severity(args.sev_csv)
-    train_assignment(args.ass_csv)
+
+    if args.command == "stream":
+        if args.source == "export" and not args.export:
+            p.error("--export is required with --source export")
+        source_desc = {"csv": args.sev_csv, "export": args.export, "firestore": "processed_incidents"}[args.source]
+        train_severity_streaming(
+            make_severity_source(args), n_features=args.n_features, epochs=args.epochs,
+            cv_folds=args.cv, n_jobs=args.n_jobs, version=args.version,
+            source_desc={"type": args.source, "path": source_desc},
+        )
+        if not args.skip_assignment:
+            train_assignment_streaming(args.ass_csv, args.chunksize, version=args.version)
+    else:
+        train_severity(args.sev_csv, version=args.version)
+        train_assignment(args.ass_csv, version=args.version)
@@ -0,0 +1,138 @@
+# backend/services/triage_queue.py
+
+"""
+Priority triage queue in front of report analysis / processing.
+
+Each raw report is pre-scored cheaply with the local ML severity + keyword heuristics
+(no LLM) and queued by severity tier; a fixed pool of workers always takes the most
+urgent job first, so a "boat sinking, children in water" report is analysed and reaches
+processed_incidents ahead of a backlog of minor ones, however long that backlog is.
+The pre-score is handed to the job so the local tier of the analysis is not redone.
+
+Order: (-tier, arrival), one FIFO per severity tier. Aging is explicit: every
+TRIAGE_AGING_SECONDS a waiting job has spent in the queue raises its tier by one, so a
+"low" report outranks fresh "critical" ones after 3 x TRIAGE_AGING_SECONDS and cannot
+starve. Only the head of each FIFO can be the next job, so a pop is O(tiers).
+
+Queue depth and wait time by severity are exported on /metrics and via stats().
+"""
+
+import os
+import time
+import logging
+import threading
+from collections import deque
+from concurrent.futures import Future
+
+from services import metrics
+from services.gemini_service import local_analysis, SEV_LABEL_TO_NUM
+
+TRIAGE_WORKERS = int(os.getenv("TRIAGE_WORKERS", "8"))
+TRIAGE_AGING_SECONDS = float(os.getenv("TRIAGE_AGING_SECONDS", "120"))
+
+DEPTH = metrics.gauge("crisismap_triage_queue_depth", "Reports waiting in the triage queue", ("severity",))
+WAIT_SECONDS = metrics.histogram("crisismap_triage_wait_seconds", "Time from enqueue to processing start", ("severity",))
+
+
+def triage_score(raw_report):
+    """(severity label, priority ~ 1..5, local analysis or None) from local ML + heuristics."""
+    try:
+        pre = local_analysis(raw_report)
+    except Exception:
+        logging.exception("Triage pre-score failed")
+        return "medium", 2.5, None
+    sev = pre.get("severity") or "medium"
+    return sev, SEV_LABEL_TO_NUM.get(sev, 2) + float(pre.get("urgency_score") or 0.5), pre
+
+
+class TriageQueue:
+    def __init__(self, workers=TRIAGE_WORKERS, aging_seconds=TRIAGE_AGING_SECONDS, score=triage_score):
+        self.workers = workers
+        self.aging_seconds = aging_seconds
+        self.score = score
+        self._tiers = {}  # tier -> deque of jobs in arrival order
+        self._size = 0
+        self._cond = threading.Condition()
+        self._depth = {}
+        self._threads = []
+
+    def _ensure_started(self):
+        if len(self._threads) >= self.workers:
+            return
+        with self._cond:
+            while len(self._threads) < self.workers:
+                t = threading.Thread(target=self._work, name=f"triage-{len(self._threads)}", daemon=True)
+                self._threads.append(t)
+                t.start()
+
+    def submit(self, raw_report, process):
+        """
+        Queue process(raw_report, triage) by severity tier; returns a Future of its result.
+        triage is {"severity", "priority", "wait_seconds", "analysis"}, where analysis is
+        the local pre-score (or None) for process to reuse; it pops it before storing triage.
+        """
+        self._ensure_started()
+        sev, priority, pre = self.score(raw_report)
+        fut = Future()
+        tier = SEV_LABEL_TO_NUM.get(sev, 2)
+        with self._cond:
+            self._tiers.setdefault(tier, deque()).append((time.monotonic(), sev, priority, pre, raw_report, process, fut))
+            self._size += 1
+            self._depth[sev] = self._depth.get(sev, 0) + 1
+            DEPTH.set(self._depth[sev], severity=sev)
+            self._cond.notify()
+        return fut
+
+    def _pop(self, now):
+        """Next job by (-aged tier, arrival); caller holds the lock and the queue is non-empty."""
+        best, best_key = None, None
+        for tier, jobs in self._tiers.items():
+            if not jobs:
+                continue
+            arrival = jobs[0][0]
+            aged = tier + (int((now - arrival) / self.aging_seconds) if self.aging_seconds > 0 else 0)
+            key = (-aged, arrival)
+            if best_key is None or key < best_key:
+                best, best_key = jobs, key
+        self._size -= 1
+        return best.popleft()
+
+    def _work(self):
+        while True:
+            with self._cond:
+                while not self._size:
+                    self._cond.wait()
+                enqueued, sev, priority, pre, raw_report, process, fut = self._pop(time.monotonic())
+                self._depth[sev] -= 1
+                DEPTH.set(self._depth[sev], severity=sev)
+            if not fut.set_running_or_notify_cancel():
+                continue
+            waited = time.monotonic() - enqueued
+            WAIT_SECONDS.observe(waited, severity=sev)
+            try:
+                fut.set_result(process(raw_report, {"severity": sev, "priority": round(priority, 3),
+                                                    "wait_seconds": round(waited, 3), "analysis": pre}))
+            except Exception as e:
+                logging.exception("Triage job failed")
+                fut.set_exception(e)
+
+    def stats(self):
+        with self._cond:
+            depth = {k: v for k, v in self._depth.items() if v}
+        waits = {}
+        for sev in SEV_LABEL_TO_NUM:
+            count, total, _ = WAIT_SECONDS.snapshot(severity=sev)
+            if count:
+                waits[sev] = {"count": count, "avg_wait_seconds": round(total / count, 4)}
+        return {"depth": depth, "total_depth": sum(depth.values()), "wait_by_severity": waits}
+
+
+_QUEUE = None
+_QUEUE_LOCK = threading.Lock()
+
+def get_triage_queue():
+    global _QUEUE
+    with _QUEUE_LOCK:
+        if _QUEUE is None:
+            _QUEUE = TriageQueue()
+        return _QUEUE
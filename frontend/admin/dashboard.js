@@ -55,6 +55,8 @@ const assignInModalBtn = document.getElementById("assignInModalBtn");
 
 const logoutBtn = document.getElementById("logoutBtn");
 logoutBtn?.addEventListener("click", () => {
+  // revoke server-side (best effort) so the signed token can't be reused
+  fetch(`${API_BASE}/api/logout`, { method: "POST", headers: { 'x-admin-token': token }, keepalive: true }).catch(() => {});
   localStorage.removeItem("admin_token");
   window.location.href = "login.html";
 });
@@ -18,6 +18,11 @@ let lastTranscript = "";
 let recognition = null;
 let recognizing = false;
 
+// one Idempotency-Key per report: reused by every retry of the same submission so the
+// server never stores it twice; a new key once it went through or the form is edited
+let submissionKey = null;
+const SUBMIT_ATTEMPTS = 4;
+
 // small toast helper
 function toast(msg){
   const t = document.createElement("div");
@@ -162,9 +167,50 @@ if (readBtn) {
 }
 
 /* =========================
-   Submit handler (unchanged core behavior)
+   Submit handler
    ========================= */
+function newSubmissionKey() {
+  if (window.crypto && typeof window.crypto.randomUUID === "function") return window.crypto.randomUUID();
+  return `${Date.now().toString(36)}-${Math.random().toString(36).slice(2)}-${Math.random().toString(36).slice(2)}`;
+}
+
+const sleep = (ms) => new Promise(resolve => setTimeout(resolve, ms));
+
+// POST with retries on network errors and retryable statuses (409 in progress, 429, 503, 5xx),
+// honouring the server's retry_after and backing off exponentially otherwise
+async function postReport(fd) {
+  if (!submissionKey) submissionKey = newSubmissionKey();
+  let lastErr = null;
+  for (let attempt = 0; attempt < SUBMIT_ATTEMPTS; attempt++) {
+    if (attempt > 0 && statusEl) statusEl.textContent = `Connection problem, retrying (${attempt}/${SUBMIT_ATTEMPTS - 1})…`;
+    let res, data;
+    try {
+      res = await fetch(`${API_BASE}/api/submit-report`, { method: "POST", body: fd, headers: { "Idempotency-Key": submissionKey } });
+      data = await res.json().catch(() => ({}));
+    } catch (err) {
+      lastErr = err;
+      await sleep(1000 * 2 ** attempt);
+      continue;
+    }
+    if (res.ok) return data;
+    if (res.status === 422) {
+      // the key already went through with different content (e.g. the location changed
+      // since): that earlier version is stored, so don't send a second copy behind the
+      // user's back - only an explicit new submit (with a new key) does that
+      submissionKey = null;
+      throw new Error("An earlier version of this report was already received. Submit again only if you want to send it as a new report.");
+    }
+    lastErr = new Error(data.error || "submit failed");
+    const retryable = res.status === 409 || res.status === 429 || res.status >= 500;
+    if (!retryable) throw lastErr;
+    await sleep(1000 * (data.retry_after || 2 ** attempt));
+  }
+  throw lastErr || new Error("submit failed");
+}
+
 if (form) {
+  form.addEventListener("input", () => { submissionKey = null; });
+
   form.addEventListener("submit", async (e) => {
     e.preventDefault();
     if (submitBtn) submitBtn.disabled = true;
@@ -190,10 +236,8 @@ if (form) {
     if (img) fd.append("image", img);
 
     try {
-      const res = await fetch(`${API_BASE}/api/submit-report`, { method: "POST", body: fd });
-      const data = await res.json();
-
-      if (!res.ok) throw new Error(data.error || "submit failed");
+      await postReport(fd);
+      submissionKey = null;
 
       if (statusEl) {
         statusEl.className = "status success";
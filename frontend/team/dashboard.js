@@ -32,6 +32,8 @@ if (teamLabelEl) teamLabelEl.textContent = teamName;
 
 // Logout
 logoutBtn?.addEventListener("click", () => {
+  // revoke server-side (best effort) so the signed token can't be reused
+  fetch(`${API_BASE}/api/team/logout`, { method: "POST", headers: { "x-team-token": token }, keepalive: true }).catch(() => {});
   localStorage.removeItem("team_token");
   localStorage.removeItem("team_id");
   localStorage.removeItem("team_name");
@@ -86,32 +88,20 @@ function addDispatchToArchive(dispatchDoc) {
   if (archiveTabBtn?.getAttribute("data-active") === "true") renderArchive();
 }
 
-// Incident cache (to enrich dispatch entries with full report)
-let INCIDENTS_CACHE = { map: {}, ts: 0 };
-async function fetchIncidentMap(force = false) {
-  // refresh every 30s unless forced
-  const now = Date.now();
-  if (!force && INCIDENTS_CACHE.ts && (now - INCIDENTS_CACHE.ts) < 30000 && INCIDENTS_CACHE.map && Object.keys(INCIDENTS_CACHE.map).length) {
-    return INCIDENTS_CACHE.map;
-  }
+// Joined dispatch view: dispatch doc + its incidents' live status/report fields (one request)
+async function fetchDispatchView(dispatchId) {
   try {
-    const res = await fetch(`${API_BASE}/api/incidents`);
+    const res = await fetch(`${API_BASE}/api/team/dispatches/${encodeURIComponent(dispatchId)}/view`, {
+      headers: { "x-team-token": token }
+    });
     if (!res.ok) {
-      console.warn("fetchIncidentMap: failed to fetch incidents");
-      return INCIDENTS_CACHE.map || {};
-    }
-    const data = await res.json();
-    const map = {};
-    if (Array.isArray(data)) {
-      data.forEach(i => {
-        if (i && i._id) map[i._id] = i;
-      });
+      console.warn("fetchDispatchView: failed to fetch dispatch", dispatchId);
+      return null;
     }
-    INCIDENTS_CACHE = { map, ts: Date.now() };
-    return map;
+    return await res.json();
   } catch (e) {
-    console.warn("fetchIncidentMap error", e);
-    return INCIDENTS_CACHE.map || {};
+    console.warn("fetchDispatchView error", e);
+    return null;
   }
 }
 
@@ -188,7 +178,8 @@ async function loadDispatches() {
   if (!listEl) return;
   listEl.innerHTML = "<p class='muted'>Loading…</p>";
   try {
-    const res = await fetch(`${API_BASE}/api/team/dispatches`, {
+    // active dispatches only, without the large plan_text (the view fetches it on open)
+    const res = await fetch(`${API_BASE}/api/team/dispatches?active=1&summary=1&limit=50`, {
       headers: { "x-team-token": token }
     });
     if (res.status === 401) {
@@ -205,7 +196,8 @@ async function loadDispatches() {
       return;
     }
     const archived = loadArchive().map(d => d.dispatch_id);
-    const dispatches = Array.isArray(data) ? data.filter(dd => !archived.includes(dd.dispatch_id)) : [];
+    const items = Array.isArray(data) ? data : (data.items || []);
+    const dispatches = items.filter(dd => !archived.includes(dd.dispatch_id));
     renderList(dispatches);
   } catch (err) {
     console.error("Network error loading dispatches:", err);
@@ -232,13 +224,16 @@ function renderList(list) {
     card.className = "card";
 
     const created = d.created_at ? String(d.created_at).replace("T", " ") : "";
-    let previewText = "";
-    try {
-      const parsed = tryParseJSON(d.plan_text);
-      const full = planToHumanText(parsed, d.dispatch_id, d.team_id);
-      previewText = (full || "").slice(0, 160);
-    } catch (e) {
-      previewText = String(d.plan_text || "").slice(0, 160);
+    // summary listings carry a server-side plan_preview instead of plan_text
+    let previewText = d.plan_preview || "";
+    if (!previewText && d.plan_text) {
+      try {
+        const parsed = tryParseJSON(d.plan_text);
+        const full = planToHumanText(parsed, d.dispatch_id, d.team_id);
+        previewText = (full || "").slice(0, 160);
+      } catch (e) {
+        previewText = String(d.plan_text || "").slice(0, 160);
+      }
     }
 
     card.innerHTML = `
@@ -259,10 +254,13 @@ function renderList(list) {
 }
 
 // Open dispatch modal — enrich incidents with full report from backend and show tick for completed subtasks
-async function openDispatch(d) {
+async function openDispatch(summary) {
   if (!modal) return;
   modal.classList.remove("hidden");
 
+  // one request: full dispatch (incl. plan_text) with live incident fields embedded
+  const d = (await fetchDispatchView(summary.dispatch_id)) || summary;
+
   dispTitle.textContent = `Dispatch ${d.dispatch_id || "(n/a)"}`;
   dispMeta.textContent = `Team: ${d.team_id || "Unassigned"} • Status: ${d.status || ""} • Created: ${d.created_at || ""}`;
 
@@ -275,8 +273,9 @@ async function openDispatch(d) {
   let humanPlanText = planToHumanText(parsedPlan, d.dispatch_id, d.team_id);
   if (dispPlan) dispPlan.textContent = humanPlanText;
 
-  // Fetch full incident map (latest reports)
-  const incidentMap = await fetchIncidentMap();
+  // live incidents of this dispatch, by id
+  const incidentMap = {};
+  (Array.isArray(d.incidents) ? d.incidents : []).forEach(it => { if (it && it._id) incidentMap[it._id] = it; });
 
   // Build ordered incidents based on plan.route if available (preserve generated order)
   let orderedIncidentEntries = [];
@@ -468,11 +467,9 @@ async function teamUpdateIncident(dispatch_id, incident_id, new_status, incident
 }
 
 /**
- * Robust dispatch archival checker.
- * - Always tries to fetch dispatch doc first.
- * - Builds list of incident IDs from dispatch doc.
- * - Fetches global incidents and maps statuses, but will override status for
- *   updatedIncidentId (if provided) to avoid timing issues.
+ * Dispatch archival checker.
+ * - Fetches the joined dispatch view (incident statuses embedded server-side).
+ * - Overrides the status of updatedIncidentId (if provided) to avoid timing issues.
  *
  * @param {string} dispatch_id
  * @param {object} opts optional { updatedIncidentId, updatedStatus }
@@ -480,95 +477,23 @@ async function teamUpdateIncident(dispatch_id, incident_id, new_status, incident
 async function checkAndArchiveDispatch(dispatch_id, opts = {}) {
   try {
     const { updatedIncidentId, updatedStatus } = opts || {};
+    const view = await fetchDispatchView(dispatch_id);
+    if (!view || !Array.isArray(view.incidents) || !view.incidents.length) return;
 
-    // fetch the authoritative dispatch doc (team-auth required)
-    const docRes = await fetch(`${API_BASE}/api/team/dispatches/${dispatch_id}`, {
-      headers: { "x-team-token": token }
-    });
-
-    let dispatchDoc = null;
-    if (docRes.ok) {
-      dispatchDoc = await docRes.json();
-    }
-
-    // if we have a dispatch doc, prefer the incident ids from it
-    let incidentIds = [];
-    if (dispatchDoc && Array.isArray(dispatchDoc.incidents) && dispatchDoc.incidents.length) {
-      incidentIds = dispatchDoc.incidents.map(i => i && (i._id || i.id)).filter(Boolean);
-    }
-
-    // if no incidentIds from dispatch doc, fallback to scanning global incidents for dispatch reference
-    if (!incidentIds.length) {
-      const allRes = await fetch(`${API_BASE}/api/incidents`);
-      if (!allRes.ok) {
-        // can't check statuses; abort
-        return;
-      }
-      const all = await allRes.json();
-      // filter those referencing dispatch_id in common fields
-      const related = (Array.isArray(all) ? all : []).filter(i => {
-        if (!i) return false;
-        const di = String(i.dispatch_id || i.dispatch || "").trim();
-        return di && di === dispatch_id;
-      });
-      incidentIds = related.map(i => i._id).filter(Boolean);
-      // if still empty, abort
-      if (!incidentIds.length) {
-        return;
-      }
-    }
-
-    // fetch global incidents once and map by id
-    const allRes2 = await fetch(`${API_BASE}/api/incidents`);
-    if (!allRes2.ok) {
-      // fallback: if dispatchDoc had statuses and all closed, archive
-      if (dispatchDoc && Array.isArray(dispatchDoc.incidents) && dispatchDoc.incidents.length) {
-        const allClosedDoc = dispatchDoc.incidents.every(it => String((it.status || "")).toLowerCase() === "closed");
-        if (allClosedDoc) addDispatchToArchive(dispatchDoc);
-      }
-      return;
-    }
-    const allIncidents = await allRes2.json();
-    const map = {};
-    if (Array.isArray(allIncidents)) {
-      allIncidents.forEach(i => { if (i && i._id) map[i._id] = i; });
-    }
-
-    // Build a status list for relevant incidentIds, overriding with updatedStatus if needed
-    const statuses = incidentIds.map(id => {
-      if (!id) return null;
+    const statuses = view.incidents.map(it => {
+      const id = it && (it._id || it.id);
       if (updatedIncidentId && String(id) === String(updatedIncidentId)) {
         return String(updatedStatus || "").toLowerCase();
       }
-      const inc = map[id];
-      if (!inc) {
-        // if not present in global incidents, see if dispatchDoc holds status
-        if (dispatchDoc) {
-          const di = (dispatchDoc.incidents || []).find(x => (x._id || x.id) == id);
-          if (di && di.status) return String(di.status).toLowerCase();
-        }
-        return null;
-      }
-      return String(inc.status || "").toLowerCase();
+      return String((it && it.status) || "").toLowerCase();
     });
 
-    // if any status is null/undefined, treat as not closed
+    // if any status is missing, treat as not closed
     const allClosed = statuses.length > 0 && statuses.every(s => s === "closed");
-
     if (allClosed) {
-      // prefer archiving using the dispatch doc if available; otherwise save minimal info
-      if (dispatchDoc) {
-        addDispatchToArchive(dispatchDoc);
-      } else {
-        // create minimal archive entry
-        addDispatchToArchive({
-          dispatch_id,
-          created_at: new Date().toISOString(),
-          team_id: teamIdStored || "",
-          plan_text: "(archived - dispatch doc not available)",
-          incidents: incidentIds.map(id => ({ _id: id, status: "closed" }))
-        });
-      }
+      addDispatchToArchive(Object.assign({}, view, {
+        incidents: view.incidents.map(it => Object.assign({}, it, { status: "closed" }))
+      }));
     }
   } catch (e) {
     console.warn("checkAndArchiveDispatch failed", e);
@@ -620,8 +545,6 @@ async function teamUpdateLocation(lat = 13.0108, lng = 74.7943) {
       return null;
     }
     alert("Location updated");
-    // clear incident cache so distance-aware logic sees new base coords
-    INCIDENTS_CACHE = { map: {}, ts: 0 };
     return j;
   } catch (e) {
     console.error("Update location error", e);